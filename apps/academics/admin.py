@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Branch, Semester, Subject, Unit, ExamDate
+from django.db.models import Count
+from .models import Branch, Semester, Subject, SubjectGroup, Unit, ExamDate
 
 @admin.register(Branch)
 class BranchAdmin(admin.ModelAdmin):
@@ -12,12 +13,39 @@ class SemesterAdmin(admin.ModelAdmin):
 
 @admin.register(Subject)
 class SubjectAdmin(admin.ModelAdmin):
-    list_display = ('code', 'name', 'branch', 'semester', 'is_active')
+    list_display = ('code', 'name', 'branch', 'semester', 'group', 'is_active')
     list_filter = ('branch', 'semester', 'is_active')
-    search_fields = ('code', 'name')
-    list_select_related = ('branch', 'semester')
+    search_fields = ('code', 'name', 'group__key')
+    list_select_related = ('branch', 'semester', 'group')
+    list_per_page = 20
+
+class GroupMemberInline(admin.TabularInline):
+    model = Subject
+    fields = ('code', 'name', 'branch', 'semester', 'is_active')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    show_change_link = True
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(SubjectGroup)
+class SubjectGroupAdmin(admin.ModelAdmin):
+    list_display = ('key', 'name', 'member_count', 'updated_at')
+    search_fields = ('key', 'name', 'subjects__code')
+    readonly_fields = ('key', 'created_at', 'updated_at')
+    inlines = [GroupMemberInline]
     list_per_page = 20
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(member_count=Count('subjects'))
+
+    def member_count(self, obj):
+        return obj.member_count
+    member_count.short_description = 'Subjects'
+    member_count.admin_order_field = 'member_count'
+
 @admin.register(Unit)
 class UnitAdmin(admin.ModelAdmin):
     list_display = ('subject', 'number', 'name')
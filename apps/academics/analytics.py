@@ -0,0 +1,308 @@
+"""
+Deterministic subject analytics computed from parsed PYQ papers.
+
+Questions are mapped to syllabus units and topics by TF-IDF cosine
+similarity against ``Unit.topics`` (an explicit ``unit`` on the question
+wins), repeated questions are found by clustering near-identical question
+vectors across papers, and everything is aggregated with NumPy / SciPy
+sparse matrices. ``compute_analytics`` returns the same JSON shape the
+LLM-based command used to write to ``SubjectAnalytics``.
+"""
+
+import math
+import re
+from collections import Counter
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+TOPIC_MIN_SIMILARITY = 0.12
+REPEAT_MIN_SIMILARITY = 0.75
+HEATMAP_SIZE = 20
+TOP_REPEATED = 5
+EXAMPLES_PER_CLASS = 3
+
+_LATEX_RE = re.compile(r'\\[a-zA-Z]+')
+_TOKEN_RE = re.compile(r'[a-z][a-z0-9]+')
+_STOPWORDS = frozenset("""
+    a an and are as at be between by can define describe differentiate discuss do does
+    draw each example explain following for from give how in into is it its list
+    marks mention name note notes of on or short state suitable the their them these
+    this those to using what when where which why with write your briefly detail
+    detailed different various also any all brief neat sketch
+""".split())
+
+_NUMERICAL_VERB_RE = re.compile(
+    r'\b(calculate|compute|determine|evaluate|find|solve|estimate|obtain)\b',
+    re.IGNORECASE,
+)
+_NUMERICAL_RE = re.compile(
+    r'\b(convert|simplify|prove that)\b'
+    r'|\d+(\.\d+)?\s*(v|a|w|kw|hz|khz|mhz|kg|m|cm|mm|km|s|ms|ohm|kb|mb|%|°)\b'
+    r'|=',
+    re.IGNORECASE,
+)
+# Asking for a design or a drawing, not merely mentioning a circuit or diagram
+_DESIGN_RE = re.compile(
+    r'\b(design|implement)\b'
+    r'|\b(block diagram|flow ?chart|schematic|architecture)\b'
+    r'|\b(draw|sketch)\b.*\b(diagram|circuit|layout|graph|waveform|sketch)s?\b',
+    re.IGNORECASE,
+)
+COMPLEXITY_CLASSES = ('Theory', 'Numerical', 'Design / Block Diagrams')
+
+
+def _stem(token):
+    if token.endswith('ies') and len(token) > 4:
+        return token[:-3] + 'y'
+    if token.endswith('ing') and len(token) > 5:
+        return token[:-3]
+    if token.endswith('s') and not token.endswith('ss') and len(token) > 3:
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    text = _LATEX_RE.sub(' ', str(text or '').lower())
+    return [_stem(t) for t in _TOKEN_RE.findall(text) if t not in _STOPWORDS]
+
+
+def tfidf(token_lists):
+    """L2-normalised sublinear TF-IDF rows (CSR) for a list of token lists."""
+    vocabulary = {}
+    rows, cols, counts = [], [], []
+    for row, tokens in enumerate(token_lists):
+        for token, count in Counter(tokens).items():
+            rows.append(row)
+            cols.append(vocabulary.setdefault(token, len(vocabulary)))
+            counts.append(count)
+
+    shape = (len(token_lists), max(len(vocabulary), 1))
+    if not counts:
+        return csr_matrix(shape)
+    cols = np.asarray(cols)
+    tf = 1.0 + np.log(np.asarray(counts, dtype=np.float64))
+    df = np.bincount(cols, minlength=shape[1])
+    idf = np.log((1.0 + shape[0]) / (1.0 + df)) + 1.0
+    matrix = csr_matrix((tf * idf[cols], (rows, cols)), shape=shape)
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return csr_matrix(matrix.multiply(1.0 / norms[:, None]))
+
+
+def _questions(papers):
+    """Flatten papers into parallel lists; papers without questions are dropped."""
+    texts, marks, years, paper_index, units = [], [], [], [], []
+    paper_count = 0
+    for paper in papers:
+        data = paper.get('structured_data') or {}
+        questions = data.get('questions') if isinstance(data, dict) else None
+        found = False
+        for q in questions or []:
+            text = (q.get('question_text') or q.get('text') or '').strip() if isinstance(q, dict) else ''
+            if not text:
+                continue
+            found = True
+            texts.append(text)
+            try:
+                marks.append(float(q.get('marks') or 0))
+            except (TypeError, ValueError):
+                marks.append(0.0)
+            years.append(paper.get('year') or 0)
+            paper_index.append(paper_count)
+            try:
+                units.append(int(q.get('unit')))
+            except (TypeError, ValueError):
+                units.append(0)
+        if found:
+            paper_count += 1
+    return texts, np.asarray(marks), np.asarray(years, dtype=np.int64), np.asarray(paper_index), np.asarray(units), paper_count
+
+
+def _percentages(counts):
+    """Integer percentages summing to 100 (largest remainder)."""
+    total = sum(counts)
+    if not total:
+        return [0] * len(counts)
+    exact = [c * 100 / total for c in counts]
+    result = [math.floor(x) for x in exact]
+    order = sorted(range(len(counts)), key=lambda i: exact[i] - result[i], reverse=True)
+    for i in order[:100 - sum(result)]:
+        result[i] += 1
+    return result
+
+
+def classify_complexity(text):
+    # "Calculate the current in the circuit" is a numerical, whatever it mentions
+    if _NUMERICAL_VERB_RE.search(text):
+        return 'Numerical'
+    if _DESIGN_RE.search(text):
+        return 'Design / Block Diagrams'
+    if _NUMERICAL_RE.search(text):
+        return 'Numerical'
+    return 'Theory'
+
+
+def _repeat_clusters(question_vectors, paper_index):
+    """Connected components of the cross-paper near-duplicate graph."""
+    similarity = (question_vectors @ question_vectors.T).tocoo()
+    keep = (
+        (similarity.data >= REPEAT_MIN_SIMILARITY)
+        & (paper_index[similarity.row] != paper_index[similarity.col])
+    )
+    n = question_vectors.shape[0]
+    graph = csr_matrix(
+        (np.ones(int(keep.sum())), (similarity.row[keep], similarity.col[keep])), shape=(n, n)
+    )
+    _, labels = connected_components(graph, directed=False)
+    return labels, similarity.tocsr()
+
+
+def compute_analytics(papers, units, repeated=None):
+    """
+    ``papers``: dicts with ``year`` and ``structured_data`` (PYQ schema).
+    ``units``: dicts with ``number``, ``name`` and ``topics``.
+    ``repeated``: optional persisted question clusters (dicts with ``text``,
+    ``occurrences`` and ``years``, most repeated first); when given they are
+    the top repeated questions instead of the TF-IDF clusters.
+    Returns the ``SubjectAnalytics`` field values.
+    """
+    texts, marks, years, paper_index, explicit_units, paper_count = _questions(papers)
+    units = sorted(units, key=lambda u: u['number'])
+    unit_numbers = np.asarray([u['number'] for u in units], dtype=np.int64)
+
+    topic_names, topic_units = [], []
+    for unit in units:
+        for topic in unit.get('topics') or []:
+            if str(topic).strip():
+                topic_names.append(str(topic).strip())
+                topic_units.append(unit['number'])
+    topic_units = np.asarray(topic_units, dtype=np.int64)
+
+    result = {
+        'predictability_score': 0.0,
+        'unit_roi_data': {},
+        'syllabus_heatmap': {},
+        'complexity_breakdown': {name: 0 for name in COMPLEXITY_CLASSES},
+        'top_repeated_questions': [],
+    }
+    result['complexity_breakdown'].update(theory_examples=[], numerical_examples=[], design_examples=[])
+    if not texts:
+        result['unit_roi_data'] = {
+            str(u['number']): {'avg_marks': 0, 'efficiency': 'Low', 'name': u['name'], 'yearly_questions': {}}
+            for u in units
+        }
+        return result
+
+    n = len(texts)
+    # Topic rows carry their unit name too, so short topic labels still match
+    unit_names = {u['number']: u['name'] for u in units}
+    vectors = tfidf(
+        [tokenize(t) for t in texts]
+        + [tokenize(f"{name} {unit_names[u]}") for name, u in zip(topic_names, topic_units)]
+    )
+    question_vectors, topic_vectors = vectors[:n], vectors[n:]
+
+    # ── Units and topics ─────────────────────────────────────────────────
+    assigned_unit = np.where(np.isin(explicit_units, unit_numbers), explicit_units, 0)
+    assigned_topic = np.full(n, -1)
+    if len(topic_names):
+        similarity = (question_vectors @ topic_vectors.T).toarray()
+        best = similarity.argmax(axis=1)
+        missing = (assigned_unit == 0) & (similarity.max(axis=1) > 0)
+        assigned_unit[missing] = topic_units[best[missing]]
+        # Topics only from the question's own unit
+        similarity[topic_units[None, :] != assigned_unit[:, None]] = -1.0
+        best = similarity.argmax(axis=1)
+        confident = similarity[np.arange(n), best] >= TOPIC_MIN_SIMILARITY
+        assigned_topic[confident] = best[confident]
+
+    year_values = np.unique(years[years > 0])
+    unit_pos = {number: i for i, number in enumerate(unit_numbers)}
+    mapped = np.asarray([unit_pos.get(u, -1) for u in assigned_unit], dtype=np.int64)
+    has_unit = mapped >= 0
+    unit_marks = np.bincount(mapped[has_unit], weights=marks[has_unit], minlength=len(units))
+    yearly = np.zeros((len(units), len(year_values)), dtype=np.int64)
+    dated = has_unit & (years > 0)
+    np.add.at(yearly, (mapped[dated], np.searchsorted(year_values, years[dated])), 1)
+
+    avg_marks = unit_marks / max(paper_count, 1)
+    mean = avg_marks.mean() if len(avg_marks) else 0
+    for i, unit in enumerate(units):
+        if mean and avg_marks[i] >= 1.15 * mean:
+            efficiency = 'High'
+        elif mean and avg_marks[i] > 0.85 * mean:
+            efficiency = 'Medium'
+        else:
+            efficiency = 'Low'
+        result['unit_roi_data'][str(unit['number'])] = {
+            'avg_marks': int(round(avg_marks[i])),
+            'efficiency': efficiency,
+            'name': unit['name'],
+            'yearly_questions': {
+                str(int(year)): int(count) for year, count in zip(year_values, yearly[i]) if count
+            },
+        }
+
+    topic_hits = assigned_topic >= 0
+    topic_counts = np.bincount(assigned_topic[topic_hits], minlength=len(topic_names))
+    for t in np.argsort(-topic_counts, kind='stable')[:HEATMAP_SIZE]:
+        if not topic_counts[t]:
+            break
+        asked = years[(assigned_topic == t) & (years > 0)]
+        result['syllabus_heatmap'][topic_names[t]] = {
+            'frequency': int(topic_counts[t]),
+            'years': [int(y) for y in np.unique(asked)],
+            'unit': int(topic_units[t]),
+        }
+
+    # ── Repeated questions ───────────────────────────────────────────────
+    labels, similarity = _repeat_clusters(question_vectors, paper_index)
+    sizes = np.bincount(labels)
+    clusters = []
+    for label in np.flatnonzero(sizes > 1):
+        members = np.flatnonzero(labels == label)
+        papers_in = np.unique(paper_index[members])
+        if len(papers_in) < 2:
+            continue
+        # Medoid: the member most similar to the rest reads as the canonical wording
+        sub = similarity[members][:, members]
+        medoid = members[int(np.asarray(sub.sum(axis=1)).ravel().argmax())]
+        clusters.append((len(papers_in), members, medoid))
+
+    repeated_marks = sum(marks[members].sum() for _, members, _ in clusters)
+    total_marks = marks.sum()
+    if paper_count >= 2 and total_marks:
+        result['predictability_score'] = round(float(100.0 * repeated_marks / total_marks), 1)
+
+    clusters.sort(key=lambda c: (c[0], marks[c[1]].sum()), reverse=True)
+    if repeated:
+        result['top_repeated_questions'] = [
+            {'text': c['text'], 'occurrences': c['occurrences'], 'years': list(c['years'])}
+            for c in repeated[:TOP_REPEATED]
+        ]
+    else:
+        result['top_repeated_questions'] = [
+            {
+                'text': texts[medoid],
+                'occurrences': occurrences,
+                'years': [int(y) for y in np.unique(years[members]) if y],
+            }
+            for occurrences, members, medoid in clusters[:TOP_REPEATED]
+        ]
+
+    # ── Complexity ───────────────────────────────────────────────────────
+    classes = [classify_complexity(t) for t in texts]
+    percentages = _percentages([classes.count(name) for name in COMPLEXITY_CLASSES])
+    breakdown = result['complexity_breakdown']
+    for name, pct in zip(COMPLEXITY_CLASSES, percentages):
+        breakdown[name] = pct
+    example_keys = dict(zip(COMPLEXITY_CLASSES, ('theory_examples', 'numerical_examples', 'design_examples')))
+    for i in np.argsort(-marks, kind='stable'):
+        examples = breakdown[example_keys[classes[i]]]
+        if len(examples) < EXAMPLES_PER_CLASS and texts[i] not in examples:
+            examples.append(texts[i])
+
+    return result
@@ -1,3 +1,5 @@
+from django.core.cache import cache
+
 from apps.common.services import BaseService
 from apps.academics.models import Branch, Semester, Subject, Unit, ExamDate
 
@@ -71,7 +73,7 @@ class AcademicsDataService(BaseService):
     def get_subject_by_id(cls, subject_id):
         return cls.get_or_set_cache(
             f'subject_{subject_id}',
-            lambda: Subject.objects.select_related('branch', 'semester', 'analytics')
+            lambda: Subject.objects.select_related('branch', 'semester', 'group__analytics')
             .prefetch_related('units')
             .filter(pk=subject_id)
             .first(),
@@ -112,7 +114,7 @@ class AcademicsDataService(BaseService):
         return cls.get_or_set_cache(
             f'subjects_{branch.id}_{semester.id}',
             lambda: list(
-                Subject.objects.select_related('branch', 'semester', 'analytics')
+                Subject.objects.select_related('branch', 'semester', 'group__analytics')
                 .filter(branch=branch, semester=semester, is_active=True)
                 .order_by('code')
             ),
@@ -143,6 +145,26 @@ class AcademicsDataService(BaseService):
             timeout=3600,
         )
 
+    @classmethod
+    def get_units_for_subjects(cls, subjects):
+        """
+        Units for many subjects at once, keyed by subject id. Shares the
+        per-subject cache keys of ``get_units_for_subject``; misses are
+        filled with a single query.
+        """
+        keys = {subj.id: f'units_for_subject_{subj.id}' for subj in subjects}
+        cached = cache.get_many(keys.values())
+        result = {sid: cached[key] for sid, key in keys.items() if key in cached}
+
+        missing = [sid for sid in keys if sid not in result]
+        if missing:
+            fetched = {sid: [] for sid in missing}
+            for unit in Unit.objects.filter(subject_id__in=missing).order_by('number'):
+                fetched[unit.subject_id].append(unit)
+            cache.set_many({keys[sid]: units for sid, units in fetched.items()}, 3600)
+            result.update(fetched)
+        return result
+
     @classmethod
     def get_exam_date(cls, branch, semester):
         return cls.get_or_set_cache(
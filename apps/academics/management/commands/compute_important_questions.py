@@ -1,9 +1,10 @@
 import json
-import httpx
 import asyncio
 from django.core.management.base import BaseCommand
+from apps.common import async_runtime, llm_cache
 from asgiref.sync import sync_to_async
-from apps.academics.models import Subject, SubjectAnalytics
+from apps.academics.subject_groups import groups_with_members, sync_groups
+from apps.content import parse_checkpoints
 from apps.content.models import ParsedDocument
 from apps.content.services.ai_parser.important_qs import ImportantQsParser
 
@@ -14,126 +15,125 @@ class Command(BaseCommand):
         parser.add_argument('--force', action='store_true', help='Delete existing Important Questions and re-generate.')
         parser.add_argument('--unit-wise', action='store_true', help='Generate per-unit important questions.')
         parser.add_argument('--complete', action='store_true', help='Generate a single subject-wide important question bank.')
+        parser.add_argument('--subject', type=str, help='Filter by subject code (e.g. CS-601).')
+        parser.add_argument('--refresh-cache', action='store_true', help='Ignore cached LLM responses and call the model again.')
 
     def handle(self, *args, **options):
-        asyncio.run(self.async_handle(options))
+        with llm_cache.refreshing(options['refresh_cache']):
+            async_runtime.run_coro(self.async_handle(options))
 
     async def async_handle(self, options):
         force_reprocess = options.get('force', False)
         unit_wise = options.get('unit_wise', False)
         complete = options.get('complete', False)
+        subject_filter = options.get('subject')
         
         # If no specific mode is chosen, default to --complete
         if not unit_wise and not complete:
             complete = True
 
-        # 1. Get all active subjects
+        # 1. Get all active subject groups (one generation each, attached to every member)
         @sync_to_async
-        def get_all_subjects():
-            qs = Subject.objects.filter(is_active=True)
-            if subject_filter:
-                qs = qs.filter(code__iexact=subject_filter)
-            
-            subjects = list(qs.prefetch_related('units'))
-            unique_subjects = []
-            seen_codes = set()
-            for s in subjects:
-                norm_code = s.code.replace(' ', '').replace('-', '').upper()
-                if norm_code not in seen_codes:
-                    unique_subjects.append(s)
-                    seen_codes.add(norm_code)
-            return unique_subjects
-
-        subjects = await get_all_subjects()
+        def get_all_groups():
+            sync_groups()
+            return groups_with_members(code=subject_filter)
+
+        groups = await get_all_groups()
         
-        if not subjects:
+        if not groups:
             self.stdout.write(self.style.ERROR("No active subjects found."))
             return
 
-        # 2. Concurrency Control: Large limit as requested (SQLite safe-ish, but using many tasks)
-        semaphore = asyncio.Semaphore(5000)
+        # 2. Concurrency Control: every task starts at once; the parser's model calls follow
+        # the adaptive concurrency limit (apps/common/concurrency.py)
         parser = ImportantQsParser()
 
-        async def process_task(subject, unit_number=None, module_title=None):
-            async with semaphore:
-                try:
-                    title_suffix = f"Unit {unit_number}: {module_title}" if unit_number and module_title else (f"Unit {unit_number}" if unit_number else "Subject-wide")
-                    doc_title = f"{subject.code} Important Questions - {title_suffix}"
+        async def process_task(members, unit_number=None, module_title=None):
+            subject = members[0]
+            try:
+                title_suffix = f"Unit {unit_number}: {module_title}" if unit_number and module_title else (f"Unit {unit_number}" if unit_number else "Subject-wide")
+                doc_title = f"{subject.code} Important Questions - {title_suffix}"
                     
-                    # 0. Check if it already exists
-                    @sync_to_async
-                    def handle_existing():
-                        query = ParsedDocument.objects.filter(subjects=subject, document_type='IMPORTANT_Q')
-                        if unit_number:
-                            # Use title as a proxy for unit-wise distinction
-                            query = query.filter(title__contains=f"Unit {unit_number}")
-                        else:
-                            query = query.exclude(title__contains="Unit ")
+                # 0. Check if it already exists
+                @sync_to_async
+                def handle_existing():
+                    query = ParsedDocument.objects.filter(subjects__in=members, document_type='IMPORTANT_Q').distinct()
+                    if unit_number:
+                        # Use title as a proxy for unit-wise distinction
+                        query = query.filter(title__contains=f"Unit {unit_number}")
+                    else:
+                        query = query.exclude(title__contains="Unit ")
                         
-                        if query.exists():
-                            if force_reprocess:
-                                query.delete()
-                                return False
-                            return True
-                        return False
+                    existing = list(query)
+                    if existing:
+                        if force_reprocess:
+                            ParsedDocument.objects.filter(pk__in=[d.pk for d in existing]).delete()
+                            return False
+                        # Members that joined the group later get the existing document
+                        for doc in existing:
+                            doc.subjects.add(*members)
+                        return True
+                    return False
                     
-                    if await handle_existing():
-                        return
+                if await handle_existing():
+                    return
 
-                    self.stdout.write(f"Generating {title_suffix} IQ for {subject.code}...")
+                self.stdout.write(f"Generating {title_suffix} IQ for {subject.code}...")
 
-                    @sync_to_async
-                    def create_doc():
-                        doc = ParsedDocument.objects.create(
-                            document_type='IMPORTANT_Q',
-                            title=doc_title,
-                            parsing_status='PROCESSING',
-                            is_published=False,
-                            render_mode='NATIVE'
-                        )
-                        doc.subjects.add(subject)
-                        return doc
-
-                    doc_obj = await create_doc()
-
-                    try:
-                        parse_kwargs = {"unit_number": unit_number} if unit_number else {}
-                        result = await parser.parse(doc_obj, **parse_kwargs)
+                @sync_to_async
+                def create_doc():
+                    doc = ParsedDocument.objects.create(
+                        document_type='IMPORTANT_Q',
+                        title=doc_title,
+                        parsing_status='PROCESSING',
+                        is_published=False,
+                        render_mode='NATIVE'
+                    )
+                    doc.subjects.add(*members)
+                    return doc
+
+                doc_obj = await create_doc()
+
+                try:
+                    parse_kwargs = {"unit_number": unit_number} if unit_number else {}
+                    result = await parser.parse(doc_obj, **parse_kwargs)
                         
-                        @sync_to_async
-                        def save_doc(data):
-                            doc_obj.structured_data = data
-                            doc_obj.parsing_status = 'COMPLETED'
-                            doc_obj.is_published = True
-                            doc_obj.save()
-
-                        await save_doc(result)
-                        self.stdout.write(self.style.SUCCESS(f"Finished {subject.code} - {title_suffix}"))
-
-                    except Exception as e:
-                        @sync_to_async
-                        def mark_failed():
-                            doc_obj.parsing_status = 'FAILED'
-                            doc_obj.save()
-                        await mark_failed()
-                        self.stdout.write(self.style.ERROR(f"Failed {subject.code} {title_suffix}: {str(e)[:100]}"))
+                    @sync_to_async
+                    def save_doc(data):
+                        doc_obj.structured_data = data
+                        doc_obj.parsing_status = 'COMPLETED'
+                        doc_obj.is_published = True
+                        doc_obj.save()
+                        parse_checkpoints.clear(doc_obj.id)
+
+                    await save_doc(result)
+                    self.stdout.write(self.style.SUCCESS(f"Finished {subject.code} - {title_suffix}"))
 
                 except Exception as e:
-                    self.stdout.write(self.style.ERROR(f"Outer error for {subject.code}: {str(e)}"))
+                    @sync_to_async
+                    def mark_failed():
+                        doc_obj.parsing_status = 'FAILED'
+                        doc_obj.save()
+                    await mark_failed()
+                    self.stdout.write(self.style.ERROR(f"Failed {subject.code} {title_suffix}: {str(e)[:100]}"))
+
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Outer error for {subject.code}: {str(e)}"))
 
         # Create tasks
         all_tasks = []
-        for s in subjects:
+        for group, members in groups:
+            s = members[0]
             # Mode A: Subject-wide (Complete)
             if complete:
-                all_tasks.append(process_task(s))
+                all_tasks.append(process_task(members))
             
             # Mode B: Unit-wise
             if unit_wise:
                 @sync_to_async
                 def get_syllabus():
                     return ParsedDocument.objects.filter(
-                        subjects=s,
+                        subjects__in=members,
                         document_type='SYLLABUS',
                         parsing_status='COMPLETED'
                     ).first()
@@ -143,11 +143,11 @@ class Command(BaseCommand):
                     for module in syllabus.structured_data['modules']:
                         u_num = module.get('unit')
                         u_title = module.get('title', f"Unit {u_num}")
-                        all_tasks.append(process_task(s, unit_number=u_num, module_title=u_title))
+                        all_tasks.append(process_task(members, unit_number=u_num, module_title=u_title))
                 else:
                     self.stdout.write(self.style.WARNING(f"No structured syllabus found for {s.code}. Falling back to Units 1-5."))
                     for unit_num in range(1, 6):
-                        all_tasks.append(process_task(s, unit_num))
+                        all_tasks.append(process_task(members, unit_num))
 
         if not all_tasks:
             self.stdout.write(self.style.WARNING("No tasks created."))
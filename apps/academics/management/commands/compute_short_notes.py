@@ -1,7 +1,8 @@
 import asyncio
 from django.core.management.base import BaseCommand
+from apps.common import async_runtime, llm_cache
 from asgiref.sync import sync_to_async
-from apps.academics.models import Subject
+from apps.academics.subject_groups import groups_with_members, sync_groups
 from apps.content.models import ParsedDocument
 from apps.content.services.ai_parser.short_notes import ShortNotesParser
 
@@ -14,9 +15,11 @@ class Command(BaseCommand):
         parser.add_argument('--complete', action='store_true', help='Generate a single subject-wide short note bank.')
         parser.add_argument('--subject', type=str, help='Filter by subject code (e.g. CS-601).')
         parser.add_argument('--unit', type=int, help='Filter by unit number (1-5).')
+        parser.add_argument('--refresh-cache', action='store_true', help='Ignore cached LLM responses and call the model again.')
 
     def handle(self, *args, **options):
-        asyncio.run(self.async_handle(options))
+        with llm_cache.refreshing(options['refresh_cache']):
+            async_runtime.run_coro(self.async_handle(options))
 
     async def async_handle(self, options):
         force_reprocess = options.get('force', False)
@@ -29,114 +32,108 @@ class Command(BaseCommand):
             complete = True
 
         @sync_to_async
-        def get_all_subjects():
-            qs = Subject.objects.filter(is_active=True)
-            if subject_filter:
-                qs = qs.filter(code__iexact=subject_filter)
-            
-            subjects = list(qs.prefetch_related('units'))
-            unique_subjects = []
-            seen_codes = set()
-            for s in subjects:
-                norm_code = s.code.replace(' ', '').replace('-', '').upper()
-                if norm_code not in seen_codes:
-                    unique_subjects.append(s)
-                    seen_codes.add(norm_code)
-            return unique_subjects
-
-        subjects = await get_all_subjects()
+        def get_all_groups():
+            sync_groups()
+            return groups_with_members(code=subject_filter)
+
+        groups = await get_all_groups()
         
-        if not subjects:
+        if not groups:
             self.stdout.write(self.style.ERROR("No active subjects found."))
             return
 
-        semaphore = asyncio.Semaphore(5000)
+        # Every task starts at once; the model calls follow the adaptive concurrency limit
         parser = ShortNotesParser()
 
-        async def process_task(subject, unit_number=None, module_title=None):
-            async with semaphore:
-                try:
-                    title_suffix = f"Unit {unit_number}: {module_title}" if unit_number and module_title else (f"Unit {unit_number}" if unit_number else "Subject-wide")
-                    doc_title = f"{subject.code} Short Notes - {title_suffix}"
+        async def process_task(members, unit_number=None, module_title=None):
+            subject = members[0]
+            try:
+                title_suffix = f"Unit {unit_number}: {module_title}" if unit_number and module_title else (f"Unit {unit_number}" if unit_number else "Subject-wide")
+                doc_title = f"{subject.code} Short Notes - {title_suffix}"
                     
-                    @sync_to_async
-                    def handle_existing():
-                        query = ParsedDocument.objects.filter(subjects=subject, document_type='SHORT_NOTES')
-                        if unit_number:
-                            query = query.filter(title__contains=f"Unit {unit_number}")
-                        else:
-                            query = query.exclude(title__contains="Unit ")
+                @sync_to_async
+                def handle_existing():
+                    query = ParsedDocument.objects.filter(subjects__in=members, document_type='SHORT_NOTES').distinct()
+                    if unit_number:
+                        query = query.filter(title__contains=f"Unit {unit_number}")
+                    else:
+                        query = query.exclude(title__contains="Unit ")
                         
-                        if query.exists():
-                            if force_reprocess:
-                                query.delete()
-                                return False
-                            return True
-                        return False
+                    existing = list(query)
+                    if existing:
+                        if force_reprocess:
+                            ParsedDocument.objects.filter(pk__in=[d.pk for d in existing]).delete()
+                            return False
+                        # Members that joined the group later get the existing document
+                        for doc in existing:
+                            doc.subjects.add(*members)
+                        return True
+                    return False
                     
-                    if await handle_existing():
-                        return
+                if await handle_existing():
+                    return
 
-                    self.stdout.write(f"Generating {title_suffix} Short Notes for {subject.code}...")
+                self.stdout.write(f"Generating {title_suffix} Short Notes for {subject.code}...")
 
-                    @sync_to_async
-                    def create_doc():
-                        doc = ParsedDocument.objects.create(
-                            document_type='SHORT_NOTES',
-                            title=doc_title,
-                            parsing_status='PROCESSING',
-                            is_published=False,
-                            render_mode='NATIVE'
-                        )
-                        doc.subjects.add(subject)
-                        return doc
-
-                    doc_obj = await create_doc()
-
-                    try:
-                        parse_kwargs = {"unit_number": unit_number} if unit_number else {}
-                        result = await parser.generate(doc_obj, subject, **parse_kwargs)
+                @sync_to_async
+                def create_doc():
+                    doc = ParsedDocument.objects.create(
+                        document_type='SHORT_NOTES',
+                        title=doc_title,
+                        parsing_status='PROCESSING',
+                        is_published=False,
+                        render_mode='NATIVE'
+                    )
+                    doc.subjects.add(*members)
+                    return doc
+
+                doc_obj = await create_doc()
+
+                try:
+                    parse_kwargs = {"unit_number": unit_number} if unit_number else {}
+                    result = await parser.generate(doc_obj, subject, **parse_kwargs)
                         
-                        @sync_to_async
-                        def save_doc(data):
-                            doc_obj.structured_data = data
-                            doc_obj.parsing_status = 'COMPLETED'
-                            doc_obj.is_published = True
-                            doc_obj.save()
-
-                        await save_doc(result)
-                        self.stdout.write(self.style.SUCCESS(f"Finished {subject.code} - {title_suffix}"))
-
-                    except Exception as e:
-                        @sync_to_async
-                        def mark_failed():
-                            doc_obj.parsing_status = 'FAILED'
-                            doc_obj.save()
-                        await mark_failed()
-                        self.stdout.write(self.style.ERROR(f"Failed {subject.code} {title_suffix}: {str(e)[:100]}"))
+                    @sync_to_async
+                    def save_doc(data):
+                        doc_obj.structured_data = data
+                        doc_obj.parsing_status = 'COMPLETED'
+                        doc_obj.is_published = True
+                        doc_obj.save()
+
+                    await save_doc(result)
+                    self.stdout.write(self.style.SUCCESS(f"Finished {subject.code} - {title_suffix}"))
 
                 except Exception as e:
-                    self.stdout.write(self.style.ERROR(f"Outer error for {subject.code}: {str(e)}"))
+                    @sync_to_async
+                    def mark_failed():
+                        doc_obj.parsing_status = 'FAILED'
+                        doc_obj.save()
+                    await mark_failed()
+                    self.stdout.write(self.style.ERROR(f"Failed {subject.code} {title_suffix}: {str(e)[:100]}"))
+
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Outer error for {subject.code}: {str(e)}"))
 
         all_tasks = []
-        for s in subjects:
+        for group, members in groups:
+            s = members[0]
             if complete and not unit_filter:
-                all_tasks.append(process_task(s))
+                all_tasks.append(process_task(members))
             
             if unit_wise:
                 @sync_to_async
                 def get_syllabus():
                     # 1. Direct link
                     doc = ParsedDocument.objects.filter(
-                        subjects=s,
+                        subjects__in=members,
                         document_type='SYLLABUS',
                         parsing_status__in=['COMPLETED', 'PENDING'],
                         structured_data__isnull=False
                     ).first()
                     if not doc:
-                        # 2. Code fallback (for multi-branch subjects)
+                        # 2. Any subject of the group (for multi-branch subjects)
                         doc = ParsedDocument.objects.filter(
-                            subjects__code=s.code,
+                            subjects__group=group,
                             document_type='SYLLABUS',
                             parsing_status__in=['COMPLETED', 'PENDING'],
                             structured_data__isnull=False
@@ -150,13 +147,13 @@ class Command(BaseCommand):
                         if unit_filter and str(u_num) != str(unit_filter):
                             continue
                         u_title = module.get('title', f"Unit {u_num}")
-                        all_tasks.append(process_task(s, unit_number=u_num, module_title=u_title))
+                        all_tasks.append(process_task(members, unit_number=u_num, module_title=u_title))
                 else:
                     self.stdout.write(self.style.WARNING(f"No syllabus for {s.code}. Units 1-5 fallback."))
                     for unit_num in range(1, 6):
                         if unit_filter and unit_num != unit_filter:
                             continue
-                        all_tasks.append(process_task(s, unit_num))
+                        all_tasks.append(process_task(members, unit_num))
 
         if not all_tasks:
             self.stdout.write(self.style.WARNING("No tasks created."))
@@ -1,16 +1,18 @@
 import json
-import httpx
+import time
 import asyncio
+from collections import defaultdict
 from django.core.management.base import BaseCommand
-from apps.academics.models import Subject, SubjectAnalytics
-from apps.content.models import ParsedDocument
-from langchain_openai import ChatOpenAI
+from django.db import transaction
+from apps.academics.analytics import compute_analytics
+from apps.academics.models import SubjectAnalytics, Unit
+from apps.academics.subject_groups import groups_with_members, sync_groups
+from apps.common import async_runtime, llm_cache, llm_gateway
+from apps.content.models import ParsedDocument, QuestionCluster
 from langchain_core.messages import HumanMessage, SystemMessage
 from pydantic import BaseModel, Field
 from typing import List
-from langfuse.langchain import CallbackHandler
 
-_ai_parser_client = httpx.AsyncClient(timeout=120.0)
 
 # ---------------------------------------------------------
 # Define Pydantic Schema for Structured Output
@@ -48,203 +50,236 @@ class SubjectAnalyticsSchema(BaseModel):
     top_repeated_questions: List[RepeatedQuestion] = Field(description="Top 5 repeated questions")
 
 class Command(BaseCommand):
-    help = 'Computes analytics data for specific subjects (bt201, bt102, bt205) using LLM'
+    help = (
+        'Computes subject analytics (unit weightage, topic heatmap, repeated questions, '
+        'complexity) from parsed PYQs. Runs the local statistical engine by default; '
+        '--llm additionally asks the LLM to refine the statistical result.'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument('--force', action='store_true', help='Force re-computation even if analytics exist')
+        parser.add_argument('--llm', action='store_true', help='Refine the statistical result with the LLM (slow, paid)')
+        parser.add_argument('--refresh-cache', action='store_true', help='Ignore cached LLM responses and call the model again.')
 
     def handle(self, *args, **options):
-        asyncio.run(self.async_handle(*args, **options))
+        if options.get('llm'):
+            with llm_cache.refreshing(options['refresh_cache']):
+                async_runtime.run_coro(self.async_handle(*args, **options))
+            return
+        self.handle_statistical(force=options.get('force'))
+
+    # ------------------------------------------------------------------ #
+    # Statistical engine                                                   #
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def load_corpus(subjects):
+        """PYQ papers and units per subject id, in three queries for the whole corpus."""
+        through = ParsedDocument.subjects.through
+        doc_ids_by_subject = defaultdict(set)
+        for subject_id, document_id in through.objects.filter(
+            subject_id__in=[s.id for s in subjects],
+            parseddocument__document_type__in=['PYQ', 'UNSOLVED_PYQ'],
+            parseddocument__structured_data__isnull=False,
+        ).values_list('subject_id', 'parseddocument_id'):
+            doc_ids_by_subject[subject_id].add(document_id)
+
+        all_doc_ids = set().union(*doc_ids_by_subject.values()) if doc_ids_by_subject else set()
+        papers = {
+            d['id']: d
+            for d in ParsedDocument.objects.filter(id__in=all_doc_ids).values('id', 'year', 'title', 'structured_data')
+        }
+        units_by_subject = defaultdict(list)
+        for unit in Unit.objects.filter(subject__in=subjects).order_by('number').values('subject_id', 'number', 'name', 'topics'):
+            units_by_subject[unit['subject_id']].append(unit)
+        return doc_ids_by_subject, papers, units_by_subject
+
+    @staticmethod
+    def load_repeated(codes):
+        """Persisted near-duplicate clusters asked in 2+ papers, per group key, most repeated first."""
+        repeated = defaultdict(list)
+        for cluster in QuestionCluster.objects.filter(subject_key__in=codes, occurrences__gte=2).order_by(
+            '-occurrences', '-marks', 'id'
+        ).values('subject_key', 'text', 'occurrences', 'years'):
+            repeated[cluster['subject_key']].append(cluster)
+        return repeated
 
+    @staticmethod
+    def group_inputs(sub_list, doc_ids_by_subject, papers, units_by_subject):
+        """Papers attached to any subject of the group, and the fullest syllabus among them."""
+        doc_ids = set().union(*(doc_ids_by_subject.get(s.id, set()) for s in sub_list))
+        group_papers = sorted((papers[i] for i in doc_ids if i in papers), key=lambda d: (d['year'] or 0, d['id']))
+        units = max((units_by_subject.get(s.id, []) for s in sub_list), key=len)
+        return group_papers, units
+
+    @staticmethod
+    def load_groups():
+        """Active subjects per ``SubjectGroup``; analytics are stored once per group."""
+        sync_groups()
+        return groups_with_members()
+
+    def handle_statistical(self, force=False):
+        started = time.monotonic()
+        groups = self.load_groups()
+        if not groups:
+            self.stdout.write(self.style.ERROR("No active subjects found in the database."))
+            return
+
+        existing = set() if force else set(SubjectAnalytics.objects.values_list('group_id', flat=True))
+        doc_ids_by_subject, papers, units_by_subject = self.load_corpus([s for _, sub_list in groups for s in sub_list])
+        repeated = self.load_repeated([group.key for group, _ in groups])
+
+        computed = skipped = 0
+        with transaction.atomic():
+            for group, sub_list in groups:
+                if group.pk in existing:
+                    skipped += 1
+                    continue
+                group_papers, units = self.group_inputs(sub_list, doc_ids_by_subject, papers, units_by_subject)
+                result = compute_analytics(group_papers, units, repeated.get(group.key))
+                SubjectAnalytics.objects.update_or_create(
+                    group=group,
+                    defaults={**result, 'total_papers_analyzed': len(group_papers)},
+                )
+                computed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Computed analytics for {computed} subject groups ({skipped} skipped) "
+            f"from {len(papers)} papers in {time.monotonic() - started:.1f}s."
+        ))
+
+    # ------------------------------------------------------------------ #
+    # Optional LLM refinement                                              #
+    # ------------------------------------------------------------------ #
     async def async_handle(self, *args, **options):
         force = options.get('force')
         from asgiref.sync import sync_to_async
         
-        # Group subjects by cleaned code
-        @sync_to_async
-        def get_all_subjects():
-            return list(Subject.objects.filter(is_active=True))
+        groups = await sync_to_async(self.load_groups)()
+        corpus = await sync_to_async(self.load_corpus)([s for _, sub_list in groups for s in sub_list])
+        repeated = await sync_to_async(self.load_repeated)([group.key for group, _ in groups])
 
-        subjects = await get_all_subjects()
-        
-        from collections import defaultdict
-        subjects_by_code = defaultdict(list)
-        for subject in subjects:
-            clean_code = subject.code.replace(' ', '').replace('-', '').upper()
-            subjects_by_code[clean_code].append(subject)
-
-        if not subjects_by_code:
+        if not groups:
             self.stdout.write(self.style.ERROR("No active subjects found in the database."))
             return
 
-        import os
-        
-        # Build Dedicated Sync Client for High Concurrency Threads
-        _analytics_client = httpx.Client(
-            limits=httpx.Limits(max_connections=5000, max_keepalive_connections=1000)
-        )
-        
-        # Build LLM
-        llm = ChatOpenAI(
-            model="openrouter/stepfun/step-3.5-flash:free",
-            openai_api_base="https://bifrost.naravirtual.in/langchain",
-            openai_api_key="dummy-key",
-            default_headers={"Authorization": f"Basic {os.getenv('BIFROST_API_KEY')}"},
-            http_client=_analytics_client,
-            max_retries=0, # Handled manually in thread
-            temperature=0.5,
-        )
-        structured_llm = llm.with_structured_output(SubjectAnalyticsSchema, method="json_mode")
-        
-        # Concurrency Control
-        semaphore = asyncio.Semaphore(50000)
-
-        async def process_subject_group(code, sub_list):
-            async with semaphore:
-                representative = sub_list[0]
-                
-                # 0. Check if analytics already exists
-                @sync_to_async
-                def check_exists():
-                    return SubjectAnalytics.objects.filter(subject__in=sub_list).exists()
-                
-                if not force and await check_exists():
-                    # self.stdout.write(f"Analytics already exist for {code}. Skipping...")
-                    return
-
-                # 1. Get parsed documents
-                @sync_to_async
-                def get_docs():
-                    return list(ParsedDocument.objects.filter(
-                        subjects=representative, 
-                        document_type__in=['PYQ', 'UNSOLVED_PYQ'],
-                        structured_data__isnull=False
-                    ).values('year', 'title', 'structured_data'))
-                
-                docs_data = await get_docs()
-                total_papers = len(docs_data)
-
-                # Prepare syllabus
-                @sync_to_async
-                def get_units():
-                    return list(representative.units.order_by('number').values('number', 'name', 'topics'))
-                
-                units_data = await get_units()
-                syllabus_data = [{"unit_number": u['number'], "unit_name": u['name'], "topics": u['topics']} for u in units_data]
-
-                # Retry logic for large/problematic subjects
-                max_papers_options = [10, 5, 2, 0] # Gradually reduce papers to avoid 422/Context issues
-                success = False
-                
-                def _sync_llm_call_with_retry(messages, paper_limit):
-                    langfuse_handler = CallbackHandler()
-                    for attempt in range(3):
-                        try:
-                            return structured_llm.invoke(
-                                messages, 
-                                config={
-                                    "callbacks": [langfuse_handler],
-                                    "metadata": {
-                                        "langfuse_session_id": "global_analytics_threads",
-                                        "langfuse_tags": ["bulk_generation", code, f"limit_{paper_limit}"]
-                                    }
-                                }
-                            )
-                        except Exception as e:
-                            import time
-                            time.sleep(1.5)
-                            if attempt == 2:
-                                raise e # Re-raise if all 3 attempts fail
-
-                for paper_limit in max_papers_options:
-                    try:
-                        current_papers = docs_data[:paper_limit] if paper_limit > 0 else []
-                        papers_payload = [{"year": d['year'], "title": d['title'], "data": d['structured_data']} for d in current_papers]
-
-                        self.stdout.write(f"Processing {code} ({representative.name}) with {len(papers_payload)} papers...")
-
-                        prompt_text = f"""
+        # Concurrency, retries and backoff are handled by the gateway
+        llm = llm_gateway.model("openrouter/stepfun/step-3.5-flash:free", temperature=0.5)
+
+        async def process_subject_group(group, sub_list):
+            code = group.key
+            representative = sub_list[0]
+            
+            # 0. Check if analytics already exists
+            @sync_to_async
+            def check_exists():
+                return SubjectAnalytics.objects.filter(group=group).exists()
+            
+            if not force and await check_exists():
+                # self.stdout.write(f"Analytics already exist for {code}. Skipping...")
+                return
+
+            # 1. Papers and syllabus for the group, plus the local statistical baseline
+            docs_data, units_data = self.group_inputs(sub_list, *corpus)
+            total_papers = len(docs_data)
+            syllabus_data = [{"unit_number": u['number'], "unit_name": u['name'], "topics": u['topics']} for u in units_data]
+            baseline = compute_analytics(docs_data, units_data, repeated.get(code))
+
+            # Retry logic for large/problematic subjects
+            max_papers_options = [10, 5, 2, 0] # Gradually reduce papers to avoid 422/Context issues
+            success = False
+            
+            for paper_limit in max_papers_options:
+                try:
+                    current_papers = docs_data[:paper_limit] if paper_limit > 0 else []
+                    papers_payload = [{"year": d['year'], "title": d['title'], "data": d['structured_data']} for d in current_papers]
+
+                    self.stdout.write(f"Processing {code} ({representative.name}) with {len(papers_payload)} papers...")
+
+                    prompt_text = f"""
 Analyze subject: {representative.name} ({representative.code}) for RGPV University.
 SYLLABUS DATA: {json.dumps(syllabus_data, indent=2)}
 PAST PAPERS ANALYZED: {len(papers_payload)}
 PAST PAPERS DATA: {json.dumps(papers_payload)}
+STATISTICAL BASELINE (computed from ALL {total_papers} papers): {json.dumps(baseline)}
 
+Refine the baseline: keep its counts, years and unit weightage unless the papers clearly contradict them,
+fix topic/unit assignments that are wrong, and improve question wording and examples.
 If past papers are few or empty, use your knowledge of Indian Engineering curriculum to simulate plausible trends based on labels/topics.
 CRITICAL:
 - Total complexity percentages must sum to 100.
 - Use LaTeX ($...$ and $$...$$) for ALL mathematical formulas/variables.
 - Provide subject-specific examples for Theory, Numerical, and Design.
 """
-                        messages = [
-                            SystemMessage(content="You are a senior academic data analyst API. Return valid JSON only."),
-                            HumanMessage(content=prompt_text)
-                        ]
+                    messages = [
+                        SystemMessage(content="You are a senior academic data analyst API. Return valid JSON only."),
+                        HumanMessage(content=prompt_text)
+                    ]
+                    
+                    # A 422 / context-length error is not retried, so the paper limit drops right away
+                    parsedResult = await llm.ainvoke(
+                        messages,
+                        schema=SubjectAnalyticsSchema,
+                        method="json_mode",
+                        session="global_analytics_threads",
+                        tags=["bulk_generation", code, f"limit_{paper_limit}"],
+                    )
+
+                    # Transform and Save
+                    @sync_to_async
+                    def save_results(result):
+                        unit_roi_data = {item.unit_id: {
+                            "avg_marks": item.avg_marks, "efficiency": item.efficiency, "name": item.name
+                        } for item in result.unit_roi_data}
+                        
+                        syllabus_heatmap = {item.topic_name: {
+                            "frequency": item.frequency, "years": item.years, "unit": item.unit
+                        } for item in result.syllabus_heatmap}
                         
-                        import concurrent.futures
-                        if not hasattr(self, '_executor'):
-                            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1000)
-                            
-                        # Execute the synchronous LLM call safely in a separate explicit thread pool
-                        loop = asyncio.get_running_loop()
-                        parsedResult = await loop.run_in_executor(self._executor, _sync_llm_call_with_retry, messages, paper_limit)
-
-                        # Transform and Save
-                        @sync_to_async
-                        def save_results(result):
-                            unit_roi_data = {item.unit_id: {
-                                "avg_marks": item.avg_marks, "efficiency": item.efficiency, "name": item.name
-                            } for item in result.unit_roi_data}
-                            
-                            syllabus_heatmap = {item.topic_name: {
-                                "frequency": item.frequency, "years": item.years, "unit": item.unit
-                            } for item in result.syllabus_heatmap}
-                            
-                            complexity_breakdown = {
-                                "Theory": result.complexity_breakdown.Theory,
-                                "Numerical": result.complexity_breakdown.Numerical,
-                                "Design / Block Diagrams": getattr(result.complexity_breakdown, "Design / Block Diagrams", result.complexity_breakdown.Design_Block_Diagrams),
-                                "theory_examples": result.complexity_breakdown.theory_examples,
-                                "numerical_examples": result.complexity_breakdown.numerical_examples,
-                                "design_examples": result.complexity_breakdown.design_examples,
+                        complexity_breakdown = {
+                            "Theory": result.complexity_breakdown.Theory,
+                            "Numerical": result.complexity_breakdown.Numerical,
+                            "Design / Block Diagrams": getattr(result.complexity_breakdown, "Design / Block Diagrams", result.complexity_breakdown.Design_Block_Diagrams),
+                            "theory_examples": result.complexity_breakdown.theory_examples,
+                            "numerical_examples": result.complexity_breakdown.numerical_examples,
+                            "design_examples": result.complexity_breakdown.design_examples,
+                        }
+                        
+                        top_repeated_questions = [q.dict() for q in result.top_repeated_questions]
+
+                        SubjectAnalytics.objects.update_or_create(
+                            group=group,
+                            defaults={
+                                'predictability_score': float(result.predictability_score),
+                                'total_papers_analyzed': total_papers,
+                                'unit_roi_data': unit_roi_data,
+                                'syllabus_heatmap': syllabus_heatmap,
+                                'complexity_breakdown': complexity_breakdown,
+                                'top_repeated_questions': top_repeated_questions
                             }
-                            
-                            top_repeated_questions = [q.dict() for q in result.top_repeated_questions]
-
-                            for s in sub_list:
-                                SubjectAnalytics.objects.update_or_create(
-                                    subject=s,
-                                    defaults={
-                                        'predictability_score': float(result.predictability_score),
-                                        'total_papers_analyzed': total_papers,
-                                        'unit_roi_data': unit_roi_data,
-                                        'syllabus_heatmap': syllabus_heatmap,
-                                        'complexity_breakdown': complexity_breakdown,
-                                        'top_repeated_questions': top_repeated_questions
-                                    }
-                                )
-
-                        await save_results(parsedResult)
-                        self.stdout.write(self.style.SUCCESS(f"Finished {code}"))
-                        success = True
-                        break
-
-                    except Exception as e:
-                        error_msg = str(e)
-                        if "422" in error_msg or "context_length_exceeded" in error_msg:
-                            self.stdout.write(self.style.WARNING(f"Retrying {code} with fewer papers due to payload size (Attempt {max_papers_options.index(paper_limit) + 1})..."))
-                            continue
-                        else:
-                            self.stdout.write(self.style.ERROR(f"Error {code}: {error_msg[:150]}"))
-                            break # Non-payload error, stop retrying this group
-
-                if not success:
-                    self.stdout.write(self.style.ERROR(f"Gave up on {code} after all retry attempts."))
+                        )
+
+                    await save_results(parsedResult)
+                    self.stdout.write(self.style.SUCCESS(f"Finished {code}"))
+                    success = True
+                    break
+
+                except Exception as e:
+                    error_msg = str(e)
+                    if "422" in error_msg or "context_length_exceeded" in error_msg:
+                        self.stdout.write(self.style.WARNING(f"Retrying {code} with fewer papers due to payload size (Attempt {max_papers_options.index(paper_limit) + 1})..."))
+                        continue
+                    else:
+                        self.stdout.write(self.style.ERROR(f"Error {code}: {error_msg[:150]}"))
+                        break # Non-payload error, stop retrying this group
+
+            if not success:
+                self.stdout.write(self.style.ERROR(f"Gave up on {code} after all retry attempts."))
 
 
         # Create tasks for all groups
-        tasks = [process_subject_group(code, sub_list) for code, sub_list in subjects_by_code.items()]
+        tasks = [process_subject_group(group, sub_list) for group, sub_list in groups]
         self.stdout.write(f"Launching {len(tasks)} concurrent tasks...")
         await asyncio.gather(*tasks)
-        self.stdout.write(self.style.SUCCESS("All subjects processed."))
+        self.stdout.write(self.style.SUCCESS(f"All subjects processed. LLM: {llm_gateway.snapshot(llm)}"))
 
 
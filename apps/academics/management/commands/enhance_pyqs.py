@@ -1,8 +1,9 @@
 import asyncio
 from django.core.management.base import BaseCommand
+from apps.common import async_runtime, llm_cache
 from django.db import transaction
 from asgiref.sync import sync_to_async
-from apps.academics.models import Subject
+from apps.academics.subject_groups import groups_with_members, sync_groups
 from apps.content.models import ParsedDocument
 from apps.content.services.ai_parser.enhancer import PYQEnhancer
 
@@ -12,9 +13,11 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--subject', type=str, help='Filter by subject code')
         parser.add_argument('--force', action='store_true', help='Force re-enhancement even if already enhanced')
+        parser.add_argument('--refresh-cache', action='store_true', help='Ignore cached LLM responses and call the model again.')
 
     def handle(self, *args, **options):
-        asyncio.run(self.async_handle(*args, **options))
+        with llm_cache.refreshing(options['refresh_cache']):
+            async_runtime.run_coro(self.async_handle(*args, **options))
 
     async def async_handle(self, *args, **options):
         subject_code = options.get('subject')
@@ -22,32 +25,32 @@ class Command(BaseCommand):
         
         enhancer = PYQEnhancer()
         
-        # 1. Get Subjects
+        # 1. Get Subject Groups (papers shared by branch variants are enhanced once)
         @sync_to_async
-        def get_all_subjects():
-            qs = Subject.objects.all()
-            if subject_code:
-                qs = qs.filter(code=subject_code)
-            return list(qs)
+        def get_all_groups():
+            sync_groups()
+            return groups_with_members(code=subject_code, active_only=False)
         
-        subjects = await get_all_subjects()
-        self.stdout.write(f"Gathering documents for {len(subjects)} subjects...")
+        groups = await get_all_groups()
+        self.stdout.write(f"Gathering documents for {len(groups)} subject groups...")
 
         all_doc_tasks = []
+        queued_doc_ids = set()
 
-        async def _process_subject(s):
-            # Fetch Syllabus for this subject
+        async def _process_group(group, members):
+            s = members[0]
+            # Fetch Syllabus for this subject group
             @sync_to_async
             def get_syllabus():
                 doc = ParsedDocument.objects.filter(
-                    subjects=s,
+                    subjects__in=members,
                     document_type='SYLLABUS',
                     parsing_status__in=['COMPLETED', 'PENDING'],
                     structured_data__isnull=False
                 ).first()
                 if not doc:
                     doc = ParsedDocument.objects.filter(
-                        subjects__code=s.code,
+                        subjects__group=group,
                         document_type='SYLLABUS',
                         parsing_status__in=['COMPLETED', 'PENDING'],
                         structured_data__isnull=False
@@ -62,14 +65,18 @@ class Command(BaseCommand):
             @sync_to_async
             def get_pyqs():
                 return list(ParsedDocument.objects.filter(
-                    subjects=s,
+                    subjects__in=members,
                     document_type='UNSOLVED_PYQ',
                     parsing_status='COMPLETED'
-                ))
+                ).distinct())
             
             pyq_docs = await get_pyqs()
             
             for doc in pyq_docs:
+                if doc.pk in queued_doc_ids:
+                    continue
+                queued_doc_ids.add(doc.pk)
+
                 async def _process_single_doc(d, subj, syll):
                     data = d.structured_data or {}
                     questions = data.get('questions', [])
@@ -104,8 +111,8 @@ class Command(BaseCommand):
 
                 all_doc_tasks.append(_process_single_doc(doc, s, syllabus_doc))
 
-        # Build task list per subject
-        subject_tasks = [_process_subject(s) for s in subjects]
+        # Build task list per subject group
+        subject_tasks = [_process_group(group, members) for group, members in groups]
         await asyncio.gather(*subject_tasks)
 
         if not all_doc_tasks:
@@ -12,6 +12,7 @@ Usage:
 import asyncio
 import re
 from django.core.management.base import BaseCommand
+from apps.common import async_runtime, llm_cache
 from asgiref.sync import sync_to_async
 from apps.content.models import ParsedDocument
 from apps.content.services.ai_parser.latex_fixer import LatexFixer, extract_math_blocks, validate_with_katex
@@ -26,9 +27,11 @@ class Command(BaseCommand):
         parser.add_argument('--doc-id', type=int, help='Fix a single document by ID')
         parser.add_argument('--dry-run', action='store_true', help='Only report errors, do not fix')
         parser.add_argument('--force', action='store_true', help='Re-process already validated documents')
+        parser.add_argument('--refresh-cache', action='store_true', help='Ignore cached LLM responses and call the model again.')
 
     def handle(self, *args, **options):
-        asyncio.run(self._run(options))
+        with llm_cache.refreshing(options['refresh_cache']):
+            async_runtime.run_coro(self._run(options))
 
     async def _run(self, options):
         # Build queryset synchronously, then fetch all docs
@@ -1,9 +1,13 @@
 import re
 from django.core.management.base import BaseCommand
 from apps.academics.models import Subject
+from apps.academics.subject_groups import sync_groups
 
 class Command(BaseCommand):
-    help = 'Normalizes all subject codes to a standard format: [DEPT]-[NUM] (SUFFIX)'
+    help = (
+        'Normalizes all subject codes to a standard format: [DEPT]-[NUM] (SUFFIX) '
+        'and regroups subjects sharing a canonical code into SubjectGroups.'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument('--dry-run', action='store_true', help='Show changes without saving.')
@@ -26,6 +30,10 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.SUCCESS(f"Processed {count} subject codes. (Dry-run: {dry_run})"))
 
+        if not dry_run:
+            moved, pruned = sync_groups()
+            self.stdout.write(self.style.SUCCESS(f"Subject groups synced: {moved} subjects regrouped, {pruned} empty groups removed."))
+
     def normalize_code(self, code: str) -> str:
         # 1. Basic cleaning: uppercase and remove weird characters
         code = code.upper().strip()
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0002_subjectanalytics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubjectGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Canonical code: uppercase, no spaces or hyphens, e.g. BT201', max_length=20, unique=True)),
+                ('name', models.CharField(blank=True, max_length=500)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='subject',
+            name='group',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='subjects', to='academics.subjectgroup'),
+        ),
+        migrations.AddField(
+            model_name='subjectanalytics',
+            name='group',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='analytics', to='academics.subjectgroup'),
+        ),
+    ]
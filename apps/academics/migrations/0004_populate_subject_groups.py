@@ -0,0 +1,41 @@
+from django.db import migrations
+
+
+def key_for(code):
+    return str(code or '').replace(' ', '').replace('-', '').upper()
+
+
+def populate_groups(apps, schema_editor):
+    Subject = apps.get_model('academics', 'Subject')
+    SubjectGroup = apps.get_model('academics', 'SubjectGroup')
+    SubjectAnalytics = apps.get_model('academics', 'SubjectAnalytics')
+
+    groups = {}
+    for subject in Subject.objects.order_by('id'):
+        key = key_for(subject.code)
+        if key not in groups:
+            groups[key] = SubjectGroup.objects.create(key=key, name=subject.name)
+        subject.group = groups[key]
+        subject.save(update_fields=['group'])
+
+    # Members used to hold identical copies; keep the most recent one per group
+    seen = set()
+    for analytics in SubjectAnalytics.objects.select_related('subject').order_by('-last_computed_at', '-id'):
+        group_id = analytics.subject.group_id
+        if group_id in seen:
+            analytics.delete()
+            continue
+        seen.add(group_id)
+        analytics.group_id = group_id
+        analytics.save(update_fields=['group'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0003_subjectgroup'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_groups, migrations.RunPython.noop),
+    ]
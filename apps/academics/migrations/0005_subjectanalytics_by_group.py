@@ -0,0 +1,21 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0004_populate_subject_groups'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='subjectanalytics',
+            name='subject',
+        ),
+        migrations.AlterField(
+            model_name='subjectanalytics',
+            name='group',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analytics', to='academics.subjectgroup'),
+        ),
+    ]
@@ -18,6 +18,26 @@ class Semester(models.Model):
     def __str__(self):
         return f"Semester {self.number}"
 
+class SubjectGroup(models.Model):
+    """
+    Subjects that share one canonical code across branches (e.g. BT-201 in
+    every first-year branch). Shared artifacts — analytics, generated
+    important questions and short notes — are computed once per group and
+    referenced by every member. Membership is kept in sync by signals and
+    ``normalize_subject_codes``.
+    """
+    key = models.CharField(max_length=20, unique=True, help_text="Canonical code: uppercase, no spaces or hyphens, e.g. BT201")
+    name = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @staticmethod
+    def key_for(code):
+        return str(code or '').replace(' ', '').replace('-', '').upper()
+
+    def __str__(self):
+        return f"{self.key} - {self.name}"
+
 class Subject(models.Model):
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='subjects')
     semester = models.ForeignKey(Semester, on_delete=models.CASCADE, related_name='subjects')
@@ -25,6 +45,9 @@ class Subject(models.Model):
     name = models.CharField(max_length=500)
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
+    group = models.ForeignKey(
+        SubjectGroup, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='subjects'
+    )
 
     class Meta:
         unique_together = ('branch', 'semester', 'code')
@@ -32,6 +55,13 @@ class Subject(models.Model):
     def __str__(self):
         return f"[{self.branch.code} Sem {self.semester.number}] {self.code} - {self.name}"
 
+    @property
+    def analytics(self):
+        """The group's shared ``SubjectAnalytics``, or None until computed."""
+        if not self.group_id:
+            return None
+        return getattr(self.group, 'analytics', None)
+
 class Unit(models.Model):
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='units')
     number = models.PositiveSmallIntegerField(help_text="Unit number (usually 1-5)")
@@ -58,7 +88,7 @@ class ExamDate(models.Model):
         return f"{self.branch.code} Sem {self.semester.number} - {self.date} "
 
 class SubjectAnalytics(models.Model):
-    subject = models.OneToOneField(Subject, on_delete=models.CASCADE, related_name='analytics')
+    group = models.OneToOneField(SubjectGroup, on_delete=models.CASCADE, related_name='analytics')
     
     # Updated every time a new PYQ is added and parsed, or via command
     last_computed_at = models.DateTimeField(auto_now=True)
@@ -97,4 +127,4 @@ class SubjectAnalytics(models.Model):
         verbose_name_plural = "Subject Analytics"
 
     def __str__(self):
-        return f"Analytics Snapshot for {self.subject.code}"
+        return f"Analytics Snapshot for {self.group.key}"
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import subject_groups
+from .models import Subject
+
+
+@receiver(pre_save, sender=Subject)
+def subject_saving(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous_group_id = instance.group_id
+    if subject_groups.assign_group(instance):
+        instance._previous_group_id = previous_group_id
+
+
+@receiver(post_save, sender=Subject)
+def subject_saved(sender, instance, raw=False, **kwargs):
+    if raw or not hasattr(instance, '_previous_group_id'):
+        return
+    previous_group_id = instance.__dict__.pop('_previous_group_id')
+    subject_groups.prune_empty([previous_group_id])
+    subject_groups.share_group_documents(instance)
+
+
+@receiver(post_delete, sender=Subject)
+def subject_deleted(sender, instance, **kwargs):
+    subject_groups.prune_empty([instance.group_id])
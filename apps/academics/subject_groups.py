@@ -0,0 +1,73 @@
+"""
+Maintenance of ``SubjectGroup`` membership.
+
+A subject belongs to the group of its canonical code key
+(``SubjectGroup.key_for``). Signals keep single saves in sync;
+``sync_groups`` repairs everything after bulk imports or code
+normalisation. Generation commands iterate ``groups_with_members`` so each
+shared artifact is computed once and attached to every member by reference.
+"""
+
+from .models import Subject, SubjectGroup
+
+# Generated documents shared by every member of a group
+GROUP_DOCUMENT_TYPES = ('IMPORTANT_Q', 'SHORT_NOTES')
+
+
+def assign_group(subject):
+    """Point ``subject.group`` at the group for its current code (unsaved)."""
+    key = SubjectGroup.key_for(subject.code)
+    if subject.group_id and subject.group.key == key:
+        return False
+    subject.group, _ = SubjectGroup.objects.get_or_create(key=key, defaults={'name': subject.name})
+    return True
+
+
+def prune_empty(group_ids=None):
+    """Delete groups without members (and, by cascade, their shared analytics)."""
+    groups = SubjectGroup.objects.filter(subjects__isnull=True)
+    if group_ids is not None:
+        groups = groups.filter(pk__in=[pk for pk in group_ids if pk])
+    deleted, _ = groups.delete()
+    return deleted
+
+
+def sync_groups():
+    """Regroup every subject by its canonical key. Returns (subjects moved, groups pruned)."""
+    groups = {group.key: group for group in SubjectGroup.objects.all()}
+    moved = []
+    for subject in Subject.objects.only('id', 'code', 'name', 'group').order_by('id'):
+        key = SubjectGroup.key_for(subject.code)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = SubjectGroup.objects.create(key=key, name=subject.name)
+        if subject.group_id != group.pk:
+            subject.group = group
+            moved.append(subject)
+    Subject.objects.bulk_update(moved, ['group'], batch_size=500)
+    return len(moved), prune_empty()
+
+
+def groups_with_members(code=None, active_only=True):
+    """``[(group, [subjects])]`` in key order; ``code`` restricts to that subject's group."""
+    subjects = Subject.objects.filter(group__isnull=False).select_related('group', 'branch').order_by('group__key', 'id')
+    if active_only:
+        subjects = subjects.filter(is_active=True)
+    if code:
+        subjects = subjects.filter(group__key=SubjectGroup.key_for(code))
+    grouped = {}
+    for subject in subjects:
+        grouped.setdefault(subject.group_id, (subject.group, []))[1].append(subject)
+    return list(grouped.values())
+
+
+def share_group_documents(subject):
+    """Attach the group's generated documents to a subject that just joined it."""
+    from apps.content.models import ParsedDocument
+
+    documents = ParsedDocument.objects.filter(
+        subjects__group_id=subject.group_id, document_type__in=GROUP_DOCUMENT_TYPES,
+    ).exclude(subjects=subject).distinct()
+    for document in documents:
+        document.subjects.add(subject)
+    return len(documents)
@@ -0,0 +1,159 @@
+"""
+One event loop per process for running coroutines from sync code.
+
+``asyncio.run`` builds a loop, runs one coroutine and tears it all down
+again: the LLM gateway's connection pool (bound to its loop), the image
+recreator's browser, the executor threads. Celery tasks and management
+commands hand their coroutines to ``run_coro`` instead, which runs them on a
+loop that lives in a background thread for the whole process. Celery starts
+it on ``worker_process_init`` (``config/celery.py``) so the first task does
+not pay for it; anywhere else it starts on first use.
+
+The caller's context variables (``llm_cache.refreshing``,
+``rate_limit.priority``) carry over to the coroutine. ``asyncio.to_thread``
+work runs on a persistent executor whose threads check their database
+connection the first time they run for a new ``run_coro`` call, the way
+Celery and Django do around each task and request.
+
+Cleanup that has to run on the loop (connection pools, browsers) is
+registered with ``at_shutdown``; ``stop`` runs it, on
+``worker_process_shutdown`` and at exit.
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import contextvars
+import itertools
+import logging
+import os
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+SHUTDOWN_TIMEOUT = 10
+
+_lock = threading.Lock()
+_loop = None
+_thread = None
+_pid = None
+_shutdown_hooks = []
+# Bumped on every run_coro call; executor threads compare it with the one they last ran for
+_generation = itertools.count(1)
+_current_generation = 0
+_thread_state = threading.local()
+
+
+class _Executor(concurrent.futures.ThreadPoolExecutor):
+    """Default executor of the runtime loop."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(_with_fresh_connection, fn, *args, **kwargs)
+
+
+def _with_fresh_connection(fn, *args, **kwargs):
+    # A connection left over from an earlier task may be stale or past CONN_MAX_AGE
+    if getattr(_thread_state, 'generation', None) != _current_generation:
+        close_old_connections()
+        _thread_state.generation = _current_generation
+    return fn(*args, **kwargs)
+
+
+def _serve(loop, ready):
+    asyncio.set_event_loop(loop)
+    loop.set_default_executor(_Executor(thread_name_prefix='async-runtime'))
+    loop.call_soon(ready.set)
+    loop.run_forever()
+
+
+def start():
+    """Start this process's loop if it is not running (a forked child gets its own)."""
+    global _loop, _thread, _pid
+    with _lock:
+        if _loop is not None and _pid == os.getpid() and _thread.is_alive():
+            return _loop
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        thread = threading.Thread(target=_serve, args=(loop, ready), name='async-runtime', daemon=True)
+        thread.start()
+        ready.wait()
+        _loop, _thread, _pid = loop, thread, os.getpid()
+        logger.debug("Async runtime started in process %s", _pid)
+        return loop
+
+
+def running():
+    """Whether the current thread is the runtime loop's."""
+    return _thread is not None and threading.current_thread() is _thread
+
+
+def at_shutdown(hook):
+    """Run the coroutine function ``hook`` on the loop when it stops."""
+    with _lock:
+        if hook not in _shutdown_hooks:
+            _shutdown_hooks.append(hook)
+
+
+async def _in_context(coro, context):
+    # This task runs in a copy of the loop thread's context: apply the caller's values
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+def run_coro(coro, timeout=None):
+    """
+    Run ``coro`` on the runtime loop and return its result, blocking the
+    calling thread (like ``asyncio.run``, but the loop and everything bound
+    to it outlive the call). If the caller is interrupted, the coroutine is
+    cancelled.
+    """
+    global _current_generation
+    if running():
+        coro.close()
+        raise RuntimeError("run_coro() called from the runtime loop; await the coroutine instead")
+    loop = start()
+    _current_generation = next(_generation)
+    future = asyncio.run_coroutine_threadsafe(_in_context(coro, contextvars.copy_context()), loop)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        # Timeout, Celery's soft time limit, Ctrl-C: do not leave the work running
+        future.cancel()
+        raise
+
+
+async def _shutdown():
+    for hook in reversed(_shutdown_hooks):
+        try:
+            await hook()
+        except Exception as exc:
+            logger.warning("Async runtime shutdown hook %s failed: %s", getattr(hook, '__qualname__', hook), exc)
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.get_running_loop().shutdown_default_executor()
+
+
+def stop():
+    """Run the shutdown hooks and stop the loop."""
+    global _loop, _thread, _pid
+    with _lock:
+        loop, thread, pid = _loop, _thread, _pid
+        _loop = _thread = _pid = None
+    if loop is None or pid != os.getpid() or not thread.is_alive():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_shutdown(), loop).result(SHUTDOWN_TIMEOUT)
+    except Exception as exc:
+        logger.warning("Async runtime did not shut down cleanly: %s", exc)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(SHUTDOWN_TIMEOUT)
+    if not thread.is_alive():
+        loop.close()
+
+
+atexit.register(stop)
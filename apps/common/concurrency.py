@@ -0,0 +1,309 @@
+"""
+Adaptive (AIMD) concurrency limits for LLM calls.
+
+An ``AdaptiveLimiter`` admits at most ``limit`` calls at once and moves the
+limit with the provider's response, TCP-style:
+
+* every successful call adds ``1 / limit`` (one more slot per window of
+  ``limit`` calls) while the limit is actually in use, latency stays within
+  ``LLM_CONCURRENCY_LATENCY_TOLERANCE`` × the best latency seen and the
+  recent error rate stays under ``MAX_ERROR_RATE``; otherwise it holds;
+* a 429 / 503 or a timeout multiplies it by ``BACKOFF``, at most once per
+  cooldown (a typical call's duration), so one burst of rejections counts once;
+* other errors only count towards the error rate.
+
+There is one limiter per model (``limiter_for``), shared by every call site
+in the process, with ``initial`` / ``min`` / ``max`` from
+``LLM_CONCURRENCY``. ``llm_gateway`` takes a slot for every model call;
+slots work from coroutines and threads alike::
+
+    async with limiter_for(llm).slot():
+        ...
+
+A slot is re-entrant: a model call made while the caller already holds a
+slot of the same limiter (the parser holds one per chunk, around loading its
+pages) runs in that slot and only reports its errors. Cache hits mark the
+slot (``mark_cached``) so their instant "latency" does not count. The shared
+``rate_limit`` buckets still cap RPM / TPM across processes; this controller
+finds how much parallelism the provider actually sustains below that.
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BACKOFF = 0.5
+# Weight of the newest sample in the latency and error-rate averages
+LATENCY_EWMA = 0.2
+ERROR_EWMA = 0.05
+MAX_ERROR_RATE = 0.1
+# The best latency drifts up this share of the gap per sample, so a slower model version is relearned
+BASELINE_DRIFT = 0.01
+MIN_COOLDOWN = 1.0
+OVERLOAD_STATUSES = (429, 503)
+
+_current_slot = contextvars.ContextVar('llm_concurrency_slot', default=None)
+
+
+def is_overload(exc):
+    """Whether ``exc`` means the provider is saturated (429 / 503 or a timeout)."""
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError)):
+        return True
+    status = getattr(exc, 'status_code', None)
+    response = getattr(exc, 'response', None)
+    if status is None and response is not None:
+        status = getattr(response, 'status_code', None)
+    if status in OVERLOAD_STATUSES:
+        return True
+    # openai.RateLimitError / APITimeoutError, httpx.TimeoutException and friends
+    name = type(exc).__name__
+    return name in ('RateLimitError', 'APITimeoutError') or name.endswith('TimeoutException')
+
+
+def mark_cached():
+    """Tell the enclosing slot (if any) that no model call was made."""
+    slot = _current_slot.get()
+    if slot is not None:
+        slot.cached = True
+
+
+class _Slot:
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.cached = False
+        self._started = None
+        self._token = None
+        self._outer = None
+
+    def _nested(self):
+        outer = _current_slot.get()
+        if outer is not None and outer.limiter is self.limiter:
+            self._outer = outer
+        return self._outer is not None
+
+    def _enter(self):
+        self._started = time.monotonic()
+        self._token = _current_slot.set(self)
+        return self
+
+    def _exit(self, exc):
+        if self._outer is not None:
+            # The outer slot records the latency; failed attempts within it still count
+            if isinstance(exc, Exception):
+                self.limiter._report(exc)
+            return
+        _current_slot.reset(self._token)
+        elapsed = time.monotonic() - self._started
+        self.limiter._release(None if self.cached else elapsed, exc)
+
+    async def __aenter__(self):
+        if self._nested():
+            return self
+        await self.limiter._acquire()
+        return self._enter()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._exit(exc)
+
+    def __enter__(self):
+        if self._nested():
+            return self
+        self.limiter._acquire_sync()
+        return self._enter()
+
+    def __exit__(self, exc_type, exc, tb):
+        self._exit(exc)
+
+
+class AdaptiveLimiter:
+    def __init__(self, name, initial=8, minimum=1, maximum=256, latency_tolerance=2.0):
+        self.name = name
+        self.min_limit = minimum
+        self.max_limit = maximum
+        self.latency_tolerance = latency_tolerance
+        self._limit = float(min(max(initial, minimum), maximum))
+        self._in_flight = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self._latency = None
+        self._baseline = None
+        self._error_rate = 0.0
+        self._cooldown_until = 0.0
+        self.successes = self.overloads = self.errors = 0
+
+    @property
+    def limit(self):
+        """Calls admitted at once right now."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def slot(self):
+        """Context manager (``async with`` or ``with``) holding one slot."""
+        return _Slot(self)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'limit': int(self._limit),
+                'in_flight': self._in_flight,
+                'waiting': len(self._waiters),
+                'latency': round(self._latency, 3) if self._latency is not None else None,
+                'baseline': round(self._baseline, 3) if self._baseline is not None else None,
+                'error_rate': round(self._error_rate, 3),
+                'successes': self.successes,
+                'overloads': self.overloads,
+                'errors': self.errors,
+            }
+
+    # ── Admission ──────────────────────────────────────────────────────────
+
+    def _admit_locked(self):
+        if self._in_flight < int(self._limit) and not self._waiters:
+            self._in_flight += 1
+            return True
+        return False
+
+    def _grant_locked(self):
+        granted = []
+        while self._waiters and self._in_flight < int(self._limit):
+            granted.append(self._waiters.popleft())
+            self._in_flight += 1
+        return granted
+
+    def _wake(self, waiters):
+        for waiter in waiters:
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+            else:
+                loop, future = waiter
+                try:
+                    loop.call_soon_threadsafe(self._resolve, future)
+                except RuntimeError:
+                    # Its loop is closed: nobody will take the slot
+                    self._release(None, None)
+
+    def _resolve(self, future):
+        if future.done():
+            # Cancelled after the slot was handed over
+            self._release(None, None)
+        else:
+            future.set_result(None)
+
+    def _acquire_sync(self):
+        with self._lock:
+            if self._admit_locked():
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def _acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._admit_locked():
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            if waiter[1].done() and not waiter[1].cancelled():
+                self._release(None, None)
+            raise
+
+    # ── Feedback ───────────────────────────────────────────────────────────
+
+    def _release(self, elapsed, exc):
+        with self._lock:
+            self._in_flight -= 1
+            if elapsed is not None:
+                self._record_locked(elapsed, exc)
+            granted = self._grant_locked()
+        self._wake(granted)
+
+    def _report(self, exc):
+        with self._lock:
+            self._record_locked(None, exc)
+
+    def _decrease_locked(self, factor, reason):
+        now = time.monotonic()
+        if now < self._cooldown_until:
+            return
+        previous = self._limit
+        self._limit = max(float(self.min_limit), self._limit * factor)
+        self._cooldown_until = now + max(self._latency or 0.0, MIN_COOLDOWN)
+        if int(previous) != int(self._limit):
+            logger.info("LLM concurrency %s: %s -> %s (%s)", self.name, int(previous), int(self._limit), reason)
+
+    def _record_locked(self, elapsed, exc):
+        self._error_rate += ERROR_EWMA * ((exc is not None) - self._error_rate)
+        if exc is not None:
+            if is_overload(exc):
+                self.overloads += 1
+                self._decrease_locked(BACKOFF, type(exc).__name__)
+            else:
+                self.errors += 1
+            return
+
+        self.successes += 1
+        self._latency = elapsed if self._latency is None else self._latency + LATENCY_EWMA * (elapsed - self._latency)
+        if self._baseline is None or elapsed < self._baseline:
+            self._baseline = elapsed
+        else:
+            self._baseline += BASELINE_DRIFT * (elapsed - self._baseline)
+
+        healthy = self._latency <= self._baseline * self.latency_tolerance and self._error_rate <= MAX_ERROR_RATE
+        # Only grow while the limit is actually the constraint
+        if healthy and int(self._limit) <= self._in_flight + 1:
+            self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _model_name(llm_or_name):
+    if isinstance(llm_or_name, str):
+        return llm_or_name
+    model = getattr(llm_or_name, 'model_name', None) or getattr(llm_or_name, 'model', None)
+    return model if isinstance(model, str) else type(llm_or_name).__name__
+
+
+def limiter_for(llm_or_name):
+    """The process-wide ``AdaptiveLimiter`` of a model (a chat model or its name)."""
+    name = _model_name(llm_or_name)
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            configs = getattr(settings, 'LLM_CONCURRENCY', {})
+            config = {**configs.get('default', {}), **configs.get(name, {})}
+            limiter = _limiters[name] = AdaptiveLimiter(
+                name,
+                initial=config.get('initial', 8),
+                minimum=config.get('min', 1),
+                maximum=config.get('max', 256),
+                latency_tolerance=getattr(settings, 'LLM_CONCURRENCY_LATENCY_TOLERANCE', 2.0),
+            )
+        return limiter
+
+
+def snapshot():
+    """State of every limiter in this process."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.snapshot() for limiter in limiters]
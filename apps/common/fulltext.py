@@ -0,0 +1,71 @@
+"""
+Helpers shared by the database full-text indexes (SQLite FTS5 / Postgres).
+
+Queries are reduced to plain word terms before they reach the database, so
+user input can never inject FTS5 or tsquery operators; the last term is
+matched as a prefix for search-as-you-type. Snippets are generated with
+STX/ETX control characters around matches and turned into ``[start, end)``
+highlight offsets here, so clients never have to render database markup.
+"""
+
+import re
+
+MAX_QUERY_TERMS = 10
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def query_terms(query):
+    return _TERM_RE.findall((query or '').lower())[:MAX_QUERY_TERMS]
+
+
+def sqlite_match(terms):
+    """FTS5 MATCH expression: quoted literal terms, the last one a prefix."""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def postgres_tsquery(terms):
+    """``to_tsquery`` expression: AND of terms, the last one a prefix."""
+    return ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+
+
+def postgres_headline_options(max_words=24, min_words=8, max_fragments=2):
+    return (
+        f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, '
+        f'MaxWords={max_words}, MinWords={min_words}, MaxFragments={max_fragments}, '
+        'FragmentDelimiter=" … "'
+    )
+
+
+def split_highlights(marked):
+    """``'a \\x02b\\x03 c'`` → ``('a b c', [[2, 3]])``."""
+    text, highlights, start = [], [], None
+    length = 0
+    for char in marked or '':
+        if char == HIGHLIGHT_START:
+            start = length
+        elif char == HIGHLIGHT_END:
+            if start is not None and length > start:
+                highlights.append([start, length])
+            start = None
+        else:
+            text.append(char)
+            length += 1
+    return ''.join(text), highlights
+
+
+def snippet_segments(snippet, highlights):
+    """``[(text, is_match), ...]`` for rendering highlights with auto-escaping templates."""
+    segments, pos = [], 0
+    for start, end in highlights:
+        if start > pos:
+            segments.append((snippet[pos:start], False))
+        segments.append((snippet[start:end], True))
+        pos = end
+    if pos < len(snippet):
+        segments.append((snippet[pos:], False))
+    return segments
@@ -0,0 +1,246 @@
+"""
+Content-addressed cache of LLM responses.
+
+A response is stored under the SHA-256 of everything that determines it:
+model, temperature, output schema (and structured-output method), and the
+full message list, with inline images reduced to their digests. Re-running
+a parse or a compute command over unchanged input is therefore free, while
+any prompt, schema or model change misses naturally.
+
+Entries are JSON files under ``LLM_CACHE_DIR`` (``data/llm_cache`` — the
+volume shared by web, worker and beat), written atomically. A hit bumps the
+file's mtime, and ``evict`` deletes least recently used entries once the
+directory grows past ``LLM_CACHE_MAX_BYTES``; it runs every so often after
+writes and from the beat schedule.
+
+``llm_gateway`` looks every call up here first (``lookup``) and stores what
+the model returns (``remember``). ``refreshing()`` (or ``refresh=True``)
+skips lookups but still stores the fresh responses, for a forced re-run.
+"""
+
+import contextlib
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from langchain_core.messages import AIMessage, BaseMessage
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+KEY_VERSION = 1
+# Evict down to this share of the limit, so eviction does not run on every write
+EVICT_TARGET = 0.9
+
+_refresh = contextvars.ContextVar('llm_cache_refresh', default=False)
+_write_lock = threading.Lock()
+_bytes_since_evict = 0
+
+
+def enabled():
+    return getattr(settings, 'LLM_CACHE_ENABLED', True)
+
+
+def cache_dir():
+    return Path(getattr(settings, 'LLM_CACHE_DIR', Path(settings.BASE_DIR) / 'data' / 'llm_cache'))
+
+
+def max_bytes():
+    return getattr(settings, 'LLM_CACHE_MAX_BYTES', 1024 ** 3)
+
+
+@contextlib.contextmanager
+def refreshing(refresh=True):
+    """Within the block, ignore cached responses (new ones are still stored)."""
+    token = _refresh.set(refresh)
+    try:
+        yield
+    finally:
+        _refresh.reset(token)
+
+
+# ── Keys ───────────────────────────────────────────────────────────────────
+
+
+def _digest(data):
+    return 'sha256:' + hashlib.sha256(data.encode('utf-8') if isinstance(data, str) else data).hexdigest()
+
+
+def _content(content):
+    """Message content with inline images replaced by their digests."""
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content:
+        if isinstance(part, dict) and part.get('type') == 'image_url':
+            url = part['image_url']['url'] if isinstance(part['image_url'], dict) else part['image_url']
+            parts.append({'type': 'image', 'digest': _digest(url)})
+        else:
+            parts.append(part)
+    return parts
+
+
+def _schema(schema):
+    if schema is None:
+        return None
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        return schema.model_json_schema()
+    return schema
+
+
+def response_key(llm, messages, schema=None, **extra):
+    """Cache key of a call of ``llm`` (the underlying chat model) on ``messages``."""
+    model = getattr(llm, 'model_name', None) or getattr(llm, 'model', None)
+    payload = {
+        'v': KEY_VERSION,
+        'model': model if isinstance(model, str) else type(llm).__name__,
+        'temperature': getattr(llm, 'temperature', None),
+        'schema': _schema(schema),
+        'extra': extra,
+        'messages': [
+            {'role': message.type, 'content': _content(message.content)} if isinstance(message, BaseMessage) else message
+            for message in messages
+        ],
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+# ── Storage ────────────────────────────────────────────────────────────────
+
+
+def _path(key):
+    return cache_dir() / key[:2] / f"{key}.json"
+
+
+def load(key):
+    """The stored entry for ``key``, or None."""
+    path = _path(key)
+    try:
+        with path.open('r', encoding='utf-8') as f:
+            entry = json.load(f)
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+    return entry
+
+
+def store(key, entry):
+    global _bytes_since_evict
+    path = _path(key)
+    data = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError as exc:
+        logger.warning("Could not store LLM response %s: %s", key, exc)
+        return
+
+    with _write_lock:
+        _bytes_since_evict += len(data)
+        due = _bytes_since_evict >= max_bytes() * (1 - EVICT_TARGET)
+        if due:
+            _bytes_since_evict = 0
+    if due:
+        evict()
+
+
+def evict(limit=None):
+    """Delete least recently used entries until the cache fits. Returns (files deleted, bytes freed)."""
+    limit = max_bytes() if limit is None else limit
+    root = cache_dir()
+    if not root.exists():
+        return 0, 0
+    entries = []
+    total = 0
+    for shard in os.scandir(root):
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    if total <= limit:
+        return 0, 0
+
+    deleted = freed = 0
+    target = limit * EVICT_TARGET
+    for _, size, path in sorted(entries):
+        if total - freed <= target:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        deleted += 1
+        freed += size
+    logger.info("LLM cache eviction: %s entries, %s bytes freed", deleted, freed)
+    return deleted, freed
+
+
+# ── Values ─────────────────────────────────────────────────────────────────
+
+
+def _encode(result):
+    if isinstance(result, BaseMessage):
+        return {'kind': 'message', 'content': result.content}
+    if isinstance(result, BaseModel):
+        # Aliases, as model_validate reads them back (e.g. "Design / Block Diagrams")
+        return {'kind': 'model', 'data': result.model_dump(mode='json', by_alias=True)}
+    return {'kind': 'json', 'data': result}
+
+
+def _decode(entry, schema):
+    if entry['kind'] == 'message':
+        return AIMessage(content=entry['content'])
+    if entry['kind'] == 'model' and isinstance(schema, type) and issubclass(schema, BaseModel):
+        return schema.model_validate(entry['data'])
+    return entry['data']
+
+
+def _cacheable(result):
+    # Empty or failed generations are worth retrying, not remembering
+    if isinstance(result, BaseMessage):
+        return bool(result.content)
+    return result is not None
+
+
+# ── Lookups ────────────────────────────────────────────────────────────────
+
+
+def lookup(key, schema=None, refresh=None):
+    """
+    The cached response under ``key`` (decoded to ``schema`` if it is a
+    model), or None: also when the cache is off or a refresh was asked for,
+    and when the entry no longer decodes (it is then replaced by the fresh
+    response).
+    """
+    if not enabled() or (_refresh.get() if refresh is None else refresh):
+        return None
+    entry = load(key)
+    if entry is None:
+        return None
+    try:
+        return _decode(entry, schema)
+    except (KeyError, TypeError, ValueError) as exc:
+        # pydantic.ValidationError is a ValueError
+        logger.warning("Ignoring undecodable LLM cache entry %s: %s", key, exc)
+        return None
+
+
+def remember(key, result):
+    """Store a fresh response under ``key`` (empty ones are not kept)."""
+    if enabled() and _cacheable(result):
+        store(key, _encode(result))
@@ -0,0 +1,643 @@
+"""
+The one way model calls are made.
+
+``model(name)`` returns an ``LLM`` handle; call sites ``await llm.ainvoke(messages,
+schema=...)`` (or ``llm.invoke`` from sync code) instead of building their
+own ``ChatOpenAI`` clients and retry loops. Every call:
+
+1. is answered from ``llm_cache`` when possible (``cache=False`` to skip);
+2. fails fast with ``CircuitOpen`` while the model's circuit breaker is open,
+   i.e. after ``LLM_CIRCUIT_FAILURES`` provider failures in a row, until a
+   single probe call succeeds ``LLM_CIRCUIT_RESET`` seconds later;
+3. passes the shared rate limiter (``rate_limit``), then takes a slot of the
+   model's adaptive concurrency limit (``concurrency``);
+4. runs with the timeout of its priority (``LLM_TIMEOUTS``) unless it passes
+   its own ``timeout`` (long structured outputs such as a parse chunk);
+5. is retried with exponential backoff and full jitter, up to the priority's
+   ``LLM_MAX_ATTEMPTS`` (client errors such as a 400 or 422 are not retried);
+6. is counted in per-model metrics: calls, cache hits, failures, latency,
+   tokens and cost (``LLM_PRICES``), see ``snapshot``.
+
+Connections are pooled per event loop: an ``httpx.AsyncClient`` cannot be
+used from another loop than the one it first connected on, so each loop gets
+its own pool (and its own ``ChatOpenAI`` instances), dropped with the loop.
+Sync calls share one thread-safe ``httpx.Client``. Under ``async_runtime``
+the loop, and so its pool, lives as long as the process.
+
+``LLM_BACKEND = 'fake'`` answers every call locally and deterministically
+(``FakeBackend``), for tests and local runs without a provider.
+"""
+
+import asyncio
+import hashlib
+import logging
+import random
+import threading
+import time
+import types
+import typing
+import weakref
+from collections import deque
+
+import httpx
+from django.conf import settings
+from langchain_core.messages import AIMessage
+from langfuse.langchain import CallbackHandler
+from pydantic import BaseModel
+
+from . import async_runtime, concurrency, llm_cache, rate_limit
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# Client errors worth retrying: request timeout, conflict, rate limited
+RETRYABLE_CLIENT_STATUSES = (408, 409, 429)
+LATENCY_SAMPLES = 1000
+
+
+class CircuitOpen(Exception):
+    """The model failed repeatedly and is not being called for a while."""
+
+    def __init__(self, model, retry_after):
+        super().__init__(f"{model}: circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+# ── Errors ─────────────────────────────────────────────────────────────────
+
+
+def _status(exc):
+    status = getattr(exc, 'status_code', None)
+    response = getattr(exc, 'response', None)
+    if status is None and response is not None:
+        status = getattr(response, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def retryable(exc):
+    """Whether another attempt may succeed: everything but client errors (bad request, context too long, auth)."""
+    if isinstance(exc, rate_limit.RateLimitTimeout):
+        return False
+    status = _status(exc)
+    return status is None or not 400 <= status < 500 or status in RETRYABLE_CLIENT_STATUSES
+
+
+def provider_failure(exc):
+    """Whether ``exc`` says the provider is unhealthy (counts towards opening the circuit)."""
+    if not isinstance(exc, Exception) or isinstance(exc, (ValueError, CircuitOpen, rate_limit.RateLimitTimeout)):
+        # Unparseable output is the response's fault, not the provider's
+        return False
+    return retryable(exc)
+
+
+def _retry_after(exc):
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt, exc=None):
+    """Seconds before retry ``attempt`` (0-based): full jitter over an exponential ceiling."""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if isinstance(exc, CircuitOpen):
+        return max(delay, exc.retry_after)
+    hint = _retry_after(exc) if exc is not None else None
+    return max(delay, min(hint, BACKOFF_MAX)) if hint else delay
+
+
+# ── Circuit breaker ────────────────────────────────────────────────────────
+
+
+class CircuitBreaker:
+    """Closed → open after ``failures`` provider failures in a row → half-open (one probe) after ``reset`` seconds."""
+
+    def __init__(self, name, failures=5, reset=30.0):
+        self.name = name
+        self.failures = failures
+        self.reset = reset
+        self.state = 'closed'
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before(self):
+        """Admit a call or raise ``CircuitOpen``. Must be followed by ``after``."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == 'open':
+                remaining = self._opened_at + self.reset - now
+                if remaining > 0:
+                    raise CircuitOpen(self.name, remaining)
+                self.state = 'half_open'
+            if self.state == 'half_open':
+                if self._probing:
+                    raise CircuitOpen(self.name, min(self.reset, BACKOFF_BASE * 2))
+                self._probing = True
+
+    def after(self, exc):
+        with self._lock:
+            probe, self._probing = self._probing, False
+            if exc is None:
+                if self.state != 'closed':
+                    logger.info("LLM circuit %s closed", self.name)
+                self.state = 'closed'
+                self._consecutive = 0
+                return
+            if not provider_failure(exc):
+                return
+            self._consecutive += 1
+            if probe or (self.state == 'closed' and self._consecutive >= self.failures):
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+                logger.warning("LLM circuit %s open for %ss after %s (%s failures in a row)",
+                               self.name, self.reset, type(exc).__name__, self._consecutive)
+
+
+# ── Metrics ────────────────────────────────────────────────────────────────
+
+
+class Metrics:
+    """Per-model counters of this process."""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = self.cache_hits = self.failures = self.retries = 0
+        self.input_tokens = self.output_tokens = 0
+        self.cost = 0.0
+        self.in_flight = self.peak_in_flight = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finished(self, latency, usage=None, failed=False):
+        price = getattr(settings, 'LLM_PRICES', {}).get(self.name, (0.0, 0.0))
+        with self._lock:
+            self.in_flight -= 1
+            self.calls += 1
+            self.failures += failed
+            self._latencies.append(latency)
+            if usage:
+                self.input_tokens += usage['input_tokens']
+                self.output_tokens += usage['output_tokens']
+                self.cost += (usage['input_tokens'] * price[0] + usage['output_tokens'] * price[1]) / 1_000_000
+
+    def hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def retried(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+
+        return {
+            'calls': self.calls,
+            'cache_hits': self.cache_hits,
+            'failures': self.failures,
+            'retries': self.retries,
+            'peak_in_flight': self.peak_in_flight,
+            'latency_p50': percentile(0.5),
+            'latency_p95': percentile(0.95),
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'cost_usd': round(self.cost, 4),
+        }
+
+
+# ── Backends ───────────────────────────────────────────────────────────────
+
+
+def _usage(message, messages, result):
+    usage = getattr(message, 'usage_metadata', None)
+    if usage:
+        return {'input_tokens': usage.get('input_tokens', 0), 'output_tokens': usage.get('output_tokens', 0)}
+    # Providers that report nothing: the rate limiter's estimate
+    output = result.model_dump_json() if isinstance(result, BaseModel) else str(getattr(result, 'content', result))
+    return {
+        'input_tokens': rate_limit.estimate_tokens(messages, 0),
+        'output_tokens': len(output) // rate_limit.CHARS_PER_TOKEN,
+    }
+
+
+class OpenAIBackend:
+    """OpenAI-compatible endpoints (``LLM_PROVIDERS``) through ``ChatOpenAI``."""
+
+    def __init__(self):
+        self._sync_client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._models = weakref.WeakKeyDictionary()
+        self._sync_models = {}
+        self._lock = threading.Lock()
+
+    def async_client(self):
+        """The running loop's pooled ``httpx.AsyncClient``."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._async_clients[loop] = httpx.AsyncClient(limits=_pool_limits())
+            return client
+
+    def sync_client(self):
+        with self._lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(limits=_pool_limits())
+            return self._sync_client
+
+    def chat_model(self, llm, timeout):
+        """``ChatOpenAI`` for ``llm`` on the running loop's pool (or the sync pool outside a loop)."""
+        from langchain_openai import ChatOpenAI
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        http_async_client = self.async_client() if loop is not None else None
+        key = (llm.provider, llm.model_name, llm.temperature, llm.max_tokens, timeout)
+        with self._lock:
+            models = self._models.setdefault(loop, {}) if loop is not None else self._sync_models
+            chat = models.get(key)
+        if chat is not None:
+            return chat
+        provider = _provider(llm.provider)
+        options = {'temperature': llm.temperature} if llm.temperature is not None else {}
+        if llm.max_tokens is not None:
+            options['max_tokens'] = llm.max_tokens
+        chat = ChatOpenAI(
+            model=llm.model_name,
+            openai_api_base=provider['base_url'],
+            openai_api_key=provider.get('api_key', 'dummy-key'),
+            default_headers=provider.get('headers') or None,
+            timeout=timeout,
+            max_retries=0,  # Retried by the gateway
+            http_client=self.sync_client(),
+            http_async_client=http_async_client,
+            **options,
+        )
+        with self._lock:
+            return models.setdefault(key, chat)
+
+    def _runnable(self, llm, schema, method, timeout):
+        chat = self.chat_model(llm, timeout)
+        if schema is None:
+            return chat
+        return chat.with_structured_output(schema, include_raw=True, **({'method': method} if method else {}))
+
+    @staticmethod
+    def _unpack(output, schema, messages):
+        if schema is None:
+            return output, _usage(output, messages, output)
+        if output.get('parsing_error') is not None:
+            raise output['parsing_error']
+        if output.get('parsed') is None:
+            raise ValueError("Model returned no structured output")
+        return output['parsed'], _usage(output.get('raw'), messages, output['parsed'])
+
+    async def acall(self, llm, messages, schema, method, timeout, config):
+        output = await self._runnable(llm, schema, method, timeout).ainvoke(messages, config=config)
+        return self._unpack(output, schema, messages)
+
+    def call(self, llm, messages, schema, method, timeout, config):
+        output = self._runnable(llm, schema, method, timeout).invoke(messages, config=config)
+        return self._unpack(output, schema, messages)
+
+    async def aclose(self):
+        """Close the running loop's pool (on worker shutdown)."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.pop(loop, None)
+            self._models.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+
+class FakeProviderError(Exception):
+    status_code = 503
+
+
+def _fake_value(annotation, seed):
+    """A deterministic value of type ``annotation`` derived from ``seed``."""
+    number = int(hashlib.sha256(seed.encode('utf-8')).hexdigest()[:8], 16)
+    origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return {field.alias or name: _fake_value(field.annotation, f"{seed}.{name}")
+                for name, field in annotation.model_fields.items()}
+    if origin is typing.Literal:
+        return args[number % len(args)]
+    if origin in (typing.Union, types.UnionType):
+        return _fake_value(next(arg for arg in args if arg is not type(None)), seed)
+    if origin in (list, tuple, set) or annotation in (list, tuple, set):
+        return [_fake_value(args[0] if args else str, f"{seed}[{i}]") for i in range(1 + number % 3)]
+    if origin is dict or annotation is dict:
+        return {}
+    if annotation is bool:
+        return bool(number % 2)
+    if annotation is int:
+        return 1 + number % 10
+    if annotation is float:
+        return round((number % 1000) / 10, 1)
+    return f"{seed.rsplit('.', 1)[-1]} {number:08x}"
+
+
+class FakeBackend:
+    """
+    Deterministic offline responses (``LLM_BACKEND = 'fake'``): text and
+    schema instances derived from a hash of the request, after
+    ``LLM_FAKE_LATENCY`` seconds. ``LLM_FAKE_ERROR_RATE`` of calls fail with
+    a 503, chosen by the request hash and how often it was sent, so a run is
+    reproducible.
+    """
+
+    def __init__(self):
+        self._sent = {}
+        self._lock = threading.Lock()
+
+    def _respond(self, llm, messages, schema):
+        digest = llm_cache.response_key(llm, messages, schema)
+        with self._lock:
+            nth = self._sent[digest] = self._sent.get(digest, 0) + 1
+        error_rate = getattr(settings, 'LLM_FAKE_ERROR_RATE', 0.0)
+        if error_rate and int(hashlib.sha256(f"{digest}:{nth}".encode()).hexdigest()[:8], 16) / 0xFFFFFFFF < error_rate:
+            raise FakeProviderError(f"Fake 503 for {llm.model_name} (call {nth})")
+        if schema is None:
+            result = AIMessage(content=f"Fake response from {llm.model_name} ({digest[:12]})")
+        elif isinstance(schema, type) and issubclass(schema, BaseModel):
+            result = schema.model_validate(_fake_value(schema, digest[:12]))
+        else:
+            result = {}
+        return result, _usage(None, messages, result)
+
+    async def acall(self, llm, messages, schema, method, timeout, config):
+        latency = getattr(settings, 'LLM_FAKE_LATENCY', 0.0)
+        if latency:
+            await asyncio.wait_for(asyncio.sleep(latency), timeout)
+        return self._respond(llm, messages, schema)
+
+    def call(self, llm, messages, schema, method, timeout, config):
+        latency = getattr(settings, 'LLM_FAKE_LATENCY', 0.0)
+        if latency:
+            time.sleep(min(latency, timeout))
+        return self._respond(llm, messages, schema)
+
+    async def aclose(self):
+        pass
+
+
+def _pool_limits():
+    return httpx.Limits(
+        max_connections=getattr(settings, 'LLM_POOL_MAX_CONNECTIONS', 1000),
+        max_keepalive_connections=getattr(settings, 'LLM_POOL_MAX_KEEPALIVE', 200),
+    )
+
+
+def _provider(name):
+    providers = getattr(settings, 'LLM_PROVIDERS', {})
+    name = name or getattr(settings, 'LLM_DEFAULT_PROVIDER', 'bifrost')
+    if name not in providers:
+        raise ValueError(f"Unknown LLM provider {name!r}; configure it in LLM_PROVIDERS")
+    return providers[name]
+
+
+_openai = OpenAIBackend()
+_fake = FakeBackend()
+
+
+def backend():
+    return _fake if getattr(settings, 'LLM_BACKEND', 'openai') == 'fake' else _openai
+
+
+def async_http_client():
+    """The running loop's pooled ``httpx.AsyncClient``, for other outbound HTTP made alongside model calls."""
+    return _openai.async_client()
+
+
+async def aclose():
+    """Close the running loop's connection pool."""
+    await _openai.aclose()
+
+
+async_runtime.at_shutdown(aclose)
+
+
+# ── Per-model state ────────────────────────────────────────────────────────
+
+
+_breakers = {}
+_metrics = {}
+_state_lock = threading.Lock()
+
+
+def breaker_for(name):
+    with _state_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(
+                name,
+                failures=getattr(settings, 'LLM_CIRCUIT_FAILURES', 5),
+                reset=getattr(settings, 'LLM_CIRCUIT_RESET', 30.0),
+            )
+        return breaker
+
+
+def metrics_for(name):
+    with _state_lock:
+        metrics = _metrics.get(name)
+        if metrics is None:
+            metrics = _metrics[name] = Metrics(name)
+        return metrics
+
+
+def snapshot(llm=None):
+    """Metrics, circuit state and concurrency limit per model (or of ``llm``'s model)."""
+    with _state_lock:
+        names = [llm.model_name] if llm is not None else sorted(_metrics)
+    return {
+        name: {
+            **metrics_for(name).snapshot(),
+            'circuit': breaker_for(name).state,
+            'concurrency': concurrency.limiter_for(name).limit,
+        }
+        for name in names
+    }
+
+
+def to_dict(result):
+    """A structured result as plain data."""
+    return result.model_dump() if isinstance(result, BaseModel) else result
+
+
+def _config(config, session, tags):
+    if session is None and tags is None:
+        return config
+    config = dict(config or {})
+    config['callbacks'] = [*config.get('callbacks', []), CallbackHandler()]
+    config['metadata'] = {
+        **config.get('metadata', {}),
+        **({'langfuse_session_id': session} if session else {}),
+        **({'langfuse_tags': [tag for tag in tags if tag]} if tags else {}),
+    }
+    return config
+
+
+# ── Calls ──────────────────────────────────────────────────────────────────
+
+
+class LLM:
+    """
+    A chat model by name. Cheap to create and safe to share: clients are
+    resolved per call, on the caller's event loop.
+    """
+
+    def __init__(self, model_name, *, provider=None, temperature=None, max_tokens=None):
+        self.model_name = model_name
+        self.provider = provider
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+    def __repr__(self):
+        return f"<LLM {self.model_name}>"
+
+    def _prepare(self, messages, schema, method, priority, attempts, timeout, config, session, tags, cache, refresh, extra):
+        level = priority or rate_limit.current_priority()
+        if timeout is None:
+            timeout = getattr(settings, 'LLM_TIMEOUTS', {}).get(level, 120)
+        if attempts is None:
+            attempts = getattr(settings, 'LLM_MAX_ATTEMPTS', {}).get(level, 3)
+        key = None
+        if cache:
+            key = llm_cache.response_key(self, messages, schema, **({'method': method} if method else {}), **extra)
+        return level, timeout, max(1, attempts), _config(config, session, tags), key
+
+    def _cached(self, key, schema, refresh):
+        result = llm_cache.lookup(key, schema, refresh) if key else None
+        if result is not None:
+            concurrency.mark_cached()
+            metrics_for(self.model_name).hit()
+        return result
+
+    def _failed(self, exc, attempt, attempts):
+        if attempt + 1 >= attempts or not retryable(exc):
+            return None
+        delay = backoff(attempt, exc)
+        metrics_for(self.model_name).retried()
+        logger.warning("%s call failed (attempt %s/%s), retrying in %.1fs: %s",
+                       self.model_name, attempt + 1, attempts, delay, exc)
+        return delay
+
+    async def ainvoke(self, messages, *, schema=None, method=None, priority=None, attempts=None,
+                      timeout=None, config=None, session=None, tags=None, cache=True, refresh=None, **extra):
+        """
+        The model's reply to ``messages``: an ``AIMessage``, or an instance of
+        ``schema`` (structured output, ``method`` as for ``with_structured_output``).
+        ``timeout`` (seconds per attempt) overrides the priority's.
+        ``session`` / ``tags`` trace the call in Langfuse; ``extra`` is added to
+        the cache key. Raises the last error once attempts are exhausted.
+        """
+        level, timeout, attempts, config, key = self._prepare(
+            messages, schema, method, priority, attempts, timeout, config, session, tags, cache, refresh, extra)
+        cached = self._cached(key, schema, refresh)
+        if cached is not None:
+            return cached
+        for attempt in range(attempts):
+            try:
+                result = await self._aattempt(messages, schema, method, level, timeout, config)
+            except Exception as exc:
+                delay = self._failed(exc, attempt, attempts)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            if key:
+                llm_cache.remember(key, result)
+            return result
+
+    def invoke(self, messages, *, schema=None, method=None, priority=None, attempts=None,
+               timeout=None, config=None, session=None, tags=None, cache=True, refresh=None, **extra):
+        """Synchronous ``ainvoke``."""
+        level, timeout, attempts, config, key = self._prepare(
+            messages, schema, method, priority, attempts, timeout, config, session, tags, cache, refresh, extra)
+        cached = self._cached(key, schema, refresh)
+        if cached is not None:
+            return cached
+        for attempt in range(attempts):
+            try:
+                result = self._attempt(messages, schema, method, level, timeout, config)
+            except Exception as exc:
+                delay = self._failed(exc, attempt, attempts)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            if key:
+                llm_cache.remember(key, result)
+            return result
+
+    async def _aattempt(self, messages, schema, method, level, timeout, config):
+        breaker, metrics = breaker_for(self.model_name), metrics_for(self.model_name)
+        breaker.before()
+        outcome = None
+        try:
+            await rate_limit.aacquire(self, messages, priority=level)
+            async with concurrency.limiter_for(self).slot():
+                metrics.started()
+                started = time.monotonic()
+                try:
+                    result, usage = await backend().acall(self, messages, schema, method, timeout, config)
+                except BaseException:
+                    metrics.finished(time.monotonic() - started, failed=True)
+                    raise
+                metrics.finished(time.monotonic() - started, usage)
+        except BaseException as exc:
+            outcome = exc
+            raise
+        finally:
+            breaker.after(outcome)
+        self._log(level, time.monotonic() - started, usage)
+        return result
+
+    def _attempt(self, messages, schema, method, level, timeout, config):
+        breaker, metrics = breaker_for(self.model_name), metrics_for(self.model_name)
+        breaker.before()
+        outcome = None
+        try:
+            rate_limit.acquire(self, messages, priority=level)
+            with concurrency.limiter_for(self).slot():
+                metrics.started()
+                started = time.monotonic()
+                try:
+                    result, usage = backend().call(self, messages, schema, method, timeout, config)
+                except BaseException:
+                    metrics.finished(time.monotonic() - started, failed=True)
+                    raise
+                metrics.finished(time.monotonic() - started, usage)
+        except BaseException as exc:
+            outcome = exc
+            raise
+        finally:
+            breaker.after(outcome)
+        self._log(level, time.monotonic() - started, usage)
+        return result
+
+    def _log(self, level, latency, usage):
+        logger.debug("LLM call %s (%s): %.2fs, %s in / %s out tokens",
+                     self.model_name, level, latency, usage['input_tokens'], usage['output_tokens'])
+
+
+def model(name, *, provider=None, temperature=None, max_tokens=None):
+    """An ``LLM`` handle for ``name`` on ``provider`` (default ``LLM_DEFAULT_PROVIDER``)."""
+    return LLM(name, provider=provider, temperature=temperature, max_tokens=max_tokens)
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.common.retention import (
+    NotificationRetentionPolicy,
+    RetentionService,
+    StudySessionRetentionPolicy,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Archive old notifications and study sessions to gzip JSONL, roll sessions up '
+        'into StudySessionRollup, and delete the originals in small batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only', choices=['notifications', 'study_sessions'],
+            help='Run a single policy instead of all of them',
+        )
+        parser.add_argument(
+            '--notification-days', type=int,
+            default=getattr(settings, 'RETENTION_NOTIFICATION_DAYS', 90),
+            help='Archive read notifications older than this many days',
+        )
+        parser.add_argument(
+            '--session-days', type=int,
+            default=getattr(settings, 'RETENTION_STUDY_SESSION_DAYS', 180),
+            help='Archive study sessions older than this many days',
+        )
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows per delete batch')
+        parser.add_argument('--pause', type=float, default=None, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be archived')
+
+    def handle(self, *args, **options):
+        policies = []
+        if options['only'] in (None, 'notifications'):
+            policies.append(NotificationRetentionPolicy(options['notification_days']))
+        if options['only'] in (None, 'study_sessions'):
+            policies.append(StudySessionRetentionPolicy(options['session_days']))
+
+        reports = RetentionService.run(
+            policies,
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+            log=self.stdout.write,
+        )
+
+        for report in reports:
+            if options['dry_run']:
+                self.stdout.write(f"[DRY RUN] {report['policy']}: {report['rows']} rows older than {report['cutoff']}")
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {report['policy']}: {report['rows']} rows archived, "
+                f"{report['bytes_reclaimed'] / 1024:.1f} KB reclaimed, "
+                f"{report['archive_bytes'] / 1024:.1f} KB written"
+                + (f" to {report['archive_path']}" if report['archive_path'] else '')
+                + (f", {report['rollup_rows']} rollup buckets updated" if report['rollup_rows'] else '')
+            ))
@@ -0,0 +1,101 @@
+"""
+MinHash signatures and LSH banding for near-duplicate text detection.
+
+A signature is ``NUM_PERM`` 32-bit minima of character-shingle hashes under
+random universal hash functions; the fraction of equal positions between
+two signatures estimates the Jaccard similarity of their shingle sets.
+``LSHIndex`` splits signatures into ``BANDS`` bands and only compares texts
+that collide in at least one band, so finding duplicates is sub-linear in
+the number of indexed texts.
+
+The hash functions are seeded, so signatures are stable across processes
+and can be stored (``to_bytes`` / ``from_bytes``).
+"""
+
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+NUM_PERM = 128
+BANDS = 32
+SHINGLE_SIZE = 5
+SEED = 1729
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_rng = np.random.default_rng(SEED)
+_A = _rng.integers(1, int(_MERSENNE), size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, int(_MERSENNE), size=NUM_PERM, dtype=np.uint64)
+
+_LATEX_RE = re.compile(r'\\[a-zA-Z]+')
+_NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(text):
+    """Lowercase, LaTeX commands and punctuation dropped, single-spaced."""
+    text = _LATEX_RE.sub(' ', str(text or '').lower())
+    return _NON_WORD_RE.sub(' ', text).strip()
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """CRC32 hashes of the character ``size``-grams of already normalised text."""
+    if not text:
+        return np.empty(0, dtype=np.uint64)
+    if len(text) <= size:
+        grams = {text}
+    else:
+        grams = {text[i:i + size] for i in range(len(text) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def signature(text):
+    """MinHash signature of ``text`` (``uint32[NUM_PERM]``), or None if it has no shingles."""
+    hashes = shingles(normalize(text))
+    if not len(hashes):
+        return None
+    # uint64 products wrap around; that is fine for hashing and keeps it vectorised
+    permuted = (hashes[None, :] * _A[:, None] + _B[:, None]) % _MERSENNE
+    return (permuted & _MAX_HASH).min(axis=1).astype(np.uint32)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def to_bytes(sig):
+    return sig.astype('<u4').tobytes()
+
+
+def from_bytes(data):
+    return np.frombuffer(bytes(data), dtype='<u4').astype(np.uint32)
+
+
+class LSHIndex:
+    """Banded LSH buckets: ``query`` returns keys sharing any band with a signature."""
+
+    def __init__(self, bands=BANDS):
+        if NUM_PERM % bands:
+            raise ValueError(f"{NUM_PERM} permutations do not split into {bands} bands")
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self._buckets = [defaultdict(list) for _ in range(bands)]
+
+    def _band_keys(self, sig):
+        return [sig[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+
+    def add(self, key, sig):
+        for bucket, band_key in zip(self._buckets, self._band_keys(sig)):
+            bucket[band_key].append(key)
+
+    def query(self, sig):
+        found = []
+        seen = set()
+        for bucket, band_key in zip(self._buckets, self._band_keys(sig)):
+            for key in bucket.get(band_key, ()):
+                if key not in seen:
+                    seen.add(key)
+                    found.append(key)
+        return found
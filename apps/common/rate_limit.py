@@ -0,0 +1,275 @@
+"""
+Cluster-wide rate limiting of LLM calls.
+
+Every model has two token buckets — requests per minute and tokens per
+minute (``LLM_RATE_LIMITS``) — kept in Redis, so Celery workers, management
+commands and web processes all draw from the same budget instead of each
+enforcing its own concurrency. The buckets are refilled and debited in one
+Lua script, using the Redis clock.
+
+Calls are either ``INTERACTIVE`` (someone is waiting on the result: practice
+generation, an admin-triggered parse) or ``BATCH`` (everything else, the
+default). Batch calls leave ``LLM_RATE_LIMIT_INTERACTIVE_RESERVE`` of each
+bucket untouched, and hold back entirely while an interactive call is
+waiting, so a bulk command cannot starve the site.
+
+``LLM_RATE_LIMIT_BACKEND = 'memory'`` (or Redis being unreachable) uses
+per-process buckets with the same behaviour, for tests and local runs.
+
+``llm_gateway`` acquires before every model call (cache hits are free).
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 1600
+DEFAULT_OUTPUT_TOKENS = 1024
+# While an interactive call waits, batch callers check back this often
+YIELD_SECONDS = 0.25
+INTERACTIVE_FLAG_MS = 2000
+# Spread out waiters that would otherwise retry at the same instant
+JITTER = 0.1
+REDIS_RETRY_SECONDS = 30
+
+_priority = contextvars.ContextVar('llm_priority', default=BATCH)
+
+# Refill both buckets, then take one request and ``cost`` tokens if both
+# still hold the caller's reserve afterwards. Returns the seconds to wait
+# (as a string, Redis truncates Lua numbers to integers), "0" when granted.
+ACQUIRE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local rpm, tpm, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local reserve, interactive = tonumber(ARGV[4]), ARGV[5] == '1'
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'ts')
+local requests, tokens = tonumber(state[1]) or rpm, tonumber(state[2]) or tpm
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+requests = math.min(rpm, requests + elapsed * rpm / 60)
+tokens = math.min(tpm, tokens + elapsed * tpm / 60)
+
+local wait = 0
+if requests < 1 + reserve * rpm then wait = (1 + reserve * rpm - requests) * 60 / rpm end
+if tokens < cost + reserve * tpm then wait = math.max(wait, (cost + reserve * tpm - tokens) * 60 / tpm) end
+if wait == 0 and not interactive and redis.call('EXISTS', KEYS[2]) == 1 then wait = tonumber(ARGV[6]) end
+
+if wait == 0 then
+  requests, tokens = requests - 1, tokens - cost
+elseif interactive then
+  redis.call('SET', KEYS[2], '1', 'PX', tonumber(ARGV[7]))
+end
+redis.call('HSET', KEYS[1], 'requests', tostring(requests), 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], 120)
+return tostring(wait)
+"""
+
+
+class RateLimitTimeout(Exception):
+    """The call could not be admitted within ``LLM_RATE_LIMIT_MAX_WAIT``."""
+
+
+@dataclass(frozen=True)
+class Limit:
+    rpm: int
+    tpm: int
+
+
+def enabled():
+    return getattr(settings, 'LLM_RATE_LIMIT_ENABLED', True)
+
+
+def limit_for(model):
+    limits = getattr(settings, 'LLM_RATE_LIMITS', {})
+    limit = limits.get(model) or limits.get('default')
+    return Limit(rpm=limit['rpm'], tpm=limit['tpm']) if limit else None
+
+
+def interactive_reserve():
+    return getattr(settings, 'LLM_RATE_LIMIT_INTERACTIVE_RESERVE', 0.2)
+
+
+@contextlib.contextmanager
+def priority(level):
+    """Within the block, LLM calls are made at ``level`` (``INTERACTIVE`` or ``BATCH``)."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+# ── Estimates ──────────────────────────────────────────────────────────────
+
+
+def model_name(llm):
+    model = getattr(llm, 'model_name', None) or getattr(llm, 'model', None)
+    return model if isinstance(model, str) else type(llm).__name__
+
+
+def estimate_tokens(messages, output_tokens=None):
+    """Tokens a call will count against TPM: its prompt plus the expected output."""
+    chars = images = 0
+    for message in messages:
+        content = message.content if isinstance(message, BaseMessage) else message
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content if isinstance(content, (list, tuple)) else [content]:
+            if isinstance(part, dict) and part.get('type') == 'image_url':
+                images += 1
+            elif isinstance(part, dict):
+                chars += len(str(part.get('text', '')))
+            else:
+                chars += len(str(part))
+    output = DEFAULT_OUTPUT_TOKENS if output_tokens is None else output_tokens
+    return chars // CHARS_PER_TOKEN + images * IMAGE_TOKENS + output
+
+
+# ── Buckets ────────────────────────────────────────────────────────────────
+
+
+class MemoryBuckets:
+    """Per-process buckets: the Redis script's logic behind a lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}
+        self._interactive_until = {}
+
+    def take(self, model, limit, cost, reserve, interactive):
+        with self._lock:
+            now = time.monotonic()
+            requests, tokens, ts = self._state.get(model, (limit.rpm, limit.tpm, now))
+            elapsed = max(0.0, now - ts)
+            requests = min(limit.rpm, requests + elapsed * limit.rpm / 60)
+            tokens = min(limit.tpm, tokens + elapsed * limit.tpm / 60)
+
+            wait = 0.0
+            if requests < 1 + reserve * limit.rpm:
+                wait = (1 + reserve * limit.rpm - requests) * 60 / limit.rpm
+            if tokens < cost + reserve * limit.tpm:
+                wait = max(wait, (cost + reserve * limit.tpm - tokens) * 60 / limit.tpm)
+            if not wait and not interactive and self._interactive_until.get(model, 0) > now:
+                wait = YIELD_SECONDS
+
+            if not wait:
+                requests, tokens = requests - 1, tokens - cost
+            elif interactive:
+                self._interactive_until[model] = now + INTERACTIVE_FLAG_MS / 1000
+            self._state[model] = (requests, tokens, now)
+            return wait
+
+
+class RedisBuckets:
+    """Buckets shared through Redis (``LLM_RATE_LIMIT_REDIS_URL``)."""
+
+    def __init__(self, url):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self._script = self._client.register_script(ACQUIRE_SCRIPT)
+
+    def take(self, model, limit, cost, reserve, interactive):
+        wait = self._script(
+            keys=[f"llm_rate:{model}", f"llm_rate:{model}:interactive"],
+            args=[limit.rpm, limit.tpm, cost, reserve, '1' if interactive else '0', YIELD_SECONDS, INTERACTIVE_FLAG_MS],
+        )
+        return float(wait)
+
+
+_local = MemoryBuckets()
+_redis = None
+_redis_down_until = 0.0
+_redis_lock = threading.Lock()
+
+
+def _buckets():
+    global _redis
+    if getattr(settings, 'LLM_RATE_LIMIT_BACKEND', 'redis') == 'memory' or time.monotonic() < _redis_down_until:
+        return _local
+    with _redis_lock:
+        if _redis is None:
+            _redis = RedisBuckets(getattr(settings, 'LLM_RATE_LIMIT_REDIS_URL', 'redis://127.0.0.1:6379/1'))
+    return _redis
+
+
+def _take(model, limit, cost, interactive):
+    global _redis_down_until
+    reserve = 0.0 if interactive else interactive_reserve()
+    # A call larger than what the bucket may hold would never be admitted
+    cost = min(cost, limit.tpm * (1 - reserve))
+    buckets = _buckets()
+    try:
+        return buckets.take(model, limit, cost, reserve, interactive)
+    except Exception as exc:
+        if buckets is _local:
+            raise
+        logger.warning("LLM rate limiter: Redis unavailable (%s); using per-process buckets for %ss", exc, REDIS_RETRY_SECONDS)
+        _redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+        return _local.take(model, limit, cost, reserve, interactive)
+
+
+def current_priority():
+    """The priority in effect: the enclosing ``priority()`` block's, else ``BATCH``."""
+    return _priority.get()
+
+
+def _admission(llm, messages, tokens, level):
+    model = model_name(llm)
+    limit = limit_for(model) if enabled() else None
+    if limit is None:
+        return None
+    if tokens is None:
+        tokens = estimate_tokens(messages or [], getattr(llm, 'max_tokens', None))
+    return model, limit, tokens, (level or _priority.get()) == INTERACTIVE
+
+
+def _timeout(timeout):
+    return getattr(settings, 'LLM_RATE_LIMIT_MAX_WAIT', 600) if timeout is None else timeout
+
+
+def acquire(llm, messages=None, *, tokens=None, priority=None, timeout=None):
+    """
+    Block until ``llm`` (the chat model) may be called with ``messages``
+    (or an explicit ``tokens`` estimate). Raises ``RateLimitTimeout``.
+    """
+    admission = _admission(llm, messages, tokens, priority)
+    if admission is None:
+        return
+    deadline = time.monotonic() + _timeout(timeout)
+    while True:
+        wait = _take(*admission)
+        if not wait:
+            return
+        if time.monotonic() + wait > deadline:
+            raise RateLimitTimeout(f"{admission[0]}: no capacity within {_timeout(timeout)}s")
+        time.sleep(wait * (1 + random.uniform(0, JITTER)))
+
+
+async def aacquire(llm, messages=None, *, tokens=None, priority=None, timeout=None):
+    """``acquire`` for coroutines: waits without blocking the event loop."""
+    admission = _admission(llm, messages, tokens, priority)
+    if admission is None:
+        return
+    deadline = time.monotonic() + _timeout(timeout)
+    while True:
+        wait = await asyncio.to_thread(_take, *admission)
+        if not wait:
+            return
+        if time.monotonic() + wait > deadline:
+            raise RateLimitTimeout(f"{admission[0]}: no capacity within {_timeout(timeout)}s")
+        await asyncio.sleep(wait * (1 + random.uniform(0, JITTER)))
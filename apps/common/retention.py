@@ -0,0 +1,199 @@
+"""
+Retention policies for append-only tables (notifications, study sessions).
+
+Each policy selects rows older than a horizon, appends them to a gzip'd JSONL
+archive, optionally folds them into a compact rollup table, and deletes them
+in small primary-key batches so no statement holds long locks.
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionPolicy:
+    """Base policy: subclasses define the queryset, archived fields and rollup."""
+
+    name = ''
+    fields = ()
+
+    def __init__(self, days):
+        self.days = days
+
+    @property
+    def cutoff(self):
+        return timezone.now() - timedelta(days=self.days)
+
+    def get_queryset(self):
+        raise NotImplementedError("Subclasses must implement get_queryset")
+
+    def rollup(self, rows):
+        """Fold a batch of archived rows into a compact table. Optional."""
+        return None
+
+
+class NotificationRetentionPolicy(RetentionPolicy):
+    """
+    Archives *read* notifications past the horizon. Unread rows are kept so
+    the cached unread counters stay exact.
+    """
+
+    name = 'notifications'
+    fields = ('id', 'user_id', 'level', 'title', 'message', 'link', 'is_read', 'created_at')
+
+    def get_queryset(self):
+        from apps.notifications.models import Notification
+        return Notification.objects.filter(is_read=True, created_at__lt=self.cutoff)
+
+
+class StudySessionRetentionPolicy(RetentionPolicy):
+    """
+    Archives study sessions past the horizon and folds their durations into
+    hourly ``StudySessionRollup`` rows so lifetime analytics are unchanged.
+    """
+
+    name = 'study_sessions'
+    fields = (
+        'id', 'user_id', 'subject_id', 'parsed_document_id', 'start_time',
+        'last_ping_time', 'duration_seconds', 'is_active',
+    )
+
+    def get_queryset(self):
+        from apps.gamification.models import StudySession
+        return StudySession.objects.filter(start_time__lt=self.cutoff)
+
+    def rollup(self, rows):
+        from apps.gamification.models import StudySessionRollup
+
+        buckets = defaultdict(lambda: [0, 0])
+        for row in rows:
+            hour_start = row['start_time'].replace(minute=0, second=0, microsecond=0)
+            bucket = buckets[(row['user_id'], row['subject_id'], hour_start)]
+            bucket[0] += row['duration_seconds']
+            bucket[1] += 1
+
+        user_ids = {key[0] for key in buckets}
+        hours = [key[2] for key in buckets]
+        existing = {
+            (r.user_id, r.subject_id, r.hour_start): r
+            for r in StudySessionRollup.objects.select_for_update().filter(
+                user_id__in=user_ids, hour_start__gte=min(hours), hour_start__lte=max(hours),
+            )
+        }
+
+        to_update, to_create = [], []
+        for (user_id, subject_id, hour_start), (seconds, count) in buckets.items():
+            rollup = existing.get((user_id, subject_id, hour_start))
+            if rollup:
+                rollup.total_seconds += seconds
+                rollup.session_count += count
+                to_update.append(rollup)
+            else:
+                to_create.append(StudySessionRollup(
+                    user_id=user_id, subject_id=subject_id, hour_start=hour_start,
+                    total_seconds=seconds, session_count=count,
+                ))
+        if to_update:
+            StudySessionRollup.objects.bulk_update(to_update, ['total_seconds', 'session_count'])
+        if to_create:
+            StudySessionRollup.objects.bulk_create(to_create)
+        return len(buckets)
+
+
+class RetentionService:
+    """Runs retention policies and reports rows and bytes reclaimed."""
+
+    @staticmethod
+    def default_policies():
+        return [
+            NotificationRetentionPolicy(getattr(settings, 'RETENTION_NOTIFICATION_DAYS', 90)),
+            StudySessionRetentionPolicy(getattr(settings, 'RETENTION_STUDY_SESSION_DAYS', 180)),
+        ]
+
+    @classmethod
+    def run(cls, policies=None, batch_size=None, pause=None, dry_run=False, log=None):
+        """Apply every policy in turn; returns a list of per-policy reports."""
+        policies = policies if policies is not None else cls.default_policies()
+        batch_size = batch_size or getattr(settings, 'RETENTION_BATCH_SIZE', 500)
+        pause = getattr(settings, 'RETENTION_BATCH_PAUSE_SECONDS', 0.05) if pause is None else pause
+        return [cls.apply(policy, batch_size, pause, dry_run, log) for policy in policies]
+
+    @classmethod
+    def apply(cls, policy, batch_size, pause=0.0, dry_run=False, log=None):
+        report = {
+            'policy': policy.name,
+            'cutoff': policy.cutoff.isoformat(),
+            'rows': 0,
+            'rollup_rows': 0,
+            'bytes_reclaimed': 0,
+            'archive_bytes': 0,
+            'archive_path': None,
+        }
+        queryset = policy.get_queryset()
+
+        if dry_run:
+            report['rows'] = queryset.count()
+            return report
+
+        archive_path = cls._archive_path(policy.name)
+        last_id = 0
+        archive = None
+        try:
+            while True:
+                with transaction.atomic():
+                    rows = list(
+                        queryset.filter(id__gt=last_id)
+                        .order_by('id')
+                        .values(*policy.fields)[:batch_size]
+                    )
+                    if not rows:
+                        break
+
+                    if archive is None:
+                        os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+                        archive = gzip.open(archive_path, 'wt', encoding='utf-8')
+                        report['archive_path'] = archive_path
+                    for row in rows:
+                        line = json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+                        archive.write(line)
+                        report['bytes_reclaimed'] += len(line.encode('utf-8'))
+                    archive.flush()
+
+                    report['rollup_rows'] += policy.rollup(rows) or 0
+
+                    ids = [row['id'] for row in rows]
+                    queryset.model.objects.filter(id__in=ids).delete()
+
+                last_id = rows[-1]['id']
+                report['rows'] += len(rows)
+                if log:
+                    log(f"  {policy.name}: archived {report['rows']} rows so far")
+                if pause:
+                    time.sleep(pause)
+        finally:
+            if archive is not None:
+                archive.close()
+                report['archive_bytes'] = os.path.getsize(archive_path)
+
+        logger.info(
+            f"Retention {policy.name}: {report['rows']} rows, "
+            f"{report['bytes_reclaimed']} bytes reclaimed, {report['archive_bytes']} archived"
+        )
+        return report
+
+    @staticmethod
+    def _archive_path(name):
+        archive_dir = getattr(settings, 'RETENTION_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'data', 'archive'))
+        stamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+        return os.path.join(str(archive_dir), name, f"{name}_{stamp}.jsonl.gz")
@@ -0,0 +1,28 @@
+import logging
+from celery import shared_task
+from .retention import RetentionService
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def apply_retention_policies():
+    """Nightly beat task: archive and prune old notifications and study sessions."""
+    reports = RetentionService.run()
+    for report in reports:
+        logger.info(
+            f"Retention {report['policy']}: {report['rows']} rows, "
+            f"{report['bytes_reclaimed']} bytes reclaimed"
+        )
+    return reports
+
+
+@shared_task(ignore_result=True)
+def evict_llm_cache():
+    """Beat task: trim the LLM response cache to LLM_CACHE_MAX_BYTES."""
+    from . import llm_cache
+
+    deleted, freed = llm_cache.evict()
+    if deleted:
+        logger.info(f"LLM cache: evicted {deleted} responses, {freed} bytes freed")
+    return {'deleted': deleted, 'bytes_freed': freed}
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django import forms
-from .models import ParsedDocument, DocumentImage
-from apps.academics.models import Subject, Branch
+from .models import ParsedDocument, DocumentImage, ParseChunk, QuestionCluster, QuestionSignature
+from apps.academics.models import Subject, SubjectGroup, Branch
+from apps.common import rate_limit
 
 from django.http import HttpResponseRedirect
 from django.contrib import messages
@@ -12,6 +13,22 @@ class DocumentImageInline(admin.TabularInline):
     model = DocumentImage
     extra = 1
 
+class ParseChunkInline(admin.TabularInline):
+    """Checkpointed chunks of an unfinished parse (cleared once it completes)."""
+    model = ParseChunk
+    fields = ('index', 'status', 'attempts', 'short_hash', 'error', 'updated_at')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    verbose_name = "Parse chunk"
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Input hash")
+    def short_hash(self, obj):
+        return obj.input_hash[:12]
+
 class ParsedDocumentAdminForm(forms.ModelForm):
     subject_code = forms.ChoiceField(
         choices=[], 
@@ -48,7 +65,7 @@ class ParsedDocumentAdminForm(forms.ModelForm):
                 self.initial['subject_code'] = f"{first_sub.code}::{first_sub.name}"
                 
                 subject_branches = set(s.branch_id for s in subjects)
-                all_possible_branches = set(Subject.objects.filter(code=first_sub.code).values_list('branch_id', flat=True))
+                all_possible_branches = set(Subject.objects.filter(group__key=SubjectGroup.key_for(first_sub.code)).values_list('branch_id', flat=True))
                 
                 if subject_branches == all_possible_branches:
                     self.initial['apply_to_all_branches'] = True
@@ -64,7 +81,8 @@ class ParsedDocumentAdminForm(forms.ModelForm):
 
         if subject_code_val:
             code, name = subject_code_val.split('::', 1)
-            matching_subjects = Subject.objects.filter(code=code)
+            # Every branch variant in the subject's group, e.g. 'BT-201' and 'BT 201'
+            matching_subjects = Subject.objects.filter(group__key=SubjectGroup.key_for(code))
             
             if not apply_to_all:
                 if not specific_branches:
@@ -99,11 +117,11 @@ class ParsedDocumentAdminForm(forms.ModelForm):
 class ParsedDocumentAdmin(admin.ModelAdmin):
     form = ParsedDocumentAdminForm
     change_form_template = 'admin/parseddocument_change_form.html'
-    inlines = [DocumentImageInline]
+    inlines = [DocumentImageInline, ParseChunkInline]
     list_display = ('title', 'display_subjects', 'document_type', 'parsing_status', 'is_premium', 'is_published', 'updated_at')
     list_filter = ('parsing_status', 'is_published', 'is_premium', 'document_type', 'subjects__branch')
     search_fields = ('title', 'subjects__code')
-    readonly_fields = ('parsing_status',)
+    readonly_fields = ('parsing_status', 'pages_skipped', 'image_bytes_original', 'image_bytes_sent', 'image_bytes_saved')
     list_per_page = 20
     show_full_result_count = False
 
@@ -131,6 +149,11 @@ class ParsedDocumentAdmin(admin.ModelAdmin):
             'fields': ('system_prompt',),
             'classes': ('collapse',)
         }),
+        ('Image Preprocessing', {
+            'fields': ('pages_skipped', 'image_bytes_original', 'image_bytes_sent', 'image_bytes_saved'),
+            'classes': ('collapse',),
+            'description': 'Page images sent in the last AI parse, before and after cropping, downscaling and re-encoding.'
+        }),
         ('Generated Struct Data (Editable Preview)', {
             'fields': ('structured_data',),
         }),
@@ -143,6 +166,13 @@ class ParsedDocumentAdmin(admin.ModelAdmin):
         return ", ".join([s.code for s in obj.subjects.all()])
     display_subjects.short_description = 'Subjects'
 
+    def image_bytes_saved(self, obj):
+        if not obj.image_bytes_original:
+            return "-"
+        saved = obj.image_bytes_original - obj.image_bytes_sent
+        return f"{saved / 1024:,.0f} KiB ({saved / obj.image_bytes_original:.0%})"
+    image_bytes_saved.short_description = 'Bytes saved'
+
     def response_change(self, request, obj):
         if "_parse_ai" in request.POST:
             if obj.parsing_status == 'PROCESSING':
@@ -154,8 +184,39 @@ class ParsedDocumentAdmin(admin.ModelAdmin):
             obj.save(update_fields=['parsing_status'])
             
             # Start the background task
-            process_document_ai.delay(obj.id)
+            process_document_ai.delay(obj.id, llm_priority=rate_limit.INTERACTIVE)
             
             # Message removed to allow the progress bar to be the primary indicator
             return HttpResponseRedirect(".")
         return super().response_change(request, obj)
+
+
+class QuestionSignatureInline(admin.TabularInline):
+    model = QuestionSignature
+    fields = ('document', 'year', 'unit', 'marks', 'text')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    show_change_link = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(QuestionCluster)
+class QuestionClusterAdmin(admin.ModelAdmin):
+    """Read-only view of the near-duplicate question clusters (rebuilt from PYQs)."""
+    inlines = [QuestionSignatureInline]
+    list_display = ('subject_key', 'short_text', 'occurrences', 'years', 'unit', 'marks', 'updated_at')
+    list_filter = ('occurrences',)
+    search_fields = ('subject_key', 'text')
+    readonly_fields = ('subject_key', 'text', 'unit', 'marks', 'occurrences', 'years', 'updated_at')
+    list_per_page = 50
+    show_full_result_count = False
+
+    def short_text(self, obj):
+        return obj.text[:100]
+    short_text.short_description = 'Question'
+
+    def has_add_permission(self, request):
+        return False
@@ -7,6 +7,7 @@ from rest_framework.permissions import IsAdminUser
 from .services.ai_parser import DocumentParserService
 from .models import ParsedDocument
 from apps.academics.models import Subject
+from apps.common import rate_limit
 from django.shortcuts import get_object_or_404
 
 from .tasks import process_document_ai
@@ -45,7 +46,7 @@ class ParseDocumentAPI(APIView):
             doc.subjects.add(subject)
             
             # Trigger background task
-            process_document_ai.delay(doc.id)
+            process_document_ai.delay(doc.id, llm_priority=rate_limit.INTERACTIVE)
 
             return Response({
                 "message": "AI parsing started in the background.",
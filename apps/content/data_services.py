@@ -1,6 +1,11 @@
+import hashlib
+import json
+
+from django.core.cache import cache
 from django.db import models
 from apps.common.services import BaseService
-from apps.content.models import ParsedDocument
+from apps.content import search
+from apps.content.models import DocumentSearchEntry, ParsedDocument
 from apps.academics.models import Subject
 from apps.academics.data_services import AcademicsDataService
 
@@ -95,3 +100,84 @@ class ContentDataService(BaseService):
             ).first(),
             timeout=3600,
         )
+
+    # ── Search ────────────────────────────────────────────────────────────────
+
+    SEARCH_VERSION_KEY = 'document_search_version'
+
+    @classmethod
+    def _search_version(cls):
+        version = cache.get(cls.SEARCH_VERSION_KEY)
+        if version is None:
+            version = 1
+            cache.add(cls.SEARCH_VERSION_KEY, version, timeout=None)
+        return version
+
+    @classmethod
+    def bump_search_version(cls):
+        """Invalidates every cached search page at once."""
+        try:
+            cache.incr(cls.SEARCH_VERSION_KEY)
+        except ValueError:
+            cache.set(cls.SEARCH_VERSION_KEY, 2, timeout=None)
+
+    @classmethod
+    def index_document_search(cls, document):
+        """
+        Add, refresh or drop the document's search entry depending on whether
+        it is currently published and readable. Returns True if indexed.
+        """
+        if not search.is_searchable(document):
+            deleted, _ = DocumentSearchEntry.objects.filter(document_id=document.pk).delete()
+            if deleted:
+                cls.bump_search_version()
+            return False
+
+        DocumentSearchEntry.objects.update_or_create(
+            document_id=document.pk,
+            defaults={
+                'document_type': document.document_type,
+                'is_premium': document.is_premium,
+                **search.extract_fields(document),
+            },
+        )
+        cls.bump_search_version()
+        return True
+
+    @classmethod
+    def search_documents(cls, query, filters=None, page=1, per_page=20, full_snippet_types=None):
+        """
+        One page of ranked hits, each with its document's subjects attached.
+        Returns ``(hits, has_more)``; cached until the index next changes.
+        ``full_snippet_types`` is passed on to ``search.search``.
+        """
+        filters = {k: v for k, v in (filters or {}).items() if v}
+        if full_snippet_types is not None:
+            full_snippet_types = sorted(full_snippet_types)
+        params = json.dumps([query.strip().lower(), filters, page, per_page, full_snippet_types], sort_keys=True)
+        key = f"document_search_{cls._search_version()}_{hashlib.sha1(params.encode()).hexdigest()}"
+
+        def fetch():
+            hits = search.search(
+                query, filters, limit=per_page + 1, offset=(page - 1) * per_page,
+                full_snippet_types=full_snippet_types,
+            )
+            has_more = len(hits) > per_page
+            hits = hits[:per_page]
+            documents = ParsedDocument.objects.filter(
+                pk__in=[h['document_id'] for h in hits]
+            ).prefetch_related(
+                models.Prefetch('subjects', queryset=Subject.objects.select_related('branch', 'semester'))
+            ).in_bulk()
+            for hit in hits:
+                document = documents.get(hit['document_id'])
+                hit['year'] = document.year if document else None
+                hit['type_display'] = document.get_document_type_display() if document else hit['document_type']
+                hit['subjects'] = [
+                    {'id': s.id, 'code': s.code, 'name': s.name,
+                     'branch': s.branch.code, 'semester': s.semester.number}
+                    for s in (document.subjects.all() if document else [])
+                ]
+            return hits, has_more
+
+        return cls.get_or_set_cache(key, fetch, timeout=300)
@@ -77,7 +77,7 @@ class Command(BaseCommand):
             "--rate",
             type=float,
             default=100.0,
-            help="Max Celery tasks to dispatch per second (default: 100)",
+            help="Max Celery tasks to dispatch per second (default: 100); model calls are limited cluster-wide by LLM_RATE_LIMITS",
         )
         parser.add_argument(
             "--batch-size",
@@ -100,6 +100,11 @@ class Command(BaseCommand):
             default=None,
             help="Directory for per-run and per-error log files",
         )
+        parser.add_argument(
+            "--refresh-cache",
+            action="store_true",
+            help="Ignore cached LLM responses and pay for every chunk again",
+        )
         parser.set_defaults(resume=True, reset_failed=True)
 
     # ------------------------------------------------------------------ #
@@ -243,7 +248,7 @@ class Command(BaseCommand):
                 self.stdout.write(f"[DRY-RUN] id={doc_id}  '{doc_title}'")
             else:
                 try:
-                    process_document_ai.apply_async(args=[doc_id])
+                    process_document_ai.apply_async(args=[doc_id], kwargs={"refresh_cache": options["refresh_cache"]})
                     dispatched += 1
 
                     state.setdefault("dispatched", {})[str(doc_id)] = {
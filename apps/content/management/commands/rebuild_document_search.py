@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from apps.content.data_services import ContentDataService
+from apps.content.models import ParsedDocument
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the site-wide document search index from structured_data. '
+        'Publishing keeps it up to date; run this once after migrating.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--document-types', nargs='+', default=None, help='Only these document types')
+        parser.add_argument('--batch-size', type=int, default=100, help='Documents fetched per query')
+
+    def handle(self, *args, **options):
+        documents = ParsedDocument.objects.order_by('pk')
+        if options['document_types']:
+            documents = documents.filter(document_type__in=options['document_types'])
+
+        indexed = skipped = 0
+        for document in documents.iterator(chunk_size=options['batch_size']):
+            if ContentDataService.index_document_search(document):
+                indexed += 1
+            else:
+                skipped += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} documents ({skipped} unpublished or unparsed)."))
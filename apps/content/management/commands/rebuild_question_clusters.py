@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.content import question_clusters
+from apps.content.models import ParsedDocument, QuestionCluster
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute MinHash signatures for every parsed PYQ paper and rebuild the '
+        'near-duplicate question clusters. Saving a paper keeps them up to date; '
+        'run this once after migrating.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subject', help='Only re-cluster this subject code (signatures are kept)')
+        parser.add_argument('--batch-size', type=int, default=100, help='Documents fetched per query')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['subject']:
+            keys = {question_clusters.subject_key(options['subject'])}
+        else:
+            documents = (
+                ParsedDocument.objects.filter(document_type__in=question_clusters.PYQ_TYPES)
+                .prefetch_related('subjects')
+                .order_by('pk')
+            )
+            keys = set()
+            for document in documents.iterator(chunk_size=options['batch_size']):
+                keys |= question_clusters.index_document(document)
+
+        clusters = sum(question_clusters.recluster(key) for key in sorted(keys))
+        repeated = QuestionCluster.objects.filter(subject_key__in=keys, occurrences__gte=2).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {clusters} question clusters ({repeated} repeated across papers) "
+            f"for {len(keys)} subjects in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = 'content_document_search_fts'
+ENTRY_TABLE = 'content_documentsearchentry'
+COLUMNS = 'title, headings, questions, formulas, answers, body'
+NEW_VALUES = 'new.title, new.headings, new.questions, new.formulas, new.answers, new.body'
+OLD_VALUES = 'old.title, old.headings, old.questions, old.formulas, old.answers, old.body'
+
+SQLITE_FORWARD = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        {COLUMNS}, content='{ENTRY_TABLE}', content_rowid='document_id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {ENTRY_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {COLUMNS}) VALUES (new.document_id, {NEW_VALUES});
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {ENTRY_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {COLUMNS}) VALUES ('delete', old.document_id, {OLD_VALUES});
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {ENTRY_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {COLUMNS}) VALUES ('delete', old.document_id, {OLD_VALUES});
+        INSERT INTO {FTS_TABLE}(rowid, {COLUMNS}) VALUES (new.document_id, {NEW_VALUES});
+    END""",
+]
+SQLITE_REVERSE = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRES_FORWARD = [
+    f"""ALTER TABLE {ENTRY_TABLE} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '') || ' ' || coalesce(headings, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(questions, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(formulas, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(answers, '') || ' ' || coalesce(body, '')), 'D')
+    ) STORED""",
+    f"CREATE INDEX {ENTRY_TABLE}_search_gin ON {ENTRY_TABLE} USING GIN (search_vector)",
+]
+POSTGRES_REVERSE = [
+    f"DROP INDEX IF EXISTS {ENTRY_TABLE}_search_gin",
+    f"ALTER TABLE {ENTRY_TABLE} DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FORWARD)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_FORWARD)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_REVERSE)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_REVERSE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0002_parseddocument_latex_validated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSearchEntry',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to='content.parseddocument')),
+                ('document_type', models.CharField(db_index=True, max_length=20)),
+                ('is_premium', models.BooleanField(default=False)),
+                ('title', models.CharField(max_length=300)),
+                ('headings', models.TextField(blank=True, help_text='Unit, section and topic titles')),
+                ('questions', models.TextField(blank=True)),
+                ('formulas', models.TextField(blank=True)),
+                ('answers', models.TextField(blank=True)),
+                ('body', models.TextField(blank=True, help_text='Notes, short-note and syllabus text')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
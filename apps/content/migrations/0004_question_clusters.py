@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0003_document_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_key', models.CharField(db_index=True, help_text='Normalised subject code, e.g. CS402', max_length=20)),
+                ('text', models.TextField(help_text='Representative wording (the member most similar to the rest)')),
+                ('unit', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('marks', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('occurrences', models.PositiveIntegerField(default=1, help_text='Number of distinct papers it was asked in')),
+                ('years', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['subject_key', '-occurrences', '-marks'],
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionSignature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_key', models.CharField(db_index=True, max_length=20)),
+                ('position', models.PositiveIntegerField(help_text="Index in structured_data['questions']")),
+                ('text', models.TextField()),
+                ('year', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('unit', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('marks', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('signature', models.BinaryField()),
+                ('cluster', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='members', to='content.questioncluster')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_signatures', to='content.parseddocument')),
+            ],
+            options={
+                'unique_together': {('document', 'subject_key', 'position')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0004_question_clusters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parseddocument',
+            name='image_bytes_original',
+            field=models.PositiveBigIntegerField(default=0, help_text='JPEG bytes the sent images would have taken without preprocessing'),
+        ),
+        migrations.AddField(
+            model_name='parseddocument',
+            name='image_bytes_sent',
+            field=models.PositiveBigIntegerField(default=0, help_text='JPEG bytes actually sent after preprocessing'),
+        ),
+        migrations.AddField(
+            model_name='parseddocument',
+            name='pages_skipped',
+            field=models.PositiveIntegerField(default=0, help_text='Blank or repeated scanned pages not sent to the model'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0005_parse_image_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParseChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('input_hash', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parse_chunks', to='content.parseddocument')),
+            ],
+            options={
+                'ordering': ['document', 'index'],
+                'unique_together': {('document', 'index')},
+            },
+        ),
+    ]
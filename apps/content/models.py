@@ -54,6 +54,9 @@ class ParsedDocument(models.Model):
     parsing_status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', help_text="Current state of the AI Parser")
     parsing_completed_chunks = models.PositiveIntegerField(default=0, help_text="Number of chunks processed so far")
     parsing_total_chunks = models.PositiveIntegerField(default=0, help_text="Total number of chunks to process")
+    pages_skipped = models.PositiveIntegerField(default=0, help_text="Blank or repeated scanned pages not sent to the model")
+    image_bytes_original = models.PositiveBigIntegerField(default=0, help_text="JPEG bytes the sent images would have taken without preprocessing")
+    image_bytes_sent = models.PositiveBigIntegerField(default=0, help_text="JPEG bytes actually sent after preprocessing")
     
     # Image Recreation Progress
     recreation_completed_images = models.PositiveIntegerField(default=0, help_text="Number of images recreated so far")
@@ -93,3 +96,113 @@ class DocumentImage(models.Model):
         
     def __str__(self):
         return f"Image {self.order} for {self.document.title}"
+
+
+class DocumentSearchEntry(models.Model):
+    """
+    Searchable text of a published document, split into weighted fields.
+
+    Built from ``structured_data`` by ``apps.content.search.extract_fields``
+    whenever a document is published or edited. The full-text index is
+    created per database in migrations (FTS5 on SQLite, a weighted
+    ``tsvector`` with a GIN index on Postgres).
+    """
+
+    document = models.OneToOneField(
+        ParsedDocument,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_entry',
+    )
+    document_type = models.CharField(max_length=20, db_index=True)
+    is_premium = models.BooleanField(default=False)
+    title = models.CharField(max_length=300)
+    headings = models.TextField(blank=True, help_text="Unit, section and topic titles")
+    questions = models.TextField(blank=True)
+    formulas = models.TextField(blank=True)
+    answers = models.TextField(blank=True)
+    body = models.TextField(blank=True, help_text="Notes, short-note and syllabus text")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Search entry — {self.title}"
+
+
+class QuestionCluster(models.Model):
+    """
+    A group of near-duplicate past-paper questions for one subject.
+
+    Built by ``apps.content.question_clusters`` from the members'
+    ``QuestionSignature`` rows (MinHash / LSH). ``occurrences`` and ``years``
+    feed repeat counts, important-question ranking and "asked in" badges.
+    """
+
+    subject_key = models.CharField(max_length=20, db_index=True, help_text="Normalised subject code, e.g. CS402")
+    text = models.TextField(help_text="Representative wording (the member most similar to the rest)")
+    unit = models.PositiveSmallIntegerField(null=True, blank=True)
+    marks = models.PositiveSmallIntegerField(null=True, blank=True)
+    occurrences = models.PositiveIntegerField(default=1, help_text="Number of distinct papers it was asked in")
+    years = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['subject_key', '-occurrences', '-marks']
+
+    def __str__(self):
+        return f"{self.subject_key} ×{self.occurrences}: {self.text[:60]}"
+
+
+class QuestionSignature(models.Model):
+    """MinHash signature of one question in a parsed PYQ paper."""
+
+    document = models.ForeignKey(ParsedDocument, on_delete=models.CASCADE, related_name='question_signatures')
+    subject_key = models.CharField(max_length=20, db_index=True)
+    position = models.PositiveIntegerField(help_text="Index in structured_data['questions']")
+    text = models.TextField()
+    year = models.PositiveSmallIntegerField(null=True, blank=True)
+    unit = models.PositiveSmallIntegerField(null=True, blank=True)
+    marks = models.PositiveSmallIntegerField(null=True, blank=True)
+    signature = models.BinaryField()
+    cluster = models.ForeignKey(
+        QuestionCluster, on_delete=models.SET_NULL, null=True, blank=True, related_name='members'
+    )
+
+    class Meta:
+        unique_together = ('document', 'subject_key', 'position')
+
+    def __str__(self):
+        return f"{self.subject_key} #{self.position} of document {self.document_id}"
+
+
+class ParseChunk(models.Model):
+    """
+    Checkpoint of one chunk of an AI parse.
+
+    ``parse()`` stores each chunk's structured output as soon as the model
+    returns it. A retried or redelivered ``process_document_ai`` reuses every
+    DONE chunk whose ``input_hash`` (prompt, schema, model and the chunk's
+    blocks) still matches, so only missing chunks are sent again. The rows
+    are deleted once the document is saved as COMPLETED.
+    """
+
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    )
+
+    document = models.ForeignKey(ParsedDocument, on_delete=models.CASCADE, related_name='parse_chunks')
+    index = models.PositiveIntegerField()
+    input_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    result = models.JSONField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['document', 'index']
+        unique_together = ('document', 'index')
+
+    def __str__(self):
+        return f"Chunk {self.index + 1} of document {self.document_id} ({self.status})"
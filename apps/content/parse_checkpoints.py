@@ -0,0 +1,121 @@
+"""
+Per-chunk checkpoints of ``BaseDocumentParser.parse`` (``ParseChunk`` rows).
+
+``prepare`` lines the stored rows up with the chunks planned for this run
+and returns the results that can be reused; ``save`` / ``fail`` record each
+chunk as it finishes; ``clear`` drops them once the document is complete.
+
+``ParseLock`` makes sure only one worker parses (and so resets the rows of)
+a document at a time.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ParseChunk
+
+logger = logging.getLogger(__name__)
+
+# The lock expires this long after its holder stops renewing it (a dead worker)
+LOCK_TTL = 120
+LOCK_HEARTBEAT = 30
+
+
+def chunk_hash(*parts):
+    """Stable hash of a chunk's inputs (anything JSON-serialisable)."""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def prepare(document_id, hashes):
+    """
+    ``{index: result}`` of DONE chunks whose input hash is unchanged. Every
+    other planned chunk is reset to PENDING; rows beyond the plan are dropped.
+    """
+    with transaction.atomic():
+        existing = {chunk.index: chunk for chunk in ParseChunk.objects.select_for_update().filter(document_id=document_id)}
+        reusable, stale, new = {}, [], []
+        for index, input_hash in enumerate(hashes):
+            chunk = existing.get(index)
+            if chunk is None:
+                new.append(ParseChunk(document_id=document_id, index=index, input_hash=input_hash))
+            elif chunk.status == 'DONE' and chunk.input_hash == input_hash:
+                reusable[index] = chunk.result
+            else:
+                chunk.input_hash, chunk.status, chunk.result, chunk.error = input_hash, 'PENDING', None, ''
+                chunk.updated_at = timezone.now()
+                stale.append(chunk)
+        ParseChunk.objects.filter(document_id=document_id, index__gte=len(hashes)).delete()
+        ParseChunk.objects.bulk_create(new, batch_size=500)
+        ParseChunk.objects.bulk_update(stale, ['input_hash', 'status', 'result', 'error', 'updated_at'], batch_size=500)
+    return reusable
+
+
+def save(document_id, index, result):
+    ParseChunk.objects.filter(document_id=document_id, index=index).update(
+        status='DONE', result=result, error='', attempts=F('attempts') + 1, updated_at=timezone.now(),
+    )
+
+
+def fail(document_id, index, error):
+    ParseChunk.objects.filter(document_id=document_id, index=index).update(
+        status='FAILED', error=str(error)[:2000], attempts=F('attempts') + 1, updated_at=timezone.now(),
+    )
+
+
+def clear(document_id):
+    ParseChunk.objects.filter(document_id=document_id).delete()
+
+
+class ParseLock:
+    """
+    Cache lock on parsing one document, renewed every ``LOCK_HEARTBEAT``
+    seconds by a background thread while the parse runs. If the worker dies,
+    the lock lapses after ``LOCK_TTL`` and a redelivered task can take over;
+    while the holder is alive, another copy of the task cannot::
+
+        lock = ParseLock(document_id)
+        if lock.acquire():
+            try:
+                ...
+            finally:
+                lock.release()
+    """
+
+    def __init__(self, document_id):
+        self.key = f'parse_lock_{document_id}'
+        self.token = uuid.uuid4().hex
+        self._stop = threading.Event()
+        self._thread = None
+
+    def acquire(self):
+        if not cache.add(self.key, self.token, timeout=LOCK_TTL):
+            return False
+        self._thread = threading.Thread(target=self._heartbeat, name=f'{self.key}_heartbeat', daemon=True)
+        self._thread.start()
+        return True
+
+    def _heartbeat(self):
+        while not self._stop.wait(LOCK_HEARTBEAT):
+            try:
+                if cache.get(self.key) != self.token or not cache.touch(self.key, LOCK_TTL):
+                    logger.error("Lost %s; another worker may now parse the same document", self.key)
+                    return
+            except Exception as exc:
+                # A cache hiccup: try again at the next beat, the TTL leaves room for a few
+                logger.warning("Could not renew %s: %s", self.key, exc)
+
+    def release(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if cache.get(self.key) == self.token:
+            cache.delete(self.key)
@@ -0,0 +1,249 @@
+"""
+Near-duplicate clustering of past-paper questions.
+
+Every question of a parsed PYQ paper gets a MinHash signature
+(``QuestionSignature``) when the paper is saved. ``recluster`` groups a
+subject's signatures with LSH banding — only questions sharing a band are
+ever compared — and rewrites that subject's ``QuestionCluster`` rows.
+
+Signatures are keyed by the ``SubjectGroup`` key, so a paper attached to
+several branch variants of the same subject counts once. Clusters are the
+source of truth for repeat counts and "asked in" years: generated important
+questions are matched against them and re-ranked.
+"""
+
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.db import transaction
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from apps.academics.analytics import tokenize
+from apps.academics.models import SubjectGroup
+from apps.common import minhash
+
+from .models import QuestionCluster, QuestionSignature
+
+PYQ_TYPES = ('PYQ', 'UNSOLVED_PYQ')
+DUPLICATE_MIN_SIMILARITY = 0.5
+HIGH_PRIORITY_OCCURRENCES = 3
+# Medoid selection compares members pairwise; huge clusters use a sample
+MEDOID_SAMPLE = 200
+
+
+def subject_key(code):
+    return SubjectGroup.key_for(code)
+
+
+def question_signature(text):
+    """
+    Signature of the question's stemmed content words, sorted and run
+    together: "Explain…"/"Describe…" wordings, reordered clauses and
+    "quick sort"/"quicksort" spellings all meet.
+    """
+    return minhash.signature(''.join(sorted(set(tokenize(text)))))
+
+
+def _small_int(value):
+    try:
+        value = int(float(value))
+    except (TypeError, ValueError):
+        return None
+    return value if 0 <= value <= 32767 else None
+
+
+# ── Indexing ───────────────────────────────────────────────────────────────
+
+
+def index_document(document):
+    """
+    Replace the document's question signatures. Returns the subject keys
+    whose clusters are now stale (keys it had before and keys it has now).
+    """
+    stale = set(
+        QuestionSignature.objects.filter(document_id=document.pk).values_list('subject_key', flat=True)
+    )
+    data = document.structured_data if isinstance(document.structured_data, dict) else {}
+    rows = []
+    if document.document_type in PYQ_TYPES:
+        keys = sorted({subject_key(subject.code) for subject in document.subjects.all()})
+        for position, question in enumerate(data.get('questions') or []):
+            if not isinstance(question, dict):
+                continue
+            text = (question.get('question_text') or question.get('text') or '').strip()
+            sig = question_signature(text) if text else None
+            if sig is None:
+                continue
+            for key in keys:
+                rows.append(QuestionSignature(
+                    document_id=document.pk,
+                    subject_key=key,
+                    position=position,
+                    text=text,
+                    year=document.year,
+                    unit=_small_int(question.get('unit')),
+                    marks=_small_int(question.get('marks')),
+                    signature=minhash.to_bytes(sig),
+                ))
+
+    with transaction.atomic():
+        QuestionSignature.objects.filter(document_id=document.pk).delete()
+        QuestionSignature.objects.bulk_create(rows, batch_size=500)
+    return stale | {row.subject_key for row in rows}
+
+
+def cluster_signatures(signatures):
+    """Connected-component label per signature over LSH candidate pairs above the threshold."""
+    n = len(signatures)
+    index = minhash.LSHIndex()
+    rows, cols = [], []
+    for i, sig in enumerate(signatures):
+        for j in index.query(sig):
+            if minhash.similarity(sig, signatures[j]) >= DUPLICATE_MIN_SIMILARITY:
+                rows.append(i)
+                cols.append(j)
+        index.add(i, sig)
+    graph = csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+    return connected_components(graph, directed=False)[1]
+
+
+def _medoid(matrix):
+    """Row most similar to the others (estimated Jaccard)."""
+    sample = matrix[:MEDOID_SAMPLE]
+    agreement = (sample[:, None, :] == sample[None, :, :]).sum(axis=(1, 2))
+    return int(agreement.argmax())
+
+
+def recluster(key):
+    """Rebuild the ``QuestionCluster`` rows of one subject key. Returns the cluster count."""
+    members = list(
+        QuestionSignature.objects.filter(subject_key=key)
+        .order_by('document_id', 'position')
+        .values_list('id', 'document_id', 'text', 'year', 'unit', 'marks', 'signature')
+    )
+    signatures = [minhash.from_bytes(m[6]) for m in members]
+    groups = defaultdict(list)
+    if members:
+        for i, label in enumerate(cluster_signatures(signatures)):
+            groups[label].append(i)
+
+    clusters, assignments = [], []
+    for indices in groups.values():
+        medoid = indices[_medoid(np.stack([signatures[i] for i in indices]))]
+        units = Counter(members[i][4] for i in indices if members[i][4] is not None)
+        marks = [members[i][5] for i in indices if members[i][5] is not None]
+        clusters.append(QuestionCluster(
+            subject_key=key,
+            text=members[medoid][2],
+            unit=units.most_common(1)[0][0] if units else None,
+            marks=max(marks) if marks else None,
+            occurrences=len({members[i][1] for i in indices}),
+            years=sorted({members[i][3] for i in indices if members[i][3]}),
+        ))
+        assignments.append(indices)
+
+    with transaction.atomic():
+        QuestionCluster.objects.filter(subject_key=key).delete()
+        QuestionCluster.objects.bulk_create(clusters, batch_size=500)
+        QuestionSignature.objects.bulk_update(
+            [
+                QuestionSignature(id=members[i][0], cluster_id=cluster.pk)
+                for cluster, indices in zip(clusters, assignments)
+                for i in indices
+            ],
+            ['cluster'],
+            batch_size=500,
+        )
+    return len(clusters)
+
+
+# ── Lookups ────────────────────────────────────────────────────────────────
+
+
+def repeated_clusters(key, limit=None, unit=None):
+    """Clusters asked in two or more papers, most repeated first."""
+    clusters = QuestionCluster.objects.filter(subject_key=key, occurrences__gte=2).order_by('-occurrences', '-marks', 'id')
+    if unit is not None:
+        clusters = clusters.filter(unit=unit)
+    return list(clusters[:limit] if limit else clusters)
+
+
+def match_clusters(key, texts):
+    """The best matching ``QuestionCluster`` (or None) for each text."""
+    clusters = {c.pk: c for c in QuestionCluster.objects.filter(subject_key=key)}
+    index = minhash.LSHIndex()
+    member_signatures = {}
+    for member_id, cluster_id, data in QuestionSignature.objects.filter(
+        subject_key=key, cluster__isnull=False,
+    ).values_list('id', 'cluster_id', 'signature'):
+        sig = minhash.from_bytes(data)
+        member_signatures[member_id] = (cluster_id, sig)
+        index.add(member_id, sig)
+
+    matches = []
+    for text in texts:
+        sig = question_signature(text)
+        best, best_similarity = None, DUPLICATE_MIN_SIMILARITY
+        for member_id in index.query(sig) if sig is not None else ():
+            cluster_id, other = member_signatures[member_id]
+            score = minhash.similarity(sig, other)
+            if score >= best_similarity:
+                best, best_similarity = cluster_id, score
+        matches.append(clusters.get(best))
+    return matches
+
+
+def merge_near_duplicates(questions, text_field='text'):
+    """
+    Keep the first of each group of near-duplicate questions, folding the
+    others' years and frequency into it.
+    """
+    index = minhash.LSHIndex()
+    kept, signatures = [], []
+    for question in questions:
+        sig = question_signature(question.get(text_field, ''))
+        duplicate = None
+        if sig is not None:
+            duplicate = next(
+                (i for i in index.query(sig) if minhash.similarity(sig, signatures[i]) >= DUPLICATE_MIN_SIMILARITY),
+                None,
+            )
+        if duplicate is None:
+            if sig is not None:
+                index.add(len(kept), sig)
+            signatures.append(sig)
+            kept.append(question)
+            continue
+        original = kept[duplicate]
+        original['years'] = sorted(set(original.get('years') or []) | set(question.get('years') or []))
+        original['frequency_count'] = max(original.get('frequency_count') or 0, question.get('frequency_count') or 0)
+    return kept
+
+
+def rank_important_questions(key, questions):
+    """
+    Replace LLM-estimated frequency, years and priority with the counts of
+    the matching cluster, drop questions matching an already listed
+    cluster, and order by how often each question was actually asked.
+    Questions are left as generated when the subject has no indexed papers.
+    """
+    if not QuestionSignature.objects.filter(subject_key=key).exists():
+        return questions
+
+    ranked, used = [], set()
+    for question, cluster in zip(questions, match_clusters(key, [q.get('text', '') for q in questions])):
+        if cluster is None:
+            question.update(frequency_count=0, years=[], priority='Low')
+        elif cluster.pk in used:
+            continue
+        else:
+            used.add(cluster.pk)
+            question.update(
+                frequency_count=cluster.occurrences,
+                years=list(cluster.years),
+                priority='High' if cluster.occurrences >= HIGH_PRIORITY_OCCURRENCES else 'Medium',
+            )
+        ranked.append(question)
+    ranked.sort(key=lambda q: (q['frequency_count'], q.get('marks') or 0), reverse=True)
+    return ranked
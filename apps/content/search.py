@@ -0,0 +1,213 @@
+"""
+Site-wide full-text search over published documents.
+
+``DocumentSearchEntry`` stores a document's text split into fields, each
+weighted separately when ranking (title > headings > questions > formulas >
+answers / body). The index is database specific and created in migration
+0003:
+
+* SQLite — ``content_document_search_fts``, an FTS5 external-content table
+  kept in sync by triggers, ranked with per-column ``bm25()`` weights.
+* Postgres — a generated ``search_vector`` column with the fields in weight
+  classes A–D and a GIN index, ranked with ``ts_rank_cd()``.
+
+Hits can be filtered by branch, semester and subject (through the
+document's subjects) and by document type. Premium documents only ever
+show snippets from their headings and question text, never answers or
+notes body; so do documents whose type is outside ``full_snippet_types``
+(for guests, the types they may open).
+"""
+
+from django.db import connection
+
+from apps.academics.models import Subject
+from apps.common.fulltext import (
+    HIGHLIGHT_END,
+    HIGHLIGHT_START,
+    postgres_headline_options,
+    postgres_tsquery,
+    query_terms,
+    split_highlights,
+    sqlite_match,
+)
+
+from .models import ParsedDocument
+
+FTS_TABLE = 'content_document_search_fts'
+ENTRY_TABLE = 'content_documentsearchentry'
+FIELDS = ('title', 'headings', 'questions', 'formulas', 'answers', 'body')
+
+# bm25() weights in FIELDS order
+SQLITE_WEIGHTS = (6.0, 4.0, 3.0, 2.0, 1.0, 1.0)
+# ts_rank_cd() weights for classes {D, C, B, A}
+POSTGRES_WEIGHTS = '{0.1, 0.2, 0.4, 1.0}'
+
+# Only documents readers can open are indexed
+SEARCHABLE_STATUSES = ('PENDING', 'COMPLETED')
+
+
+def is_searchable(document):
+    return (
+        document.is_published
+        and document.parsing_status in SEARCHABLE_STATUSES
+        and bool(document.structured_data)
+    )
+
+
+def _text(value):
+    return str(value).strip() if value not in (None, '') else ''
+
+
+def extract_fields(document):
+    """Split ``structured_data`` into the weighted search fields."""
+    data = document.structured_data if isinstance(document.structured_data, dict) else {}
+    fields = {name: [] for name in FIELDS}
+    fields['title'].append(_text(document.title))
+    if document.year:
+        fields['headings'].append(str(document.year))
+
+    for question in data.get('questions') or []:
+        if not isinstance(question, dict):
+            continue
+        fields['questions'].append(_text(question.get('question_text') or question.get('text')))
+        fields['headings'].append(_text(question.get('topic_name')))
+        fields['answers'].append(_text(question.get('latex_answer')))
+        fields['body'].append(_text(question.get('description')))
+
+    for section in data.get('sections') or []:
+        if not isinstance(section, dict):
+            continue
+        fields['headings'].append(_text(section.get('section_title')))
+        for block in section.get('content_blocks') or []:
+            if isinstance(block, dict) and block.get('type', 'text') == 'text':
+                fields['body'].append(_text(block.get('content')))
+
+    for topic in data.get('topics') or []:
+        if isinstance(topic, dict):
+            fields['headings'].append(_text(topic.get('title')))
+            fields['body'].append(_text(topic.get('content')))
+
+    for module in data.get('modules') or []:
+        if isinstance(module, dict):
+            fields['headings'].append(_text(module.get('title')))
+            fields['body'].extend(_text(t) for t in module.get('topics') or [])
+
+    for formula in data.get('formulas') or []:
+        if isinstance(formula, dict):
+            fields['formulas'].append(f"{_text(formula.get('name'))}: {_text(formula.get('latex'))}")
+
+    for key in ('experiments', 'reference_books'):
+        fields['body'].extend(_text(item) for item in data.get(key) or [])
+
+    return {name: '\n'.join(part for part in parts if part) for name, parts in fields.items()}
+
+
+# ── Backends ───────────────────────────────────────────────────────────────
+
+
+def _filter_sql(filters):
+    """``AND ...`` clauses and params for the optional filters."""
+    clauses, params = [], []
+    if filters.get('document_type'):
+        clauses.append('e.document_type = %s')
+        params.append(filters['document_type'])
+
+    subject_clauses = []
+    for key, column in (('subject_id', 's.id'), ('branch_id', 's.branch_id'), ('semester_id', 's.semester_id')):
+        if filters.get(key):
+            subject_clauses.append(f'{column} = %s')
+            params.append(filters[key])
+    if subject_clauses:
+        through = ParsedDocument.subjects.through._meta.db_table
+        clauses.append(
+            f'EXISTS (SELECT 1 FROM {through} ds JOIN {Subject._meta.db_table} s ON s.id = ds.subject_id '
+            f'WHERE ds.parseddocument_id = e.document_id AND {" AND ".join(subject_clauses)})'
+        )
+    return ''.join(f' AND {clause}' for clause in clauses), params
+
+
+def _full_snippet_sql(full_snippet_types):
+    """Condition under which a hit may show a snippet from any field."""
+    if full_snippet_types is None:
+        return 'NOT e.is_premium', []
+    types = sorted(full_snippet_types)
+    if not types:
+        return '1 = 0', []
+    return f"NOT e.is_premium AND e.document_type IN ({', '.join(['%s'] * len(types))})", types
+
+
+def _sqlite_search(terms, filters, limit, offset, full_snippet_types):
+    where, params = _filter_sql(filters)
+    full, full_params = _full_snippet_sql(full_snippet_types)
+    marks = [HIGHLIGHT_START, HIGHLIGHT_END]
+    weights = ', '.join(str(w) for w in SQLITE_WEIGHTS)
+    sql = f"""
+        SELECT e.document_id, e.title, e.document_type,
+               CASE
+                   WHEN {full} THEN snippet({FTS_TABLE}, -1, %s, %s, '…', 24)
+                   WHEN e.questions != '' THEN snippet({FTS_TABLE}, 2, %s, %s, '…', 24)
+                   ELSE snippet({FTS_TABLE}, 1, %s, %s, '…', 24)
+               END,
+               bm25({FTS_TABLE}, {weights}) AS score
+        FROM {FTS_TABLE}
+        JOIN {ENTRY_TABLE} e ON e.document_id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s{where}
+        ORDER BY score
+        LIMIT %s OFFSET %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, full_params + marks * 3 + [sqlite_match(terms)] + params + [limit, offset])
+        return [row[:4] + (-row[4],) for row in cursor.fetchall()]
+
+
+def _postgres_search(terms, filters, limit, offset, full_snippet_types):
+    where, params = _filter_sql(filters)
+    full, full_params = _full_snippet_sql(full_snippet_types)
+    tsquery = postgres_tsquery(terms)
+    # Rank on the index first, then build headlines for the page of hits only
+    sql = f"""
+        SELECT hit.document_id, hit.title, hit.document_type,
+               ts_headline('english', hit.snippet_text, q, %s), hit.rank
+        FROM (
+            SELECT e.document_id, e.title, e.document_type,
+                   CASE WHEN {full}
+                        THEN concat_ws(E'\\n', e.questions, e.formulas, e.body, e.answers)
+                        ELSE concat_ws(E'\\n', e.headings, e.questions)
+                   END AS snippet_text,
+                   ts_rank_cd('{POSTGRES_WEIGHTS}', e.search_vector, q) AS rank
+            FROM {ENTRY_TABLE} e, to_tsquery('english', %s) q
+            WHERE e.search_vector @@ q{where}
+            ORDER BY rank DESC
+            LIMIT %s OFFSET %s
+        ) hit, to_tsquery('english', %s) q
+        ORDER BY hit.rank DESC
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [postgres_headline_options()] + full_params + [tsquery] + params + [limit, offset, tsquery])
+        return cursor.fetchall()
+
+
+def search(query, filters=None, limit=20, offset=0, full_snippet_types=None):
+    """
+    Ranked hits: dicts with ``document_id``, ``title``, ``document_type``,
+    ``snippet``, ``highlights`` and ``rank`` (higher is better).
+    ``filters`` may hold ``branch_id``, ``semester_id``, ``subject_id`` and
+    ``document_type``. With ``full_snippet_types`` set, hits of other types
+    get heading / question snippets only, like premium documents.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    backend = _postgres_search if connection.vendor == 'postgresql' else _sqlite_search
+    results = []
+    for document_id, title, document_type, marked, rank in backend(terms, filters or {}, limit, offset, full_snippet_types):
+        snippet, highlights = split_highlights(marked)
+        results.append({
+            'document_id': document_id,
+            'title': title,
+            'document_type': document_type,
+            'snippet': snippet,
+            'highlights': highlights,
+            'rank': float(rank),
+        })
+    return results
@@ -1,9 +1,8 @@
-import os
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from langfuse.langchain import CallbackHandler
+
+from apps.common import llm_gateway
 
 # Define the structured output schema for PYQs
 class Question(BaseModel):
@@ -20,14 +19,7 @@ class ExamPaper(BaseModel):
 
 class ContentParserService:
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gemini/gemini-2.5-flash",
-            openai_api_base="https://bifrost.naravirtual.in/langchain",
-            openai_api_key="dummy-key",
-            default_headers={"Authorization": f"Basic {os.getenv('BIFROST_API_KEY')}"},
-        )
-        # Bind the Pydantic schema so the LLM strictly returns JSON
-        self.structured_llm = self.llm.with_structured_output(ExamPaper)
+        self.llm = llm_gateway.model("gemini/gemini-2.5-flash")
 
     def parse_pyq_text(self, raw_text: str) -> dict:
         """
@@ -45,17 +37,12 @@ class ContentParserService:
             ("user", "Extract and structure the following exam paper:\n\n{text}")
         ])
 
-        chain = prompt | self.structured_llm
-        langfuse_handler = CallbackHandler()
-        result = chain.invoke(
-            {"text": raw_text},
-            config={
-                "callbacks": [langfuse_handler],
-                "metadata": {
-                    "langfuse_session_id": "pyq_parsing",
-                    "langfuse_tags": ["pyq", "parser"]
-                }
-            }
+        # The ExamPaper schema makes the LLM strictly return JSON
+        result = self.llm.invoke(
+            prompt.format_messages(text=raw_text),
+            schema=ExamPaper,
+            session="pyq_parsing",
+            tags=["pyq", "parser"],
         )
         
         # Return as dict to easily save into Django JSONField
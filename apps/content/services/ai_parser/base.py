@@ -1,23 +1,14 @@
-import os
 import json
-import base64
 import asyncio
 import re
-import fitz
 from typing import List, Optional, Any, Union, Literal
 from django.conf import settings
 from django.core.files.storage import default_storage
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
-from langfuse.langchain import CallbackHandler
-import httpx
-
-# Shared Async HTTP Client for AI parsing connection pooling with max limits for high concurrency
-import httpx
-_ai_parser_client = httpx.AsyncClient(
-    timeout=120.0,
-    limits=httpx.Limits(max_connections=5000, max_keepalive_connections=1000)
-)
+from apps.common import concurrency, llm_gateway
+from apps.content import parse_checkpoints
+from apps.content.services import chunking, page_images
+from apps.content.services.pdf_pages import PAGE_IMAGE, PAGE_TEXT, PdfPages
 
 class BaseDocumentParser:
     CONTENT_GUIDELINES = r"""
@@ -50,21 +41,8 @@ class BaseDocumentParser:
         # if not model_name:
         #     model_name = getattr(settings, 'AI_PARSER_DEFAULT_MODEL', 'gemini/gemini-2.5-flash')
             
-        # self.llm = ChatOpenAI(
-        #     model="gemini/gemini-3.1-flash-lite-preview",
-        #     openai_api_base="https://bifrost.naravirtual.in/langchain",
-        #     openai_api_key="dummy-key",
-        #     default_headers={"Authorization": f"Basic {os.getenv('BIFROST_API_KEY')}"},
-        #     http_async_client=_ai_parser_client,
-        #     max_retries=5000,
-        # )
-        self.llm = ChatOpenAI(
-            model="gpt-5-mini",
-            openai_api_base="http://localhost:4141/",
-            openai_api_key="dummy-key",
-            http_async_client=_ai_parser_client,
-            max_retries=5000,
-        )
+        # self.llm = llm_gateway.model("gemini/gemini-3.1-flash-lite-preview")
+        self.llm = llm_gateway.model("gpt-5-mini", provider="local")
 
     def get_schema(self, doc_type: str):
         raise NotImplementedError("Subclasses must implement get_schema")
@@ -72,26 +50,6 @@ class BaseDocumentParser:
     def get_system_prompt(self, context: dict) -> str:
         raise NotImplementedError("Subclasses must implement get_system_prompt")
 
-    def encode_image(self, image_name: str) -> str:
-        with default_storage.open(image_name, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
-
-    def _get_pdf_page_images(self, pdf_name: str) -> List[str]:
-        images = []
-        try:
-            with default_storage.open(pdf_name, "rb") as pdf_file:
-                pdf_bytes = pdf_file.read()
-                doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-                for page in doc:
-                    # Use original resolution (no zoom) for OCR
-                    pix = page.get_pixmap(matrix=fitz.Matrix(1, 1))
-                    img_bytes = pix.tobytes("jpg")
-                    images.append(base64.b64encode(img_bytes).decode('utf-8'))
-                doc.close()
-        except Exception as e:
-            print(f"Error converting PDF to images: {e}")
-        return images
-
     def _sanitize_content(self, text: str) -> str:
         if not isinstance(text, str):
             return str(text)
@@ -99,46 +57,155 @@ class BaseDocumentParser:
         text = re.sub(r'\\right\s*\}', r'\\right\\}', text)
         return text
 
-    def _split_text(self, text: str, chunk_size: int = 5000) -> List[str]:
-        if not text:
-            return []
-        return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    def _text_blocks(self, text: str) -> List[dict]:
+        """Lazy text blocks, split on headings, question numbers and paragraphs."""
+        if not getattr(settings, 'AI_PARSER_ADAPTIVE_CHUNKING', True):
+            return [chunking.text_block(part) for part in chunking.split_fixed(text)]
+        return [chunking.text_block(part, boundary) for part, boundary in chunking.split_text(text)]
 
-    async def _process_chunk_async(self, structured_llm, messages, chunk_idx, total_chunks, semaphore):
-        async with semaphore:
-            max_retries = getattr(settings, 'AI_PARSER_RETRIES', 10)
-            for attempt in range(max_retries):
-                try:
-                    print(f"Calling Gemini for Chunk {chunk_idx + 1}... (Attempt {attempt + 1})")
-                    langfuse_handler = CallbackHandler()
-                    result = await structured_llm.ainvoke(
-                        messages,
-                        config={
-                            "callbacks": [langfuse_handler],
-                            "metadata": {
-                                "langfuse_session_id": "pdf_parsing",
-                                "langfuse_tags": ["pdf_parser"]
-                            }
-                        }
-                    )
-                    return result.model_dump() if hasattr(result, 'model_dump') else (result.dict() if hasattr(result, 'dict') else result)
-                except Exception as e:
-                    print(f"LLM Call failed for Chunk {chunk_idx + 1}: {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(2 ** attempt)
-                    else:
-                        raise e
+    async def _invoke(self, messages, chunk_idx, schema_class):
+        print(f"Calling {self.llm.model_name} for Chunk {chunk_idx + 1}...")
+        try:
+            result = await self.llm.ainvoke(
+                messages,
+                schema=schema_class,
+                attempts=getattr(settings, 'AI_PARSER_RETRIES', 10),
+                # A whole chunk's output, even when an upload runs at interactive priority
+                timeout=getattr(settings, 'AI_PARSER_TIMEOUT', 180),
+                session="pdf_parsing",
+                tags=["pdf_parser"],
+            )
+        except Exception as e:
+            print(f"LLM Call failed for Chunk {chunk_idx + 1}: {e}")
+            raise
+        return llm_gateway.to_dict(result)
+
+    async def _page_blocks(self, pdf_pages):
+        """
+        One lazy block per PDF page, plus the number of pages skipped. Pages
+        with a clean text layer are sent as markdown, the rest as images,
+        except blank and near-duplicate scans. Each block carries its token
+        estimates (``chunking.page_costs``).
+        """
+        text_layer = getattr(settings, 'AI_PARSER_TEXT_LAYER', True)
+        options = page_images.options_from_settings()
+        blocks, kept, blank, repeated = [], [], [], []
+        for i, stats in enumerate(await pdf_pages.classify(survey=options.enabled)):
+            ink = None
+            if stats.thumbnail is not None:
+                if stats.blank:
+                    blank.append(i)
+                    continue
+                if page_images.is_duplicate(stats.thumbnail, stats.phash, kept, options):
+                    repeated.append(i)
+                    continue
+                kept.append((stats.thumbnail, stats.phash))
+                ink = page_images.ink_ratio(stats.thumbnail)
+            kind = PAGE_TEXT if text_layer and stats.kind == PAGE_TEXT else PAGE_IMAGE
+            tokens, output = chunking.page_costs(stats.glyphs, kind == PAGE_TEXT, options.token_budget, ink)
+            blocks.append({
+                "type": "page", "index": i, "kind": kind, "glyphs": stats.glyphs,
+                "tokens": tokens, "output": output, "boundary": stats.starts_section,
+            })
+        skipped = len(blank) + len(repeated)
+        text_pages = sum(1 for block in blocks if block["kind"] == PAGE_TEXT)
+        print(f"PDF pages: {text_pages} from text layer, {len(blocks) - text_pages} as images, {skipped} blank or repeated skipped")
+        # Page numbers (1-based) of every page not sent, so a dropped page can be traced
+        if blank:
+            print(f"   Skipped as blank: pages {', '.join(str(i + 1) for i in blank)}")
+        if repeated:
+            print(f"   Skipped as repeated: pages {', '.join(str(i + 1) for i in repeated)}")
+        return blocks, skipped
+
+    def _plan_chunks(self, blocks, system_prompt):
+        """
+        ``[(reference_start, start, end)]`` block ranges, packed to the
+        model's token budget (or the fixed ``AI_PARSER_CHUNK_SIZE`` scheme).
+        """
+        if not getattr(settings, 'AI_PARSER_ADAPTIVE_CHUNKING', True):
+            return chunking.plan_fixed(
+                blocks, getattr(settings, 'AI_PARSER_CHUNK_SIZE', 5), getattr(settings, 'AI_PARSER_OVERLAP_SIZE', 1),
+            )
+        budget = chunking.budget_for(getattr(self.llm, 'model_name', None))
+        return chunking.plan(blocks, budget, chunking.text_tokens(system_prompt))
+
+    async def _load_blocks(self, blocks, pdf_pages, options):
+        """
+        Render / read the lazy blocks of one chunk window. Returns the
+        blocks and the image bytes before and after preprocessing.
+        """
+        pages = [block["index"] for block in blocks if block["type"] == "page"]
+        text_pages = [block["index"] for block in blocks if block["type"] == "page" and block["kind"] == PAGE_TEXT]
+        markdown = dict(zip(text_pages, await pdf_pages.markdown(text_pages))) if text_pages else {}
+        # Pages whose text layer came out empty after all go as images
+        image_pages = [index for index in pages if not markdown.get(index)]
+        rendered = dict(zip(image_pages, await pdf_pages.render(image_pages, options))) if image_pages else {}
+        loaded, original_bytes, sent_bytes = [], 0, 0
+        for position, block in enumerate(blocks):
+            if block["type"] == "page" and block["index"] in rendered:
+                prepared = rendered[block["index"]]
+            elif block["type"] == "page":
+                loaded.append({"type": "text", "data": f"(Page {block['index'] + 1}, from the PDF text layer)\n{markdown[block['index']]}", "position": position})
+                continue
+            elif block["type"] == "image_file":
+                prepared = await asyncio.to_thread(self._prepare_image_file, block["name"], options)
+            else:
+                loaded.append({**block, "position": position})
+                continue
+            # A split two-page spread yields two images for one block
+            loaded.extend({"type": "image", "data": image, "position": position} for image in prepared.images)
+            original_bytes += prepared.original_bytes
+            sent_bytes += prepared.sent_bytes
+        return loaded, original_bytes, sent_bytes
+
+    def _image_file_block(self, image_name):
+        tokens = page_images.options_from_settings().token_budget
+        return {"type": "image_file", "name": image_name, "tokens": tokens, "output": chunking.image_output_tokens(), "boundary": False}
+
+    def _prepare_image_file(self, image_name, options):
+        with default_storage.open(image_name, "rb") as image_file:
+            return page_images.prepare_file(image_file.read(), options)
+
+    def _build_messages(self, system_prompt, chunk, reference_blocks):
+        human_content = [{"type": "text", "text": "Parse this context. THE FIRST BLOCK MIGHT BE 'REFERENCE ONLY' - use it for continuity but do not re-extract its data."}]
+        for block in chunk:
+            is_reference = block["position"] < reference_blocks
+            label = "[REFERENCE ONLY - ALREADY PARSED]" if is_reference else "[EXTRACT THIS]"
+            if block["type"] == "text":
+                human_content.append({"type": "text", "text": f"\n\n{label} TEXT BLOCK:\n{block['data']}"})
+            else:
+                human_content.append({"type": "text", "text": label})
+                human_content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{block['data']}"}})
+        return [SystemMessage(content=system_prompt), HumanMessage(content=human_content)]
 
     def _merge_results(self, doc_type: str, all_results: List[dict]) -> dict:
         raise NotImplementedError("Subclasses must implement _merge_results")
 
+    def _chunk_hashes(self, chunks, blocks, system_prompt, schema_class, source):
+        """Checkpoint input hash of each planned chunk: its window, prompt, schema, model and source."""
+        def describe(block):
+            if block["type"] == "text":
+                return {"type": "text", "digest": parse_checkpoints.chunk_hash(block["data"])}
+            return {key: value for key, value in block.items() if key in ("type", "index", "kind", "name")}
+
+        base = (
+            getattr(self.llm, 'model_name', None),
+            getattr(self.llm, 'temperature', None),
+            getattr(schema_class, '__name__', str(schema_class)),
+            parse_checkpoints.chunk_hash(system_prompt),
+            source,
+        )
+        return [
+            parse_checkpoints.chunk_hash(base, start - ref, [describe(block) for block in blocks[ref:end]])
+            for ref, start, end in chunks
+        ]
+
     async def parse(self, parsed_document_obj, **extra_context_kwargs):
         from apps.content.models import ParsedDocument
         from django.db.models import F
         
         doc_type = parsed_document_obj.document_type
         schema_class = self.get_schema(doc_type)
-        structured_llm = self.llm.with_structured_output(schema_class)
         
         # Consolidate all ORM/database-heavy fetching into a single thread-safe block
         def _fetch_initial_data():
@@ -161,68 +228,93 @@ class BaseDocumentParser:
             
         system_prompt = self.get_system_prompt(context) + self.CONTENT_GUIDELINES
         
+        # Blocks are lazy: PDF pages and image files are only rendered / read when
+        # their chunk is sent, so memory stays bounded by (chunk + overlap) × concurrency
         content_blocks = []
         source_text = parsed_document_obj.source_text
         if source_text:
-            for txt in self._split_text(source_text):
-                content_blocks.append({"type": "text", "data": txt})
-        
+            content_blocks.extend(self._text_blocks(source_text))
+
+        pdf_pages = None
+        pages_skipped = 0
         if parsed_document_obj.source_file:
             fname = parsed_document_obj.source_file.name
             if fname.lower().endswith('.pdf'):
-                images = await asyncio.to_thread(self._get_pdf_page_images, fname)
-                for img in images: content_blocks.append({"type": "image", "data": img})
+                pdf_pages = await asyncio.to_thread(PdfPages(fname).open)
+                try:
+                    page_blocks, pages_skipped = await self._page_blocks(pdf_pages)
+                    content_blocks.extend(page_blocks)
+                except BaseException:
+                    await asyncio.to_thread(pdf_pages.close)
+                    raise
             else:
-                img_data = await asyncio.to_thread(self.encode_image, fname)
-                content_blocks.append({"type": "image", "data": img_data})
+                content_blocks.append(self._image_file_block(fname))
 
-        # Process additional images fetched earlier
+        # Additional images fetched earlier
         for img_name in additional_images_paths:
-            img_data = await asyncio.to_thread(self.encode_image, img_name)
-            content_blocks.append({"type": "image", "data": img_data})
+            content_blocks.append(self._image_file_block(img_name))
 
         # Special Case: If no content blocks but we have context (e.g. IMPORTANT_Q or SHORT_NOTES synthesis)
         # Add a dummy block to trigger at least one LLM call
         if not content_blocks and doc_type in ['IMPORTANT_Q', 'SHORT_NOTES']:
-            content_blocks.append({"type": "text", "data": "[SYNTHESIS MODE: USE CONTEXT ONLY]"})
+            content_blocks.append(chunking.text_block("[SYNTHESIS MODE: USE CONTEXT ONLY]"))
 
-        chunk_size = getattr(settings, 'AI_PARSER_CHUNK_SIZE', 5)
-        max_concurrency = getattr(settings, 'AI_PARSER_MAX_CONCURRENCY', 5)
-        semaphore = asyncio.Semaphore(max_concurrency)
+        # Chunks in flight (and so pages rendered) follow the model's adaptive limit
+        limiter = concurrency.limiter_for(self.llm)
         
         if not content_blocks:
+            if pdf_pages is not None:
+                await asyncio.to_thread(pdf_pages.close)
             total_chunks = 0
             await asyncio.to_thread(ParsedDocument.objects.filter(id=parsed_document_obj.id).update, parsing_total_chunks=0, parsing_status='COMPLETED')
             return self._merge_results(doc_type, [])
 
-        total_chunks = (len(content_blocks) + chunk_size - 1) // chunk_size
-        
-        await asyncio.to_thread(ParsedDocument.objects.filter(id=parsed_document_obj.id).update, parsing_total_chunks=total_chunks)
-        
-        tasks = []
-        async def _run_chunk(c, idx):
-            res = await self._process_chunk_async(structured_llm, c, idx, total_chunks, semaphore)
-            await asyncio.to_thread(ParsedDocument.objects.filter(id=parsed_document_obj.id).update, parsing_completed_chunks=F('parsing_completed_chunks') + 1)
-            return res
+        chunks = self._plan_chunks(content_blocks, system_prompt)
+        total_chunks = len(chunks)
+        document_id = parsed_document_obj.id
 
-        for i in range(0, len(content_blocks), chunk_size):
-            overlap_size = getattr(settings, 'AI_PARSER_OVERLAP_SIZE', 1)
-            start_idx = max(0, i - overlap_size)
-            chunk = content_blocks[start_idx : i + chunk_size]
-            chunk_idx = i // chunk_size
-            
-            human_content = [{"type": "text", "text": "Parse this context. THE FIRST BLOCK MIGHT BE 'REFERENCE ONLY' - use it for continuity but do not re-extract its data."}]
-            for idx, block in enumerate(chunk):
-                is_reference = (start_idx < i and idx == 0)
-                label = "[REFERENCE ONLY - ALREADY PARSED]" if is_reference else "[EXTRACT THIS]"
-                if block["type"] == "text":
-                    human_content.append({"type": "text", "text": f"\n\n{label} TEXT BLOCK:\n{block['data']}"})
-                else:
-                    human_content.append({"type": "text", "text": label})
-                    human_content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{block['data']}"}})
-            
-            messages = [SystemMessage(content=system_prompt), HumanMessage(content=human_content)]
-            tasks.append(_run_chunk(messages, chunk_idx))
+        # Resume: chunks finished by an earlier attempt on the same input are not sent again
+        source_name = parsed_document_obj.source_file.name if parsed_document_obj.source_file else None
+        options = page_images.options_from_settings()
+        hashes = self._chunk_hashes(chunks, content_blocks, system_prompt, schema_class, (source_name, options))
+        done = await asyncio.to_thread(parse_checkpoints.prepare, document_id, hashes)
+        if done:
+            print(f"Resuming: {len(done)} of {total_chunks} chunks already parsed")
 
-        results = await asyncio.gather(*tasks)
+        await asyncio.to_thread(
+            ParsedDocument.objects.filter(id=document_id).update,
+            parsing_total_chunks=total_chunks, parsing_completed_chunks=len(done),
+            pages_skipped=pages_skipped, image_bytes_original=0, image_bytes_sent=0,
+        )
+
+        async def _run_chunk(chunk_idx, ref, start, end):
+            if chunk_idx in done:
+                return done[chunk_idx]
+            async with limiter.slot():
+                chunk, original_bytes, sent_bytes = await self._load_blocks(content_blocks[ref:end], pdf_pages, options)
+                messages = self._build_messages(system_prompt, chunk, start - ref)
+                del chunk
+                try:
+                    res = await self._invoke(messages, chunk_idx, schema_class)
+                except Exception as e:
+                    await asyncio.to_thread(parse_checkpoints.fail, document_id, chunk_idx, e)
+                    raise
+            await asyncio.to_thread(parse_checkpoints.save, document_id, chunk_idx, res)
+            await asyncio.to_thread(
+                ParsedDocument.objects.filter(id=document_id).update,
+                parsing_completed_chunks=F('parsing_completed_chunks') + 1,
+                image_bytes_original=F('image_bytes_original') + original_bytes,
+                image_bytes_sent=F('image_bytes_sent') + sent_bytes,
+            )
+            return res
+
+        try:
+            # Let every other chunk finish (and checkpoint) before reporting a failure
+            results = await asyncio.gather(*(_run_chunk(n, *chunk) for n, chunk in enumerate(chunks)), return_exceptions=True)
+        finally:
+            if pdf_pages is not None:
+                await asyncio.to_thread(pdf_pages.close)
+        errors = [res for res in results if isinstance(res, BaseException)]
+        if errors:
+            raise errors[0]
         return self._merge_results(doc_type, results)
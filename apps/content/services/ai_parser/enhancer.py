@@ -1,32 +1,15 @@
-import os
 import json
 import asyncio
 from typing import List, Optional, Union
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
+from apps.common import concurrency, llm_gateway
 from .schemas import ParsedPYQPaper, ParsedUnsolvedPYQPaper
-import httpx
-import concurrent.futures
 
 
 
 class PYQEnhancer:
-    _executor = concurrent.futures.ThreadPoolExecutor(max_workers=500)
-    
     def __init__(self):
-        # We will use a dedicated synchronous client for this task
-        _enhancer_client = httpx.Client(
-            limits=httpx.Limits(max_connections=500, max_keepalive_connections=100)
-        )
-        self.llm = ChatOpenAI(
-            model="openrouter/stepfun/step-3.5-flash:free",
-            openai_api_base="https://bifrost.naravirtual.in/langchain",
-            openai_api_key="dummy-key",
-            default_headers={"Authorization": f"Basic {os.getenv('BIFROST_API_KEY')}"},
-            http_client=_enhancer_client,
-            max_retries=0, # We will handle retries manually
-            temperature=0.5,
-        )
+        self.llm = llm_gateway.model("openrouter/stepfun/step-3.5-flash:free", temperature=0.5)
 
     def _build_system_prompt(self, context: dict) -> str:
         return f"""You are an elite Academic Data Architect specializing in RGPV University engineering curriculum.
@@ -58,10 +41,10 @@ RULES FOR ENHANCEMENT:
         
         # 1. Use pure tool calling (structured output) instead of raw parsing
         schema = ParsedPYQPaper if is_solved else ParsedUnsolvedPYQPaper
-        structured_llm = self.llm.with_structured_output(schema, method="json_mode")
+        # Batches in flight follow the model's adaptive concurrency limit
+        limiter = concurrency.limiter_for(self.llm)
         
-        def _sync_enhance_batch_with_retry(chunk, batch_idx):
-            from langfuse.langchain import CallbackHandler
+        async def _enhance_batch(chunk, batch_idx):
             human_content = f"Here are {len(chunk)} questions to enhance:\n{json.dumps(chunk, indent=2)}"
             
             messages = [
@@ -69,50 +52,37 @@ RULES FOR ENHANCEMENT:
                 HumanMessage(content=human_content)
             ]
             
-            langfuse_handler = CallbackHandler()
-            
-            # 2. Add retry logic up to 3 times
-            for attempt in range(3):
-                try:
-                    result = structured_llm.invoke(
-                        messages,
-                        config={
-                            "callbacks": [langfuse_handler],
-                            "metadata": {
-                                "langfuse_session_id": "global_pyq_enhancement_threads",
-                                "langfuse_tags": ["enhancement", context.get('subject_code')]
-                            }
-                        }
-                    )
-                    
-                    res_dict = result.model_dump() if hasattr(result, 'model_dump') else result
-                    # Safely extract questions array
-                    if 'questions' in res_dict:
-                        return res_dict['questions']
-                    elif 'enhanced_questions' in res_dict:
-                        return res_dict['enhanced_questions']
-                    elif isinstance(res_dict, list):
-                        return res_dict
-                    return []
-                    
-                except Exception as e:
-                    import time
-                    time.sleep(1.5) # small backoff
-                    if attempt == 2:
-                        print(f"  [Attempt {attempt + 1}/3] Failed for batch {batch_idx+1}: {e}")
-                        
-            print(f"  Batch {batch_idx+1} completely failed after 3 attempts.")
+            # 2. The gateway retries with backoff (LLM_MAX_ATTEMPTS)
+            try:
+                result = await self.llm.ainvoke(
+                    messages,
+                    schema=schema,
+                    method="json_mode",
+                    session="global_pyq_enhancement_threads",
+                    tags=["enhancement", context.get('subject_code')],
+                )
+            except Exception as e:
+                print(f"  Batch {batch_idx+1} failed: {e}")
+                return []
+
+            res_dict = llm_gateway.to_dict(result)
+            # Safely extract questions array
+            if 'questions' in res_dict:
+                return res_dict['questions']
+            elif 'enhanced_questions' in res_dict:
+                return res_dict['enhanced_questions']
+            elif isinstance(res_dict, list):
+                return res_dict
             return []
 
-        # 3. Use an explicit ThreadPoolExecutor to bypass Python's default OS core limit
-        loop = asyncio.get_running_loop()
+        # 3. All batches are scheduled at once; the limiter decides how many run
         tasks = []
         for i in range(0, len(questions), chunk_size):
             chunk = questions[i:i+chunk_size]
             batch_idx = i // chunk_size
-            tasks.append(loop.run_in_executor(self._executor, _sync_enhance_batch_with_retry, chunk, batch_idx))
+            tasks.append(_enhance_batch(chunk, batch_idx))
             
-        print(f"  Launched {len(tasks)} async threads for {len(questions)} questions.")
+        print(f"  Launched {len(tasks)} batches for {len(questions)} questions (concurrency limit {limiter.limit}).")
         
         results = await asyncio.gather(*tasks)
         
@@ -105,7 +105,14 @@ CONSTRAINTS:
 
         # 3. Get AI Analytics
         from apps.academics.models import SubjectAnalytics
-        analytics = await asyncio.to_thread(lambda: SubjectAnalytics.objects.filter(subject=subject).first())
+        from apps.content import question_clusters
+        analytics = await asyncio.to_thread(lambda: SubjectAnalytics.objects.filter(group__subjects=subject).first())
+        repeated = await asyncio.to_thread(
+            question_clusters.repeated_clusters,
+            question_clusters.subject_key(subject.code),
+            limit=30,
+            unit=int(unit_number) if str(unit_number or '').isdigit() else None,
+        )
         paper_trends_ctx = "No analytics."
         if analytics:
             heatmap = analytics.syllabus_heatmap or {}
@@ -123,6 +130,12 @@ CONSTRAINTS:
                     "syllabus_heatmap": heatmap,
                     "top_repeated_questions": top_qs
                 }, indent=2)
+        if repeated:
+            # Exact repeat counts from the clustered past papers
+            paper_trends_ctx += "\n\nREPEATED QUESTION CLUSTERS:\n" + json.dumps([
+                {"text": c.text, "times_asked": c.occurrences, "years": c.years, "unit": c.unit}
+                for c in repeated
+            ], indent=2)
 
         # 4. Get Short Notes (Added for better conceptual synthesis)
         def _fetch_notes():
@@ -160,16 +173,22 @@ CONSTRAINTS:
                         break
         return context
 
+    async def parse(self, parsed_document_obj, **extra_context_kwargs):
+        from apps.content import question_clusters
+        result = await super().parse(parsed_document_obj, **extra_context_kwargs)
+
+        # Frequency, years and priority come from the clustered past papers, not the LLM
+        def _rank():
+            subject = parsed_document_obj.subjects.first()
+            if subject and result.get('questions'):
+                result['questions'] = question_clusters.rank_important_questions(
+                    question_clusters.subject_key(subject.code), result['questions']
+                )
+            return result
+        return await asyncio.to_thread(_rank)
+
     def _merge_results(self, doc_type: str, all_results: List[dict]) -> dict:
-        if not all_results: return {"questions": []}
-        merged = {"questions": []}
-        seen_qs = set()
-        for res in all_results:
-            if res and 'questions' in res:
-                for q in res['questions']:
-                    # Simple text-based deduplication
-                    norm = q.get('text', '').strip().lower()
-                    if norm not in seen_qs:
-                        merged['questions'].append(q)
-                        seen_qs.add(norm)
-        return merged
+        from apps.content.question_clusters import merge_near_duplicates
+        questions = [q for res in all_results if res and 'questions' in res for q in res['questions']]
+        # Near-duplicate (MinHash / LSH) rather than exact-text deduplication
+        return {"questions": merge_near_duplicates(questions)}
@@ -8,13 +8,8 @@ import subprocess
 import asyncio
 import os
 from typing import List, Dict, Tuple
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
-import httpx
-
-_latex_fixer_client = httpx.AsyncClient(
-    limits=httpx.Limits(max_connections=50000, max_keepalive_connections=1000)
-)
+from apps.common import llm_gateway
 
 KATEX_SCRIPT = os.path.join(os.path.dirname(__file__), '..', '..', '..', '..', 'scripts', 'validate_katex.js')
 
@@ -119,15 +114,7 @@ def validate_with_katex(blocks: List[Dict]) -> List[Dict]:
 
 class LatexFixer:
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model="cerebras/gpt-oss-120b",
-            openai_api_base="https://bifrost.naravirtual.in/langchain",
-            openai_api_key="dummy-key",
-            default_headers={"Authorization": f"Basic {os.getenv('BIFROST_API_KEY')}"},
-            http_async_client=_latex_fixer_client,
-            max_retries=5000,
-            temperature=0.1,
-        )
+        self.llm = llm_gateway.model("cerebras/gpt-oss-120b", temperature=0.1)
     
     async def fix_content(self, content: str, max_retries: int = 2) -> Tuple[str, int]:
         """
@@ -187,31 +174,29 @@ class LatexFixer:
     
     async def _batch_fix(self, broken_blocks: List[Dict], errors_by_id: Dict) -> Dict[int, str]:
         """Send broken blocks to LLM for fixing. Returns {id: fixed_latex}."""
-        semaphore = asyncio.Semaphore(10000)
-        
+        # Model calls in flight follow the model's adaptive concurrency limit (llm_gateway)
         async def fix_one(block):
-            async with semaphore:
-                error_msg = errors_by_id.get(block['id'], 'Unknown error')
-                user_msg = (
-                    f"BROKEN LATEX:\n```\n{block['latex']}\n```\n\n"
-                    f"KATEX ERROR: {error_msg}\n\n"
-                    f"SURROUNDING CONTEXT (10 lines above and below):\n```markdown\n{block['context']}\n```\n\n"
-                    f"Return ONLY the fixed LaTeX string (no $ delimiters, no explanation)."
-                )
-                try:
-                    response = await self.llm.ainvoke([
-                        SystemMessage(content=FIXER_SYSTEM_PROMPT),
-                        HumanMessage(content=user_msg),
-                    ])
-                    fixed = response.content.strip()
-                    # Strip any accidental delimiter wrapping
-                    fixed = re.sub(r'^\$+|\$+$', '', fixed).strip()
-                    # Strip markdown code fences
-                    fixed = re.sub(r'^```(?:latex)?\s*|\s*```$', '', fixed, flags=re.MULTILINE).strip()
-                    return block['id'], fixed
-                except Exception as e:
-                    print(f"LLM fix failed for block {block['id']}: {e}")
-                    return block['id'], None
+            error_msg = errors_by_id.get(block['id'], 'Unknown error')
+            user_msg = (
+                f"BROKEN LATEX:\n```\n{block['latex']}\n```\n\n"
+                f"KATEX ERROR: {error_msg}\n\n"
+                f"SURROUNDING CONTEXT (10 lines above and below):\n```markdown\n{block['context']}\n```\n\n"
+                f"Return ONLY the fixed LaTeX string (no $ delimiters, no explanation)."
+            )
+            try:
+                response = await self.llm.ainvoke([
+                    SystemMessage(content=FIXER_SYSTEM_PROMPT),
+                    HumanMessage(content=user_msg),
+                ])
+                fixed = response.content.strip()
+                # Strip any accidental delimiter wrapping
+                fixed = re.sub(r'^\$+|\$+$', '', fixed).strip()
+                # Strip markdown code fences
+                fixed = re.sub(r'^```(?:latex)?\s*|\s*```$', '', fixed, flags=re.MULTILINE).strip()
+                return block['id'], fixed
+            except Exception as e:
+                print(f"LLM fix failed for block {block['id']}: {e}")
+                return block['id'], None
         
         tasks = [fix_one(b) for b in broken_blocks]
         results = await asyncio.gather(*tasks)
@@ -4,16 +4,12 @@ Uses StrOutputParser like naughty-notes for raw markdown generation.
 """
 import asyncio
 import json
-import os
 from typing import List
-from langchain_openai import ChatOpenAI
+from django.conf import settings
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langfuse.langchain import CallbackHandler
+from apps.common import llm_gateway
 from .utils import normalize_markdown
-import httpx
-
-_short_notes_client = httpx.AsyncClient(timeout=120.0)
 
 SUBJECT_PROMPTS = {
     "Mathematics": "Focus on rigorous definitions, step-by-step proofs, and clear worked examples. Use LaTeX for every equation.",
@@ -26,15 +22,7 @@ SUBJECT_PROMPTS = {
 
 class ShortNotesParser:
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model="openrouter/stepfun/step-3.5-flash:free",
-            openai_api_base="https://bifrost.naravirtual.in/langchain",
-            openai_api_key="dummy-key",
-            default_headers={"Authorization": f"Basic {os.getenv('BIFROST_API_KEY')}"},
-            http_async_client=_short_notes_client,
-            max_retries=5000,
-            temperature=0.5,
-        )
+        self.llm = llm_gateway.model("openrouter/stepfun/step-3.5-flash:free", temperature=0.5)
 
     def _get_subject_instruction(self, subject_name: str) -> str:
         if any(kw in subject_name.lower() for kw in ["computer", "it", "software", "data", "algorithm", "programming"]):
@@ -138,7 +126,8 @@ Generate the comprehensive short notes now. Follow the exact structure of the AP
 
         from langchain_core.messages import SystemMessage, HumanMessage
 
-        langfuse_handler = CallbackHandler()
+        # A failed unit costs a whole command re-run: retry as long as the parser does
+        attempts = getattr(settings, 'AI_PARSER_RETRIES', 10)
 
         # STEP 1: PLANNER
         planner_messages = [
@@ -147,13 +136,9 @@ Generate the comprehensive short notes now. Follow the exact structure of the AP
         ]
         planner_response = await self.llm.ainvoke(
             planner_messages,
-            config={
-                "callbacks": [langfuse_handler],
-                "metadata": {
-                    "langfuse_session_id": "short_notes_planner",
-                    "langfuse_tags": ["short_notes", "planner"],
-                }
-            }
+            attempts=attempts,
+            session="short_notes_planner",
+            tags=["short_notes", "planner"],
         )
         context['plan'] = planner_response.content
 
@@ -165,13 +150,9 @@ Generate the comprehensive short notes now. Follow the exact structure of the AP
         
         response = await self.llm.ainvoke(
             writer_messages,
-            config={
-                "callbacks": [langfuse_handler],
-                "metadata": {
-                    "langfuse_session_id": "short_notes_generation",
-                    "langfuse_tags": ["short_notes", "direct_markdown", "writer"],
-                }
-            }
+            attempts=attempts,
+            session="short_notes_generation",
+            tags=["short_notes", "direct_markdown", "writer"],
         )
         result = response.content
 
@@ -234,9 +215,9 @@ Generate the comprehensive short notes now. Follow the exact structure of the AP
         ).first())
 
         if not syllabus:
-            # Fallback: find any syllabus for the same subject code
+            # Fallback: find any syllabus in the same subject group
             syllabus = await asyncio.to_thread(lambda: ParsedDocument.objects.filter(
-                subjects__code=subject.code,
+                subjects__group_id=subject.group_id,
                 document_type='SYLLABUS',
                 parsing_status__in=['COMPLETED', 'PENDING'],
                 structured_data__isnull=False
@@ -0,0 +1,260 @@
+"""
+Token-budget chunking for the AI parser.
+
+Every content block (a text segment, a PDF page, an uploaded image) carries
+an estimate of the input tokens it costs and the output tokens the model
+will write for it, and whether it starts a new section (a heading, a
+question number, a unit). ``plan`` packs consecutive blocks into chunks up
+to the model's budget (``AI_PARSER_TOKEN_BUDGETS``), preferring to cut
+just before a section start, and gives each chunk the preceding blocks as
+reference context only when it does not start on one.
+
+Text is split on heading / question-number / paragraph boundaries
+(``split_text``), never mid-sentence unless a single sentence is larger
+than a segment.
+
+``plan_fixed`` is the previous scheme (``AI_PARSER_CHUNK_SIZE`` page images
+per chunk, ``AI_PARSER_OVERLAP_SIZE`` blocks of overlap), kept behind
+``AI_PARSER_ADAPTIVE_CHUNKING`` and for ``scripts/testing/benchmark_chunking.py``.
+
+Plain functions without Django settings at import, like ``page_images``.
+"""
+
+import math
+import re
+from dataclasses import dataclass
+
+CHARS_PER_TOKEN = 4
+# Markdown of a text page is longer than its glyph count (spaces, markup)
+MARKDOWN_PER_GLYPH = 1.2
+# Structured output repeats the transcribed text with JSON keys and LaTeX escapes
+OUTPUT_PER_INPUT_TOKEN = 1.3
+# A scanned exam page of typical density, and the ink share of such a page
+IMAGE_PAGE_OUTPUT_TOKENS = 600
+TYPICAL_INK = 0.06
+MIN_DENSITY, MAX_DENSITY = 0.25, 3.0
+
+# Text is split into segments of at most this many tokens before packing
+TEXT_SEGMENT_TOKENS = 1200
+# A chunk is only cut early at a section start if it is at least this full
+MIN_FILL = 0.5
+OVERLAP_SHARE = 0.1
+
+# The fixed scheme: characters of text that weigh as much as one page image
+FIXED_TEXT_CHARS = 5000
+FIXED_MIN_TEXT_WEIGHT = 0.1
+
+SECTION_START = re.compile(
+    r"""^\s*(?:
+        \#{1,6}\s                                   # markdown heading
+      | (?:q(?:uestion)?|que?s?)\s*\.?\s*\d+        # Q1, Q.2, Ques 3, Question 4
+      | \d{1,3}\s*[.)]\s                            # 1. / 2)
+      | \(\s*(?:[a-h]|[ivx]{1,4})\s*\)\s            # (a) / (iv)
+      | (?:unit|module|chapter|section|part)\s*[-:]?\s*(?:[ivx]+|\d+|[a-e])\b
+    )""",
+    re.IGNORECASE | re.VERBOSE,
+)
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=[A-Z(\[$\\])')
+
+
+@dataclass(frozen=True)
+class TokenBudget:
+    input: int
+    output: int
+
+    @property
+    def overlap(self):
+        return int(self.input * OVERLAP_SHARE)
+
+
+def budget_for(model_name):
+    """``TokenBudget`` of a model from ``AI_PARSER_TOKEN_BUDGETS`` (falling back to ``default``)."""
+    from django.conf import settings
+
+    budgets = getattr(settings, 'AI_PARSER_TOKEN_BUDGETS', {})
+    budget = budgets.get(str(model_name)) or budgets.get('default') or {'input': 24000, 'output': 8000}
+    return TokenBudget(input=budget['input'], output=budget['output'])
+
+
+# ── Estimates ──────────────────────────────────────────────────────────────
+
+
+def text_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def starts_section(text):
+    return bool(SECTION_START.match(text))
+
+
+def text_block(text, boundary=None):
+    """Lazy block for a piece of text with its token estimates."""
+    tokens = text_tokens(text)
+    return {
+        "type": "text",
+        "data": text,
+        "tokens": tokens,
+        "output": math.ceil(tokens * OUTPUT_PER_INPUT_TOKEN),
+        "boundary": starts_section(text) if boundary is None else boundary,
+    }
+
+
+def image_output_tokens(ink=None):
+    """Expected output for a scanned page, scaled by how much ink it has."""
+    if ink is None:
+        return IMAGE_PAGE_OUTPUT_TOKENS
+    density = min(max(ink / TYPICAL_INK, MIN_DENSITY), MAX_DENSITY)
+    return math.ceil(IMAGE_PAGE_OUTPUT_TOKENS * density)
+
+
+def page_costs(glyphs, as_text, image_tokens, ink=None):
+    """``(input, output)`` token estimates of one PDF page."""
+    text = math.ceil(glyphs * MARKDOWN_PER_GLYPH / CHARS_PER_TOKEN)
+    if as_text:
+        return text, math.ceil(text * OUTPUT_PER_INPUT_TOKEN)
+    # A scan with some text layer (e.g. bad fonts) still says how dense it is
+    output = max(image_output_tokens(ink), math.ceil(text * OUTPUT_PER_INPUT_TOKEN))
+    return image_tokens, output
+
+
+# ── Text splitting ─────────────────────────────────────────────────────────
+
+
+def _units(text):
+    """Paragraphs, with a new one at every line that starts a section."""
+    units = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        current = []
+        for line in paragraph.split('\n'):
+            if current and starts_section(line):
+                units.append('\n'.join(current))
+                current = []
+            current.append(line)
+        if current and any(line.strip() for line in current):
+            units.append('\n'.join(current))
+    return units
+
+
+def _pieces(unit, max_tokens):
+    """A unit cut to ``max_tokens``: at sentence ends, and only as a last resort mid-sentence."""
+    if text_tokens(unit) <= max_tokens:
+        return [unit]
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces, current = [], ''
+    for sentence in SENTENCE_END.split(unit):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_text(text, max_tokens=TEXT_SEGMENT_TOKENS):
+    """
+    Segments of at most ``max_tokens`` (estimated), cut between paragraphs
+    and preferably right before a heading or question number. Returns
+    ``[(segment, starts_section)]``.
+    """
+    segments, current, current_tokens = [], [], 0
+    for unit in _units(text or ''):
+        boundary = starts_section(unit)
+        for piece in _pieces(unit, max_tokens):
+            tokens = text_tokens(piece) + 1
+            full = current_tokens + tokens > max_tokens
+            early = boundary and current_tokens >= max_tokens * MIN_FILL
+            if current and (full or early):
+                segments.append('\n\n'.join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+            boundary = False
+    if current:
+        segments.append('\n\n'.join(current))
+    return [(segment, starts_section(segment)) for segment in segments]
+
+
+# ── Planning ───────────────────────────────────────────────────────────────
+
+
+def _fill(blocks, budget):
+    tokens = sum(block.get("tokens", 0) for block in blocks)
+    output = sum(block.get("output", 0) for block in blocks)
+    return max(tokens / budget.input, output / budget.output)
+
+
+def _reference_start(blocks, start, budget):
+    """First block of the reference context for a chunk starting at ``start``."""
+    if start == 0 or blocks[start].get("boundary"):
+        return start
+    ref, tokens = start - 1, blocks[start - 1].get("tokens", 0)
+    # Always the block just before (the cut may be mid-question), more while they fit
+    while ref > 0 and tokens + blocks[ref - 1].get("tokens", 0) <= budget.overlap:
+        ref -= 1
+        tokens += blocks[ref].get("tokens", 0)
+    return ref
+
+
+def plan(blocks, budget, prompt_tokens=0):
+    """
+    ``[(reference_start, start, end)]`` block ranges: each chunk's blocks
+    fit ``budget`` (input after the prompt and reference context, and
+    output), and a chunk is ended early before a section start if it is at
+    least ``MIN_FILL`` full.
+    """
+    limit = TokenBudget(input=max(budget.input - prompt_tokens - budget.overlap, 1), output=budget.output)
+    ranges, start, tokens, output, section = [], 0, 0, 0, None
+    for i, block in enumerate(blocks):
+        block_tokens, block_output = block.get("tokens", 0), block.get("output", 0)
+        # After moving the cut back to a section start, the carried-over blocks plus this one may still not fit
+        while i > start and (tokens + block_tokens > limit.input or output + block_output > limit.output):
+            cut = i
+            if not block.get("boundary") and section is not None and _fill(blocks[start:section], limit) >= MIN_FILL:
+                cut = section
+            ranges.append((start, cut))
+            start = cut
+            section = next((j for j in range(i - 1, start, -1) if blocks[j].get("boundary")), None)
+            tokens = sum(b.get("tokens", 0) for b in blocks[start:i])
+            output = sum(b.get("output", 0) for b in blocks[start:i])
+        if block.get("boundary") and i > start:
+            section = i
+        tokens += block_tokens
+        output += block_output
+    if blocks:
+        ranges.append((start, len(blocks)))
+    return [(_reference_start(blocks, s, budget), s, e) for s, e in ranges]
+
+
+def fixed_weight(block):
+    if block["type"] == "text":
+        return max(block.get("tokens", 0) * CHARS_PER_TOKEN / FIXED_TEXT_CHARS, FIXED_MIN_TEXT_WEIGHT)
+    if block["type"] == "page" and block.get("kind") == 'text':
+        return max(block.get("glyphs", 0) / FIXED_TEXT_CHARS, FIXED_MIN_TEXT_WEIGHT)
+    return 1
+
+
+def plan_fixed(blocks, chunk_size, overlap_size):
+    """The fixed scheme: up to ``chunk_size`` images' worth of blocks, ``overlap_size`` blocks of reference."""
+    ranges, start, weight = [], 0, 0
+    for i, block in enumerate(blocks):
+        block_weight = fixed_weight(block)
+        if i > start and weight + block_weight > chunk_size:
+            ranges.append((start, i))
+            start, weight = i, 0
+        weight += block_weight
+    if blocks:
+        ranges.append((start, len(blocks)))
+    return [(max(0, s - overlap_size), s, e) for s, e in ranges]
+
+
+def split_fixed(text, chunk_chars=FIXED_TEXT_CHARS):
+    """The fixed scheme's text split: ``chunk_chars`` slices."""
+    return [text[i:i + chunk_chars] for i in range(0, len(text or ''), chunk_chars)]
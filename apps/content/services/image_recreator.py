@@ -1,29 +1,51 @@
-import os
 import asyncio
 import uuid
+import weakref
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
-from langfuse.langchain import CallbackHandler
+from apps.common import async_runtime, llm_gateway
 from playwright.async_api import async_playwright
-import httpx
 from typing import Optional
 
-# Shared Async HTTP Client for image recreation connection pooling
-_image_recreator_client = httpx.AsyncClient(timeout=60.0)
+WIKIMEDIA_TIMEOUT = 60.0
+
+# On the persistent runtime loop, one Chromium serves every document (relaunched if it dies)
+_browsers = weakref.WeakKeyDictionary()
+_browser_locks = weakref.WeakKeyDictionary()
+
+
+async def _shared_browser():
+    loop = asyncio.get_running_loop()
+    lock = _browser_locks.setdefault(loop, asyncio.Lock())
+    async with lock:
+        playwright, browser = _browsers.get(loop, (None, None))
+        if browser is not None and browser.is_connected():
+            return browser
+        if playwright is None:
+            playwright = await async_playwright().start()
+        browser = await playwright.chromium.launch(headless=True)
+        _browsers[loop] = (playwright, browser)
+        return browser
+
+
+async def _close_shared_browser():
+    playwright, browser = _browsers.pop(asyncio.get_running_loop(), (None, None))
+    try:
+        if browser is not None:
+            await browser.close()
+    finally:
+        if playwright is not None:
+            await playwright.stop()
+
+
+async_runtime.at_shutdown(_close_shared_browser)
+
 
 class ImageRecreationService:
     def __init__(self, doc_obj=None):
         self.doc_obj = doc_obj
-        self.llm = ChatOpenAI(
-            model="cerebras/gpt-oss-120b",
-            openai_api_base="https://bifrost.naravirtual.in/langchain",
-            openai_api_key="dummy-key",
-            default_headers={"Authorization": f"Basic {os.getenv('BIFROST_API_KEY')}"},
-            temperature=0.1,
-            http_async_client=_image_recreator_client
-        )
+        self.llm = llm_gateway.model("cerebras/gpt-oss-120b", temperature=0.1)
         self.browser = None
         self.playwright = None
 
@@ -50,26 +72,31 @@ class ImageRecreationService:
         if total == 0:
             return data
 
-        async with async_playwright() as p:
-            self.playwright = p
-            self.browser = await p.chromium.launch(headless=True)
-            
-            # Use a semaphore to process X images in parallel to avoid overloading Gemini/System
-            # Tuning: Reduced from 20 to 8 for better stability on medium-tier servers
-            semaphore = asyncio.Semaphore(8)
-            
-            # We need to collect all tasks and run them
-            tasks = []
-            self._collect_tasks(data, tasks, semaphore)
-            
-            if tasks:
-                print(f"🚀 Starting Parallel Image Recreation for {len(tasks)} images...")
-                await asyncio.gather(*tasks)
-            
-            await self.browser.close()
+        if async_runtime.running():
+            self.browser = await _shared_browser()
+            await self._recreate_all(data)
+        else:
+            async with async_playwright() as p:
+                self.playwright = p
+                self.browser = await p.chromium.launch(headless=True)
+                await self._recreate_all(data)
+                await self.browser.close()
             
         return data
 
+    async def _recreate_all(self, data):
+        # Use a semaphore to process X images in parallel to avoid overloading Gemini/System
+        # Tuning: Reduced from 20 to 8 for better stability on medium-tier servers
+        semaphore = asyncio.Semaphore(8)
+        
+        # We need to collect all tasks and run them
+        tasks = []
+        self._collect_tasks(data, tasks, semaphore)
+        
+        if tasks:
+            print(f"🚀 Starting Parallel Image Recreation for {len(tasks)} images...")
+            await asyncio.gather(*tasks)
+
     def _collect_tasks(self, data, tasks, semaphore):
         """Recursively find CANVAS and SEARCH blocks and add them to the task list."""
         if isinstance(data, list):
@@ -130,57 +157,48 @@ Create a professional academic diagram based on the instructions.
 Output ONLY the HTML/Script code. NO markdown backticks."""
             
             messages = [SystemMessage(content=system_prompt), HumanMessage(content=instructions)]
-            langfuse_handler = CallbackHandler()
-            res = await self.llm.ainvoke(
-                messages,
-                config={
-                    "callbacks": [langfuse_handler],
-                    "metadata": {
-                        "langfuse_session_id": "image_recreation",
-                        "langfuse_tags": ["canvas_generation"]
-                    }
-                }
-            )
+            res = await self.llm.ainvoke(messages, session="image_recreation", tags=["canvas_generation"])
             raw_html = res.content.strip().replace('```html', '').replace('```', '')
             
             # 2. Render with Dynamic Resolution
             page = await self.browser.new_page()
-            
-            # Inject the generated HTML
-            full_html = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <style>
-                    body {{ margin: 0; padding: 20px; background: transparent; display: inline-block; }}
-                    canvas {{ display: block; max-width: 100%; height: auto; }}
-                </style>
-            </head>
-            <body>
-                {raw_html}
-            </body>
-            </html>
-            """
-            
-            await page.set_content(full_html)
-            
-            # Auto-sizing logic: Wait for canvas to be sized/rendered
-            # We evaluate the bounding box of the canvas to get dynamic resolution
-            await asyncio.sleep(1.0) # Wait for potential JS execution
-            
-            canvas_handle = await page.query_selector("canvas")
-            if not canvas_handle:
-                await page.close()
-                return None
+            try:
+                # Inject the generated HTML
+                full_html = f"""
+                <!DOCTYPE html>
+                <html>
+                <head>
+                    <style>
+                        body {{ margin: 0; padding: 20px; background: transparent; display: inline-block; }}
+                        canvas {{ display: block; max-width: 100%; height: auto; }}
+                    </style>
+                </head>
+                <body>
+                    {raw_html}
+                </body>
+                </html>
+                """
+                
+                await page.set_content(full_html)
+                
+                # Auto-sizing logic: Wait for canvas to be sized/rendered
+                # We evaluate the bounding box of the canvas to get dynamic resolution
+                await asyncio.sleep(1.0) # Wait for potential JS execution
                 
-            # Take a high-DPI screenshot of just the canvas element
-            # This handles dynamic resolution automatically
-            buffer = await canvas_handle.screenshot(
-                type="png",
-                omit_background=True,
-                animations="disabled"
-            )
-            await page.close()
+                canvas_handle = await page.query_selector("canvas")
+                if not canvas_handle:
+                    return None
+                    
+                # Take a high-DPI screenshot of just the canvas element
+                # This handles dynamic resolution automatically
+                buffer = await canvas_handle.screenshot(
+                    type="png",
+                    omit_background=True,
+                    animations="disabled"
+                )
+            finally:
+                # The browser outlives this document under the async runtime
+                await page.close()
             
             # 3. Save to Django Storage
             file_name = f"recreated/{uuid.uuid4()}.png"
@@ -206,7 +224,8 @@ Output ONLY the HTML/Script code. NO markdown backticks."""
         """Search Wikimedia Commons for a diagram and return the URL of the best match."""
         try:
             print(f"🔍 Searching Wikipedia for: {query}...")
-            # Use the shared pool for efficiency
+            # The loop's pooled client, shared with the model calls
+            client = llm_gateway.async_http_client()
             url = "https://commons.wikimedia.org/w/api.php"
             headers = {"User-Agent": "rgpv-project/1.0 (divyanshshukla@example.com)"}
             
@@ -220,7 +239,7 @@ Output ONLY the HTML/Script code. NO markdown backticks."""
                 "format": "json"
             }
             
-            resp = await _image_recreator_client.get(url, params=search_params, headers=headers)
+            resp = await client.get(url, params=search_params, headers=headers, timeout=WIKIMEDIA_TIMEOUT)
             if resp.status_code != 200:
                 return None
             
@@ -238,7 +257,7 @@ Output ONLY the HTML/Script code. NO markdown backticks."""
                 "format": "json"
             }
             
-            resp2 = await _image_recreator_client.get(url, params=image_params, headers=headers)
+            resp2 = await client.get(url, params=image_params, headers=headers, timeout=WIKIMEDIA_TIMEOUT)
             if resp2.status_code != 200:
                 return None
                 
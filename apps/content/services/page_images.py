@@ -0,0 +1,217 @@
+"""
+Preprocessing of page images before they are sent to the vision model.
+
+Ported from the datamine ``DocumentPipeline`` (page crop, dual-page split,
+blank check) onto Pillow and numpy, which the app already depends on:
+
+* ``page_thumbnail`` / ``is_blank`` / ``dhash`` — a cheap look at every
+  scanned page up front, so blank separators and repeated pages are never
+  rendered or sent. Blankness is judged on a larger survey render than the
+  thumbnail, against the page's own paper shade.
+* ``prepare`` — crop to the content, split two-page scans, drop colour from
+  pages that have none, downscale to the token budget and re-encode as JPEG.
+
+Everything here is plain functions on ``PreprocessOptions`` so it can run in
+the render pool, which has no Django settings.
+"""
+
+import base64
+from dataclasses import dataclass
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Vision models bill roughly one token per this many pixels
+PIXELS_PER_TOKEN = 750
+THUMBNAIL_WIDTH = 64
+HASH_SIZE = 16
+
+# Ink is anything darker than this on a 0–255 grey scale
+INK_LEVEL = 200
+# Blank checks run on a render this wide: on the thumbnail, thin text blurs to a grey above INK_LEVEL
+BLANK_CHECK_WIDTH = 400
+# For the blank check, ink is darker than the paper (this percentile of the page) by INK_CONTRAST
+PAPER_PERCENTILE = 90
+INK_CONTRAST = 32
+# DocumentPipeline.is_blank bounds: almost no ink, or almost all ink (black/noise).
+# A single line of light 11pt text is about 0.0025 of the survey render.
+BLANK_MIN_INK = 0.001
+BLANK_MAX_INK = 0.9
+# Thumbnails of the same page differ by less than this (mean grey level)
+DUPLICATE_MAX_DIFFERENCE = 6
+
+CROP_MARGIN = 0.02
+# A crop must remove at least this share of either dimension to be worth it
+MIN_CROP = 0.05
+DUAL_PAGE_ASPECT = 1.2
+# The middle tenth of a two-page spread is (nearly) free of ink
+GUTTER_MAX_INK = 0.01
+# Mean channel spread below which a page is treated as black-and-white
+MAX_GRAY_SPREAD = 12
+
+MAX_PIXELS = 40_000_000
+
+
+@dataclass(frozen=True)
+class PreprocessOptions:
+    enabled: bool = True
+    token_budget: int = 1600
+    jpeg_quality: int = 75
+    duplicate_distance: int = 8
+
+    @property
+    def max_pixels(self):
+        return self.token_budget * PIXELS_PER_TOKEN
+
+
+def options_from_settings():
+    from django.conf import settings
+
+    return PreprocessOptions(
+        enabled=getattr(settings, 'AI_PARSER_PREPROCESS', True),
+        token_budget=getattr(settings, 'AI_PARSER_IMAGE_TOKEN_BUDGET', 1600),
+        jpeg_quality=getattr(settings, 'AI_PARSER_JPEG_QUALITY', 75),
+        duplicate_distance=getattr(settings, 'AI_PARSER_DUPLICATE_HASH_DISTANCE', 8),
+    )
+
+
+@dataclass
+class PreparedImage:
+    """JPEGs to send for one page (two for a split spread) and the bytes it would have cost."""
+    images: list
+    original_bytes: int
+
+    @property
+    def sent_bytes(self):
+        return sum(len(image) * 3 // 4 for image in self.images)
+
+
+# ── Page survey ────────────────────────────────────────────────────────────
+
+
+def page_thumbnail(gray):
+    """``uint8`` array of a greyscale ``PIL.Image`` shrunk to ``THUMBNAIL_WIDTH``."""
+    height = max(1, round(gray.height * THUMBNAIL_WIDTH / gray.width))
+    return np.asarray(gray.resize((THUMBNAIL_WIDTH, height), Image.BILINEAR), dtype=np.uint8)
+
+
+def ink_ratio(pixels):
+    return float(np.count_nonzero(pixels < INK_LEVEL)) / (pixels.size or 1)
+
+
+def page_ink(pixels):
+    """Share of pixels clearly darker than the paper, whatever shade the paper and the ink are."""
+    paper = np.percentile(pixels, PAPER_PERCENTILE)
+    return float(np.count_nonzero(pixels < paper - INK_CONTRAST)) / (pixels.size or 1)
+
+
+def is_blank(pixels):
+    """
+    Whether a page (``uint8`` greyscale, ``BLANK_CHECK_WIDTH`` wide) has
+    almost no ink on it, or is almost all ink.
+    """
+    return page_ink(pixels) < BLANK_MIN_INK or ink_ratio(pixels) > BLANK_MAX_INK
+
+
+def dhash(thumbnail):
+    """``HASH_SIZE``² bit difference hash of a thumbnail, as a Python int."""
+    small = Image.fromarray(thumbnail).resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def is_duplicate(thumbnail, phash, kept, options):
+    """
+    Whether a page matches one of ``kept`` (``[(thumbnail, phash)]``): hashes
+    within ``duplicate_distance`` bits, confirmed by comparing thumbnails, so
+    two different pages with a similar layout are never merged.
+    """
+    for other, other_hash in kept:
+        if bin(phash ^ other_hash).count('1') > options.duplicate_distance or other.shape != thumbnail.shape:
+            continue
+        difference = np.abs(thumbnail.astype(np.int16) - other.astype(np.int16)).mean()
+        if difference <= DUPLICATE_MAX_DIFFERENCE:
+            return True
+    return False
+
+
+# ── Per-image preparation ──────────────────────────────────────────────────
+
+
+def content_box(gray):
+    """Bounding box of the ink plus a margin, or None if cropping would not help."""
+    ink = np.asarray(gray) < INK_LEVEL
+    rows, cols = np.flatnonzero(ink.any(axis=1)), np.flatnonzero(ink.any(axis=0))
+    if not len(rows):
+        return None
+    height, width = ink.shape
+    margin_y, margin_x = round(height * CROP_MARGIN), round(width * CROP_MARGIN)
+    top, bottom = max(0, rows[0] - margin_y), min(height, rows[-1] + 1 + margin_y)
+    left, right = max(0, cols[0] - margin_x), min(width, cols[-1] + 1 + margin_x)
+    if (bottom - top) > height * (1 - MIN_CROP) and (right - left) > width * (1 - MIN_CROP):
+        return None
+    return left, top, right, bottom
+
+
+def split_dual_page(image, gray):
+    """Halves of a two-page spread (wide, with an empty gutter), else ``[image]``."""
+    if image.width <= image.height * DUAL_PAGE_ASPECT:
+        return [image]
+    pixels = np.asarray(gray)
+    mid = pixels.shape[1] // 2
+    band = max(1, pixels.shape[1] // 20)
+    if ink_ratio(pixels[:, mid - band:mid + band]) > GUTTER_MAX_INK:
+        return [image]
+    return [image.crop((0, 0, mid, image.height)), image.crop((mid, 0, image.width, image.height))]
+
+
+def is_grayscale(image):
+    if image.mode == 'L':
+        return True
+    small = np.asarray(image.resize((THUMBNAIL_WIDTH, max(1, round(image.height * THUMBNAIL_WIDTH / image.width)))), dtype=np.int16)
+    return float((small.max(axis=2) - small.min(axis=2)).mean()) < MAX_GRAY_SPREAD
+
+
+def fit_budget(image, max_pixels):
+    pixels = image.width * image.height
+    if pixels <= max_pixels:
+        return image
+    scale = (max_pixels / pixels) ** 0.5
+    size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def encode_jpeg(image, quality):
+    out = BytesIO()
+    image.save(out, format='JPEG', quality=quality, optimize=True)
+    return base64.b64encode(out.getvalue()).decode('utf-8')
+
+
+def prepare(image, options, original_bytes):
+    """
+    Crop, split, grey and shrink one page image (``PIL.Image``) for the
+    model. ``original_bytes`` is what the page would have cost unprocessed.
+    """
+    image = image.convert('RGB') if image.mode not in ('RGB', 'L') else image
+    gray = image.convert('L')
+    box = content_box(gray)
+    if box:
+        image, gray = image.crop(box), gray.crop(box)
+    images = []
+    for part in split_dual_page(image, gray):
+        if is_grayscale(part):
+            part = part.convert('L')
+        images.append(encode_jpeg(fit_budget(part, options.max_pixels), options.jpeg_quality))
+    return PreparedImage(images=images, original_bytes=original_bytes)
+
+
+def prepare_file(data, options):
+    """``PreparedImage`` for an uploaded page photo or screenshot."""
+    if not options.enabled:
+        return PreparedImage(images=[base64.b64encode(data).decode('utf-8')], original_bytes=len(data))
+    with Image.open(BytesIO(data)) as img:
+        if img.width * img.height > MAX_PIXELS:
+            raise ValueError("Image dimensions too large.")
+        return prepare(ImageOps.exif_transpose(img), options, len(data))
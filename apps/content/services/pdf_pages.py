@@ -0,0 +1,281 @@
+"""
+Lazy, bounded-memory rendering of stored PDFs for the AI parser.
+
+``PdfPages`` renders a page only when the chunk containing it is about to
+be sent to the model, so the parser holds roughly
+(chunk size + overlap) × concurrency rendered pages at any time instead
+of the whole document. The source is never read into memory either: local
+storage is opened in place and remote storage (S3) is streamed to a
+temporary file.
+
+Pages are classified up front (``classify_page``): born-digital pages with
+a clean text layer are extracted as markdown with ``pymupdf4llm``, and only
+scanned or image-heavy pages are rendered to JPEG for the vision model.
+
+Scanned pages also get a thumbnail during classification (blank and
+near-duplicate pages are dropped before chunking), and rendered pages go
+through ``page_images.prepare`` (crop, split, greyscale, downscale, JPEG
+quality) unless ``AI_PARSER_PREPROCESS`` is off.
+
+Rendering runs in a small process pool (``AI_PARSER_RENDER_WORKERS``);
+each worker opens the PDF once. Daemonic processes such as Celery prefork
+children cannot start a pool, so they render in a background thread
+instead.
+
+This module only imports PyMuPDF at the top level so pool workers start
+quickly; ``pymupdf4llm`` is imported on first use.
+"""
+
+import asyncio
+import base64
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import fitz
+import numpy as np
+from PIL import Image
+
+from . import chunking, page_images
+
+# Original resolution (no zoom), as the vision models expect
+RENDER_ZOOM = 1.0
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Page classifier thresholds. A page goes to the model as text only if it
+# has enough real glyphs, they cover a plausible share of the page, images
+# cover little of it, it is not a vector diagram and the text decodes cleanly.
+MIN_GLYPHS = 80
+MIN_TEXT_COVERAGE = 0.02
+MAX_IMAGE_AREA_RATIO = 0.25
+MAX_DRAWINGS = 150
+MAX_BAD_GLYPH_RATIO = 0.02
+
+PAGE_TEXT = 'text'
+PAGE_IMAGE = 'image'
+
+_worker_doc = None
+
+
+def _open_worker(path):
+    global _worker_doc
+    _worker_doc = fitz.open(path)
+
+
+def _render_in_worker(index, zoom, options):
+    return render_page(_worker_doc, index, zoom, options)
+
+
+def _markdown_in_worker(indices):
+    return page_markdown(_worker_doc, indices)
+
+
+def _classify_in_worker(start, stop, survey):
+    return _classify_range(_worker_doc, start, stop, survey)
+
+
+def _classify_range(doc, start, stop, survey):
+    return [classify_page(doc.load_page(i), survey) for i in range(start, stop)]
+
+
+def render_page(doc, index, zoom=RENDER_ZOOM, options=None):
+    """``PreparedImage`` of one page (preprocessed unless ``options`` is disabled)."""
+    pix = doc.load_page(index).get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    jpeg = pix.tobytes("jpg")
+    if options is None or not options.enabled:
+        return page_images.PreparedImage(images=[base64.b64encode(jpeg).decode('utf-8')], original_bytes=len(jpeg))
+    mode = 'L' if pix.n == 1 else 'RGB'
+    image = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+    return page_images.prepare(image, options, len(jpeg))
+
+
+def survey_page(page):
+    """
+    Greyscale thumbnail of a page (``page_images.THUMBNAIL_WIDTH`` wide) and
+    whether the page is blank, judged on the larger survey render.
+    """
+    scale = page_images.BLANK_CHECK_WIDTH / (page.rect.width or 1)
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=fitz.csGRAY, alpha=False)
+    gray = Image.frombytes('L', (pix.width, pix.height), pix.samples)
+    return page_images.page_thumbnail(gray), page_images.is_blank(np.asarray(gray))
+
+
+def page_markdown(doc, indices):
+    """Markdown of the text layer of each page in ``indices``, in order."""
+    import pymupdf4llm
+
+    chunks = pymupdf4llm.to_markdown(doc, pages=list(indices), page_chunks=True, show_progress=False)
+    return [chunk['text'].strip() for chunk in chunks]
+
+
+@dataclass
+class PageStats:
+    glyphs: int
+    text_coverage: float
+    image_area_ratio: float
+    drawings: int
+    bad_glyph_ratio: float
+    # The first text on the page is a heading or question number
+    starts_section: bool = False
+    # Scanned pages only, when surveyed
+    thumbnail: np.ndarray = None
+    phash: int = None
+    blank: bool = False
+
+    @property
+    def kind(self):
+        if (
+            self.glyphs >= MIN_GLYPHS
+            and self.text_coverage >= MIN_TEXT_COVERAGE
+            and self.image_area_ratio <= MAX_IMAGE_AREA_RATIO
+            and self.drawings <= MAX_DRAWINGS
+            and self.bad_glyph_ratio <= MAX_BAD_GLYPH_RATIO
+        ):
+            return PAGE_TEXT
+        return PAGE_IMAGE
+
+
+def _area(rect, page_rect):
+    rect = fitz.Rect(rect) & page_rect
+    return 0.0 if rect.is_empty else rect.width * rect.height
+
+
+def classify_page(page, survey=False):
+    """
+    Text-layer statistics of one page; ``.kind`` says how to send it.
+    With ``survey``, image pages also get a thumbnail and perceptual hash.
+    """
+    page_rect = page.rect
+    page_area = (page_rect.width * page_rect.height) or 1.0
+    glyphs = bad = 0
+    text_area = 0.0
+    first_text = None
+    for block in page.get_text("blocks"):
+        if block[6] != 0:
+            continue
+        text = block[4]
+        if first_text is None and text.strip():
+            first_text = text
+        text_area += _area(block[:4], page_rect)
+        for char in text:
+            if char.isspace():
+                continue
+            glyphs += 1
+            # Fonts without a usable ToUnicode map extract as U+FFFD or control/private-use codes
+            if char == '\ufffd' or unicodedata.category(char) in ('Cc', 'Co', 'Cn'):
+                bad += 1
+    image_area = sum(_area(info['bbox'], page_rect) for info in page.get_image_info())
+    stats = PageStats(
+        glyphs=glyphs,
+        text_coverage=min(text_area / page_area, 1.0),
+        image_area_ratio=min(image_area / page_area, 1.0),
+        drawings=len(page.get_cdrawings()),
+        bad_glyph_ratio=bad / glyphs if glyphs else 0.0,
+        starts_section=first_text is not None and chunking.starts_section(first_text),
+    )
+    if survey and stats.kind == PAGE_IMAGE:
+        stats.thumbnail, stats.blank = survey_page(page)
+        stats.phash = page_images.dhash(stats.thumbnail)
+    return stats
+
+
+class PdfPages:
+    """
+    A stored PDF whose pages are rendered on demand::
+
+        with PdfPages(name) as pages:
+            kinds = await pages.classify()
+            images = await pages.render(range(0, 5), options)
+            texts = await pages.markdown(range(5, 10))
+    """
+
+    def __init__(self, name, storage=None, workers=None, zoom=RENDER_ZOOM):
+        from django.conf import settings
+        from django.core.files.storage import default_storage
+
+        self.name = name
+        self.storage = storage or default_storage
+        self.workers = getattr(settings, 'AI_PARSER_RENDER_WORKERS', 2) if workers is None else workers
+        self.zoom = zoom
+        self._path = None
+        self._temp_path = None
+        self._doc = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        try:
+            self._path = self.storage.path(self.name)
+        except NotImplementedError:
+            # Remote storage: stream to disk rather than holding the bytes
+            fd, self._temp_path = tempfile.mkstemp(suffix='.pdf')
+            with os.fdopen(fd, 'wb') as local, self.storage.open(self.name, 'rb') as remote:
+                shutil.copyfileobj(remote, local, COPY_BUFFER_SIZE)
+            self._path = self._temp_path
+
+        # Opening by path reads only the xref; pages load as they are rendered
+        self._doc = fitz.open(self._path)
+        if self.workers > 0 and not multiprocessing.current_process().daemon:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_open_worker,
+                initargs=(self._path,),
+            )
+        return self
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+        if self._temp_path:
+            os.unlink(self._temp_path)
+            self._temp_path = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._doc.page_count
+
+    def _inline(self, func, *args):
+        # One fitz.Document must not be used from several threads at once
+        with self._lock:
+            return func(self._doc, *args)
+
+    async def _run(self, worker_func, inline_func, *args):
+        if self._pool is not None:
+            return await asyncio.wrap_future(self._pool.submit(worker_func, *args))
+        return await asyncio.to_thread(self._inline, inline_func, *args)
+
+    async def classify(self, survey=False, batch_size=50):
+        """``PageStats`` of every page, in order."""
+        batches = [
+            self._run(_classify_in_worker, _classify_range, start, min(start + batch_size, len(self)), survey)
+            for start in range(0, len(self), batch_size)
+        ]
+        return [stats for batch in await asyncio.gather(*batches) for stats in batch]
+
+    async def render(self, indices, options=None):
+        """``PreparedImage`` for each of ``indices``, in order."""
+        return list(await asyncio.gather(*(
+            self._run(_render_in_worker, render_page, index, self.zoom, options) for index in indices
+        )))
+
+    async def markdown(self, indices):
+        """Text-layer markdown for ``indices``, in order."""
+        indices = list(indices)
+        if not indices:
+            return []
+        return await self._run(_markdown_in_worker, page_markdown, indices)
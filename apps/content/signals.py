@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .data_services import ContentDataService
+from .models import ParsedDocument
+from .question_clusters import PYQ_TYPES
+from .tasks import index_document_search, index_question_signatures, recluster_questions
+
+# Fields the search entry is built from; saves touching only progress
+# counters (every parsed chunk) skip reindexing
+SEARCH_FIELDS = {
+    'title', 'year', 'document_type', 'structured_data',
+    'is_published', 'is_premium', 'parsing_status',
+}
+# Fields question signatures are built from
+QUESTION_FIELDS = {'year', 'document_type', 'structured_data'}
+
+
+@receiver(post_save, sender=ParsedDocument)
+def parsed_document_saved(sender, instance, update_fields=None, **kwargs):
+    document_id = instance.pk
+    if update_fields is None or SEARCH_FIELDS.intersection(update_fields):
+        transaction.on_commit(lambda: index_document_search.delay(document_id))
+    if update_fields is not None and not QUESTION_FIELDS.intersection(update_fields):
+        return
+    # Also runs when a paper stops being a PYQ, so its signatures are dropped
+    if instance.document_type in PYQ_TYPES or instance.question_signatures.exists():
+        transaction.on_commit(lambda: index_question_signatures.delay(document_id))
+
+
+@receiver(m2m_changed, sender=ParsedDocument.subjects.through)
+def parsed_document_subjects_changed(sender, instance, action, reverse, **kwargs):
+    if reverse or action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if instance.document_type in PYQ_TYPES:
+        document_id = instance.pk
+        transaction.on_commit(lambda: index_question_signatures.delay(document_id))
+
+
+@receiver(pre_delete, sender=ParsedDocument)
+def parsed_document_deleting(sender, instance, **kwargs):
+    keys = set(instance.question_signatures.values_list('subject_key', flat=True))
+    for key in keys:
+        transaction.on_commit(lambda key=key: recluster_questions.delay(key))
+
+
+@receiver(post_delete, sender=ParsedDocument)
+def parsed_document_deleted(sender, instance, **kwargs):
+    ContentDataService.bump_search_version()
@@ -1,16 +1,33 @@
 import logging
-import asyncio
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
+from apps.common import async_runtime, llm_cache, rate_limit
+from .data_services import ContentDataService
+from . import parse_checkpoints, question_clusters
 from .models import ParsedDocument
 from .services.ai_parser import DocumentParserService
 
 logger = logging.getLogger(__name__)
 
-@shared_task(bind=True, max_retries=3)
-def process_document_ai(self, document_id):
+@shared_task(
+    bind=True, max_retries=3, acks_late=True, reject_on_worker_lost=True,
+    soft_time_limit=getattr(settings, 'AI_PARSE_TIME_LIMIT', 6 * 3600),
+    time_limit=getattr(settings, 'AI_PARSE_TIME_LIMIT', 6 * 3600) + 300,
+)
+def process_document_ai(self, document_id, refresh_cache=False, llm_priority=rate_limit.BATCH):
     """
-    Background task to parse a document using AI.
+    Background task to parse a document using AI. Unchanged chunks reuse
+    cached model responses unless ``refresh_cache`` is set. Uploads and admin
+    re-parses run at ``rate_limit.INTERACTIVE`` priority, bulk dispatch at
+    ``BATCH``.
+
+    The task is acknowledged only once it finishes, so a worker that dies
+    mid-parse gets it redelivered; chunks already checkpointed
+    (``ParseChunk``) are not sent to the model again. A parse is capped at
+    ``AI_PARSE_TIME_LIMIT``, below the broker's visibility timeout, and
+    holds a ``parse_checkpoints.ParseLock`` so a second copy of the task
+    (a redelivery while this one still runs, a double dispatch) skips.
     """
     # Wait for document to be available in DB (handles transaction race condition)
     document = None
@@ -25,11 +42,21 @@ def process_document_ai(self, document_id):
             import time
             time.sleep(1)
 
-    # Guard: prevent multiple concurrent parsing tasks for the same document
-    if document.parsing_status == 'PROCESSING':
+    # Guard: prevent multiple concurrent parsing tasks for the same document.
+    # The lock lapses only when its holder stops renewing it, so a task
+    # redelivered after a worker died still gets through.
+    lock = parse_checkpoints.ParseLock(document_id)
+    if not lock.acquire():
         logger.warning(f"Document {document_id} is already being processed. Skipping.")
         return {"status": "skipped", "reason": "already_processing"}
+    try:
+        return _parse_locked(self, document, refresh_cache, llm_priority)
+    finally:
+        lock.release()
+
 
+def _parse_locked(task, document, refresh_cache, llm_priority):
+    document_id = document.id
     # Update status to PROCESSING and reset chunk counters
     document.parsing_status = 'PROCESSING'
     document.parsing_completed_chunks = 0
@@ -38,13 +65,14 @@ def process_document_ai(self, document_id):
 
     try:
         parser = DocumentParserService()
-        # The parser service handles its own internal chunking and merging
-        structured_data = asyncio.run(parser.parse_document(document))
-        
-        # Post-Processing: Recreate CANVAS images
-        from .services.image_recreator import ImageRecreationService
-        recreator = ImageRecreationService(doc_obj=document)
-        structured_data = asyncio.run(recreator.process_structured_data(structured_data))
+        with llm_cache.refreshing(refresh_cache), rate_limit.priority(llm_priority):
+            # The parser service handles its own internal chunking and merging
+            structured_data = async_runtime.run_coro(parser.parse_document(document))
+
+            # Post-Processing: Recreate CANVAS images
+            from .services.image_recreator import ImageRecreationService
+            recreator = ImageRecreationService(doc_obj=document)
+            structured_data = async_runtime.run_coro(recreator.process_structured_data(structured_data))
         
         # Save results and update status
         document.structured_data = structured_data
@@ -57,6 +85,7 @@ def process_document_ai(self, document_id):
             document.source_file = None
             
         document.save(update_fields=['structured_data', 'parsing_status', 'source_file', 'updated_at'])
+        parse_checkpoints.clear(document.id)
 
         # Delete related DocumentImages
         document.images.all().delete()
@@ -79,4 +108,30 @@ def process_document_ai(self, document_id):
         
         # Retry the task with exponential backoff if it's a transient error
         # (Parser service already has some retries, but this covers higher level failures)
-        raise self.retry(exc=exc, countdown=60 * (2 ** self.request.retries))
+        raise task.retry(exc=exc, countdown=60 * (2 ** task.request.retries))
+
+
+@shared_task
+def index_document_search(document_id):
+    """Refresh (or drop) a document's site-search entry after it is saved."""
+    document = ParsedDocument.objects.filter(pk=document_id).first()
+    if not document:
+        return False
+    return ContentDataService.index_document_search(document)
+
+
+@shared_task
+def index_question_signatures(document_id):
+    """Refresh a PYQ paper's question signatures and re-cluster the affected subjects."""
+    document = ParsedDocument.objects.filter(pk=document_id).first()
+    if not document:
+        return 0
+    keys = question_clusters.index_document(document)
+    for key in keys:
+        question_clusters.recluster(key)
+    return len(keys)
+
+
+@shared_task
+def recluster_questions(subject_key):
+    return question_clusters.recluster(subject_key)
@@ -23,6 +23,7 @@ from apps.users.data_services import UserDataService
 from apps.academics.data_services import AcademicsDataService
 from apps.content.models import ParsedDocument
 from apps.content.seo_constants import SEO_VALUABLE_CONTENT
+from apps.common.fulltext import snippet_segments
 
 GUEST_ALLOWED_DOCUMENT_TYPES = {'UNSOLVED_PYQ', 'SYLLABUS'}
 
@@ -786,6 +787,88 @@ def explore_subjects(request):
         'semesters': semesters,
     })
 
+SEARCH_PAGE_SIZE = 20
+
+
+def _positive_int(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def _document_search(request):
+    """Parses the shared search query string and runs the search."""
+    query = request.GET.get('q', '').strip()[:200]
+    document_type = request.GET.get('type') or None
+    if document_type not in dict(ParsedDocument.DOCUMENT_TYPES):
+        document_type = None
+    filters = {
+        'branch_id': _positive_int(request.GET.get('branch')),
+        'semester_id': _positive_int(request.GET.get('semester')),
+        'subject_id': _positive_int(request.GET.get('subject')),
+        'document_type': document_type,
+    }
+    page = _positive_int(request.GET.get('page')) or 1
+
+    # Guests only see answers and body text of the document types they can open
+    full_snippet_types = None if request.user.is_authenticated else GUEST_ALLOWED_DOCUMENT_TYPES
+    hits, has_more = ([], False)
+    if query:
+        hits, has_more = ContentDataService.search_documents(
+            query, filters, page, SEARCH_PAGE_SIZE, full_snippet_types=full_snippet_types,
+        )
+    for hit in hits:
+        hit['url'] = reverse('read_document_slug', args=[hit['document_id'], slugify(hit['title']) or 'document'])
+    return query, filters, page, hits, has_more
+
+
+def search_documents_api(request):
+    """Public JSON search over published documents with highlight offsets."""
+    query, filters, page, hits, has_more = _document_search(request)
+    return JsonResponse({
+        'query': query,
+        'filters': filters,
+        'page': page,
+        'has_more': has_more,
+        'results': hits,
+    })
+
+
+def search_documents(request):
+    """
+    Site-wide search page. HTMX requests get only the results partial so the
+    page updates as the user types or changes a filter.
+    """
+    query, filters, page, hits, has_more = _document_search(request)
+    for hit in hits:
+        hit['segments'] = snippet_segments(hit['snippet'], hit['highlights'])
+
+    next_params = request.GET.copy()
+    next_params['page'] = page + 1
+    context = {
+        'query': query,
+        'filters': filters,
+        'page': page,
+        'hits': hits,
+        'has_more': has_more,
+        'next_query': next_params.urlencode(),
+    }
+    if request.headers.get('HX-Request'):
+        return render(request, 'content/partials/_search_results.html', context)
+
+    branch = AcademicsDataService.get_branch_by_id(filters['branch_id']) if filters['branch_id'] else None
+    semester = AcademicsDataService.get_semester_by_id(filters['semester_id']) if filters['semester_id'] else None
+    context.update({
+        'branches': ContentDataService.get_all_branches(),
+        'semesters': ContentDataService.get_all_semesters(),
+        'subjects': ContentDataService.get_subjects_by_branch_and_semester(branch, semester) if branch and semester else [],
+        'document_types': ParsedDocument.DOCUMENT_TYPES,
+    })
+    return render(request, 'content/search.html', context)
+
+
 @staff_member_required
 def admin_ai_parser(request):
     subjects = AcademicsDataService.get_all_active_subjects()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import GamerProfile, StudySession
+from .models import GamerProfile, StudySession, StudySessionRollup
 
 @admin.register(GamerProfile)
 class GamerProfileAdmin(admin.ModelAdmin):
@@ -19,3 +19,13 @@ class StudySessionAdmin(admin.ModelAdmin):
     autocomplete_fields = ['user', 'subject', 'parsed_document']
     list_per_page = 20
     show_full_result_count = False
+
+@admin.register(StudySessionRollup)
+class StudySessionRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'subject', 'hour_start', 'total_seconds', 'session_count')
+    list_filter = ('hour_start',)
+    search_fields = ('user__username',)
+    list_select_related = ('user', 'subject')
+    raw_id_fields = ('user', 'subject')
+    list_per_page = 20
+    show_full_result_count = False
@@ -1,7 +1,7 @@
 from apps.common.services import BaseService
-from apps.gamification.models import GamerProfile, StudySession
+from apps.gamification.models import GamerProfile, StudySession, StudySessionRollup
 from django.db.models import Sum, Count
-from django.db.models.functions import TruncDate, TruncHour, TruncWeek
+from django.db.models.functions import ExtractHour, TruncDate, TruncHour, TruncWeek
 from django.utils import timezone
 from datetime import timedelta
 
@@ -82,6 +82,20 @@ class GamificationDataService(BaseService):
         cls.invalidate_profile_cache(profile.user)
         return True
 
+    # ── Archived rollups ──────────────────────────────────────────────────────
+    # Sessions past the retention horizon live on as hourly StudySessionRollup
+    # rows; the helpers below fold them back into the dashboard aggregates.
+
+    @classmethod
+    def _rollup_daily_totals(cls, user, since_date):
+        return dict(
+            StudySessionRollup.objects.filter(user=user, hour_start__date__gte=since_date)
+            .annotate(day=TruncDate('hour_start'))
+            .values('day')
+            .annotate(total=Sum('total_seconds'))
+            .values_list('day', 'total')
+        )
+
     # ── Dashboard analytics (heavy, cached 10 min) ───────────────────────────
 
     @classmethod
@@ -96,8 +110,14 @@ class GamificationDataService(BaseService):
                 total_seconds=Sum('duration_seconds'),
                 total_sessions=Count('id'),
             )
-            total_seconds = stats['total_seconds'] or 0
-            total_sessions = stats['total_sessions'] or 0
+            archived = StudySessionRollup.objects.filter(user=user).aggregate(
+                total_seconds=Sum('total_seconds'),
+                total_sessions=Sum('session_count'),
+            )
+            total_seconds = (stats['total_seconds'] or 0) + (archived['total_seconds'] or 0)
+            total_sessions = (stats['total_sessions'] or 0) + (archived['total_sessions'] or 0)
+            week_start = today - timedelta(days=6)
+            archived_days = cls._rollup_daily_totals(user, week_start)
             weekly_labels, weekly_minutes = [], []
             for i in range(6, -1, -1):
                 target_date = today - timedelta(days=i)
@@ -105,22 +125,32 @@ class GamificationDataService(BaseService):
                     StudySession.objects.filter(user=user, start_time__date=target_date)
                     .aggregate(total=Sum('duration_seconds'))['total']
                     or 0
-                )
+                ) + archived_days.get(target_date, 0)
                 weekly_labels.append(target_date.strftime('%a %d'))
                 weekly_minutes.append(round(day_seconds / 60))
-            subject_data = (
+            subject_totals = {}
+            for name, code, seconds in (
                 StudySession.objects.filter(user=user, subject__isnull=False)
                 .values('subject__name', 'subject__code')
                 .annotate(total_seconds=Sum('duration_seconds'))
-                .order_by('-total_seconds')[:8]
-            )
+                .values_list('subject__name', 'subject__code', 'total_seconds')
+            ):
+                subject_totals[(name, code)] = seconds
+            for name, code, seconds in (
+                StudySessionRollup.objects.filter(user=user, subject__isnull=False)
+                .values('subject__name', 'subject__code')
+                .annotate(total=Sum('total_seconds'))
+                .values_list('subject__name', 'subject__code', 'total')
+            ):
+                subject_totals[(name, code)] = subject_totals.get((name, code), 0) + seconds
+            subject_data = sorted(subject_totals.items(), key=lambda item: item[1], reverse=True)[:8]
             return {
                 'total_seconds': total_seconds,
                 'total_sessions': total_sessions,
                 'weekly_labels': weekly_labels,
                 'weekly_minutes': weekly_minutes,
-                'subject_labels': [row['subject__name'] for row in subject_data],
-                'subject_minutes': [round(row['total_seconds'] / 60) for row in subject_data],
+                'subject_labels': [name for (name, _code), _seconds in subject_data],
+                'subject_minutes': [round(seconds / 60) for _key, seconds in subject_data],
                 'timestamp': now.isoformat(),
             }
 
@@ -140,6 +170,8 @@ class GamificationDataService(BaseService):
                 .annotate(total=Sum('duration_seconds'))
                 .values_list('day', 'total')
             )
+            for day, total in cls._rollup_daily_totals(user, thirty_days_ago).items():
+                daily_totals[day] = daily_totals.get(day, 0) + total
             return [
                 {'date': (today - timedelta(days=i)).strftime('%b %d'),
                  'minutes': round(daily_totals.get(today - timedelta(days=i), 0) / 60)}
@@ -160,6 +192,13 @@ class GamificationDataService(BaseService):
             for row in rows:
                 h = timezone.localtime(row['hour']).hour
                 hourly_data[h] += round(row['total'] / 60)
+            for row in (
+                StudySessionRollup.objects.filter(user=user)
+                .annotate(h=ExtractHour('hour_start'))
+                .values('h')
+                .annotate(total=Sum('total_seconds'))
+            ):
+                hourly_data[row['h']] += round(row['total'] / 60)
             return hourly_data
         return cls.get_or_set_cache(f'hourly_heatmap_{user.id}', _calc, timeout=600)
 
@@ -177,6 +216,14 @@ class GamificationDataService(BaseService):
             )
             for row in rows:
                 weekly_totals[row['week'].date()] = row['total']
+            for row in (
+                StudySessionRollup.objects.filter(user=user, hour_start__date__gte=twelve_weeks_ago)
+                .annotate(week=TruncWeek('hour_start'))
+                .values('week')
+                .annotate(total=Sum('total_seconds'))
+            ):
+                week = row['week'].date()
+                weekly_totals[week] = weekly_totals.get(week, 0) + row['total']
             labels, minutes = [], []
             for w in range(11, -1, -1):
                 week_start = today - timedelta(days=today.weekday() + w * 7)
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0002_subjectanalytics'),
+        ('content', '0002_parseddocument_latex_validated'),
+        ('gamification', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudySessionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour_start', models.DateTimeField(help_text='Session start time truncated to the hour (UTC)')),
+                ('total_seconds', models.PositiveBigIntegerField(default=0)),
+                ('session_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['start_time'], name='gamificatio_start_t_680e37_idx'),
+        ),
+        migrations.AddField(
+            model_name='studysessionrollup',
+            name='subject',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='academics.subject'),
+        ),
+        migrations.AddField(
+            model_name='studysessionrollup',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='study_session_rollups', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='studysessionrollup',
+            index=models.Index(fields=['user', 'hour_start'], name='gamificatio_user_id_de5f23_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='studysessionrollup',
+            unique_together={('user', 'subject', 'hour_start')},
+        ),
+    ]
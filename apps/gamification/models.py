@@ -44,7 +44,30 @@ class StudySession(models.Model):
     duration_seconds = models.PositiveIntegerField(default=0)
     
     is_active = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['start_time'])]
     
     def __str__(self):
         doc_name = self.parsed_document.title if self.parsed_document else "Unknown Doc"
         return f"{self.user.username} studied {doc_name} for {self.duration_seconds}s"
+
+
+class StudySessionRollup(models.Model):
+    """
+    Compact hourly aggregate of StudySession rows that the retention job has
+    archived. Dashboard totals add these back so they stay intact after the
+    raw rows are gone.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='study_session_rollups')
+    subject = models.ForeignKey(Subject, on_delete=models.SET_NULL, null=True, blank=True)
+    hour_start = models.DateTimeField(help_text="Session start time truncated to the hour (UTC)")
+    total_seconds = models.PositiveBigIntegerField(default=0)
+    session_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'subject', 'hour_start')
+        indexes = [models.Index(fields=['user', 'hour_start'])]
+
+    def __str__(self):
+        return f"{self.user.username} {self.hour_start:%Y-%m-%d %H}:00 — {self.total_seconds}s"
@@ -0,0 +1,16 @@
+"""
+Context processors for the notifications app.
+"""
+
+from .data_services import NotificationDataService
+
+
+def unread_notifications(request):
+    """
+    Exposes the navbar's unread count. It is read from the Redis counter only
+    when a template uses it, so pages without the bell pay nothing.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'unread_notifications_count': lambda: NotificationDataService.get_unread_count(user)}
@@ -1,3 +1,6 @@
+from django.core.cache import cache
+from django.db.models import Count, Q
+
 from apps.common.services import BaseService
 from apps.notifications.models import Notification
 
@@ -5,8 +8,18 @@ from apps.notifications.models import Notification
 class NotificationDataService(BaseService):
     """
     Service for user notifications.
+
+    The unread badge is backed by a per-user counter that lives in the cache
+    (Redis) without expiry. It is incremented on ``notify`` and decremented on
+    mark-read with atomic INCR/DECR, so reading it never touches the database
+    once warm. ``reconcile_unread_counts`` periodically rewrites the counters
+    from the ``Notification`` table to heal any drift.
     """
 
+    @staticmethod
+    def _unread_counter_key(user_id):
+        return f'unread_notifications_counter_{user_id}'
+
     @classmethod
     def get_user_notifications(cls, user):
         if not user.is_authenticated:
@@ -21,30 +34,84 @@ class NotificationDataService(BaseService):
     def get_unread_count(cls, user):
         if not user.is_authenticated:
             return 0
-        return cls.get_or_set_cache(
-            f'unread_notifications_count_{user.id}',
-            lambda: Notification.objects.filter(user=user, is_read=False).count(),
-            timeout=300,
-        )
+        return cls.get_unread_count_for_user_id(user.id)
+
+    @classmethod
+    def get_unread_count_for_user_id(cls, user_id):
+        """Counter read; falls back to a single ``COUNT(*)`` only when cold."""
+        key = cls._unread_counter_key(user_id)
+        count = cache.get(key)
+        if count is None:
+            count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+            # add() so a concurrent incr/decr that already seeded the key wins
+            cache.add(key, count, timeout=None)
+        return max(int(count), 0)
+
+    @classmethod
+    def adjust_unread_count(cls, user_id, delta):
+        """
+        Atomically shift the unread counter. A missing key is left missing so
+        the next read recomputes it; a negative result is dropped for the same
+        reason.
+        """
+        key = cls._unread_counter_key(user_id)
+        try:
+            value = cache.incr(key, delta) if delta >= 0 else cache.decr(key, -delta)
+        except ValueError:
+            return None
+        if value < 0:
+            cache.delete(key)
+            return None
+        return value
+
+    @classmethod
+    def set_unread_count(cls, user_id, count):
+        cache.set(cls._unread_counter_key(user_id), int(count), timeout=None)
 
     @classmethod
     def clear_user_notification_cache(cls, user):
         cls.clear_cache(f'user_notifications_{user.id}')
-        cls.clear_cache(f'unread_notifications_count_{user.id}')
+
+    @classmethod
+    def reconcile_unread_counts(cls, batch_size=1000):
+        """
+        Rewrite every user's counter from the database in one grouped query.
+        Returns the number of counters written.
+        """
+        rows = (
+            Notification.objects.values('user_id')
+            .annotate(unread=Count('id', filter=Q(is_read=False)))
+            .values_list('user_id', 'unread')
+            .order_by()
+        )
+        written = 0
+        batch = {}
+        for user_id, unread in rows.iterator(chunk_size=batch_size):
+            batch[cls._unread_counter_key(user_id)] = unread
+            if len(batch) >= batch_size:
+                cache.set_many(batch, timeout=None)
+                written += len(batch)
+                batch = {}
+        if batch:
+            cache.set_many(batch, timeout=None)
+            written += len(batch)
+        return written
 
     # ── Mutation helpers ──────────────────────────────────────────────────────
 
     @classmethod
     def mark_notification_read(cls, user, pk):
-        """Mark a single notification as read and bust caches."""
+        """Mark a single notification as read and decrement the counter."""
         updated = Notification.objects.filter(pk=pk, user=user, is_read=False).update(is_read=True)
         if updated:
             cls.clear_user_notification_cache(user)
+            cls.adjust_unread_count(user.id, -updated)
         return updated
 
     @classmethod
     def mark_all_read(cls, user):
-        """Bulk-mark all unread notifications and bust caches."""
+        """Bulk-mark all unread notifications and zero the counter."""
         updated = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
         cls.clear_user_notification_cache(user)
+        cls.set_unread_count(user.id, 0)
         return updated
@@ -19,6 +19,7 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['is_read', 'created_at'])]
 
     def __str__(self):
         return f"{self.user.username} - {self.title}"
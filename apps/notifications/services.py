@@ -16,8 +16,9 @@ class NotificationService:
             link=link
         )
         
-        # Invalidate cached notification data for this user
+        # Invalidate the cached list and bump the live unread counter
         NotificationDataService.clear_user_notification_cache(user)
+        NotificationDataService.adjust_unread_count(user.id, 1)
         
         # Send Web Push Notification
         try:
@@ -0,0 +1,16 @@
+import logging
+from celery import shared_task
+from .data_services import NotificationDataService
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def reconcile_unread_counts():
+    """
+    Periodic beat task: rewrite every cached unread counter from the database
+    so drift from lost increments or evictions heals itself.
+    """
+    written = NotificationDataService.reconcile_unread_counts()
+    logger.info(f"Reconciled {written} unread notification counters")
+    return written
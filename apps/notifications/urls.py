@@ -8,5 +8,6 @@ urlpatterns = [
     path('mark-read/<int:pk>/', views.mark_as_read, name='mark_as_read'),
     path('mark-all-read/', views.mark_all_read, name='mark_all_read'),
     path('unread-count/', views.unread_count, name='unread_count'),
+    path('unread-poll/', views.unread_poll, name='unread_poll'),
     path('vapid/', views.vapid_config, name='vapid_config'),
 ]
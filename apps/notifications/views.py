@@ -1,8 +1,9 @@
+import os
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, FileResponse
-import os
+from django.http import HttpResponse, FileResponse, JsonResponse
 from django.conf import settings
+from django.views.decorators.http import require_GET
 from .data_services import NotificationDataService
 
 @login_required
@@ -31,6 +32,20 @@ def unread_count(request):
     count = NotificationDataService.get_unread_count(request.user)
     return render(request, 'notifications/partials/unread_count.html', {'count': count})
 
+
+@login_required
+@require_GET
+def unread_poll(request):
+    """
+    Unread badge count as JSON, from the cached counter. The page renders
+    the count itself; the badge script only asks again when the tab comes
+    back into view or a notification is marked read, never on a timer.
+    """
+    count = NotificationDataService.get_unread_count_for_user_id(request.user.id)
+    response = JsonResponse({'count': count})
+    response['Cache-Control'] = 'no-store'
+    return response
+
 @login_required
 def vapid_config(request):
     from django.http import JsonResponse
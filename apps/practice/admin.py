@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Question, QuestionSet, UserAttempt, UserAnswer
+from .models import Question, QuestionSet, UserAttempt, UserAnswer, GenerationJob, QuestionPool
 
 
 class UserAnswerInline(admin.TabularInline):
@@ -72,3 +72,31 @@ class UserAttemptAdmin(admin.ModelAdmin):
     autocomplete_fields = ['user', 'question_set']
     list_per_page = 20
     show_full_result_count = False
+
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'subject', 'unit', 'difficulty', 'status', 'requested_count', 'created_at')
+    list_filter = ('status', 'difficulty')
+    search_fields = ('user__username', 'subject__name')
+    list_select_related = ('user', 'subject', 'unit')
+    raw_id_fields = ('user', 'subject', 'unit', 'question_set')
+    readonly_fields = ('questions', 'error', 'created_at', 'updated_at')
+
+
+@admin.register(QuestionPool)
+class QuestionPoolAdmin(admin.ModelAdmin):
+    list_display = ('key', 'subject', 'unit', 'difficulty', 'pool_size', 'hit_count', 'miss_count', 'hit_rate', 'served_count', 'last_filled_at')
+    list_filter = ('difficulty',)
+    search_fields = ('key', 'subject__name', 'subject__code')
+    list_select_related = ('subject', 'unit')
+    raw_id_fields = ('subject', 'unit')
+    readonly_fields = ('key', 'hit_count', 'miss_count', 'served_count', 'generated_count', 'last_requested_at', 'last_filled_at')
+    exclude = ('questions',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(_pool_size=Count('questions'))
+
+    @admin.display(description='Pool size', ordering='_pool_size')
+    def pool_size(self, obj):
+        return obj._pool_size
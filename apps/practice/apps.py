@@ -5,3 +5,6 @@ class PracticeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.practice'
     verbose_name = 'Practice'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -1,6 +1,16 @@
+import hashlib
+import json
+from datetime import timedelta
+
 from apps.common.services import BaseService
-from apps.practice.models import Question, QuestionSet, UserAttempt, UserAnswer
-from django.db.models import Count
+from apps.practice.models import (
+    GenerationJob, PracticeSubjectStats, Question, QuestionPool, QuestionSet, ServedQuestion,
+    UserAttempt, UserAnswer,
+)
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
 
 
 class PracticeDataService(BaseService):
@@ -52,6 +62,99 @@ class PracticeDataService(BaseService):
             timeout=3600,
         )
 
+    @classmethod
+    def get_subject_counts(cls):
+        """Published set and question counts for every subject, cached as one blob."""
+        def fetch():
+            counts = {}
+            set_rows = (
+                QuestionSet.objects.filter(is_published=True)
+                .values('subject_id').annotate(n=Count('id')).order_by()
+            )
+            for row in set_rows:
+                counts.setdefault(row['subject_id'], {'set_count': 0, 'q_count': 0})['set_count'] = row['n']
+            q_rows = (
+                Question.objects.filter(is_published=True)
+                .values('subject_id').annotate(n=Count('id')).order_by()
+            )
+            for row in q_rows:
+                counts.setdefault(row['subject_id'], {'set_count': 0, 'q_count': 0})['q_count'] = row['n']
+            return counts
+
+        return cls.get_or_set_cache('practice_subject_counts', fetch, timeout=3600)
+
+    @classmethod
+    def get_user_subject_stats(cls, user):
+        """
+        A user's attempts, accuracy and last-practiced time for every subject,
+        read from ``PracticeSubjectStats`` in one query and cached per user.
+        Invalidated when the user submits a quiz.
+        """
+        def fetch():
+            return {
+                row.subject_id: {
+                    'attempts': row.attempt_count,
+                    'accuracy': row.accuracy,
+                    'graded': row.graded_count,
+                    'last_practiced': row.last_practiced_at,
+                }
+                for row in PracticeSubjectStats.objects.filter(user=user)
+            }
+
+        return cls.get_or_set_cache(f'practice_user_stats_{user.id}', fetch, timeout=3600)
+
+    @classmethod
+    def clear_user_subject_stats(cls, user_id):
+        cls.clear_cache(f'practice_user_stats_{user_id}')
+
+    # ── Quiz payload ──────────────────────────────────────────────────────────
+
+    @classmethod
+    def get_quiz_payload(cls, question_set):
+        """
+        Serialized questions for a set, cached per ``QuestionSet.version``.
+        Answers are not included. ``etag`` is a digest of the serialized
+        questions so it changes exactly when the payload does.
+        """
+        def build():
+            questions = [{
+                'id': q.id,
+                'type': q.question_type,
+                'type_display': q.get_question_type_display(),
+                'difficulty': q.difficulty,
+                'difficulty_display': q.get_difficulty_display(),
+                'body': q.body_md,
+                'options': {
+                    'A': q.option_a,
+                    'B': q.option_b,
+                    'C': q.option_c,
+                    'D': q.option_d,
+                } if q.question_type == Question.TYPE_MCQ else {},
+            } for q in question_set.questions.filter(is_published=True).order_by('id')]
+            body = json.dumps(questions, ensure_ascii=False, separators=(',', ':'))
+            return {
+                'set_id': question_set.id,
+                'version': question_set.version,
+                'etag': '"' + hashlib.sha1(body.encode('utf-8')).hexdigest() + '"',
+                'questions': questions,
+                'json': body,
+            }
+
+        return cls.get_or_set_cache(
+            f'quiz_payload_{question_set.id}_v{question_set.version}', build, timeout=86400,
+        )
+
+    @classmethod
+    def bump_question_set_versions(cls, set_ids):
+        """Invalidate cached payloads for the given sets after their questions change."""
+        set_ids = list(set_ids)
+        if not set_ids:
+            return
+        QuestionSet.objects.filter(pk__in=set_ids).update(version=F('version') + 1)
+        for set_id in set_ids:
+            cls.clear_cache(f'question_set_{set_id}')
+            cls.clear_cache(f'published_questions_set_{set_id}')
+
     # ── Attempt / Answer CRUD ─────────────────────────────────────────────────
 
     @classmethod
@@ -64,6 +167,69 @@ class PracticeDataService(BaseService):
     def bulk_create_answers(cls, answers):
         return UserAnswer.objects.bulk_create(answers)
 
+    @classmethod
+    def score_and_save_attempt(cls, user, question_set, question_ids, responses):
+        """
+        Grade a submission and persist it with a constant number of queries:
+        one ``in_bulk`` fetch for the answer keys, then the attempt, all
+        answers and the per-subject rollup in a single transaction.
+
+        `responses` maps question id to the submitted string.
+        """
+        keys = Question.objects.only('id', 'question_type', 'correct_answer').in_bulk(question_ids)
+        auto_graded = (Question.TYPE_MCQ, Question.TYPE_TF, Question.TYPE_FILL)
+
+        score, graded, answers = 0, 0, []
+        for qid in question_ids:
+            q = keys.get(qid)
+            if q is None:
+                continue
+            given = responses.get(qid, '').strip()
+            correct = False
+            if q.question_type in auto_graded:
+                graded += 1
+                # Normalise comparison
+                correct = given.upper() == q.correct_answer.strip().upper()
+            # SHORT/LONG: we don't auto-grade — mark as submitted, show model answer
+            score += correct
+            answers.append(UserAnswer(question_id=qid, given_answer=given, is_correct=correct))
+
+        now = timezone.now()
+        with transaction.atomic():
+            attempt = UserAttempt.objects.create(
+                user=user, question_set=question_set,
+                max_score=len(answers), score=score, finished_at=now,
+            )
+            for answer in answers:
+                answer.attempt = attempt
+            UserAnswer.objects.bulk_create(answers)
+
+            deltas = dict(
+                attempt_count=F('attempt_count') + 1,
+                answered_count=F('answered_count') + len(answers),
+                graded_count=F('graded_count') + graded,
+                correct_count=F('correct_count') + score,
+                last_practiced_at=now,
+            )
+            updated = PracticeSubjectStats.objects.filter(
+                user=user, subject_id=question_set.subject_id,
+            ).update(**deltas)
+            if not updated:
+                try:
+                    with transaction.atomic():
+                        PracticeSubjectStats.objects.create(
+                            user=user, subject_id=question_set.subject_id,
+                            attempt_count=1, answered_count=len(answers), graded_count=graded,
+                            correct_count=score, last_practiced_at=now,
+                        )
+                except IntegrityError:
+                    # A concurrent first submit created the row; apply ours on top
+                    PracticeSubjectStats.objects.filter(
+                        user=user, subject_id=question_set.subject_id,
+                    ).update(**deltas)
+            transaction.on_commit(lambda: cls.clear_user_subject_stats(user.id))
+        return attempt
+
     @classmethod
     def get_user_attempt(cls, user, attempt_id):
         return UserAttempt.objects.filter(pk=attempt_id, user=user).first()
@@ -92,4 +258,126 @@ class PracticeDataService(BaseService):
         if unit:
             cls.clear_cache(f'published_sets_{subject.id}_unit_{unit.id}')
         cls.clear_cache(f'subject_practice_stats_{subject.id}')
+        cls.clear_cache('practice_subject_counts')
         return qset
+
+    # ── Background generation jobs ────────────────────────────────────────────
+
+    @classmethod
+    def create_generation_job(cls, user, subject, unit, question_types, difficulty, count, pooled_question_ids=None):
+        return GenerationJob.objects.create(
+            user=user, subject=subject, unit=unit,
+            question_types=question_types, difficulty=difficulty, requested_count=count,
+            pooled_question_ids=pooled_question_ids or [],
+        )
+
+    @classmethod
+    def get_generation_job(cls, job_id):
+        return GenerationJob.objects.select_related('subject', 'unit').filter(pk=job_id).first()
+
+    @staticmethod
+    def _job_payload(job):
+        return {
+            'job_id': job.id,
+            'user_id': job.user_id,
+            'status': job.status,
+            'generated': len(job.pooled_question_ids) + len(job.questions),
+            'total': job.requested_count,
+            'set_id': job.question_set_id,
+            'error': job.error,
+            # Bodies only — answers stay server-side until the quiz is submitted
+            'questions': [
+                {'type': q.get('question_type'), 'body': q.get('body_md')}
+                for q in job.questions
+            ],
+        }
+
+    @classmethod
+    def save_generation_job(cls, job, fields):
+        """Persist job progress and mirror it into the cache for status polls."""
+        job.save(update_fields=[*fields, 'updated_at'])
+        cache.set(f'practice_job_{job.id}', cls._job_payload(job), 3600)
+
+    @classmethod
+    def get_generation_job_status(cls, user, job_id):
+        """Status payload for the owner, served from cache while the job runs."""
+        def _fetch():
+            job = GenerationJob.objects.filter(pk=job_id).first()
+            return cls._job_payload(job) if job else None
+
+        payload = cls.get_or_set_cache(f'practice_job_{job_id}', _fetch, timeout=3600)
+        if not payload or payload['user_id'] != user.id:
+            return None
+        return payload
+
+    # ── Question pools ────────────────────────────────────────────────────────
+
+    @classmethod
+    def get_or_create_pool(cls, subject, unit, question_types, difficulty):
+        pool, _ = QuestionPool.objects.get_or_create(
+            key=QuestionPool.make_key(subject.id, unit.id if unit else None, question_types, difficulty),
+            defaults={
+                'subject': subject, 'unit': unit,
+                'question_types': sorted(set(question_types)), 'difficulty': difficulty,
+            },
+        )
+        return pool
+
+    @classmethod
+    def sample_pool_questions(cls, pool, user, count):
+        """Up to `count` random published pool questions `user` has not been served."""
+        return list(
+            pool.questions.filter(is_published=True)
+            .exclude(served_to__user=user)
+            .order_by('?')[:count]
+        )
+
+    @classmethod
+    def record_pool_request(cls, pool, hit):
+        """Count a request against the pool's hit rate."""
+        field = 'hit_count' if hit else 'miss_count'
+        QuestionPool.objects.filter(pk=pool.pk).update(
+            **{field: F(field) + 1}, last_requested_at=timezone.now(),
+        )
+
+    @classmethod
+    def mark_questions_served(cls, pool, user, questions):
+        """Remember which pool questions `user` has received so they are not repeated."""
+        ServedQuestion.objects.bulk_create(
+            [ServedQuestion(user=user, question=q) for q in questions],
+            ignore_conflicts=True,
+        )
+        QuestionPool.objects.filter(pk=pool.pk).update(served_count=F('served_count') + len(questions))
+
+    @classmethod
+    def add_questions_to_pool(cls, pool, questions):
+        pool.questions.add(*questions)
+        QuestionPool.objects.filter(pk=pool.pk).update(
+            generated_count=F('generated_count') + len(questions), last_filled_at=timezone.now(),
+        )
+
+    @classmethod
+    def get_pools_to_fill(cls, target_size, active_days):
+        """Pools requested within `active_days` holding fewer than `target_size` questions."""
+        cutoff = timezone.now() - timedelta(days=active_days)
+        return list(
+            QuestionPool.objects.select_related('subject', 'unit')
+            .filter(last_requested_at__gte=cutoff)
+            .annotate(size=Count('questions', filter=Q(questions__is_published=True)))
+            .filter(size__lt=target_size)
+        )
+
+    @classmethod
+    def get_pool_stats(cls):
+        """Totals across all pools: size, hit rate and questions served."""
+        totals = QuestionPool.objects.aggregate(
+            hits=Sum('hit_count'), misses=Sum('miss_count'), served=Sum('served_count'),
+        )
+        hits, misses = totals['hits'] or 0, totals['misses'] or 0
+        return {
+            'pools': QuestionPool.objects.count(),
+            'pooled_questions': QuestionPool.questions.through.objects.count(),
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            'served': totals['served'] or 0,
+            'dedup_records': ServedQuestion.objects.count(),
+        }
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0002_subjectanalytics'),
+        ('practice', '0003_generationjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='pooled_question_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='QuestionPool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('question_types', models.JSONField(default=list)),
+                ('difficulty', models.CharField(choices=[('EASY', 'Easy'), ('MEDIUM', 'Medium'), ('HARD', 'Hard')], default='MEDIUM', max_length=10)),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('miss_count', models.PositiveIntegerField(default=0)),
+                ('served_count', models.PositiveIntegerField(default=0)),
+                ('generated_count', models.PositiveIntegerField(default=0)),
+                ('last_requested_at', models.DateTimeField(blank=True, null=True)),
+                ('last_filled_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('questions', models.ManyToManyField(blank=True, related_name='pools', to='practice.question')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_pools', to='academics.subject')),
+                ('unit', models.ForeignKey(blank=True, help_text='Blank = whole subject', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='question_pools', to='academics.unit')),
+            ],
+            options={
+                'ordering': ['-last_requested_at'],
+                'indexes': [models.Index(fields=['last_requested_at'], name='practice_qu_last_re_dc7ea3_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ServedQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('served_at', models.DateTimeField(auto_now_add=True)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='served_to', to='practice.question')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='served_practice_questions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'question')},
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+AUTO_GRADED_TYPES = ('MCQ', 'TF', 'FILL')
+
+
+def backfill_subject_stats(apps, schema_editor):
+    UserAttempt = apps.get_model('practice', 'UserAttempt')
+    UserAnswer = apps.get_model('practice', 'UserAnswer')
+    PracticeSubjectStats = apps.get_model('practice', 'PracticeSubjectStats')
+
+    stats = {}
+    attempts = (
+        UserAttempt.objects.values('user_id', 'question_set__subject_id')
+        .annotate(attempts=Count('id'), last=Max('started_at'))
+        .order_by()
+    )
+    for row in attempts:
+        stats[(row['user_id'], row['question_set__subject_id'])] = PracticeSubjectStats(
+            user_id=row['user_id'], subject_id=row['question_set__subject_id'],
+            attempt_count=row['attempts'], last_practiced_at=row['last'],
+        )
+    answers = (
+        UserAnswer.objects.values('attempt__user_id', 'attempt__question_set__subject_id')
+        .annotate(
+            answered=Count('id'),
+            graded=Count('id', filter=Q(question__question_type__in=AUTO_GRADED_TYPES)),
+            correct=Count('id', filter=Q(is_correct=True)),
+        )
+        .order_by()
+    )
+    for row in answers:
+        entry = stats.get((row['attempt__user_id'], row['attempt__question_set__subject_id']))
+        if entry:
+            entry.answered_count = row['answered']
+            entry.graded_count = row['graded']
+            entry.correct_count = row['correct']
+    PracticeSubjectStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0002_subjectanalytics'),
+        ('practice', '0004_question_pool'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionset',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.CreateModel(
+            name='PracticeSubjectStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempt_count', models.PositiveIntegerField(default=0)),
+                ('answered_count', models.PositiveIntegerField(default=0)),
+                ('graded_count', models.PositiveIntegerField(default=0)),
+                ('correct_count', models.PositiveIntegerField(default=0)),
+                ('last_practiced_at', models.DateTimeField(blank=True, null=True)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='practice_user_stats', to='academics.subject')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='practice_subject_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'subject')},
+            },
+        ),
+        migrations.RunPython(backfill_subject_stats, migrations.RunPython.noop),
+    ]
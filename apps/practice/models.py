@@ -76,6 +76,8 @@ class QuestionSet(models.Model):
     is_ai_generated = models.BooleanField(default=False)
     is_published    = models.BooleanField(default=True)
     created_at      = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever the set's questions change; keys the cached quiz payload
+    version         = models.PositiveIntegerField(default=1, editable=False)
 
     class Meta:
         ordering = ['-created_at']
@@ -122,3 +124,128 @@ class UserAnswer(models.Model):
 
     def __str__(self):
         return f"{'✓' if self.is_correct else '✗'} {self.question}"
+
+
+class GenerationJob(models.Model):
+    """An AI practice-set generation request processed by a Celery worker."""
+
+    STATUS_PENDING   = 'PENDING'
+    STATUS_RUNNING   = 'RUNNING'
+    STATUS_COMPLETED = 'COMPLETED'
+    STATUS_FAILED    = 'FAILED'
+    STATUSES = [
+        (STATUS_PENDING,   'Pending'),
+        (STATUS_RUNNING,   'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED,    'Failed'),
+    ]
+
+    user    = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='practice_generation_jobs')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='practice_generation_jobs')
+    unit    = models.ForeignKey(Unit, on_delete=models.SET_NULL, null=True, blank=True, related_name='practice_generation_jobs')
+
+    question_types  = models.JSONField(default=list)
+    difficulty      = models.CharField(max_length=10, choices=Question.DIFFICULTIES, default=Question.DIFF_MEDIUM)
+    requested_count = models.PositiveSmallIntegerField(default=10)
+
+    status    = models.CharField(max_length=10, choices=STATUSES, default=STATUS_PENDING)
+    # Generated question dicts, appended batch by batch while the job runs
+    questions = models.JSONField(default=list, blank=True)
+    question_set = models.ForeignKey(QuestionSet, on_delete=models.SET_NULL, null=True, blank=True, related_name='generation_jobs')
+    # Ids of existing pool questions reused for this job (see QuestionPool)
+    pooled_question_ids = models.JSONField(default=list, blank=True)
+    error     = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Job {self.id} — {self.subject.code} ({self.status}, {len(self.questions)}/{self.requested_count})"
+
+
+class QuestionPool(models.Model):
+    """
+    Pregenerated AI questions for one (subject, unit, question types,
+    difficulty) combination. Practice requests are served by sampling
+    questions the user has not seen yet; the model is only called when the
+    pool runs dry or when the off-peak fill job tops it up.
+    """
+
+    key     = models.CharField(max_length=255, unique=True)
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='question_pools')
+    unit    = models.ForeignKey(Unit, on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='question_pools', help_text="Blank = whole subject")
+    question_types = models.JSONField(default=list)
+    difficulty     = models.CharField(max_length=10, choices=Question.DIFFICULTIES, default=Question.DIFF_MEDIUM)
+    questions      = models.ManyToManyField(Question, related_name='pools', blank=True)
+
+    # Serving stats: a hit is a request fully answered from the pool
+    hit_count      = models.PositiveIntegerField(default=0)
+    miss_count     = models.PositiveIntegerField(default=0)
+    served_count   = models.PositiveIntegerField(default=0)
+    generated_count = models.PositiveIntegerField(default=0)
+
+    last_requested_at = models.DateTimeField(null=True, blank=True)
+    last_filled_at    = models.DateTimeField(null=True, blank=True)
+    created_at        = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-last_requested_at']
+        indexes = [models.Index(fields=['last_requested_at'])]
+
+    def __str__(self):
+        unit_str = f"U{self.unit.number}" if self.unit else "All"
+        return f"{self.subject.code} {unit_str} {'+'.join(self.question_types)} {self.difficulty}"
+
+    @staticmethod
+    def make_key(subject_id, unit_id, question_types, difficulty):
+        types = '+'.join(sorted(set(question_types)))
+        return f"{subject_id}:{unit_id or 'all'}:{types}:{difficulty}"
+
+    @property
+    def hit_rate(self):
+        total = self.hit_count + self.miss_count
+        return round(self.hit_count / total, 3) if total else 0.0
+
+
+class ServedQuestion(models.Model):
+    """Per-user record of pool questions already handed out, for dedup."""
+
+    user      = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='served_practice_questions')
+    question  = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='served_to')
+    served_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'question')
+
+    def __str__(self):
+        return f"{self.user_id} ← {self.question_id}"
+
+
+class PracticeSubjectStats(models.Model):
+    """Per-user, per-subject practice totals, updated when a quiz is submitted."""
+
+    user    = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='practice_subject_stats')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='practice_user_stats')
+
+    attempt_count  = models.PositiveIntegerField(default=0)
+    answered_count = models.PositiveIntegerField(default=0)
+    # Auto-graded answers only (MCQ/TF/FILL) — the denominator for accuracy
+    graded_count   = models.PositiveIntegerField(default=0)
+    correct_count  = models.PositiveIntegerField(default=0)
+    last_practiced_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'subject')
+
+    def __str__(self):
+        return f"{self.user_id} — {self.subject.code} ({self.correct_count}/{self.graded_count})"
+
+    @property
+    def accuracy(self):
+        if not self.graded_count:
+            return 0
+        return round((self.correct_count / self.graded_count) * 100)
@@ -1,9 +1,9 @@
-import os
-from typing import List, Optional
+from typing import Iterator, List, Optional
+from django.conf import settings
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from langfuse.langchain import CallbackHandler
+
+from apps.common import llm_gateway
 
 
 # ── Pydantic schemas for structured AI output ────────────────────────────────
@@ -51,14 +51,7 @@ class PracticeQuestionList(BaseModel):
 
 class PracticeAIService:
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gemini/gemini-2.5-flash",
-            openai_api_base="https://bifrost.naravirtual.in/langchain",
-            openai_api_key="dummy-key",
-            default_headers={"Authorization": f"Basic {os.getenv('BIFROST_API_KEY')}"},
-            temperature=0.7,
-        )
-        self.structured_llm = self.llm.with_structured_output(PracticeQuestionList)
+        self.llm = llm_gateway.model("gemini/gemini-2.5-flash", temperature=0.7)
 
     def generate(
         self,
@@ -68,7 +61,8 @@ class PracticeAIService:
         difficulty: str,
         count: int = 10,
         unit_topics: Optional[List[str]] = None,
-        syllabus_context: Optional[str] = None
+        syllabus_context: Optional[str] = None,
+        avoid: Optional[List[str]] = None,
     ) -> List[PracticeQuestionSchema]:
         """
         Generate `count` practice questions using Gemini via Bifrost.
@@ -103,6 +97,11 @@ class PracticeAIService:
             safe_syllabus = syllabus_context.replace('{', '{{').replace('}', '}}')
             user_prompt += f"--- SYLLABUS REFERENCE ---\n{safe_syllabus}\n\n"
 
+        if avoid:
+            # Earlier batches of the same job — keep the new ones distinct
+            safe_avoid = "\n".join(f"- {body[:200]}" for body in avoid).replace('{', '{{').replace('}', '}}')
+            user_prompt += f"--- ALREADY GENERATED (DO NOT REPEAT) ---\n{safe_avoid}\n\n"
+
         user_prompt += (
             f"Mix the requested question types proportionally. "
             f"Make sure MCQ options are plausible distractors. "
@@ -114,13 +113,104 @@ class PracticeAIService:
             ("system", system_prompt),
             ("user", user_prompt),
         ])
-        chain = prompt | self.structured_llm
-        langfuse_handler = CallbackHandler()
-        result: PracticeQuestionList = chain.invoke({}, config={
-            "callbacks": [langfuse_handler],
-            "metadata": {
-                "langfuse_session_id": "practice_generation",
-                "langfuse_tags": ["practice_questions", subject_name, difficulty]
-            }
-        })
+        # Runs at the caller's rate_limit priority: interactive for a waiting
+        # student (generate_practice_set), batch for the nightly pool top-up.
+        # Not cached: asking again should give new questions.
+        result: PracticeQuestionList = self.llm.invoke(
+            prompt.format_messages(),
+            schema=PracticeQuestionList,
+            cache=False,
+            session="practice_generation",
+            tags=["practice_questions", subject_name, difficulty],
+        )
         return result.questions
+
+    def generate_batches(self, count: int, batch_size: int, **kwargs) -> Iterator[List[PracticeQuestionSchema]]:
+        """
+        Yield questions in batches of at most `batch_size` so callers can
+        persist partial progress. Each batch is told what was already produced.
+        """
+        avoid = list(kwargs.pop('avoid', None) or [])
+        remaining = count
+        while remaining > 0:
+            batch = self.generate(count=min(batch_size, remaining), avoid=avoid, **kwargs)
+            if not batch:
+                return
+            batch = batch[:remaining]
+            avoid.extend(q.body_md for q in batch)
+            remaining -= len(batch)
+            yield batch
+
+
+class FakePracticeAIService(PracticeAIService):
+    """
+    Deterministic offline backend (PRACTICE_AI_BACKEND='fake') for tests and
+    local development. Produces well-formed questions without any network call.
+    """
+
+    def __init__(self):
+        pass
+
+    def generate(
+        self,
+        subject_name: str,
+        unit_name: Optional[str],
+        question_types: List[str],
+        difficulty: str,
+        count: int = 10,
+        unit_topics: Optional[List[str]] = None,
+        syllabus_context: Optional[str] = None,
+        avoid: Optional[List[str]] = None,
+    ) -> List[PracticeQuestionSchema]:
+        offset = len(avoid or [])
+        topics = unit_topics or [unit_name or subject_name]
+        types = question_types or ['MCQ']
+        questions = []
+        for i in range(offset, offset + count):
+            q_type = types[i % len(types)]
+            topic = topics[i % len(topics)]
+            body = f"Q{i + 1}. ({q_type}) Explain a key idea of {topic} in {subject_name}."
+            mcq = None
+            answer = 'Model answer.'
+            if q_type == 'MCQ':
+                mcq = MCQOptions(a=f"{topic} A", b=f"{topic} B", c=f"{topic} C", d=f"{topic} D", correct='A')
+                answer = 'A'
+            elif q_type == 'TF':
+                answer = 'True'
+            elif q_type == 'FILL':
+                body = f"Q{i + 1}. {topic} is ___."
+                answer = topic
+            questions.append(PracticeQuestionSchema(
+                question_type=q_type,
+                difficulty=difficulty,
+                body_md=body,
+                mcq_options=mcq,
+                correct_answer=answer,
+                explanation_md=f"Explanation for question {i + 1}.",
+            ))
+        return questions
+
+
+def get_practice_ai_service() -> PracticeAIService:
+    """Backend selected by ``settings.PRACTICE_AI_BACKEND`` ('llm' or 'fake')."""
+    if getattr(settings, 'PRACTICE_AI_BACKEND', 'llm') == 'fake':
+        return FakePracticeAIService()
+    return PracticeAIService()
+
+
+def schema_to_question_data(generated: PracticeQuestionSchema) -> dict:
+    """Flatten a generated question into JSON-safe ``Question`` field values."""
+    data = dict(
+        question_type=generated.question_type,
+        difficulty=generated.difficulty,
+        body_md=generated.body_md,
+        correct_answer=generated.correct_answer,
+        explanation_md=generated.explanation_md,
+    )
+    if generated.question_type == 'MCQ' and generated.mcq_options:
+        data['option_a'] = generated.mcq_options.a
+        data['option_b'] = generated.mcq_options.b
+        data['option_c'] = generated.mcq_options.c
+        data['option_d'] = generated.mcq_options.d
+        data['correct_answer'] = generated.mcq_options.correct.upper()
+    return data
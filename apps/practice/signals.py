@@ -0,0 +1,42 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .data_services import PracticeDataService
+from .models import Question, QuestionSet
+
+
+def _set_ids_for_question(question_id):
+    return list(QuestionSet.questions.through.objects.filter(
+        question_id=question_id,
+    ).values_list('questionset_id', flat=True))
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, **kwargs):
+    """An edited question invalidates the cached payload of every set containing it."""
+    PracticeDataService.bump_question_set_versions(_set_ids_for_question(instance.pk))
+
+
+@receiver(pre_delete, sender=Question)
+def question_deleting(sender, instance, **kwargs):
+    # Membership rows are gone by post_delete, so remember the sets now
+    instance._practice_set_ids = _set_ids_for_question(instance.pk)
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    PracticeDataService.bump_question_set_versions(getattr(instance, '_practice_set_ids', []))
+
+
+@receiver(m2m_changed, sender=QuestionSet.questions.through)
+def question_set_membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # instance is the QuestionSet
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            PracticeDataService.bump_question_set_versions([instance.pk])
+    elif action == 'pre_clear':
+        instance._practice_set_ids = _set_ids_for_question(instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        PracticeDataService.bump_question_set_versions(pk_set or [])
+    elif action == 'post_clear':
+        PracticeDataService.bump_question_set_versions(getattr(instance, '_practice_set_ids', []))
@@ -0,0 +1,146 @@
+import json
+import logging
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+
+from apps.common import rate_limit
+from .models import GenerationJob, Question
+from .data_services import PracticeDataService
+
+logger = logging.getLogger(__name__)
+
+
+def _syllabus_context(subject):
+    from apps.content.data_services import ContentDataService
+
+    syllabus_doc = ContentDataService.get_syllabus_for_subject(subject)
+    if syllabus_doc and syllabus_doc.structured_data:
+        return json.dumps(syllabus_doc.structured_data, indent=2)
+    return None
+
+
+def _generate_batches(subject, unit, question_types, difficulty, count, avoid):
+    """Yield lists of ``Question`` field dicts from the configured AI backend."""
+    from .services import get_practice_ai_service, schema_to_question_data
+
+    batches = get_practice_ai_service().generate_batches(
+        count=count,
+        batch_size=getattr(settings, 'PRACTICE_AI_BATCH_SIZE', 5),
+        subject_name=subject.name,
+        unit_name=unit.name if unit else None,
+        question_types=question_types,
+        difficulty=difficulty,
+        unit_topics=getattr(unit, 'topics', []) if unit else [],
+        syllabus_context=_syllabus_context(subject),
+        avoid=avoid,
+    )
+    for batch in batches:
+        yield [schema_to_question_data(g) for g in batch]
+
+
+@shared_task(bind=True, max_retries=2)
+def generate_practice_set(self, job_id):
+    """
+    Background AI practice-set generation.
+
+    Questions are requested in small batches and appended to
+    ``GenerationJob.questions`` after each one, so status polls see progress
+    and a retry resumes from what was already generated. Pool questions
+    reserved by the view are reused; new questions are added to the pool.
+    """
+    job = PracticeDataService.get_generation_job(job_id)
+    if not job:
+        logger.error(f"Practice generation job {job_id} not found.")
+        return
+    if job.status == GenerationJob.STATUS_COMPLETED:
+        return {"status": "skipped", "reason": "already_completed"}
+
+    job.status = GenerationJob.STATUS_RUNNING
+    job.error = ''
+    PracticeDataService.save_generation_job(job, ['status', 'error'])
+
+    subject, unit = job.subject, job.unit
+    try:
+        pooled = list(Question.objects.filter(id__in=job.pooled_question_ids))
+        remaining = job.requested_count - len(pooled) - len(job.questions)
+        if remaining > 0:
+            batches = _generate_batches(
+                subject, unit, job.question_types, job.difficulty, remaining,
+                avoid=[q.body_md for q in pooled] + [q['body_md'] for q in job.questions],
+            )
+            # A student is waiting on this one: ahead of bulk generation in the shared limiter
+            with rate_limit.priority(rate_limit.INTERACTIVE):
+                for batch in batches:
+                    job.questions.extend(batch)
+                    PracticeDataService.save_generation_job(job, ['questions'])
+
+        if not pooled and not job.questions:
+            raise ValueError("The model returned no questions.")
+
+        # One transaction: a failure here rolls back the saved questions too, so
+        # the retry does not insert them (and add them to the pool) a second time
+        with transaction.atomic():
+            saved_questions = PracticeDataService.bulk_create_questions([
+                dict(q, subject=subject, unit=unit, is_ai_generated=True, is_published=True)
+                for q in job.questions
+            ])
+            pool = PracticeDataService.get_or_create_pool(subject, unit, job.question_types, job.difficulty)
+            PracticeDataService.add_questions_to_pool(pool, saved_questions)
+            PracticeDataService.mark_questions_served(pool, job.user, pooled + saved_questions)
+
+            unit_label = unit.name if unit else "All Units"
+            job.question_set = PracticeDataService.create_question_set(
+                title=f"AI: {subject.name} — {unit_label} ({job.difficulty})",
+                subject=subject,
+                unit=unit,
+                questions=pooled + saved_questions,
+                is_ai=True,
+            )
+            job.status = GenerationJob.STATUS_COMPLETED
+            PracticeDataService.save_generation_job(job, ['question_set', 'status'])
+        return {"status": "success", "set_id": job.question_set_id}
+
+    except Exception as exc:
+        logger.error(f"Practice generation job {job_id} failed: {exc}")
+        job.error = str(exc)
+        if self.request.retries >= self.max_retries:
+            job.status = GenerationJob.STATUS_FAILED
+            PracticeDataService.save_generation_job(job, ['status', 'error'])
+            raise
+        PracticeDataService.save_generation_job(job, ['error'])
+        raise self.retry(exc=exc, countdown=10 * (2 ** self.request.retries))
+
+
+@shared_task
+def fill_question_pools(target_size=None, active_days=None, max_pools=None):
+    """
+    Off-peak top-up of recently requested question pools to `target_size`.
+    Runs from Celery beat; one pool failing does not stop the others.
+    """
+    target_size = target_size or getattr(settings, 'PRACTICE_POOL_TARGET_SIZE', 60)
+    active_days = active_days or getattr(settings, 'PRACTICE_POOL_ACTIVE_DAYS', 14)
+    max_pools = max_pools or getattr(settings, 'PRACTICE_POOL_FILL_MAX_POOLS', 50)
+
+    filled, generated = 0, 0
+    for pool in PracticeDataService.get_pools_to_fill(target_size, active_days)[:max_pools]:
+        try:
+            existing = list(pool.questions.values_list('body_md', flat=True))
+            batches = _generate_batches(
+                pool.subject, pool.unit, pool.question_types, pool.difficulty,
+                target_size - pool.size, avoid=existing,
+            )
+            for batch in batches:
+                saved = PracticeDataService.bulk_create_questions([
+                    dict(q, subject=pool.subject, unit=pool.unit, is_ai_generated=True, is_published=True)
+                    for q in batch
+                ])
+                PracticeDataService.add_questions_to_pool(pool, saved)
+                generated += len(saved)
+            filled += 1
+        except Exception as exc:
+            logger.error(f"Filling question pool {pool.key} failed: {exc}")
+
+    stats = PracticeDataService.get_pool_stats()
+    logger.info(f"Question pools: filled {filled}, generated {generated}, stats {stats}")
+    return {"filled": filled, "generated": generated, **stats}
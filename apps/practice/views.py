@@ -1,15 +1,15 @@
 import json
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.utils import timezone
-from django.views.decorators.http import require_POST
+from django.http import HttpResponse, JsonResponse
+from django.db import transaction
+from django.urls import reverse
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.views.decorators.csrf import csrf_exempt
 
-from .models import Question, UserAnswer
+from .models import Question
 from .data_services import PracticeDataService
 from apps.academics.data_services import AcademicsDataService
-from apps.content.data_services import ContentDataService
 
 
 # ── Index — subject / unit / type picker ──────────────────────────────────────
@@ -24,14 +24,20 @@ def index(request):
     if not subjects:
         subjects = AcademicsDataService.get_all_active_subjects()
 
+    # Batched: one cached blob of counts, one per-user blob of stats, one units lookup
+    counts = PracticeDataService.get_subject_counts()
+    user_stats = PracticeDataService.get_user_subject_stats(user)
+    units_by_subject = AcademicsDataService.get_units_for_subjects(subjects)
+
     subject_data = []
     for subj in subjects:
-        stats = PracticeDataService.get_subject_practice_stats(subj)
+        subj_counts = counts.get(subj.id, {'set_count': 0, 'q_count': 0})
         subject_data.append({
             'subject': subj,
-            'set_count': stats['set_count'],
-            'question_count': stats['q_count'],
-            'units': AcademicsDataService.get_units_for_subject(subj),
+            'set_count': subj_counts['set_count'],
+            'question_count': subj_counts['q_count'],
+            'stats': user_stats.get(subj.id),
+            'units': units_by_subject.get(subj.id, []),
         })
 
     return render(request, 'practice/index.html', {
@@ -67,29 +73,35 @@ def quiz(request, set_id):
     question_set = PracticeDataService.get_question_set_by_id(set_id)
     if not question_set:
         return redirect('practice_index')
-    questions    = PracticeDataService.get_published_questions_for_set(question_set)
-
-    # Serialize question data to JSON for JavaScript rendering
-    questions_json = json.dumps([{
-        'id':   q.id,
-        'type': q.question_type,
-        'body': q.body_md,
-        'options': {
-            'A': q.option_a,
-            'B': q.option_b,
-            'C': q.option_c,
-            'D': q.option_d,
-        } if q.question_type == 'MCQ' else {},
-    } for q in questions])
+    payload = PracticeDataService.get_quiz_payload(question_set)
 
     return render(request, 'practice/quiz.html', {
         'question_set':  question_set,
-        'questions':     questions,
-        'questions_json': questions_json,
-        'question_count': len(questions),
+        'questions':     payload['questions'],
+        'question_count': len(payload['questions']),
     })
 
 
+def _quiz_payload_etag(request, set_id):
+    question_set = PracticeDataService.get_question_set_by_id(set_id)
+    if not question_set:
+        return None
+    return PracticeDataService.get_quiz_payload(question_set)['etag']
+
+
+@login_required
+@require_GET
+@condition(etag_func=_quiz_payload_etag)
+def quiz_payload(request, set_id):
+    """Serialized quiz questions; revalidates with If-None-Match → 304."""
+    question_set = PracticeDataService.get_question_set_by_id(set_id)
+    if not question_set:
+        return JsonResponse({'success': False, 'error': 'Quiz not found'}, status=404)
+    payload = PracticeDataService.get_quiz_payload(question_set)
+    response = HttpResponse(payload['json'], content_type='application/json')
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 
 # ── Submit quiz ───────────────────────────────────────────────────────────────
 @login_required
@@ -98,40 +110,14 @@ def submit_quiz(request, set_id):
     question_set = PracticeDataService.get_question_set_by_id(set_id)
     if not question_set:
         return redirect('practice_index')
-    questions    = PracticeDataService.get_published_questions_for_set(question_set)
+    payload = PracticeDataService.get_quiz_payload(question_set)
 
-    attempt = PracticeDataService.create_attempt(
-        request.user, question_set, len(questions),
+    question_ids = [q['id'] for q in payload['questions']]
+    responses = {qid: request.POST.get(f'q_{qid}', '') for qid in question_ids}
+    attempt = PracticeDataService.score_and_save_attempt(
+        request.user, question_set, question_ids, responses,
     )
 
-    score = 0
-    answers_to_create = []
-    for q in questions:
-        given = request.POST.get(f'q_{q.id}', '').strip()
-        correct = False
-
-        if q.question_type in (Question.TYPE_MCQ, Question.TYPE_TF, Question.TYPE_FILL):
-            # Normalise comparison
-            correct = given.strip().upper() == q.correct_answer.strip().upper()
-        # SHORT/LONG: we don't auto-grade — mark as submitted, show model answer
-        # correct stays False; instructor can override in admin
-
-        if correct:
-            score += 1
-
-        answers_to_create.append(UserAnswer(
-            attempt=attempt,
-            question=q,
-            given_answer=given,
-            is_correct=correct,
-        ))
-
-    PracticeDataService.bulk_create_answers(answers_to_create)
-
-    attempt.score      = score
-    attempt.finished_at = timezone.now()
-    attempt.save()
-
     return redirect('practice_result', attempt_id=attempt.id)
 
 
@@ -159,6 +145,10 @@ def result(request, attempt_id):
 @login_required
 @require_POST
 def ai_generate(request):
+    """
+    Serve a set from the question pool, or queue a background generation
+    job for the shortfall and return its id immediately.
+    """
     try:
         data = json.loads(request.body)
         subject_id = data.get('subject_id')
@@ -174,62 +164,44 @@ def ai_generate(request):
         if unit_id:
             unit = AcademicsDataService.get_unit_by_id(unit_id, subject)
 
-        from .services import PracticeAIService
-        service = PracticeAIService()
-        
-        # Prepare syllabus context for richer generation
-        unit_topics = getattr(unit, 'topics', []) if unit else []
-        syllabus_doc = ContentDataService.get_syllabus_for_subject(subject)
-        
-        syllabus_context = None
-        if syllabus_doc and syllabus_doc.structured_data:
-            syllabus_context = json.dumps(syllabus_doc.structured_data, indent=2)
-
-        generated = service.generate(
-            subject_name=subject.name,
-            unit_name=unit.name if unit else None,
-            question_types=types,
-            difficulty=difficulty,
-            count=count,
-            unit_topics=unit_topics,
-            syllabus_context=syllabus_context
-        )
-
-        # Save to DB
-        questions_data = []
-        for g in generated:
-            q_data = dict(
-                subject=subject,
-                unit=unit,
-                question_type=g.question_type,
-                difficulty=g.difficulty,
-                body_md=g.body_md,
-                correct_answer=g.correct_answer,
-                explanation_md=g.explanation_md,
-                is_ai_generated=True,
-                is_published=True,
+        # Serve from the pregenerated pool when it has enough unseen questions
+        pool = PracticeDataService.get_or_create_pool(subject, unit, types, difficulty)
+        pooled = PracticeDataService.sample_pool_questions(pool, request.user, count)
+        if len(pooled) >= count:
+            PracticeDataService.record_pool_request(pool, hit=True)
+            PracticeDataService.mark_questions_served(pool, request.user, pooled)
+            unit_label = unit.name if unit else "All Units"
+            qset = PracticeDataService.create_question_set(
+                title=f"AI: {subject.name} — {unit_label} ({difficulty})",
+                subject=subject, unit=unit, questions=pooled, is_ai=True,
             )
-            if g.question_type == Question.TYPE_MCQ and g.mcq_options:
-                q_data['option_a'] = g.mcq_options.a
-                q_data['option_b'] = g.mcq_options.b
-                q_data['option_c'] = g.mcq_options.c
-                q_data['option_d'] = g.mcq_options.d
-                q_data['correct_answer'] = g.mcq_options.correct.upper()
-            questions_data.append(q_data)
-
-        saved_questions = PracticeDataService.bulk_create_questions(questions_data)
-
-        # Create QuestionSet
-        unit_label = unit.name if unit else "All Units"
-        qset = PracticeDataService.create_question_set(
-            title=f"AI: {subject.name} — {unit_label} ({difficulty})",
-            subject=subject,
-            unit=unit,
-            questions=saved_questions,
-            is_ai=True,
+            return JsonResponse({'success': True, 'set_id': qset.id})
+
+        PracticeDataService.record_pool_request(pool, hit=False)
+        job = PracticeDataService.create_generation_job(
+            request.user, subject, unit, types, difficulty, count,
+            pooled_question_ids=[q.id for q in pooled],
         )
 
-        return JsonResponse({'success': True, 'set_id': qset.id})
+        from .tasks import generate_practice_set
+        transaction.on_commit(lambda: generate_practice_set.delay(job.id))
+
+        return JsonResponse({
+            'success': True,
+            'job_id': job.id,
+            'status_url': reverse('practice_ai_job_status', args=[job.id]),
+        }, status=202)
 
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@login_required
+@require_GET
+def ai_job_status(request, job_id):
+    """Progress of a generation job: status, partial question list and set id."""
+    payload = PracticeDataService.get_generation_job_status(request.user, job_id)
+    if not payload:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+    payload = {k: v for k, v in payload.items() if k != 'user_id'}
+    return JsonResponse({'success': True, **payload})
@@ -1,24 +1,34 @@
 from django.contrib import admin
-from .models import Note, NoteVersion, BaseNote
+from .models import Note, NoteImage, NoteVersion, BaseNote
 
 
 @admin.register(Note)
 class NoteAdmin(admin.ModelAdmin):
-    list_display = ('user', 'subject', 'unit', 'updated_at')
+    list_display = ('user', 'subject', 'unit', 'base_note', 'updated_at')
     list_filter = ('subject__branch', 'subject__semester')
     search_fields = ('user__username', 'subject__code', 'unit__name')
     readonly_fields = ('created_at', 'updated_at')
-    raw_id_fields = ('user', 'subject', 'unit')
+    raw_id_fields = ('user', 'subject', 'unit', 'base_note')
 
 
 @admin.register(NoteVersion)
 class NoteVersionAdmin(admin.ModelAdmin):
-    list_display = ('note', 'created_at')
+    list_display = ('note', 'created_at', 'raw_size', 'stored_size')
     list_filter = ('created_at',)
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'manifest_digest', 'raw_size', 'stored_size')
+    exclude = ('manifest',)
     raw_id_fields = ('note',)
 
 
+@admin.register(NoteImage)
+class NoteImageAdmin(admin.ModelAdmin):
+    list_display = ('path', 'user', 'status', 'raw_bytes', 'created_at', 'processed_at')
+    list_filter = ('status',)
+    search_fields = ('path', 'user__username')
+    raw_id_fields = ('user',)
+    readonly_fields = ('variants', 'created_at', 'processed_at')
+
+
 @admin.register(BaseNote)
 class BaseNoteAdmin(admin.ModelAdmin):
     list_display = ('subject', 'unit', 'title', 'is_published', 'updated_at')
@@ -5,3 +5,6 @@ class StudentNotesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.student_notes'
     verbose_name = 'Student Notes'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -1,13 +1,26 @@
-from django.db.models import Count
-from django.db import connection, IntegrityError
+from datetime import timedelta
+import hashlib
+import json
+import zlib
+
+from django.db.models import Count, F
+from django.db import connection, IntegrityError, transaction
+from django.utils import timezone
 import logging
 
 from apps.common.services import BaseService
-from .models import BaseNote, Note, NoteVersion
+from .forks import compute_overlay, materialize, overlay_digest
+from . import search
+from .models import BaseNote, Note, NoteBlockObject, NoteImage, NoteSearchEntry, NoteVersion
 
 _logger = logging.getLogger(__name__)
 
 
+def _canonical(value):
+    """Stable JSON bytes used both as block content and as its hash input."""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
 class NotesDataService(BaseService):
     """Service layer for student notes data retrieval."""
 
@@ -43,6 +56,151 @@ class NotesDataService(BaseService):
             user=user, subject=subject, unit=unit,
         )
 
+    @classmethod
+    def get_note_blocks(cls, note):
+        """
+        The note's block document. Forks are materialized from their base
+        note plus overlay and cached per (base revision, overlay digest), so
+        every untouched fork of a base note shares one cache entry.
+        """
+        if not note.base_note_id:
+            return note.blocks if isinstance(note.blocks, dict) else {'blocks': []}
+        base = cls.get_base_note_doc(note.base_note_id)
+        if base is None:
+            return note.blocks if isinstance(note.blocks, dict) else {'blocks': []}
+        return cls.get_or_set_cache(
+            f"note_fork_{note.base_note_id}_r{base['revision']}_{overlay_digest(note.overlay)}",
+            lambda: materialize(base['blocks'], note.overlay),
+            timeout=3600,
+        )
+
+    @classmethod
+    def save_note_blocks(cls, note, blocks, base_revision=None):
+        """
+        Write `blocks` and bump the revision. With `base_revision` the write
+        only succeeds if nobody else saved since (optimistic concurrency);
+        returns False on a stale revision and leaves `note` untouched.
+        Forks store only the blocks that differ from their base note.
+        """
+        now = timezone.now()
+        qs = Note.objects.filter(pk=note.pk)
+        if base_revision is not None:
+            qs = qs.filter(revision=base_revision)
+
+        base = cls.get_base_note_doc(note.base_note_id) if note.base_note_id else None
+        if base is not None:
+            overlay = compute_overlay(base['blocks'], blocks)
+            updated = qs.update(overlay=overlay, revision=F('revision') + 1, updated_at=now)
+            if updated:
+                note.overlay = overlay
+        else:
+            updated = qs.update(blocks=blocks, revision=F('revision') + 1, updated_at=now)
+            if updated:
+                note.blocks = blocks
+        if not updated:
+            return False
+        note.updated_at = now
+        note.revision = (
+            base_revision + 1 if base_revision is not None
+            else Note.objects.values_list('revision', flat=True).get(pk=note.pk)
+        )
+        cls.index_note_search(note, blocks)
+        return True
+
+    @classmethod
+    def fork_base_note(cls, note, base):
+        """Point `note` at `base` with an empty overlay — no blocks are copied."""
+        now = timezone.now()
+        Note.objects.filter(pk=note.pk).update(
+            base_note=base, base_revision=base.revision, overlay={},
+            blocks={'blocks': []}, revision=F('revision') + 1, updated_at=now,
+        )
+        note.refresh_from_db(fields=['base_note', 'base_revision', 'overlay', 'blocks', 'revision', 'updated_at'])
+        cls.index_note_search(note, base.blocks)
+        return note
+
+    @classmethod
+    def detach_forks(cls, base):
+        """Materialize every fork of `base` into a standalone note (before deletion)."""
+        base_doc = base.blocks if isinstance(base.blocks, dict) else {'blocks': []}
+        for note in Note.objects.filter(base_note=base).iterator():
+            Note.objects.filter(pk=note.pk).update(
+                blocks=materialize(base_doc, note.overlay), overlay={},
+                base_note=None, revision=F('revision') + 1,
+            )
+
+    # ── Search ────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def index_note_search(cls, note, doc=None):
+        """Refresh the note's search text; one UPDATE on the hot path, INSERT the first time."""
+        body = search.extract_text(doc if doc is not None else cls.get_note_blocks(note))
+        now = timezone.now()
+        updated = NoteSearchEntry.objects.filter(note_id=note.pk).update(body=body, updated_at=now)
+        if not updated:
+            NoteSearchEntry.objects.update_or_create(
+                note_id=note.pk,
+                defaults={'user_id': note.user_id, 'title': search.note_title(note), 'body': body},
+            )
+
+    @classmethod
+    def reindex_note_search(cls, notes):
+        """Rebuild entries (title included) for `notes`; returns how many were written."""
+        count = 0
+        for note in notes:
+            NoteSearchEntry.objects.update_or_create(
+                note_id=note.pk,
+                defaults={
+                    'user_id': note.user_id,
+                    'title': search.note_title(note),
+                    'body': search.extract_text(cls.get_note_blocks(note)),
+                },
+            )
+            count += 1
+        return count
+
+    @classmethod
+    def search_notes(cls, user, query, limit=20):
+        """Ranked hits across the user's notes, each with subject/unit ids for linking."""
+        hits = search.search(user.id, query, limit)
+        if hits:
+            placement = {
+                row['id']: row
+                for row in Note.objects.filter(pk__in=[h['note_id'] for h in hits])
+                .values('id', 'subject_id', 'unit_id')
+            }
+            for hit in hits:
+                row = placement.get(hit['note_id'], {})
+                hit['subject_id'] = row.get('subject_id')
+                hit['unit_id'] = row.get('unit_id')
+        return hits
+
+    # ── Images ────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def create_note_image(cls, user, path, raw_bytes):
+        return NoteImage.objects.create(user=user, path=path, raw_bytes=raw_bytes)
+
+    @classmethod
+    def get_note_image_info(cls, path):
+        """
+        ``{'status', 'variants'}`` for a raw upload path. Images uploaded
+        before the pipeline existed have no row and report status ``None``.
+        """
+        def fetch():
+            row = NoteImage.objects.filter(path=path).values('status', 'variants').first()
+            return row or {'status': None, 'variants': {}}
+
+        return cls.get_or_set_cache(f'note_image_info_{path}', fetch, timeout=3600)
+
+    @classmethod
+    def mark_note_image_ready(cls, image, variants):
+        image.variants = variants
+        image.status = NoteImage.STATUS_READY
+        image.processed_at = timezone.now()
+        image.save(update_fields=['variants', 'status', 'processed_at'])
+        cls.clear_cache(f'note_image_info_{image.path}')
+
     # ── Base notes ────────────────────────────────────────────────────────────
 
     @classmethod
@@ -63,6 +221,21 @@ class NotesDataService(BaseService):
             timeout=3600,
         )
 
+    @classmethod
+    def get_base_note_doc(cls, base_note_id):
+        """``{'revision', 'blocks'}`` of a base note, published or not, cached until it is saved."""
+        return cls.get_or_set_cache(
+            f'base_note_doc_{base_note_id}',
+            lambda: BaseNote.objects.filter(pk=base_note_id).values('revision', 'blocks').first(),
+            timeout=3600,
+        )
+
+    @classmethod
+    def clear_base_note_cache(cls, base):
+        cls.clear_cache(f'base_note_doc_{base.id}')
+        cls.clear_cache(f'base_notes_subject_{base.subject_id}')
+        cls.clear_cache(f'base_note_{base.subject_id}_{base.unit_id}')
+
     @classmethod
     def get_base_note_by_id(cls, base_note_id):
         return BaseNote.objects.filter(pk=base_note_id, is_published=True).first()
@@ -87,10 +260,72 @@ class NotesDataService(BaseService):
                 """
             )
 
+    @staticmethod
+    def _lock_versions(note):
+        """
+        Row-lock `note` for the rest of the transaction. Writing a version
+        and compacting the history both take it, so compaction cannot delete
+        a block object that a version being written has just deduped against.
+        """
+        list(Note.objects.select_for_update().filter(pk=note.pk).values_list('pk', flat=True))
+
+    @classmethod
+    def _store_version(cls, note, doc, dedupe=True):
+        """
+        Write `doc` as a manifest plus any block objects the note does not
+        already hold. Returns the new version, or (with `dedupe`) the latest
+        one when the document is identical to it.
+        """
+        with transaction.atomic():
+            cls._lock_versions(note)
+            return cls._write_version(note, doc, dedupe)
+
+    @classmethod
+    def _write_version(cls, note, doc, dedupe):
+        doc = doc if isinstance(doc, dict) else {'blocks': []}
+        blocks = doc.get('blocks') or []
+        encoded = {}
+        digests = []
+        for block in blocks:
+            raw = _canonical(block)
+            digest = hashlib.sha256(raw).hexdigest()
+            digests.append(digest)
+            encoded.setdefault(digest, raw)
+
+        manifest_raw = _canonical({
+            'meta': {k: v for k, v in doc.items() if k != 'blocks'},
+            'blocks': digests,
+        })
+        manifest_digest = hashlib.sha256(manifest_raw).hexdigest()
+
+        if dedupe:
+            latest = NoteVersion.objects.filter(note=note).only('id', 'manifest_digest', 'created_at').first()
+            if latest and latest.manifest_digest == manifest_digest:
+                return latest
+
+        existing = set(
+            NoteBlockObject.objects.filter(note=note, digest__in=list(encoded))
+            .values_list('digest', flat=True)
+        )
+        new_objects = [
+            NoteBlockObject(note=note, digest=digest, data=zlib.compress(raw, 6))
+            for digest, raw in encoded.items() if digest not in existing
+        ]
+        NoteBlockObject.objects.bulk_create(new_objects, ignore_conflicts=True)
+
+        manifest = zlib.compress(manifest_raw, 6)
+        return NoteVersion.objects.create(
+            note=note,
+            manifest=manifest,
+            manifest_digest=manifest_digest,
+            raw_size=len(json.dumps(doc, ensure_ascii=False).encode('utf-8')),
+            stored_size=len(manifest) + sum(len(o.data) for o in new_objects),
+        )
+
     @classmethod
     def create_version_snapshot(cls, note):
         try:
-            return NoteVersion.objects.create(note=note, blocks=note.blocks)
+            return cls._store_version(note, cls.get_note_blocks(note))
         except IntegrityError as exc:
             _logger.warning(
                 "NoteVersion create failed with IntegrityError; resetting sequence and retrying (%s)",
@@ -101,21 +336,90 @@ class NotesDataService(BaseService):
             except Exception:
                 _logger.exception("Failed to reset NoteVersion sequence")
                 raise
-            return NoteVersion.objects.create(note=note, blocks=note.blocks)
+            return cls._store_version(note, cls.get_note_blocks(note))
 
     @classmethod
-    def prune_versions(cls, note, keep=50):
-        old_ids = list(
-            NoteVersion.objects.filter(note=note)
-            .order_by('-created_at')
-            .values_list('id', flat=True)[keep:]
+    def get_version_blocks(cls, version):
+        """Reconstruct the full blocks document stored by `version`."""
+        if version.manifest is None:
+            return version.blocks
+        manifest = json.loads(zlib.decompress(bytes(version.manifest)))
+        objects = dict(
+            NoteBlockObject.objects.filter(note_id=version.note_id, digest__in=set(manifest['blocks']))
+            .values_list('digest', 'data')
         )
-        if old_ids:
-            NoteVersion.objects.filter(id__in=old_ids).delete()
+        missing = set(manifest['blocks']) - objects.keys()
+        if missing:
+            raise ValueError(f"Version {version.id} references missing blocks: {sorted(missing)[:3]}")
+        decoded = {d: json.loads(zlib.decompress(bytes(data))) for d, data in objects.items()}
+        return {**manifest['meta'], 'blocks': [decoded[d] for d in manifest['blocks']]}
+
+    # ── Compaction ────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _decay_bucket(created_at, now):
+        """
+        Retention bucket for a version of this age: every version in the
+        first day, hourly to a week, daily to a month, weekly after that.
+        Only the newest version in each bucket survives compaction.
+        """
+        age = now - created_at
+        if age < timedelta(days=1):
+            return ('all', created_at)
+        if age < timedelta(days=7):
+            return ('hour', created_at.replace(minute=0, second=0, microsecond=0))
+        if age < timedelta(days=30):
+            return ('day', created_at.date())
+        return ('week', tuple(created_at.isocalendar())[:2])
+
+    @classmethod
+    def compact_versions(cls, note, max_versions=50, now=None):
+        """
+        Thin a note's history on the time-decay schedule, convert legacy
+        full-copy rows to manifests, and drop block objects no surviving
+        version references. Returns ``(versions_deleted, objects_deleted)``.
+        """
+        now = now or timezone.now()
+
+        with transaction.atomic():
+            cls._lock_versions(note)
+            for legacy in NoteVersion.objects.filter(note=note, manifest__isnull=True).order_by('created_at'):
+                converted = cls._write_version(note, legacy.blocks, dedupe=False)
+                NoteVersion.objects.filter(pk=converted.pk).update(created_at=legacy.created_at)
+                legacy.delete()
+
+            versions = list(
+                NoteVersion.objects.filter(note=note).order_by('-created_at').values_list('id', 'created_at')
+            )
+            keep, seen = [], set()
+            for version_id, created_at in versions:
+                bucket = cls._decay_bucket(created_at, now)
+                if bucket in seen:
+                    continue
+                seen.add(bucket)
+                keep.append(version_id)
+            keep = set(keep[:max_versions])
+            drop = [version_id for version_id, _ in versions if version_id not in keep]
+            if drop:
+                NoteVersion.objects.filter(id__in=drop).delete()
+
+            referenced = set()
+            for manifest in NoteVersion.objects.filter(note=note).values_list('manifest', flat=True):
+                referenced.update(json.loads(zlib.decompress(bytes(manifest)))['blocks'])
+            orphan_ids = [
+                obj_id for obj_id, digest in
+                NoteBlockObject.objects.filter(note=note).values_list('id', 'digest')
+                if digest not in referenced
+            ]
+            if orphan_ids:
+                NoteBlockObject.objects.filter(id__in=orphan_ids).delete()
+            return len(drop), len(orphan_ids)
 
     @classmethod
     def get_version_history(cls, note, limit=20):
-        return list(NoteVersion.objects.filter(note=note).order_by('-created_at')[:limit])
+        return list(
+            NoteVersion.objects.filter(note=note).only('id', 'created_at').order_by('-created_at')[:limit]
+        )
 
     @classmethod
     def get_version_by_id(cls, user, version_id):
@@ -0,0 +1,81 @@
+"""
+Copy-on-write forks of base notes.
+
+A forked note stores only an overlay against its base note:
+
+    {"blocks": {block_id: block, ...},  # edited or added blocks
+     "deleted": [block_id, ...],        # base blocks the student removed
+     "order": [block_id, ...] | null}   # set only when the order differs
+
+Reading materializes base + overlay. Blocks the curator adds to the base
+later appear after their preceding base block; curator edits reach every
+block the student has not edited.
+"""
+
+import hashlib
+import json
+
+
+def overlay_digest(overlay):
+    raw = json.dumps(overlay or {}, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _default_order(base_ids, overlay_blocks, deleted):
+    order = [block_id for block_id in base_ids if block_id not in deleted]
+    base_set = set(base_ids)
+    order.extend(block_id for block_id in overlay_blocks if block_id not in base_set)
+    return order
+
+
+def materialize(base_doc, overlay):
+    """Full ``{'blocks': [...]}`` document for a fork."""
+    base_blocks = (base_doc or {}).get('blocks') or []
+    overlay = overlay or {}
+    edited = overlay.get('blocks') or {}
+    deleted = set(overlay.get('deleted') or [])
+    base_by_id = {b['id']: b for b in base_blocks if isinstance(b, dict) and b.get('id')}
+    base_ids = list(base_by_id)
+
+    order = overlay.get('order')
+    if order is None:
+        order = _default_order(base_ids, edited, deleted)
+    else:
+        # Base blocks added after the order was recorded follow their predecessor
+        placed = set(order)
+        order = list(order)
+        for i, block_id in enumerate(base_ids):
+            if block_id in placed or block_id in deleted:
+                continue
+            prev = next((base_ids[j] for j in range(i - 1, -1, -1) if base_ids[j] in placed), None)
+            order.insert(order.index(prev) + 1 if prev else 0, block_id)
+            placed.add(block_id)
+
+    blocks = []
+    for block_id in order:
+        block = edited.get(block_id) or (base_by_id.get(block_id) if block_id not in deleted else None)
+        if block is not None:
+            blocks.append(block)
+    return {**{k: v for k, v in (base_doc or {}).items() if k != 'blocks'}, 'blocks': blocks}
+
+
+def compute_overlay(base_doc, doc):
+    """Smallest overlay that materializes `doc` on top of `base_doc`."""
+    base_by_id = {
+        b['id']: b for b in (base_doc or {}).get('blocks') or []
+        if isinstance(b, dict) and b.get('id')
+    }
+    blocks = doc.get('blocks') or []
+    ids = [b['id'] for b in blocks]
+    present = set(ids)
+
+    edited = {b['id']: b for b in blocks if base_by_id.get(b['id']) != b}
+    deleted = [block_id for block_id in base_by_id if block_id not in present]
+    overlay = {}
+    if edited:
+        overlay['blocks'] = edited
+    if deleted:
+        overlay['deleted'] = deleted
+    if ids != _default_order(list(base_by_id), edited, set(deleted)):
+        overlay['order'] = ids
+    return overlay
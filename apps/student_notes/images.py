@@ -0,0 +1,79 @@
+"""
+Responsive variants for note images.
+
+Each variant is bounded by a maximum width and re-encoded to WebP without
+EXIF/ICC metadata. Photos are encoded lossy; images with transparency or a
+small palette (diagrams, screenshots) keep a lossless ``full`` variant so
+text stays crisp.
+"""
+
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+DEFAULT_VARIANTS = {
+    'thumb': {'max_width': 320, 'quality': 70},
+    'reader': {'max_width': 960, 'quality': 80},
+    'full': {'max_width': 1920, 'quality': 90},
+}
+
+# Refuse to decode anything larger than this many pixels (decompression bombs)
+MAX_PIXELS = 40_000_000
+
+
+def variant_specs():
+    return getattr(settings, 'NOTE_IMAGE_VARIANTS', DEFAULT_VARIANTS)
+
+
+def _is_graphic(img):
+    if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info:
+        return True
+    if img.mode == 'P':
+        return True
+    colors = img.convert('RGB').getcolors(maxcolors=256)
+    return colors is not None
+
+
+def build_variants(source_bytes):
+    """
+    Return ``{name: (webp_bytes, width, height)}``. Variants that would not
+    be smaller than the source width collapse into one, so a 600px image
+    yields thumb plus a single 600px variant reused for reader and full.
+    """
+    with Image.open(BytesIO(source_bytes)) as img:
+        if img.width * img.height > MAX_PIXELS:
+            raise ValueError("Image dimensions too large.")
+        img = ImageOps.exif_transpose(img)
+        graphic = _is_graphic(img)
+        img = img.convert('RGBA') if img.mode in ('RGBA', 'LA', 'P', 'PA') else img.convert('RGB')
+
+        variants = {}
+        encoded_by_width = {}
+        for name, spec in sorted(variant_specs().items(), key=lambda kv: kv[1]['max_width']):
+            width = min(img.width, spec['max_width'])
+            if width in encoded_by_width:
+                variants[name] = encoded_by_width[width]
+                continue
+            height = max(1, round(img.height * width / img.width))
+            resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+
+            out = BytesIO()
+            if graphic and name == 'full':
+                resized.save(out, format='WEBP', lossless=True, method=4)
+            else:
+                resized.save(out, format='WEBP', quality=spec['quality'], method=4)
+            encoded_by_width[width] = variants[name] = (out.getvalue(), width, height)
+        return variants
+
+
+def pick_variant(variants, width_hint):
+    """Smallest variant at least `width_hint` wide; the widest one otherwise."""
+    if not variants:
+        return None
+    ordered = sorted(variants.values(), key=lambda v: v['width'])
+    if width_hint:
+        for variant in ordered:
+            if variant['width'] >= width_hint:
+                return variant
+    return ordered[-1]
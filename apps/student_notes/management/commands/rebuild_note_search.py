@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from apps.student_notes.data_services import NotesDataService
+from apps.student_notes.models import Note
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the note full-text search entries from the current note blocks. '
+        'Saves keep the index up to date; run this once after migrating and after bulk imports.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, default=None, help='Only rebuild notes of this user id')
+        parser.add_argument('--batch-size', type=int, default=500, help='Notes fetched per query')
+
+    def handle(self, *args, **options):
+        notes = Note.objects.select_related('subject', 'unit').order_by('pk')
+        if options['user']:
+            notes = notes.filter(user_id=options['user'])
+
+        count = NotesDataService.reindex_note_search(notes.iterator(chunk_size=options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} notes."))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_notes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='revision',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
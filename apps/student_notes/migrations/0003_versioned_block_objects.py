@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_notes', '0002_note_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='noteversion',
+            name='manifest',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='noteversion',
+            name='manifest_digest',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='noteversion',
+            name='raw_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='noteversion',
+            name='stored_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='noteversion',
+            name='blocks',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='NoteBlockObject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64)),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='block_objects', to='student_notes.note')),
+            ],
+            options={
+                'unique_together': {('note', 'digest')},
+            },
+        ),
+    ]
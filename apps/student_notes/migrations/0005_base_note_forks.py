@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_notes', '0004_note_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='basenote',
+            name='revision',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='base_note',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='forks', to='student_notes.basenote'),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='base_revision',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='overlay',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
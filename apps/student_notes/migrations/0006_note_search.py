@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+FTS_TABLE = 'student_notes_search_fts'
+ENTRY_TABLE = 'student_notes_notesearchentry'
+
+SQLITE_FORWARD = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, body, content='{ENTRY_TABLE}', content_rowid='note_id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {ENTRY_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.note_id, new.title, new.body);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {ENTRY_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ('delete', old.note_id, old.title, old.body);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF title, body ON {ENTRY_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ('delete', old.note_id, old.title, old.body);
+        INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.note_id, new.title, new.body);
+    END""",
+]
+SQLITE_REVERSE = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRES_FORWARD = [
+    f"""ALTER TABLE {ENTRY_TABLE} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(body, '')), 'B')
+    ) STORED""",
+    f"CREATE INDEX {ENTRY_TABLE}_search_gin ON {ENTRY_TABLE} USING GIN (search_vector)",
+]
+POSTGRES_REVERSE = [
+    f"DROP INDEX IF EXISTS {ENTRY_TABLE}_search_gin",
+    f"ALTER TABLE {ENTRY_TABLE} DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FORWARD)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_FORWARD)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_REVERSE)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_REVERSE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_notes', '0005_base_note_forks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteSearchEntry',
+            fields=[
+                ('note', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to='student_notes.note')),
+                ('title', models.CharField(max_length=1200)),
+                ('body', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='note_search_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
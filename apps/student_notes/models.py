@@ -41,6 +41,21 @@ class Note(models.Model):
         default=default_blocks,
         help_text="Structured JSON block document",
     )
+    # Incremented on every write; autosave patches must name the revision they are based on
+    revision = models.PositiveIntegerField(default=0, editable=False)
+
+    # Copy-on-write fork of a base note: ``blocks`` is unused and the document
+    # is the base note's current blocks with ``overlay`` applied on top
+    # (see forks.py). ``base_revision`` is the base revision at fork time.
+    base_note = models.ForeignKey(
+        'BaseNote',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='forks',
+    )
+    base_revision = models.PositiveIntegerField(null=True, blank=True)
+    overlay = models.JSONField(default=dict, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -54,10 +69,23 @@ class Note(models.Model):
 
 
 class NoteVersion(models.Model):
-    """Snapshot of a note's blocks at a point in time."""
+    """
+    Snapshot of a note's blocks at a point in time.
+
+    New versions store a zlib-compressed manifest (block digests plus any
+    top-level keys other than ``blocks``); the blocks themselves live in
+    ``NoteBlockObject`` and are shared by every version that contains them.
+    Legacy rows keep the full document in ``blocks`` until compaction
+    converts them.
+    """
 
     note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name='versions')
-    blocks = models.JSONField()
+    blocks = models.JSONField(null=True, blank=True)
+    manifest = models.BinaryField(null=True, blank=True)
+    manifest_digest = models.CharField(max_length=64, blank=True, db_index=True)
+    # Size of the full JSON document vs bytes this version added to storage
+    raw_size = models.PositiveIntegerField(default=0)
+    stored_size = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -67,6 +95,78 @@ class NoteVersion(models.Model):
         return f"v{self.id} — {self.note}"
 
 
+class NoteBlockObject(models.Model):
+    """A single block, zlib-compressed and addressed by the SHA-256 of its canonical JSON."""
+
+    note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name='block_objects')
+    digest = models.CharField(max_length=64)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('note', 'digest')
+
+    def __str__(self):
+        return f"{self.digest[:12]} — note {self.note_id}"
+
+
+class NoteImage(models.Model):
+    """
+    An uploaded note image. The raw upload is stored at ``path`` and served
+    until a background task has written the resized ``variants``.
+    """
+
+    STATUS_PENDING = 'PENDING'
+    STATUS_READY = 'READY'
+    STATUS_FAILED = 'FAILED'
+    STATUSES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_READY, 'Ready'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='note_images')
+    path = models.CharField(max_length=255, unique=True, help_text="Storage path of the raw upload")
+    status = models.CharField(max_length=10, choices=STATUSES, default=STATUS_PENDING)
+    # {name: {"path", "width", "height", "bytes"}} for thumb / reader / full
+    variants = models.JSONField(default=dict, blank=True)
+    raw_bytes = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.path} ({self.status})"
+
+
+class NoteSearchEntry(models.Model):
+    """
+    Plain text extracted from a note's blocks, kept in step on every save.
+
+    The full-text index lives beside this table and is created per database
+    in migrations: an FTS5 external-content table (synced by triggers) on
+    SQLite, a generated ``tsvector`` column with a GIN index on Postgres.
+    See search.py for the queries.
+    """
+
+    note = models.OneToOneField(
+        Note,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_entry',
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='note_search_entries',
+    )
+    title = models.CharField(max_length=1200)
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Search entry — {self.note_id}"
+
+
 class BaseNote(models.Model):
     """Admin-provided read-only template note that students can copy."""
 
@@ -86,6 +186,8 @@ class BaseNote(models.Model):
         help_text="Admin-authored block content",
     )
     is_published = models.BooleanField(default=False)
+    # Bumped on every save so student forks re-materialize against the new content
+    revision = models.PositiveIntegerField(default=1, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -96,3 +198,10 @@ class BaseNote(models.Model):
 
     def __str__(self):
         return f"[Base] {self.subject.code} Unit {self.unit.number} — {self.title}"
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            self.revision += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'revision'}
+        super().save(*args, **kwargs)
@@ -0,0 +1,74 @@
+"""
+Server-side application of autosave deltas to a note's ``blocks`` document.
+
+Two delta formats are accepted:
+
+* RFC 6902 JSON Patch operations against the whole document, e.g.
+  ``{"op": "replace", "path": "/blocks/3/content", "value": "..."}``.
+* Block-level changes keyed by block id: ``upserts`` (full block dicts),
+  ``deletes`` (ids) and an optional ``order`` (ids in display order).
+
+Both return a new document and never mutate the input.
+"""
+
+import copy
+
+import jsonpatch
+
+MAX_OPS = 2000
+
+
+class PatchError(ValueError):
+    """The delta could not be applied or produced an invalid document."""
+
+
+def validate_blocks(doc):
+    if not isinstance(doc, dict) or not isinstance(doc.get('blocks'), list):
+        raise PatchError("Document must be an object with a 'blocks' list.")
+    seen = set()
+    for block in doc['blocks']:
+        if not isinstance(block, dict) or not block.get('id'):
+            raise PatchError("Every block must be an object with an 'id'.")
+        if block['id'] in seen:
+            raise PatchError(f"Duplicate block id {block['id']!r}.")
+        seen.add(block['id'])
+    return doc
+
+
+def apply_json_patch(doc, ops):
+    if not isinstance(ops, list) or len(ops) > MAX_OPS:
+        raise PatchError(f"'ops' must be a list of at most {MAX_OPS} operations.")
+    try:
+        patched = jsonpatch.apply_patch(doc, ops, in_place=False)
+    except (jsonpatch.JsonPatchException, jsonpatch.JsonPointerException, TypeError, KeyError) as exc:
+        raise PatchError(str(exc)) from exc
+    return validate_blocks(patched)
+
+
+def apply_block_changes(doc, upserts=None, deletes=None, order=None):
+    upserts = upserts or []
+    deletes = set(deletes or [])
+    if not isinstance(upserts, list) or len(upserts) + len(deletes) > MAX_OPS:
+        raise PatchError(f"At most {MAX_OPS} block changes per save.")
+
+    blocks = [b for b in doc.get('blocks', []) if b.get('id') not in deletes]
+    index = {b.get('id'): i for i, b in enumerate(blocks)}
+    for block in upserts:
+        if not isinstance(block, dict) or not block.get('id'):
+            raise PatchError("Upserted blocks must be objects with an 'id'.")
+        block = copy.deepcopy(block)
+        if block['id'] in index:
+            blocks[index[block['id']]] = block
+        else:
+            index[block['id']] = len(blocks)
+            blocks.append(block)
+
+    if order is not None:
+        if not isinstance(order, list):
+            raise PatchError("'order' must be a list of block ids.")
+        by_id = {b['id']: b for b in blocks}
+        ordered = [by_id.pop(block_id) for block_id in order if block_id in by_id]
+        # Blocks the client did not mention keep their relative order at the end
+        blocks = ordered + [b for b in blocks if b['id'] in by_id]
+
+    return validate_blocks({**doc, 'blocks': blocks})
@@ -0,0 +1,126 @@
+"""
+Full-text search over a user's notes.
+
+``NoteSearchEntry`` holds the plain text of each note; the index itself is
+database specific and created in migration 0006:
+
+* SQLite — ``student_notes_search_fts``, an FTS5 external-content table over
+  the entry table, kept in sync by triggers and ranked with ``bm25()``.
+* Postgres — a generated ``search_vector`` column (title weighted A, body B)
+  with a GIN index, ranked with ``ts_rank_cd()``.
+
+Snippets come back with ``[start, end)`` highlight offsets rather than
+markup (see ``apps.common.fulltext``).
+"""
+
+import re
+from html import unescape
+
+from django.db import connection
+from django.utils.html import strip_tags
+
+from apps.common.fulltext import (
+    HIGHLIGHT_END,
+    HIGHLIGHT_START,
+    postgres_headline_options,
+    postgres_tsquery,
+    query_terms,
+    split_highlights,
+    sqlite_match,
+)
+
+FTS_TABLE = 'student_notes_search_fts'
+ENTRY_TABLE = 'student_notes_notesearchentry'
+
+_BREAK_RE = re.compile(r'<\s*(br|/p|/div|/li|/h[1-6])\s*/?>', re.IGNORECASE)
+_SPACE_RE = re.compile(r'[ \t\r\f\v]+')
+
+
+def _block_text(block, parts):
+    content = block.get('content') or ''
+    if content:
+        text = unescape(strip_tags(_BREAK_RE.sub('\n', content)))
+        text = _SPACE_RE.sub(' ', text).strip()
+        if text:
+            parts.append(text)
+    caption = (block.get('attrs') or {}).get('caption')
+    if caption:
+        parts.append(str(caption))
+    for child in block.get('children') or []:
+        if isinstance(child, dict):
+            _block_text(child, parts)
+
+
+def extract_text(doc):
+    """Plain text of a block document: block HTML stripped, captions kept."""
+    parts = []
+    for block in (doc or {}).get('blocks') or []:
+        if isinstance(block, dict):
+            _block_text(block, parts)
+    return '\n'.join(parts)
+
+
+def note_title(note):
+    return f"{note.subject.code} {note.subject.name} · Unit {note.unit.number}: {note.unit.name}"
+
+
+# ── Backends ───────────────────────────────────────────────────────────────
+
+
+def _sqlite_search(user_id, terms, limit):
+    sql = f"""
+        SELECT e.note_id, e.title,
+               snippet({FTS_TABLE}, -1, %s, %s, '…', 24),
+               bm25({FTS_TABLE}, 4.0, 1.0) AS score
+        FROM {FTS_TABLE}
+        JOIN {ENTRY_TABLE} e ON e.note_id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s AND e.user_id = %s
+        ORDER BY score
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [HIGHLIGHT_START, HIGHLIGHT_END, sqlite_match(terms), user_id, limit])
+        # bm25() is "lower is better"; flip it so every backend ranks descending
+        return [(note_id, title, snippet, -score) for note_id, title, snippet, score in cursor.fetchall()]
+
+
+def _postgres_search(user_id, terms, limit):
+    options = postgres_headline_options()
+    # Rank on the index first; ts_headline re-parses text, so only run it on the page of hits
+    sql = f"""
+        SELECT hit.note_id, hit.title, ts_headline('english', hit.body, q, %s), hit.rank
+        FROM (
+            SELECT e.note_id, e.title, e.body, ts_rank_cd(e.search_vector, q) AS rank
+            FROM {ENTRY_TABLE} e, to_tsquery('english', %s) q
+            WHERE e.user_id = %s AND e.search_vector @@ q
+            ORDER BY rank DESC
+            LIMIT %s
+        ) hit, to_tsquery('english', %s) q
+        ORDER BY hit.rank DESC
+    """
+    tsquery = postgres_tsquery(terms)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [options, tsquery, user_id, limit, tsquery])
+        return cursor.fetchall()
+
+
+def search(user_id, query, limit=20):
+    """
+    Ranked hits for ``user_id``: dicts with ``note_id``, ``title``,
+    ``snippet``, ``highlights`` and ``rank`` (higher is better).
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    backend = _postgres_search if connection.vendor == 'postgresql' else _sqlite_search
+    results = []
+    for note_id, title, marked, rank in backend(user_id, terms, limit):
+        snippet, highlights = split_highlights(marked)
+        results.append({
+            'note_id': note_id,
+            'title': title,
+            'snippet': snippet,
+            'highlights': highlights,
+            'rank': float(rank),
+        })
+    return results
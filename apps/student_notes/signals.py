@@ -0,0 +1,23 @@
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from .data_services import NotesDataService
+from .models import BaseNote
+from .tasks import reindex_base_note_forks
+
+
+@receiver(post_save, sender=BaseNote)
+def base_note_saved(sender, instance, **kwargs):
+    """Forks pick up curator edits on their next read; their search text is refreshed in the background."""
+    NotesDataService.clear_base_note_cache(instance)
+    if not kwargs.get('created'):
+        base_note_id = instance.pk
+        transaction.on_commit(lambda: reindex_base_note_forks.delay(base_note_id))
+
+
+@receiver(pre_delete, sender=BaseNote)
+def base_note_deleting(sender, instance, **kwargs):
+    # Forks hold only an overlay; give them their own copy before the base goes away
+    NotesDataService.detach_forks(instance)
+    NotesDataService.clear_base_note_cache(instance)
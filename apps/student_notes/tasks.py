@@ -0,0 +1,91 @@
+import logging
+import posixpath
+
+from celery import shared_task
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .data_services import NotesDataService
+from .images import build_variants
+from .models import Note, NoteImage, NoteVersion
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def compact_note_versions(batch_size=200):
+    """
+    Nightly: thin every note's version history on the time-decay schedule
+    and garbage-collect unreferenced block objects.
+    """
+    max_versions = getattr(settings, 'NOTES_MAX_VERSIONS', 50)
+    note_ids = (
+        NoteVersion.objects.values_list('note_id', flat=True).distinct().order_by('note_id')
+    )
+    notes = versions_deleted = objects_deleted = 0
+    for note_id in note_ids.iterator(chunk_size=batch_size):
+        note = Note.objects.filter(pk=note_id).first()
+        if not note:
+            continue
+        try:
+            v, o = NotesDataService.compact_versions(note, max_versions=max_versions)
+        except Exception as exc:
+            logger.error(f"Compacting versions of note {note_id} failed: {exc}")
+            continue
+        notes += 1
+        versions_deleted += v
+        objects_deleted += o
+
+    logger.info(
+        f"Note version compaction: {notes} notes, {versions_deleted} versions "
+        f"and {objects_deleted} block objects removed"
+    )
+    return {'notes': notes, 'versions_deleted': versions_deleted, 'objects_deleted': objects_deleted}
+
+
+@shared_task(bind=True, max_retries=3)
+def process_note_image(self, image_id):
+    """
+    Produce the thumb / reader / full WebP variants of a raw note upload.
+    Until this finishes ``serve_note_image`` keeps serving the raw file.
+    """
+    image = NoteImage.objects.filter(pk=image_id).first()
+    if not image or image.status == NoteImage.STATUS_READY:
+        return
+
+    try:
+        with default_storage.open(image.path, 'rb') as fh:
+            source = fh.read()
+        built = build_variants(source)
+    except ValueError as exc:
+        logger.error(f"Note image {image_id} cannot be processed: {exc}")
+        image.status = NoteImage.STATUS_FAILED
+        image.save(update_fields=['status'])
+        return
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=5 * (2 ** self.request.retries))
+
+    stem = posixpath.splitext(image.path)[0]
+    variants, saved = {}, {}
+    for name, (data, width, height) in built.items():
+        if width not in saved:
+            # UUID-derived names are unique, so skip the exists() round trip like the upload does
+            saved[width] = default_storage._save(f"{stem}/{width}w.webp", ContentFile(data))
+        variants[name] = {'path': saved[width], 'width': width, 'height': height, 'bytes': len(data)}
+
+    NotesDataService.mark_note_image_ready(image, variants)
+    return {name: v['bytes'] for name, v in variants.items()}
+
+
+@shared_task
+def reindex_base_note_forks(base_note_id, batch_size=200):
+    """A curator edit changes the text of every fork that did not override it."""
+    notes = (
+        Note.objects.filter(base_note_id=base_note_id)
+        .select_related('subject', 'unit')
+        .order_by('pk')
+    )
+    count = NotesDataService.reindex_note_search(notes.iterator(chunk_size=batch_size))
+    logger.info(f"Reindexed {count} forks of base note {base_note_id}")
+    return count
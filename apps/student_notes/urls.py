@@ -11,6 +11,8 @@ urlpatterns = [
 
     # API
     path('api/save/', views.api_save, name='api_save'),
+    path('api/patch/', views.api_patch, name='api_patch'),
+    path('api/search/', views.api_search, name='api_search'),
     path('api/versions/<int:note_id>/', views.api_versions, name='api_versions'),
     path('api/version/<int:version_id>/', views.api_version_detail, name='api_version_detail'),
     path('api/restore/<int:version_id>/', views.api_restore_version, name='api_restore_version'),
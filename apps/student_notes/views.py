@@ -1,5 +1,5 @@
-import copy
 import json
+import logging
 import uuid
 import mimetypes
 from io import BytesIO
@@ -16,10 +16,17 @@ from django.urls import reverse
 from django.utils.html import escape
 from django.views.decorators.http import require_GET, require_POST
 from django.core.cache import cache
+from django.db import transaction
 
 from apps.academics.data_services import AcademicsDataService
 
 from .data_services import NotesDataService
+from .images import pick_variant
+from .models import NoteImage
+from .patching import PatchError, apply_block_changes, apply_json_patch
+from .tasks import process_note_image
+
+logger = logging.getLogger(__name__)
 
 
 def _normalize_note_image_path(file_path: str) -> str:
@@ -36,7 +43,10 @@ def _is_authorized_note_image_path(user, storage_path: str) -> bool:
 
 @login_required
 def serve_note_image(request, file_path):
-    """Serve note images through an authenticated endpoint for all storage backends."""
+    """
+    Serve note images through an authenticated endpoint for all storage backends.
+    ``?w=<px>`` picks the smallest processed variant at least that wide.
+    """
     storage_path = _normalize_note_image_path(file_path)
 
     if '..' in storage_path.split('/'):
@@ -45,6 +55,18 @@ def serve_note_image(request, file_path):
     if not _is_authorized_note_image_path(request.user, storage_path):
         return HttpResponseForbidden('Unauthorized image access.')
 
+    max_age = 86400
+    info = NotesDataService.get_note_image_info(storage_path)
+    if info['variants']:
+        try:
+            width_hint = int(request.GET.get('w', 0))
+        except ValueError:
+            width_hint = 0
+        storage_path = pick_variant(info['variants'], width_hint)['path']
+    elif info['status'] == NoteImage.STATUS_PENDING:
+        # Raw upload still being processed — let the browser come back for the variant
+        max_age = 60
+
     if settings.USE_S3:
         cache_key = f"signed_url_note_img_{storage_path}"
         url = cache.get(cache_key)
@@ -63,7 +85,7 @@ def serve_note_image(request, file_path):
         content = default_storage.open(storage_path, 'rb')
         guessed_type, _ = mimetypes.guess_type(storage_path)
         response = FileResponse(content, content_type=guessed_type or 'application/octet-stream')
-        response['Cache-Control'] = 'private, max-age=86400'
+        response['Cache-Control'] = f'private, max-age={max_age}'
         return response
     except Exception:
         return HttpResponseNotFound('Image not found.')
@@ -126,9 +148,9 @@ def subject_notes(request, subject_id):
         note = user_notes.get(unit.id)
         base = base_notes.get(unit.id)
         block_count = 0
-        if note and note.blocks and 'blocks' in note.blocks:
+        if note:
             block_count = sum(
-                1 for b in note.blocks['blocks']
+                1 for b in NotesDataService.get_note_blocks(note).get('blocks', [])
                 if b.get('content', '').strip()
             )
         unit_data.append({
@@ -168,7 +190,8 @@ def editor(request, subject_id, unit_id):
         'subject': subject,
         'unit': unit,
         'base_note': base_note,
-        'blocks_json': json.dumps(note.blocks),
+        'blocks_json': json.dumps(NotesDataService.get_note_blocks(note)),
+        'revision': note.revision,
         'embed_mode': embed_mode,
     })
 
@@ -176,15 +199,37 @@ def editor(request, subject_id, unit_id):
 # ── API endpoints ──────────────────────────────────────────────────────────────
 
 
+@login_required
+@require_GET
+def api_search(request):
+    """
+    Full-text search across the user's notes. Returns ranked hits with a
+    plain-text snippet and ``[start, end)`` highlight offsets into it.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 50)
+    except ValueError:
+        limit = 20
+
+    results = NotesDataService.search_notes(request.user, query, limit) if query else []
+    for hit in results:
+        if hit['subject_id'] and hit['unit_id']:
+            hit['url'] = reverse('student_notes:editor', args=[hit['subject_id'], hit['unit_id']])
+    return JsonResponse({'success': True, 'query': query, 'results': results})
+
+
+
 @login_required
 @require_POST
 def api_save(request):
-    """Auto-save endpoint — receives blocks JSON and persists."""
+    """Auto-save endpoint — receives the full blocks JSON and persists."""
     try:
         data = json.loads(request.body)
         note_id = data.get('note_id')
         blocks = data.get('blocks')
         create_version = data.get('create_version', False)
+        base_revision = data.get('base_revision')
 
         if not note_id or blocks is None:
             return JsonResponse({'success': False, 'error': 'Missing fields'}, status=400)
@@ -196,13 +241,13 @@ def api_save(request):
         # Optionally snapshot before saving
         if create_version:
             NotesDataService.create_version_snapshot(note)
-            NotesDataService.prune_versions(note, keep=50)
 
-        note.blocks = blocks
-        note.save(update_fields=['blocks', 'updated_at'])
+        if not NotesDataService.save_note_blocks(note, blocks, base_revision):
+            return _stale_revision_response(note)
 
         return JsonResponse({
             'success': True,
+            'revision': note.revision,
             'updated_at': note.updated_at.isoformat(),
         })
     except json.JSONDecodeError:
@@ -211,6 +256,66 @@ def api_save(request):
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+def _stale_revision_response(note):
+    """409 carrying the current document so the client can rebase its changes."""
+    note.refresh_from_db(fields=['blocks', 'overlay', 'revision', 'updated_at'])
+    return JsonResponse({
+        'success': False,
+        'error': 'stale_revision',
+        'revision': note.revision,
+        'blocks': NotesDataService.get_note_blocks(note),
+        'updated_at': note.updated_at.isoformat(),
+    }, status=409)
+
+
+@login_required
+@require_POST
+def api_patch(request):
+    """
+    Delta auto-save. Body: ``note_id``, ``base_revision`` and either RFC 6902
+    ``ops`` or block-level ``upserts`` / ``deletes`` / ``order``. Rejected
+    with 409 when ``base_revision`` is not the note's current revision.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+
+    note_id = data.get('note_id')
+    base_revision = data.get('base_revision')
+    if not note_id or not isinstance(base_revision, int):
+        return JsonResponse({'success': False, 'error': 'Missing fields'}, status=400)
+
+    note = NotesDataService.get_note_by_id(request.user, note_id)
+    if not note:
+        return JsonResponse({'success': False, 'error': 'Not found'}, status=404)
+    if note.revision != base_revision:
+        return _stale_revision_response(note)
+
+    current = NotesDataService.get_note_blocks(note)
+    try:
+        if 'ops' in data:
+            blocks = apply_json_patch(current, data['ops'])
+        else:
+            blocks = apply_block_changes(
+                current, data.get('upserts'), data.get('deletes'), data.get('order'),
+            )
+    except PatchError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    if data.get('create_version'):
+        NotesDataService.create_version_snapshot(note)
+
+    if blocks != current and not NotesDataService.save_note_blocks(note, blocks, base_revision):
+        return _stale_revision_response(note)
+
+    return JsonResponse({
+        'success': True,
+        'revision': note.revision,
+        'updated_at': note.updated_at.isoformat(),
+    })
+
+
 @login_required
 @require_GET
 def api_versions(request, note_id):
@@ -237,9 +342,15 @@ def api_version_detail(request, version_id):
     if not version:
         return JsonResponse({'success': False, 'error': 'Not found'}, status=404)
 
+    try:
+        blocks = NotesDataService.get_version_blocks(version)
+    except ValueError as exc:
+        logger.warning("Version %s cannot be rebuilt: %s", version.id, exc)
+        return JsonResponse({'success': False, 'error': 'This version is no longer available'}, status=409)
+
     return JsonResponse({
         'success': True,
-        'blocks': version.blocks,
+        'blocks': blocks,
         'created_at': version.created_at.isoformat(),
     })
 
@@ -253,16 +364,21 @@ def api_restore_version(request, version_id):
         return JsonResponse({'success': False, 'error': 'Not found'}, status=404)
 
     note = version.note
+    try:
+        blocks = NotesDataService.get_version_blocks(version)
+    except ValueError as exc:
+        logger.warning("Version %s cannot be rebuilt: %s", version.id, exc)
+        return JsonResponse({'success': False, 'error': 'This version is no longer available'}, status=409)
 
     # Save current state before restoring
     NotesDataService.create_version_snapshot(note)
 
-    note.blocks = version.blocks
-    note.save(update_fields=['blocks', 'updated_at'])
+    NotesDataService.save_note_blocks(note, blocks)
 
     return JsonResponse({
         'success': True,
-        'blocks': note.blocks,
+        'blocks': NotesDataService.get_note_blocks(note),
+        'revision': note.revision,
         'updated_at': note.updated_at.isoformat(),
     })
 
@@ -305,8 +421,8 @@ def api_append_from_reader(request):
     )
 
     # Version-protect current note if it has content
-    current_blocks = note.blocks if isinstance(note.blocks, dict) else {'blocks': []}
-    block_list = current_blocks.get('blocks')
+    current_blocks = NotesDataService.get_note_blocks(note)
+    block_list = list(current_blocks.get('blocks') or [])
     if not isinstance(block_list, list):
         block_list = []
 
@@ -341,8 +457,7 @@ def api_append_from_reader(request):
         })
 
     block_list.extend(new_blocks)
-    note.blocks = {'blocks': block_list}
-    note.save(update_fields=['blocks', 'updated_at'])
+    NotesDataService.save_note_blocks(note, {'blocks': block_list})
 
     return JsonResponse({
         'success': True,
@@ -355,7 +470,10 @@ def api_append_from_reader(request):
 @login_required
 @require_POST
 def api_copy_base_note(request):
-    """Copies admin base note into the student's personal note."""
+    """
+    Forks the admin base note into the student's personal note. Only blocks
+    the student later edits or adds are stored; the rest follow the base.
+    """
     try:
         data = json.loads(request.body)
         base_note_id = data.get('base_note_id')
@@ -369,27 +487,19 @@ def api_copy_base_note(request):
         )
 
         # Version-protect existing content
-        if not created and note.blocks and note.blocks.get('blocks'):
+        if not created:
             has_content = any(
                 b.get('content', '').strip()
-                for b in note.blocks['blocks']
+                for b in NotesDataService.get_note_blocks(note).get('blocks', [])
             )
             if has_content:
                 NotesDataService.create_version_snapshot(note)
 
-        # Deep-copy with fresh IDs
-        new_blocks = copy.deepcopy(base.blocks)
-        for block in new_blocks.get('blocks', []):
-            block['id'] = str(uuid.uuid4())
-            for child in block.get('children', []):
-                child['id'] = str(uuid.uuid4())
-
-        note.blocks = new_blocks
-        note.save(update_fields=['blocks', 'updated_at'])
+        NotesDataService.fork_base_note(note, base)
 
         return JsonResponse({
             'success': True,
-            'blocks': note.blocks,
+            'blocks': NotesDataService.get_note_blocks(note),
             'note_id': note.id,
         })
     except Exception as e:
@@ -399,7 +509,10 @@ def api_copy_base_note(request):
 @login_required
 @require_POST
 def api_upload_image(request):
-    """Handles image upload for the note editor."""
+    """
+    Stores the upload as-is and returns its URL immediately; resized
+    variants are produced by ``process_note_image`` in the background.
+    """
     if 'image' not in request.FILES:
         return JsonResponse({'success': False, 'error': 'No image provided'}, status=400)
 
@@ -410,31 +523,32 @@ def api_upload_image(request):
     if image.size > max_size:
         return JsonResponse({'success': False, 'error': 'Image too large (max 5 MB)'}, status=400)
 
-    allowed_types = {'image/webp'}
-    if image.content_type not in allowed_types:
-        return JsonResponse({'success': False, 'error': 'Invalid image type. Please upload WebP only.'}, status=400)
+    allowed_types = {'image/webp': 'webp', 'image/png': 'png', 'image/jpeg': 'jpg'}
+    extension = allowed_types.get(image.content_type)
+    if not extension:
+        return JsonResponse({'success': False, 'error': 'Invalid image type. Please upload WebP, PNG or JPEG.'}, status=400)
 
+    source_bytes = image.read()
     try:
-        source_bytes = image.read()
+        # Header check only — decoding and re-encoding happen in the worker
         with Image.open(BytesIO(source_bytes)) as img:
-            normalized = img.convert('RGBA') if img.mode in ('RGBA', 'LA', 'P') else img.convert('RGB')
-            out = BytesIO()
-            normalized.save(out, format='WEBP', lossless=True, method=6, exact=True)
-            optimized_bytes = out.getvalue()
+            img.verify()
     except (UnidentifiedImageError, OSError, ValueError):
-        return JsonResponse({'success': False, 'error': 'Invalid or corrupted WebP image.'}, status=400)
-    except Exception:
-        return JsonResponse({'success': False, 'error': 'Failed to process image.'}, status=500)
+        return JsonResponse({'success': False, 'error': 'Invalid or corrupted image.'}, status=400)
 
-    filename = f"note_images/{request.user.id}/{uuid.uuid4().hex}.webp"
+    filename = f"note_images/{request.user.id}/{uuid.uuid4().hex}.{extension}"
     # Use _save() directly to skip the exists()/HeadObject check.
     # The UUID filename is already guaranteed unique so the check is wasteful
     # and fails with 403 when the IAM role lacks s3:GetObject on this prefix.
-    path = default_storage._save(filename, ContentFile(optimized_bytes))
-    
+    path = default_storage._save(filename, ContentFile(source_bytes))
+
+    note_image = NotesDataService.create_note_image(request.user, path, len(source_bytes))
+    transaction.on_commit(lambda: process_note_image.delay(note_image.id))
+
     # Always return the proxy URL (serve_note_image) instead of a direct S3 URL.
     # This prevents expiring signed URLs from being stored in the note JSON,
     # while our optimized serve_note_image view handles the direct S3 redirect + caching.
+    # The URL stays stable: once variants exist it serves them instead of the raw file.
     url = reverse('student_notes:serve_note_image', args=[path])
 
-    return JsonResponse({'success': True, 'url': url})
+    return JsonResponse({'success': True, 'url': url, 'image_id': note_image.id})
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
@@ -15,6 +16,21 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
+
+# One event loop per worker process, kept for its lifetime (apps/common/async_runtime.py):
+# tasks reuse its LLM connection pool and browser instead of rebuilding them per asyncio.run()
+@worker_process_init.connect
+def start_async_runtime(**kwargs):
+    from apps.common import async_runtime
+    async_runtime.start()
+
+
+@worker_process_shutdown.connect
+def stop_async_runtime(**kwargs):
+    from apps.common import async_runtime
+    async_runtime.stop()
+
+
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
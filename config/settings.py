@@ -16,6 +16,7 @@ import json
 from pathlib import Path
 import urllib.parse as urlparse
 from dotenv import load_dotenv
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -151,6 +152,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'apps.users.context_processors.turnstile',
+                'apps.notifications.context_processors.unread_notifications',
             ],
         },
     },
@@ -363,9 +365,104 @@ RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID', '')
 RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET', '')
 # AI Parser Settings
 AI_PARSER_RETRIES = int(os.getenv('AI_PARSER_RETRIES', '10'))
+# Seconds per attempt of a chunk call, whatever its priority (a chunk may produce AI_PARSER_OUTPUT_TOKEN_BUDGET tokens)
+AI_PARSER_TIMEOUT = float(os.getenv('AI_PARSER_TIMEOUT', '180'))
+# Hard cap on one process_document_ai run (soft limit; the hard kill follows 5 minutes later)
+AI_PARSE_TIME_LIMIT = int(os.getenv('AI_PARSE_TIME_LIMIT', str(6 * 3600)))
 AI_PARSER_CHUNK_SIZE = int(os.getenv('AI_PARSER_CHUNK_SIZE', '5'))
-AI_PARSER_MAX_CONCURRENCY = int(os.getenv('AI_PARSER_MAX_CONCURRENCY', '5'))
 AI_PARSER_OVERLAP_SIZE = int(os.getenv('AI_PARSER_OVERLAP_SIZE', '1'))
+AI_PARSER_RENDER_WORKERS = int(os.getenv('AI_PARSER_RENDER_WORKERS', '2'))
+AI_PARSER_TEXT_LAYER = os.getenv('AI_PARSER_TEXT_LAYER', 'True') == 'True'
+AI_PARSER_PREPROCESS = os.getenv('AI_PARSER_PREPROCESS', 'True') == 'True'
+AI_PARSER_IMAGE_TOKEN_BUDGET = int(os.getenv('AI_PARSER_IMAGE_TOKEN_BUDGET', '1600'))
+AI_PARSER_JPEG_QUALITY = int(os.getenv('AI_PARSER_JPEG_QUALITY', '75'))
+AI_PARSER_DUPLICATE_HASH_DISTANCE = int(os.getenv('AI_PARSER_DUPLICATE_HASH_DISTANCE', '8'))
+# Chunks are packed to an estimated token budget per model (see apps/content/services/chunking.py);
+# with AI_PARSER_ADAPTIVE_CHUNKING off, AI_PARSER_CHUNK_SIZE pages and AI_PARSER_OVERLAP_SIZE blocks are used instead
+AI_PARSER_ADAPTIVE_CHUNKING = os.getenv('AI_PARSER_ADAPTIVE_CHUNKING', 'True') == 'True'
+AI_PARSER_TOKEN_BUDGETS = {
+    'default': {
+        'input': int(os.getenv('AI_PARSER_INPUT_TOKEN_BUDGET', '24000')),
+        'output': int(os.getenv('AI_PARSER_OUTPUT_TOKEN_BUDGET', '8000')),
+    },
+    'gpt-5-mini': {'input': 32000, 'output': 12000},
+    'gemini/gemini-2.5-flash': {'input': 48000, 'output': 16000},
+    'gemini/gemini-3.1-flash-lite-preview': {'input': 32000, 'output': 12000},
+    'cohere/command-a-vision-07-2025': {'input': 24000, 'output': 6000},
+}
+
+# Content-addressed LLM response cache (see apps/common/llm_cache.py)
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'True') == 'True'
+LLM_CACHE_DIR = os.getenv('LLM_CACHE_DIR', str(BASE_DIR / 'data' / 'llm_cache'))
+LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', str(1024 ** 3)))
+
+# Cluster-wide LLM rate limits per model, shared through Redis (see apps/common/rate_limit.py).
+# Set these to the provider account's limits; 'default' covers unlisted models.
+LLM_RATE_LIMIT_ENABLED = os.getenv('LLM_RATE_LIMIT_ENABLED', 'True') == 'True'
+LLM_RATE_LIMIT_BACKEND = os.getenv('LLM_RATE_LIMIT_BACKEND', 'redis')  # 'redis' or 'memory' (per process)
+LLM_RATE_LIMIT_REDIS_URL = os.getenv('LLM_RATE_LIMIT_REDIS_URL', os.getenv('CACHE_URL', 'redis://127.0.0.1:6379/1'))
+LLM_RATE_LIMIT_INTERACTIVE_RESERVE = float(os.getenv('LLM_RATE_LIMIT_INTERACTIVE_RESERVE', '0.2'))
+LLM_RATE_LIMIT_MAX_WAIT = int(os.getenv('LLM_RATE_LIMIT_MAX_WAIT', '600'))
+LLM_RATE_LIMITS = {
+    'default': {
+        'rpm': int(os.getenv('LLM_RATE_LIMIT_RPM', '500')),
+        'tpm': int(os.getenv('LLM_RATE_LIMIT_TPM', '2000000')),
+    },
+    'gemini/gemini-2.5-flash': {'rpm': 1000, 'tpm': 4000000},
+    'cerebras/gpt-oss-120b': {'rpm': 300, 'tpm': 1000000},
+    'openrouter/stepfun/step-3.5-flash:free': {'rpm': 20, 'tpm': 200000},
+}
+
+# Adaptive (AIMD) limit on concurrent calls per model and process (see apps/common/concurrency.py):
+# starts at 'initial', grows while latency holds, halves on 429 / 503 / timeouts.
+LLM_CONCURRENCY_LATENCY_TOLERANCE = float(os.getenv('LLM_CONCURRENCY_LATENCY_TOLERANCE', '2.0'))
+LLM_CONCURRENCY = {
+    'default': {
+        'initial': int(os.getenv('LLM_CONCURRENCY_INITIAL', '8')),
+        'min': 1,
+        'max': int(os.getenv('LLM_CONCURRENCY_MAX', '256')),
+    },
+    'openrouter/stepfun/step-3.5-flash:free': {'initial': 2, 'max': 8},
+}
+
+# LLM gateway (see apps/common/llm_gateway.py): providers, pooling, retries, circuit breaker, pricing
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'openai')  # 'openai' or 'fake' (deterministic, offline)
+LLM_DEFAULT_PROVIDER = os.getenv('LLM_DEFAULT_PROVIDER', 'bifrost')
+LLM_PROVIDERS = {
+    'bifrost': {
+        'base_url': os.getenv('BIFROST_BASE_URL', 'https://bifrost.naravirtual.in/langchain'),
+        'api_key': 'dummy-key',
+        'headers': {'Authorization': f"Basic {os.getenv('BIFROST_API_KEY')}"},
+    },
+    # OpenAI-compatible proxy on the host (gpt-5-mini for the AI parser)
+    'local': {
+        'base_url': os.getenv('LLM_LOCAL_BASE_URL', 'http://localhost:4141/'),
+        'api_key': 'dummy-key',
+    },
+}
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv('LLM_POOL_MAX_CONNECTIONS', '1000'))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv('LLM_POOL_MAX_KEEPALIVE', '200'))
+# Per priority (see LLM_RATE_LIMIT_INTERACTIVE_RESERVE): someone waiting gets a short timeout and few retries
+LLM_TIMEOUTS = {
+    'interactive': float(os.getenv('LLM_TIMEOUT_INTERACTIVE', '60')),
+    'batch': float(os.getenv('LLM_TIMEOUT_BATCH', '180')),
+}
+LLM_MAX_ATTEMPTS = {
+    'interactive': int(os.getenv('LLM_MAX_ATTEMPTS_INTERACTIVE', '2')),
+    'batch': int(os.getenv('LLM_MAX_ATTEMPTS_BATCH', '3')),
+}
+LLM_CIRCUIT_FAILURES = int(os.getenv('LLM_CIRCUIT_FAILURES', '5'))
+LLM_CIRCUIT_RESET = float(os.getenv('LLM_CIRCUIT_RESET', '30'))
+# USD per million (input, output) tokens; unlisted models count as free
+LLM_PRICES = {
+    'gpt-5-mini': (0.25, 2.00),
+    'gemini/gemini-2.5-flash': (0.30, 2.50),
+    'gemini/gemini-3.1-flash-lite-preview': (0.10, 0.40),
+    'cohere/command-a-vision-07-2025': (2.50, 10.00),
+    'cerebras/gpt-oss-120b': (0.35, 0.75),
+}
+LLM_FAKE_LATENCY = float(os.getenv('LLM_FAKE_LATENCY', '0'))
+LLM_FAKE_ERROR_RATE = float(os.getenv('LLM_FAKE_ERROR_RATE', '0'))
 
 # Model Mappings for AI Parser
 AI_PARSER_DEFAULT_MODEL = os.getenv('AI_PARSER_DEFAULT_MODEL', 'cohere/command-a-vision-07-2025')
@@ -379,6 +476,17 @@ AI_PARSER_MODEL_MAPPING = {
     'FORMULA': os.getenv('AI_PARSER_FORMULA_MODEL', AI_PARSER_DEFAULT_MODEL),
 }
 
+# Student note history: hard cap per note after time-decay compaction
+NOTES_MAX_VERSIONS = int(os.getenv('NOTES_MAX_VERSIONS', '50'))
+
+# Practice question generation: 'llm' (default) or 'fake' for local/dev runs
+PRACTICE_AI_BACKEND = os.getenv('PRACTICE_AI_BACKEND', 'llm')
+PRACTICE_AI_BATCH_SIZE = int(os.getenv('PRACTICE_AI_BATCH_SIZE', '5'))
+# Pregenerated question pools, topped up off-peak by practice.tasks.fill_question_pools
+PRACTICE_POOL_TARGET_SIZE = int(os.getenv('PRACTICE_POOL_TARGET_SIZE', '60'))
+PRACTICE_POOL_ACTIVE_DAYS = int(os.getenv('PRACTICE_POOL_ACTIVE_DAYS', '14'))
+PRACTICE_POOL_FILL_MAX_POOLS = int(os.getenv('PRACTICE_POOL_FILL_MAX_POOLS', '50'))
+
 # Celery Settings
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://127.0.0.1:6379/0')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://127.0.0.1:6379/0')
@@ -386,6 +494,42 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Redis redelivers an unacknowledged (acks_late) task after this many seconds,
+# so it must outlast the longest task: a parse, AI_PARSE_TIME_LIMIT
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'visibility_timeout': int(os.getenv('CELERY_VISIBILITY_TIMEOUT', str(AI_PARSE_TIME_LIMIT + 3600))),
+}
+
+# Periodic tasks (run with `celery -A config beat`)
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-unread-notification-counts': {
+        'task': 'apps.notifications.tasks.reconcile_unread_counts',
+        'schedule': int(os.getenv('NOTIFICATIONS_RECONCILE_SECONDS', '900')),
+    },
+    'apply-retention-policies': {
+        'task': 'apps.common.tasks.apply_retention_policies',
+        'schedule': int(os.getenv('RETENTION_INTERVAL_SECONDS', '86400')),
+    },
+    'compact-note-versions': {
+        'task': 'apps.student_notes.tasks.compact_note_versions',
+        'schedule': crontab(hour=int(os.getenv('NOTES_COMPACTION_HOUR', '2')), minute=30),
+    },
+    'fill-practice-question-pools': {
+        'task': 'apps.practice.tasks.fill_question_pools',
+        'schedule': crontab(hour=int(os.getenv('PRACTICE_POOL_FILL_HOUR', '3')), minute=0),
+    },
+    'evict-llm-cache': {
+        'task': 'apps.common.tasks.evict_llm_cache',
+        'schedule': int(os.getenv('LLM_CACHE_EVICT_SECONDS', '3600')),
+    },
+}
+
+# Retention / archival of append-only tables (see apps/common/retention.py)
+RETENTION_NOTIFICATION_DAYS = int(os.getenv('RETENTION_NOTIFICATION_DAYS', '90'))
+RETENTION_STUDY_SESSION_DAYS = int(os.getenv('RETENTION_STUDY_SESSION_DAYS', '180'))
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '500'))
+RETENTION_BATCH_PAUSE_SECONDS = float(os.getenv('RETENTION_BATCH_PAUSE_SECONDS', '0.05'))
+RETENTION_ARCHIVE_DIR = os.getenv('RETENTION_ARCHIVE_DIR', str(BASE_DIR / 'data' / 'archive'))
 
 # Caching Settings (Valkey)
 CACHES = {
@@ -1,7 +1,6 @@
 import os
 import django
 import sys
-import asyncio
 from pathlib import Path
 
 # Setup Django
@@ -12,6 +11,7 @@ sys.path.insert(0, str(BASE_DIR / 'apps'))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
 
+from apps.common import async_runtime
 from apps.content.models import ParsedDocument
 from apps.content.services.image_recreator import ImageRecreationService
 from asgiref.sync import sync_to_async
@@ -40,7 +40,8 @@ async def heal_documents():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(heal_documents())
+        # One browser for every document
+        async_runtime.run_coro(heal_documents())
         print("\n✨ Healing process completed successfully!")
     except Exception as e:
         print(f"❌ Error during healing: {e}")
@@ -0,0 +1,174 @@
+"""
+Benchmark of the AI parser's chunking: fixed page count vs token budget.
+
+Builds a synthetic exam document (questions of mixed length flowing over
+sparse and dense pages), plans its chunks with both schemes through the
+real ``BaseDocumentParser`` — as a born-digital PDF, as the same PDF sent
+as page images (a scan), and as pasted source text — and reports, without
+calling any model:
+
+* calls          chunks sent to the model
+* split          questions cut across two chunks (merge errors: a question
+                 half-extracted twice, or merged wrongly from two partials)
+* overflow       chunks whose expected output exceeds the model's output budget
+* input tokens   estimated, including prompt and reference overlap
+
+    python scripts/testing/benchmark_chunking.py [--questions 120] [--seed 7] [--model gpt-5-mini]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+from pathlib import Path
+
+import django
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+import fitz
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from apps.content.services import chunking
+from apps.content.services.ai_parser.base import BaseDocumentParser
+from apps.content.services.pdf_pages import PdfPages
+
+SYSTEM_PROMPT = "Extract every question with its marks, unit and answer." * 20
+WORDS = (
+    "explain derive the expression for energy band gap semiconductor crystal lattice wave function "
+    "boundary condition potential well quantum tunnelling probability current density magnetic flux "
+    "induction coherent source interference fringe width diffraction grating resolving power laser"
+).split()
+# Lines per page: sparse cover/instruction pages and dense answer pages
+SPARSE_LINES, NORMAL_LINES, DENSE_LINES = 8, 38, 75
+
+
+class BenchmarkParser(BaseDocumentParser):
+    def get_schema(self, doc_type):
+        return dict
+
+    def get_system_prompt(self, context):
+        return SYSTEM_PROMPT
+
+    def _merge_results(self, doc_type, all_results):
+        return {}
+
+
+def sentence(rng):
+    words = rng.choices(WORDS, k=rng.randint(8, 16))
+    return ' '.join(words).capitalize() + '.'
+
+
+def build_lines(question_count, rng):
+    """Lines of a synthetic paper; each question ends with an ``(end of Qn)`` marker."""
+    lines = []
+    for n in range(1, question_count + 1):
+        if n % 20 == 1:
+            lines += [f"UNIT {n // 20 + 1}", ""]
+        # Most answers are short, some are long derivations
+        length = rng.choice([1, 1, 2, 3, 3, 5, 8, 14, 25])
+        body = [sentence(rng) for _ in range(length)]
+        body[-1] += f" (end of Q{n})"
+        lines.append(f"Q{n}. [{rng.choice([2, 3, 7, 10])} marks] {body[0]}")
+        lines += body[1:]
+        lines.append("")
+    return lines
+
+
+def build_pdf(lines, rng):
+    """Lay the lines out over pages of random density. Returns the PDF bytes and each page's text."""
+    doc = fitz.open()
+    pages, cursor = [], 0
+    while cursor < len(lines):
+        capacity = rng.choice([SPARSE_LINES, NORMAL_LINES, NORMAL_LINES, DENSE_LINES])
+        page_lines = lines[cursor:cursor + capacity]
+        cursor += capacity
+        page = doc.new_page()
+        fontsize = 10 if capacity <= NORMAL_LINES else 6
+        for i, line in enumerate(page_lines):
+            page.insert_text((36, 40 + i * (fontsize + 0.5)), line, fontsize=fontsize)
+        pages.append('\n'.join(page_lines))
+    data = doc.tobytes()
+    doc.close()
+    return data, pages
+
+
+def block_text(block, page_texts):
+    return block["data"] if block["type"] == "text" else page_texts[block["index"]]
+
+
+def evaluate(blocks, plan, page_texts, question_count, budget):
+    extracts = [''.join(block_text(b, page_texts) for b in blocks[start:end]) for _, start, end in plan]
+    split = 0
+    for n in range(1, question_count + 1):
+        first = next(i for i, text in enumerate(extracts) if f"Q{n}. " in text)
+        last = next(i for i, text in enumerate(extracts) if f"(end of Q{n})" in text)
+        split += first != last
+    overflow = sum(
+        chunking.text_tokens(text) * chunking.OUTPUT_PER_INPUT_TOKEN > budget.output for text in extracts
+    )
+    prompt = chunking.text_tokens(SYSTEM_PROMPT)
+    tokens = sum(prompt + sum(b["tokens"] for b in blocks[ref:end]) for ref, _, end in plan)
+    return {"calls": len(plan), "split": split, "overflow": overflow, "tokens": tokens}
+
+
+async def page_blocks(parser, name, text_layer):
+    settings.AI_PARSER_TEXT_LAYER = text_layer
+    with PdfPages(name, workers=0) as pages:
+        blocks, _ = await parser._page_blocks(pages)
+    return blocks
+
+
+def run(parser, adaptive, name, text, page_texts, question_count, budget):
+    settings.AI_PARSER_ADAPTIVE_CHUNKING = adaptive
+    results = {}
+    for source, text_layer in (('pdf', True), ('scan', False)):
+        blocks = asyncio.run(page_blocks(parser, name, text_layer))
+        results[source] = evaluate(blocks, parser._plan_chunks(blocks, SYSTEM_PROMPT), page_texts, question_count, budget)
+    text_blocks = parser._text_blocks(text)
+    results['text'] = evaluate(text_blocks, parser._plan_chunks(text_blocks, SYSTEM_PROMPT), page_texts, question_count, budget)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--questions', type=int, default=120)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--model', help="Token budget to plan for (default: the parser's model)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    lines = build_lines(args.questions, rng)
+    data, page_texts = build_pdf(lines, rng)
+    text = '\n'.join(lines)
+
+    doc_parser = BenchmarkParser()
+    if args.model:
+        doc_parser.llm.model_name = args.model
+    budget = chunking.budget_for(doc_parser.llm.model_name)
+    name = default_storage.save('raw_docs/benchmark_chunking.pdf', ContentFile(data))
+    try:
+        fixed = run(doc_parser, False, name, text, page_texts, args.questions, budget)
+        adaptive = run(doc_parser, True, name, text, page_texts, args.questions, budget)
+    finally:
+        default_storage.delete(name)
+
+    print(f"{args.questions} questions, {len(page_texts)} pages, {len(text)} chars of text")
+    print(f"Budget for {doc_parser.llm.model_name}: {budget.input} input / {budget.output} output tokens, "
+          f"fixed scheme: {settings.AI_PARSER_CHUNK_SIZE} pages + {settings.AI_PARSER_OVERLAP_SIZE} overlap\n")
+    print(f"{'source':<8}{'scheme':<10}{'calls':>7}{'split':>7}{'overflow':>10}{'input tokens':>14}")
+    for source in ('pdf', 'scan', 'text'):
+        for scheme, results in (('fixed', fixed), ('adaptive', adaptive)):
+            r = results[source]
+            print(f"{source:<8}{scheme:<10}{r['calls']:>7}{r['split']:>7}{r['overflow']:>10}{r['tokens']:>14}")
+
+
+if __name__ == '__main__':
+    main()
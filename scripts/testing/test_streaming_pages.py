@@ -0,0 +1,138 @@
+"""
+Memory check for streaming PDF page rendering in the AI parser.
+
+Builds a synthetic 500-page PDF, runs the real ``BaseDocumentParser.parse``
+chunk loop against the gateway's fake model backend (which just waits), and
+compares the
+tracemalloc peak with rendering every page up front (the old behaviour).
+The streaming peak must stay within (chunk + overlap) pages × the most
+calls the adaptive concurrency limit let run at once.
+
+    python scripts/testing/test_streaming_pages.py [--pages 500] [--workers 2]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import django
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+import fitz
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from apps.common import llm_gateway
+from apps.content.models import ParsedDocument
+from apps.content.services.ai_parser.base import BaseDocumentParser
+from apps.content.services.pdf_pages import PdfPages, render_page
+
+# Headroom for message lists, labels and interpreter noise
+SLACK_BYTES = 4 * 1024 * 1024
+
+
+def build_pdf(page_count):
+    doc = fitz.open()
+    for n in range(page_count):
+        page = doc.new_page()
+        for line in range(40):
+            page.insert_text((50, 60 + line * 18), f"Page {n + 1}, line {line + 1}: synthetic exam text {n * line}", fontsize=10)
+        page.draw_rect(fitz.Rect(60, 500 + n % 50, 400, 700), color=(0, 0, 1), fill=(0.8, 0.9, 1))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+class StreamingParser(BaseDocumentParser):
+    def get_schema(self, doc_type):
+        return dict
+
+    def get_system_prompt(self, context):
+        return "Parse the document."
+
+    def _merge_results(self, doc_type, all_results):
+        return {"chunks": len(all_results)}
+
+
+def eager_peak(name):
+    """tracemalloc peak of rendering every page into a list."""
+    tracemalloc.start()
+    with PdfPages(name, workers=0) as pages:
+        images = [render_page(pages._doc, i).images[0] for i in range(len(pages))]
+        largest = max(len(image) for image in images)
+    del images
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, largest
+
+
+def streaming_peak(document, workers, delay):
+    parser = StreamingParser()
+    settings.LLM_BACKEND = 'fake'
+    settings.LLM_FAKE_LATENCY = delay
+    settings.AI_PARSER_RENDER_WORKERS = workers
+    # The synthetic pages have a clean text layer; force the image path being measured
+    settings.AI_PARSER_TEXT_LAYER = False
+    # The bound below is in pages, so use the fixed page-count chunking
+    settings.AI_PARSER_ADAPTIVE_CHUNKING = False
+    # Every run must make its model calls; fake responses are not worth caching
+    settings.LLM_CACHE_ENABLED = False
+    settings.LLM_RATE_LIMIT_BACKEND = 'memory'
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = asyncio.run(parser.parse(document))
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, elapsed, result, llm_gateway.snapshot(parser.llm)[parser.llm.model_name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--delay', type=float, default=0.05, help="Seconds each stand-in model call takes")
+    args = parser.parse_args()
+
+    chunk_size = settings.AI_PARSER_CHUNK_SIZE
+    overlap = settings.AI_PARSER_OVERLAP_SIZE
+    expected_chunks = (args.pages + chunk_size - 1) // chunk_size
+
+    print(f"Building a {args.pages}-page PDF...")
+    name = default_storage.save('raw_docs/streaming_pages_test.pdf', ContentFile(build_pdf(args.pages)))
+    document = ParsedDocument.objects.create(document_type='NOTES', title='Streaming pages test', source_file=name)
+    try:
+        eager, largest = eager_peak(name)
+        peak, elapsed, result, model = streaming_peak(document, args.workers, args.delay)
+        calls, concurrency = model['calls'], model['peak_in_flight']
+        # Each page is held as its base64 string and again inside the message being built
+        bound = (chunk_size + overlap) * concurrency * largest * 2 + SLACK_BYTES
+
+        print(f"Largest page:    {largest / 1024:.1f} KiB (base64)")
+        print(f"Eager peak:      {eager / 1024 / 1024:.1f} MiB")
+        print(f"Streaming peak:  {peak / 1024 / 1024:.1f} MiB  (bound {bound / 1024 / 1024:.1f} MiB)")
+        print(f"Chunks:          {calls} calls in {elapsed:.1f}s with {args.workers} render workers, "
+              f"up to {concurrency} at once")
+
+        assert calls == expected_chunks, f"expected {expected_chunks} model calls, got {calls}"
+        assert result == {"chunks": expected_chunks}, result
+        assert peak <= bound, "streaming peak exceeds (chunk + overlap) × concurrent calls pages"
+        assert peak < eager, "streaming used more memory than eager rendering"
+        print("✅ Page rendering memory is bounded by the chunk window")
+    finally:
+        document.delete()
+        default_storage.delete(name)
+
+
+if __name__ == '__main__':
+    main()
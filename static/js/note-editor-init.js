@@ -10,6 +10,8 @@
         noteId: config.noteId,
         csrfToken: config.csrfToken,
         saveUrl: config.saveUrl,
+        patchUrl: config.patchUrl,
+        revision: config.revision,
         uploadUrl: config.uploadUrl,
         versionsUrl: config.versionsUrl,
         restoreBaseUrl: config.restoreBaseUrl,
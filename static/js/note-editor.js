@@ -63,6 +63,8 @@
             this.noteId          = cfg.noteId;
             this.csrfToken       = cfg.csrfToken;
             this.saveUrl         = cfg.saveUrl;
+            this.patchUrl        = cfg.patchUrl;
+            this.revision        = cfg.revision || 0;
             this.uploadUrl       = cfg.uploadUrl;
             this.versionsUrl     = cfg.versionsUrl;
             this.restoreBaseUrl  = cfg.restoreBaseUrl;
@@ -72,7 +74,7 @@
             this.focusMode = false;
             this.isDirty   = false;
             this.isSaving  = false;
-            this._lastSavedStr  = '';
+            this._saved         = null;   // last persisted state, see _snapshotBlocks()
             this._lastVersionTs = Date.now();
 
             // Slash-menu state
@@ -106,6 +108,7 @@
 
             // Blocks
             this.blocks = (cfg.initialBlocks && cfg.initialBlocks.blocks) ? cfg.initialBlocks.blocks : [];
+            this._saved = this._snapshotBlocks();
             if (!this.blocks.length) this.blocks.push(this._newBlock('paragraph'));
 
             this._init();
@@ -284,6 +287,11 @@
                 fig.className = `${block.attrs.align === 'center' ? 'text-center' : block.attrs.align === 'right' ? 'text-right' : ''}`;
                 const img = document.createElement('img');
                 img.src = block.attrs.url; img.alt = block.attrs.caption || ''; img.loading = 'lazy';
+                if (!block.attrs.uploading && block.attrs.url.includes('/api/note-image/')) {
+                    // Server picks the processed variant from the width hint
+                    img.srcset = [320, 960, 1920].map(w => `${block.attrs.url}?w=${w} ${w}w`).join(', ');
+                    img.sizes = block.attrs.width || '(max-width: 768px) 100vw, 768px';
+                }
                 img.className = 'max-w-full rounded-lg inline-block'; if (block.attrs.width) img.style.width = block.attrs.width;
                 if (block.attrs.uploading) {
                     img.style.opacity = '0.5';
@@ -1198,24 +1206,78 @@
             this._focusBlock(Math.min(this._activeIdx ?? 0, this.blocks.length - 1));
         }
 
-        async _save(createVersion = false) {
+        // Per-block JSON of the current blocks, used to diff against the last save.
+        _snapshotBlocks() {
+            const byId = new Map();
+            this.blocks.forEach(b => byId.set(b.id, JSON.stringify(b)));
+            return { order: this.blocks.map(b => b.id), byId };
+        }
+
+        // Block-level delta since the last successful save, or null if nothing changed.
+        _computeDelta(snap) {
+            const upserts = this.blocks.filter(b => this._saved.byId.get(b.id) !== snap.byId.get(b.id));
+            const deletes = this._saved.order.filter(id => !snap.byId.has(id));
+            const orderChanged = snap.order.length !== this._saved.order.length
+                || snap.order.some((id, i) => id !== this._saved.order[i]);
+            if (!upserts.length && !deletes.length && !orderChanged) return null;
+            const delta = { upserts, deletes };
+            if (orderChanged) delta.order = snap.order;
+            return delta;
+        }
+
+        // Another tab saved first: replay our block changes on top of the server copy.
+        _rebase(serverDoc, revision, delta) {
+            const serverBlocks = (serverDoc && serverDoc.blocks) || [];
+            this.blocks = serverBlocks;
+            this._saved = this._snapshotBlocks();
+            this.revision = revision;
+
+            const deleted = new Set(delta.deletes);
+            let merged = serverBlocks.filter(b => !deleted.has(b.id));
+            delta.upserts.forEach(b => {
+                const i = merged.findIndex(x => x.id === b.id);
+                if (i >= 0) merged[i] = b; else merged.push(b);
+            });
+            if (delta.order) {
+                const rank = new Map(delta.order.map((id, i) => [id, i]));
+                merged = merged.slice().sort((a, b) => (rank.get(a.id) ?? Infinity) - (rank.get(b.id) ?? Infinity));
+            }
+            this.blocks = merged;
+            this._render();
+        }
+
+        async _save(createVersion = false, isRetry = false) {
             if (this.isSaving) return;
             this._syncAllBlocks();
-            const data = JSON.stringify(this.blocks);
-            if (data === this._lastSavedStr && !createVersion) { this.isDirty = false; this._updateStatus('Saved', 'saved'); return; }
+            const snap = this._snapshotBlocks();
+            const delta = this._computeDelta(snap);
+            if (!delta && !createVersion) { this.isDirty = false; this._updateStatus('Saved', 'saved'); return; }
             this.isSaving = true;
             this._updateStatus('Saving…', 'saving');
+            let retry = false;
             try {
-                const r = await fetch(this.saveUrl, {
+                const r = await fetch(this.patchUrl, {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json', 'X-CSRFToken': this.csrfToken },
-                    body: JSON.stringify({ note_id: this.noteId, blocks: { blocks: this.blocks }, create_version: createVersion }),
+                    body: JSON.stringify(Object.assign(
+                        { note_id: this.noteId, base_revision: this.revision, create_version: createVersion },
+                        delta || {},
+                    )),
                 });
                 const j = await r.json();
-                if (j.success) { this.isDirty = false; this._lastSavedStr = data; this._updateStatus('Saved', 'saved'); }
-                else this._updateStatus('Error', 'error');
+                if (j.success) {
+                    this.revision = j.revision;
+                    this._saved = snap;
+                    this._syncAllBlocks();
+                    this.isDirty = this._computeDelta(this._snapshotBlocks()) !== null;
+                    this._updateStatus(this.isDirty ? 'Unsaved' : 'Saved', this.isDirty ? 'dirty' : 'saved');
+                } else if (r.status === 409 && j.error === 'stale_revision' && !isRetry) {
+                    this._rebase(j.blocks, j.revision, delta || { upserts: [], deletes: [] });
+                    retry = true;
+                } else this._updateStatus('Error', 'error');
             } catch { this._updateStatus('Offline', 'error'); }
             finally { this.isSaving = false; }
+            if (retry) await this._save(createVersion, true);
         }
 
         _updateStatus(text, type) {
@@ -1666,7 +1728,8 @@
                     this.blocks = j.blocks.blocks || j.blocks;
                     this._render();
                     this._focusBlock(0);
-                    this._lastSavedStr = JSON.stringify(this.blocks);
+                    this.revision = j.revision;
+                    this._saved = this._snapshotBlocks();
                     this.isDirty = false;
                     document.getElementById('version-modal').classList.add('hidden');
                     this._updateStatus('Restored', 'saved');
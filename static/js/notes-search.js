@@ -0,0 +1,75 @@
+(function () {
+    'use strict';
+
+    var dataEl = document.getElementById('notes-search-config');
+    var input = document.getElementById('notes-search-input');
+    var resultsEl = document.getElementById('notes-search-results');
+    if (!dataEl || !input || !resultsEl) return;
+    var config = JSON.parse(dataEl.textContent);
+
+    var timer = null;
+    var controller = null;
+
+    // Builds the snippet from text nodes + <mark> so note content is never parsed as HTML
+    function renderSnippet(el, text, highlights) {
+        var pos = 0;
+        highlights.forEach(function (range) {
+            if (range[0] > pos) el.appendChild(document.createTextNode(text.slice(pos, range[0])));
+            var mark = document.createElement('mark');
+            mark.className = 'bg-emerald-500/20 text-inherit rounded px-0.5';
+            mark.textContent = text.slice(range[0], range[1]);
+            el.appendChild(mark);
+            pos = range[1];
+        });
+        if (pos < text.length) el.appendChild(document.createTextNode(text.slice(pos)));
+    }
+
+    function render(data) {
+        resultsEl.innerHTML = '';
+        if (!data.results.length) {
+            var empty = document.createElement('p');
+            empty.className = 'text-sm text-muted-foreground';
+            empty.textContent = 'No notes match “' + data.query + '”.';
+            resultsEl.appendChild(empty);
+            return;
+        }
+        data.results.forEach(function (hit) {
+            var link = document.createElement('a');
+            link.href = hit.url || '#';
+            link.className = 'block border border-border rounded-lg p-3 hover:border-emerald-500/40 transition-colors';
+            var title = document.createElement('div');
+            title.className = 'text-sm font-semibold';
+            title.textContent = hit.title;
+            var snippet = document.createElement('p');
+            snippet.className = 'text-xs text-muted-foreground mt-1';
+            renderSnippet(snippet, hit.snippet, hit.highlights);
+            link.appendChild(title);
+            link.appendChild(snippet);
+            resultsEl.appendChild(link);
+        });
+    }
+
+    async function runSearch(query) {
+        if (controller) controller.abort();
+        controller = new AbortController();
+        try {
+            var resp = await fetch(config.searchUrl + '?q=' + encodeURIComponent(query), { signal: controller.signal });
+            var data = await resp.json();
+            if (data.success && input.value.trim() === query) render(data);
+        } catch (e) {
+            if (e.name !== 'AbortError') console.error('Note search failed', e);
+        }
+    }
+
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        var query = input.value.trim();
+        if (!query) {
+            resultsEl.classList.add('hidden');
+            resultsEl.innerHTML = '';
+            return;
+        }
+        resultsEl.classList.remove('hidden');
+        timer = setTimeout(function () { runSearch(query); }, 150);
+    });
+})();
@@ -0,0 +1,41 @@
+/**
+ * Unread-notification badge for the navbar bell.
+ * The page renders the count; it is fetched again (a cache read) only when
+ * the tab comes back into view or a notification is marked read. There is
+ * no timer, so an idle tab makes no requests.
+ */
+(function () {
+    'use strict';
+
+    const badge = document.getElementById('notificationsBadge');
+    if (!badge) return;
+
+    // Flipping between tabs should not refetch more often than this
+    const MIN_REFRESH_MS = 30000;
+    let lastRefresh = Date.now();
+
+    function render(count) {
+        const value = parseInt(count, 10) || 0;
+        badge.textContent = value > 99 ? '99+' : String(value);
+        badge.classList.toggle('hidden', value <= 0);
+    }
+
+    async function refresh() {
+        lastRefresh = Date.now();
+        try {
+            const response = await fetch(badge.dataset.pollUrl, { credentials: 'same-origin' });
+            if (response.ok) {
+                render((await response.json()).count);
+            }
+        } catch (e) {
+            // network hiccup — the next focus or mark-read tries again
+        }
+    }
+
+    document.addEventListener('visibilitychange', () => {
+        if (!document.hidden && Date.now() - lastRefresh >= MIN_REFRESH_MS) {
+            refresh();
+        }
+    });
+    document.body.addEventListener('notifications-updated', refresh);
+})();
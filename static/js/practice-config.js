@@ -61,6 +61,18 @@
         a.href = url;
     }
 
+    // Poll a background generation job until it finishes, showing progress.
+    async function pollGenerationJob(url, textEl) {
+        while (true) {
+            await new Promise(function (r) { setTimeout(r, 1500); });
+            var resp = await fetch(url, { headers: { 'Accept': 'application/json' } });
+            var job = await resp.json();
+            if (!job.success) return { status: 'FAILED', error: job.error };
+            if (job.status === 'COMPLETED' || job.status === 'FAILED') return job;
+            textEl.textContent = 'Generating\u2026 ' + job.generated + '/' + job.total;
+        }
+    }
+
     window.aiGenerate = async function () {
         if (!selectedSubjectId) return alert('Please select a subject first.');
         var types = getSelectedTypes();
@@ -89,11 +101,20 @@
                 })
             });
             var data = await resp.json();
-            if (data.success) {
-                window.location.href = '/practice/quiz/' + data.set_id + '/';
-            } else {
+            if (!data.success) {
                 alert('AI generation failed: ' + data.error);
+                return;
+            }
+            if (data.set_id) {
+                window.location.href = '/practice/quiz/' + data.set_id + '/';
+                return;
+            }
+            var job = await pollGenerationJob(data.status_url, text);
+            if (job.status === 'COMPLETED' && job.set_id) {
+                window.location.href = '/practice/quiz/' + job.set_id + '/';
+                return;
             }
+            alert('AI generation failed: ' + (job.error || 'Unknown error'));
         } catch (e) {
             alert('Network error: ' + e.message);
         } finally {